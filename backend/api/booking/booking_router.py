@@ -4,6 +4,7 @@ from .client_orders import router as client_orders_router
 from .creative_orders import router as creative_orders_router
 from .booking_actions import router as booking_actions_router
 from .deliverables import router as deliverables_router
+from .upload_sessions import router as upload_sessions_router
 from .invoices import router as invoices_router
 
 # Main router for booking endpoints
@@ -26,5 +27,6 @@ router.include_router(client_orders_router)
 router.include_router(creative_orders_router)
 router.include_router(booking_actions_router)
 router.include_router(deliverables_router)
+router.include_router(upload_sessions_router)
 router.include_router(invoices_router)
 
@@ -1,17 +1,24 @@
 """Deliverables router for booking endpoints"""
 from fastapi import APIRouter, HTTPException, Request, Depends, File, UploadFile, Body
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any, List
 import logging
 import uuid
 import os
-from urllib.parse import urlparse
+import asyncio
 from core.limiter import limiter
 from core.verify import require_auth
 from core.safe_errors import log_exception_if_dev, is_dev_env
 from db.db_session import get_authenticated_client_dep, db_admin
+from db.query_executor import run_query, run_blocking
 from supabase import Client
 from services.file_scanning.scanner_service import ScannerService
 from util.storage_setup import ensure_bucket_exists
+from util.upload_spool import get_upload_size, open_upload_body, close_upload_body
+from util.signed_urls import normalize_storage_path, create_signed_urls, create_signed_url, signed_url_cache
+from util.zip_stream import parse_range
+from services.booking.deliverables_archive import DeliverablesArchive, ARCHIVE_DELIVERABLE_FIELDS
+from services.booking.storage_limits import check_storage_limit
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
@@ -62,113 +69,6 @@ def check_file_exists_in_storage(bucket_name: str, file_path: str) -> bool:
         return False
 
 
-def format_storage_size(bytes: int) -> str:
-    """Format bytes to human-readable size"""
-    if bytes == 0:
-        return "0 B"
-    k = 1024
-    sizes = ['B', 'KB', 'MB', 'GB']
-    i = int(bytes.bit_length() / 10) if bytes > 0 else 0
-    i = min(i, len(sizes) - 1)
-    return f"{(bytes / (k ** i)):.2f} {sizes[i]}"
-
-
-async def check_storage_limit(
-    user_id: str,
-    new_files_size: int,
-    client: Client
-) -> tuple[bool, str]:
-    """
-    Check if uploading new files would exceed storage limit.
-    Returns (is_allowed, error_message)
-    """
-    try:
-        # Get creative profile with subscription tier
-        creative_result = client.table('creatives')\
-            .select('subscription_tier_id')\
-            .eq('user_id', user_id)\
-            .single()\
-            .execute()
-        
-        if not creative_result.data:
-            # No creative profile found, allow upload (shouldn't happen but be safe)
-            return True, ""
-        
-        subscription_tier_id = creative_result.data.get('subscription_tier_id')
-        if not subscription_tier_id:
-            # No subscription tier, allow upload
-            return True, ""
-        
-        # Get storage limit from subscription tier
-        tier_result = client.table('subscription_tiers')\
-            .select('storage_amount_bytes')\
-            .eq('id', subscription_tier_id)\
-            .single()\
-            .execute()
-        
-        if not tier_result.data:
-            # No tier data, allow upload
-            return True, ""
-        
-        storage_limit_bytes = tier_result.data.get('storage_amount_bytes', 0)
-        if storage_limit_bytes == 0:
-            # No storage limit set, allow upload
-            return True, ""
-        
-        # Calculate actual storage used from deliverables (deduplicated by file_url)
-        bookings_result = client.table('bookings')\
-            .select('id')\
-            .eq('creative_user_id', user_id)\
-            .execute()
-        
-        if not bookings_result.data:
-            # No bookings, storage used is 0
-            current_storage_used = 0
-        else:
-            booking_ids = [b['id'] for b in bookings_result.data]
-            
-            # Get all deliverables
-            deliverables_result = db_admin.table('booking_deliverables')\
-                .select('file_size_bytes, file_url')\
-                .in_('booking_id', booking_ids)\
-                .execute()
-            
-            # Deduplicate by file_url (same logic as frontend)
-            seen_file_urls = set()
-            unique_deliverables = []
-            for deliverable in (deliverables_result.data or []):
-                file_url = deliverable.get('file_url')
-                if file_url and file_url not in seen_file_urls:
-                    seen_file_urls.add(file_url)
-                    unique_deliverables.append(deliverable)
-            
-            # Calculate total storage used
-            current_storage_used = sum(
-                d.get('file_size_bytes', 0) or 0
-                for d in unique_deliverables
-                if isinstance(d.get('file_size_bytes'), (int, float))
-            )
-        
-        # Check if adding new files would exceed limit
-        total_after_upload = current_storage_used + new_files_size
-        
-        if total_after_upload > storage_limit_bytes:
-            overage = total_after_upload - storage_limit_bytes
-            remaining = max(0, storage_limit_bytes - current_storage_used)
-            error_msg = (
-                f"Uploading these files would exceed your storage limit by {format_storage_size(overage)}. "
-                f"You have {format_storage_size(remaining)} remaining out of {format_storage_size(storage_limit_bytes)} total storage."
-            )
-            return False, error_msg
-        
-        return True, ""
-    
-    except Exception as e:
-        log_exception_if_dev(logger, "Error checking storage limit", e)
-        # On error, allow upload (fail open) but log the error
-        return True, ""
-
-
 class FileUploadInfo(BaseModel):
     file_name: str
     file_size: int
@@ -203,11 +103,10 @@ async def get_upload_paths(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Verify booking exists and user is the creative
-        booking_result = client.table('bookings')\
+        booking_result = await run_query(client.table('bookings')\
             .select('id, creative_user_id')\
             .eq('id', booking_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not booking_result.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -247,6 +146,27 @@ async def get_upload_paths(
         raise HTTPException(status_code=500, detail="Failed to generate upload paths")
 
 
+# Paths per booking_deliverables lookup (they go in the query string) and rows per insert
+REGISTER_LOOKUP_BATCH_SIZE = 200
+REGISTER_INSERT_BATCH_SIZE = 500
+
+
+async def find_registered_paths(booking_id: str, storage_paths: List[str]) -> set:
+    """Which of storage_paths are already registered as deliverables of the booking"""
+    batches = [
+        storage_paths[batch_start:batch_start + REGISTER_LOOKUP_BATCH_SIZE]
+        for batch_start in range(0, len(storage_paths), REGISTER_LOOKUP_BATCH_SIZE)
+    ]
+    results = await asyncio.gather(*(
+        run_query(db_admin.table('booking_deliverables')\
+            .select('file_url')\
+            .eq('booking_id', booking_id)\
+            .in_('file_url', batch))
+        for batch in batches
+    ))
+    return {row['file_url'] for result in results for row in (result.data or [])}
+
+
 @router.post("/register-uploaded-files")
 @limiter.limit("20 per minute")
 async def register_uploaded_files(
@@ -259,7 +179,8 @@ async def register_uploaded_files(
     Register files that were uploaded directly to Supabase Storage
     Requires authentication - will return 401 if not authenticated.
     - Verifies user is the creative for this booking
-    - Registers file metadata in booking_deliverables table
+    - Registers file metadata in booking_deliverables table in bulk (one existing-path lookup, one multi-row insert per 500 files)
+    - Returns per-file results; files registered before are flagged already_exists
     - Returns registered file information
     """
     try:
@@ -270,11 +191,10 @@ async def register_uploaded_files(
         booking_id = register_request.booking_id
         
         # Verify booking exists and user is the creative
-        booking_result = client.table('bookings')\
+        booking_result = await run_query(client.table('bookings')\
             .select('id, creative_user_id')\
             .eq('id', booking_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not booking_result.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -286,75 +206,63 @@ async def register_uploaded_files(
         if not register_request.files or len(register_request.files) == 0:
             raise HTTPException(status_code=400, detail="No files provided")
         
-        # Check storage limit before registering files
-        total_new_files_size = sum(f.file_size for f in register_request.files)
+        # One lookup for paths that are already registered (repeat calls, retried uploads)
+        storage_paths = list(dict.fromkeys(f.storage_path for f in register_request.files))
+        existing_paths = await find_registered_paths(booking_id, storage_paths)
+        
+        # First occurrence of each new path gets registered; repeats count as existing
+        new_files = []
+        seen_paths = set(existing_paths)
+        for file_info in register_request.files:
+            if file_info.storage_path not in seen_paths:
+                seen_paths.add(file_info.storage_path)
+                new_files.append(file_info)
+        
+        # Check storage limit before registering files (only files not registered yet count)
+        total_new_files_size = sum(f.file_size for f in new_files)
         is_allowed, error_message = await check_storage_limit(user_id, total_new_files_size, client)
         if not is_allowed:
             raise HTTPException(status_code=403, detail=error_message)
         
-        # Register files in database
+        # Register new files in one multi-row insert per batch; rows another request registered
+        # meanwhile are skipped by the unique (booking_id, file_url) key
+        inserted_paths = set()
+        try:
+            for batch_start in range(0, len(new_files), REGISTER_INSERT_BATCH_SIZE):
+                batch = new_files[batch_start:batch_start + REGISTER_INSERT_BATCH_SIZE]
+                insert_result = await run_query(db_admin.table('booking_deliverables').upsert([
+                    {
+                        'booking_id': booking_id,
+                        'file_url': file_info.storage_path,
+                        'file_name': file_info.file_name,
+                        'file_size_bytes': file_info.file_size,  # Column name is file_size_bytes, not file_size
+                        'file_type': file_info.file_type or 'application/octet-stream'
+                    }
+                    for file_info in batch
+                ], on_conflict='booking_id,file_url', ignore_duplicates=True))
+                inserted_paths.update(row.get('file_url') for row in (insert_result.data or []))
+        except Exception as insert_error:
+            log_exception_if_dev(logger, "Failed to register files", insert_error)
+            raise HTTPException(status_code=500, detail="Failed to register files")
+        
         registered_files = []
         for file_info in register_request.files:
-            # Use the storage path provided (from the upload)
-            storage_path = file_info.storage_path
-            
-            # Check if file with this file_url already exists for this booking
-            # This prevents duplicate entries if the endpoint is called multiple times
-            existing_file = db_admin.table('booking_deliverables')\
-                .select('id')\
-                .eq('booking_id', booking_id)\
-                .eq('file_url', storage_path)\
-                .limit(1)\
-                .execute()
-            
-            if existing_file.data and len(existing_file.data) > 0:
-                # File already exists, skip insertion
-                if is_dev_env():
-                    logger.warning("File with same path already exists for booking, skipping duplicate registration")
-                registered_files.append({
-                    "file_url": storage_path,
-                    "file_name": file_info.file_name,
-                    "file_size": file_info.file_size,
-                    "file_type": file_info.file_type or "application/octet-stream",
-                    "storage_path": storage_path,
-                    "already_exists": True
-                })
-                continue
-            
-            # Insert into booking_deliverables table
-            try:
-                insert_result = db_admin.table('booking_deliverables').insert({
-                    'booking_id': booking_id,
-                    'file_url': storage_path,
-                    'file_name': file_info.file_name,
-                    'file_size_bytes': file_info.file_size,  # Column name is file_size_bytes, not file_size
-                    'file_type': file_info.file_type or 'application/octet-stream'
-                }).execute()
-                
-                registered_files.append({
-                    "file_url": storage_path,
-                    "file_name": file_info.file_name,
-                    "file_size": file_info.file_size,
-                    "file_type": file_info.file_type or "application/octet-stream",
-                    "storage_path": storage_path
-                })
-            except Exception as insert_error:
-                error_str = str(insert_error)
-                # Check if it's a unique constraint violation (duplicate file_url)
-                if 'unique' in error_str.lower() or 'duplicate' in error_str.lower() or 'already exists' in error_str.lower():
-                    if is_dev_env():
-                        logger.warning("File with same path already exists for booking, skipping duplicate registration")
-                    registered_files.append({
-                        "file_url": storage_path,
-                        "file_name": file_info.file_name,
-                        "file_size": file_info.file_size,
-                        "file_type": file_info.file_type or "application/octet-stream",
-                        "storage_path": storage_path,
-                        "already_exists": True
-                    })
-                else:
-                    log_exception_if_dev(logger, "Failed to register file", insert_error)
-                    raise HTTPException(status_code=500, detail="Failed to register file")
+            registered_file = {
+                "file_url": file_info.storage_path,
+                "file_name": file_info.file_name,
+                "file_size": file_info.file_size,
+                "file_type": file_info.file_type or "application/octet-stream",
+                "storage_path": file_info.storage_path
+            }
+            if file_info.storage_path in inserted_paths:
+                # Only the first of repeated paths in the request was inserted
+                inserted_paths.discard(file_info.storage_path)
+            else:
+                registered_file["already_exists"] = True
+            registered_files.append(registered_file)
+        
+        if is_dev_env() and len(registered_files) > len(new_files):
+            logger.warning("Skipped %s duplicate file registrations for booking", len(registered_files) - len(new_files))
         
         return {
             "success": True,
@@ -392,11 +300,10 @@ async def upload_deliverables(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Verify booking exists and user is the creative
-        booking_result = client.table('bookings')\
+        booking_result = await run_query(client.table('bookings')\
             .select('id, creative_user_id')\
             .eq('id', booking_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not booking_result.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -415,99 +322,61 @@ async def upload_deliverables(
                 logger.error("Failed to ensure bucket exists")
             raise HTTPException(status_code=500, detail="Storage bucket not available. Please contact support.")
         
-        # First pass: read all files to get sizes for storage check
-        # We need to read files first to check storage, but files can only be read once
-        # So we'll read into memory, check storage, then process
-        from io import BytesIO
-        file_data = []
-        total_new_files_size = 0
-        
-        for file in files:
-            try:
-                content = await file.read()
-                file_size = len(content)
-                total_new_files_size += file_size
-                file_data.append({
-                    'file': file,
-                    'content': content,
-                    'file_size': file_size,
-                    'filename': file.filename,
-                    'content_type': file.content_type
-                })
-            except Exception as e:
-                log_exception_if_dev(logger, "Error reading file", e)
-                raise HTTPException(status_code=500, detail="Failed to read file")
+        # Sizes come from the request spool, so nothing is read into memory before the storage check
+        total_new_files_size = sum(get_upload_size(file) for file in files)
         
         # Check storage limit before processing files
         is_allowed, error_message = await check_storage_limit(user_id, total_new_files_size, client)
         if not is_allowed:
             raise HTTPException(status_code=403, detail=error_message)
         
-        # Validate and scan all files, then upload
+        # Validate and scan all files concurrently (ClamAV caps how many scans actually run at once), then upload
         scanner = ScannerService()
         max_size = 30 * 1024 * 1024 * 1024  # 30GB limit
+        scan_results = await asyncio.gather(*[
+            scanner.scan_and_validate(
+                file,
+                max_size=max_size,
+                allowed_extensions=None,  # Allow all file types except dangerous ones
+                fail_if_scanner_unavailable=False  # Don't fail if scanner is down
+            )
+            for file in files
+        ])
+        if not all(is_safe for is_safe, _, _ in scan_results):
+            raise HTTPException(status_code=400, detail="File validation failed")
+        
         uploaded_files = []
         
-        for file_info in file_data:
+        for file in files:
             try:
-                # Create a file-like object for scanning
-                from io import BytesIO
-                
-                # Create a mock UploadFile-like object for the scanner
-                class FileWrapper:
-                    def __init__(self, filename, content, content_type):
-                        self.filename = filename
-                        self._content = content
-                        self.content_type = content_type
-                        self._read = False
-                    
-                    async def read(self):
-                        if self._read:
-                            return b''
-                        self._read = True
-                        return self._content
-                
-                file_wrapper = FileWrapper(
-                    file_info['filename'],
-                    file_info['content'],
-                    file_info['content_type']
-                )
-                
-                # Validate and scan file
-                is_safe, error_message, scan_details = await scanner.scan_and_validate(
-                    file_wrapper, 
-                    max_size=max_size,
-                    allowed_extensions=None,  # Allow all file types except dangerous ones
-                    fail_if_scanner_unavailable=False  # Don't fail if scanner is down
-                )
-                
-                if not is_safe:
-                    raise HTTPException(status_code=400, detail="File validation failed")
-                
                 # Generate unique filename
-                file_extension = os.path.splitext(file_info['filename'])[1] if file_info['filename'] and '.' in file_info['filename'] else ''
+                file_extension = os.path.splitext(file.filename)[1] if file.filename and '.' in file.filename else ''
                 unique_id = uuid.uuid4().hex
                 storage_path = f"{booking_id}/{unique_id}{file_extension}"
                 
                 # Upload to Supabase Storage
+                body = await open_upload_body(file)
                 try:
-                    upload_result = db_admin.storage.from_(bucket_name).upload(
+                    upload_result = await run_blocking(
+                        db_admin.storage.from_(bucket_name).upload,
                         path=storage_path,
-                        file=file_info['content'],
+                        file=body,
                         file_options={
-                            "content-type": file_info['content_type'] or "application/octet-stream",
+                            "content-type": file.content_type or "application/octet-stream",
                             "cache-control": "3600"
                         }
                     )
                 except Exception as upload_error:
                     log_exception_if_dev(logger, "Failed to upload file to storage", upload_error)
                     raise HTTPException(status_code=500, detail="Failed to upload file")
+                finally:
+                    close_upload_body(body)
                 
                 uploaded_files.append({
                     "file_url": storage_path,
-                    "file_name": file_info['filename'],
-                    "file_size": file_info['file_size'],
-                    "file_type": file_info['content_type'] or "application/octet-stream",
+                    "file_name": file.filename,
+                    "file_size": get_upload_size(file),
+                    "file_type": file.content_type or "application/octet-stream",
                     "storage_path": storage_path
                 })
                 
@@ -553,11 +422,10 @@ async def upload_deliverable(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Verify booking exists and user is the creative
-        booking_result = client.table('bookings')\
+        booking_result = await run_query(client.table('bookings')\
             .select('id, creative_user_id')\
             .eq('id', booking_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not booking_result.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -579,9 +447,7 @@ async def upload_deliverable(
         if not is_safe:
             raise HTTPException(status_code=400, detail=error_message or "File validation failed")
         
-        # Read file content
-        content = await file.read()
-        file_size = len(content)
+        file_size = get_upload_size(file)
         
         # Check storage limit before uploading
         is_allowed, error_message = await check_storage_limit(user_id, file_size, client)
@@ -602,10 +468,12 @@ async def upload_deliverable(
                 logger.error("Failed to ensure bucket exists")
             raise HTTPException(status_code=500, detail="Storage bucket not available. Please contact support.")
         
+        body = await open_upload_body(file)
         try:
-            upload_result = db_admin.storage.from_(bucket_name).upload(
+            upload_result = await run_blocking(
+                db_admin.storage.from_(bucket_name).upload,
                 path=storage_path,
-                file=content,
+                file=body,
                 file_options={
                     "content-type": file.content_type or "application/octet-stream",
                     "cache-control": "3600"
@@ -614,6 +482,8 @@ async def upload_deliverable(
         except Exception as upload_error:
             log_exception_if_dev(logger, "Failed to upload file to storage", upload_error)
             raise HTTPException(status_code=500, detail="Failed to upload file")
+        finally:
+            close_upload_body(body)
         
         # Get the storage path (not public URL - we'll use signed URLs for downloads)
         # Store the path, not a public URL
@@ -635,6 +505,43 @@ async def upload_deliverable(
         raise HTTPException(status_code=500, detail="Failed to upload deliverable")
 
 
+async def get_downloadable_booking(client: Client, booking_id: str, user_id: str) -> Dict[str, Any]:
+    """
+    Booking whose deliverables user_id may download
+    
+    - The user must be the booking's client or creative
+    - Clients can only download once client_status is 'download' or 'completed'
+    - Creatives can always download (they can see their own deliverables)
+    
+    Raises:
+        HTTPException: 404 if the booking doesn't exist, 403 if the user may not download
+    """
+    booking_result = await run_query(client.table('bookings')\
+        .select('id, client_user_id, creative_user_id, client_status, payment_status, amount_paid, price')\
+        .eq('id', booking_id)\
+        .single())
+    
+    if not booking_result.data:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    
+    booking = booking_result.data
+    
+    # Verify user is either the client or the creative
+    client_user_id = booking.get('client_user_id')
+    creative_user_id = booking.get('creative_user_id')
+    if client_user_id != user_id and creative_user_id != user_id:
+        raise HTTPException(status_code=403, detail="You are not authorized to download files for this booking")
+    
+    is_creative = creative_user_id == user_id
+    if not is_creative and booking.get('client_status') not in ['download', 'completed']:
+        raise HTTPException(
+            status_code=403, 
+            detail="Files are not available for download yet. Please complete payment if required."
+        )
+    
+    return booking
+
+
 @router.get("/download-deliverables/{booking_id}")
 @limiter.limit("10 per minute")
 async def download_deliverables_batch(
@@ -657,44 +564,12 @@ async def download_deliverables_batch(
         if not user_id:
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
-        # Get booking to verify client/creative and payment status
-        booking_result = client.table('bookings')\
-            .select('id, client_user_id, creative_user_id, client_status, payment_status, amount_paid, price')\
-            .eq('id', booking_id)\
-            .single()\
-            .execute()
-        
-        if not booking_result.data:
-            raise HTTPException(status_code=404, detail="Booking not found")
-        
-        booking = booking_result.data
-        
-        # Verify user is either the client or the creative
-        client_user_id = booking.get('client_user_id')
-        creative_user_id = booking.get('creative_user_id')
-        if client_user_id != user_id and creative_user_id != user_id:
-            raise HTTPException(status_code=403, detail="You are not authorized to download files for this booking")
-        
-        # Check if payment is required and if it's been paid
-        client_status = booking.get('client_status')
-        payment_status = booking.get('payment_status')
-        amount_paid = float(booking.get('amount_paid', 0))
-        price = float(booking.get('price', 0))
-        
-        # For clients: Only allow download if client_status is 'download' or 'completed'
-        # For creatives: Always allow download (they can see their own deliverables)
-        is_creative = creative_user_id == user_id
-        if not is_creative and client_status not in ['download', 'completed']:
-            raise HTTPException(
-                status_code=403, 
-                detail="Files are not available for download yet. Please complete payment if required."
-            )
+        await get_downloadable_booking(client, booking_id, user_id)
         
         # Get all deliverables for this booking
-        deliverables_result = client.table('booking_deliverables')\
+        deliverables_result = await run_query(client.table('booking_deliverables')\
             .select('id, booking_id, file_url, file_name')\
-            .eq('booking_id', booking_id)\
-            .execute()
+            .eq('booking_id', booking_id))
         
         if not deliverables_result.data or len(deliverables_result.data) == 0:
             return {
@@ -703,150 +578,63 @@ async def download_deliverables_batch(
                 "total_files": 0
             }
         
-        # Generate signed URLs for all files
+        # Generate signed URLs for all files in one sign request (expires in 1 hour)
         bucket_name = "booking-deliverables"
         files_with_urls = []
-        deliverable_ids_to_update = []
-        from datetime import datetime, timezone
-        
-        # Get current timestamp once for all updates
-        downloaded_at_iso = datetime.now(timezone.utc).isoformat()
-        
-        # First pass: Generate all signed URLs and collect deliverable IDs
         failed_files = []
+        deliverable_paths = []
+        
         for deliverable in deliverables_result.data:
-            deliverable_id = deliverable.get('id')
             file_path = deliverable.get('file_url')
-            file_name = deliverable.get('file_name', 'Unknown')
-            
             if not file_path:
                 if is_dev_env():
                     logger.warning("File path not found for deliverable")
                 failed_files.append({
-                    "deliverable_id": deliverable_id,
-                    "file_name": file_name,
+                    "deliverable_id": deliverable.get('id'),
+                    "file_name": deliverable.get('file_name', 'Unknown'),
                     "error": "File path not found in database"
                 })
                 continue
-            
-            # Normalize file path - remove any leading slashes or bucket prefixes
-            # file_path should be in format: "booking_id/filename.ext"
-            normalized_path = file_path.strip()
-            
-            # Remove leading slashes
-            normalized_path = normalized_path.lstrip('/')
-            
-            # Remove bucket name prefix if present
-            if normalized_path.startswith(f"{bucket_name}/"):
-                normalized_path = normalized_path[len(f"{bucket_name}/"):]
-            
-            # If it looks like a full URL, try to extract the path
-            # This handles cases where file_url might have been stored as a URL
-            if normalized_path.startswith('http://') or normalized_path.startswith('https://'):
-                # Try to extract path from URL
-                # Format: https://project.supabase.co/storage/v1/object/public/bucket/path
-                # or: https://project.supabase.co/storage/v1/object/sign/bucket/path
-                try:
-                    parsed = urlparse(normalized_path)
-                    # Extract path after bucket name
-                    path_parts = parsed.path.split('/')
-                    if bucket_name in path_parts:
-                        bucket_index = path_parts.index(bucket_name)
-                        if bucket_index + 1 < len(path_parts):
-                            normalized_path = '/'.join(path_parts[bucket_index + 1:])
-                except Exception as parse_error:
-                    log_exception_if_dev(logger, "Failed to parse URL path for deliverable", parse_error)
-                    # Keep original path and let it fail with a clear error
-            
-            try:
-                logger.debug(f"Attempting to generate signed URL for deliverable {deliverable_id}: {normalized_path}")
-                
-                # Generate signed URL (expires in 1 hour = 3600 seconds)
-                signed_url_result = db_admin.storage.from_(bucket_name).create_signed_url(
-                    normalized_path,
-                    3600  # expires in 1 hour (seconds)
-                )
-                
-                # Extract signed URL from result
-                if isinstance(signed_url_result, dict):
-                    signed_url = signed_url_result.get('signedURL') or signed_url_result.get('signed_url') or signed_url_result.get('url')
-                elif isinstance(signed_url_result, str):
-                    signed_url = signed_url_result
-                else:
-                    signed_url = getattr(signed_url_result, 'signedURL', None) or getattr(signed_url_result, 'signed_url', None) or getattr(signed_url_result, 'url', None)
-                
-                if not signed_url:
-                    if is_dev_env():
-                        logger.error("Failed to generate signed URL for deliverable: No URL in response")
-                    failed_files.append({
-                        "deliverable_id": deliverable_id,
-                        "file_name": file_name,
-                        "error": "Failed to generate signed URL"
-                    })
-                    continue
-                
-                files_with_urls.append({
-                    "deliverable_id": deliverable_id,
-                    "file_name": file_name,
-                    "signed_url": signed_url,
-                    "expires_in": 3600
-                })
-                
-                # Collect deliverable ID for batch update
-                deliverable_ids_to_update.append(deliverable_id)
-                logger.debug(f"Successfully generated signed URL for deliverable {deliverable_id} ({file_name})")
-                    
-            except Exception as url_error:
-                error_msg = str(url_error)
-                # Check if it's a 404/not found error and provide a clearer message
-                if '404' in error_msg or 'not_found' in error_msg.lower() or 'Object not found' in error_msg:
-                    clear_error = "File not found in storage. The file may have been deleted or never uploaded successfully."
-                    if is_dev_env():
-                        logger.warning("File missing from storage for deliverable: %s", normalized_path)
-                else:
-                    clear_error = "Failed to generate download URL."
-                    log_exception_if_dev(logger, "Error processing deliverable", url_error)
-                
+            deliverable_paths.append((deliverable, normalize_storage_path(file_path, bucket_name)))
+        
+        signed_urls = await create_signed_urls(bucket_name, [path for _, path in deliverable_paths], 3600)
+        
+        for deliverable, normalized_path in deliverable_paths:
+            signed = signed_urls[normalized_path]
+            if 'error' in signed:
+                if is_dev_env():
+                    logger.warning("Failed to sign deliverable %s: %s", normalized_path, signed['error'])
                 failed_files.append({
-                    "deliverable_id": deliverable_id,
-                    "file_name": file_name,
-                    "error": clear_error,
+                    "deliverable_id": deliverable.get('id'),
+                    "file_name": deliverable.get('file_name', 'Unknown'),
+                    "error": signed['error'],
                     "file_path": normalized_path
                 })
-                # Continue with other files even if one fails
                 continue
+            files_with_urls.append({
+                "deliverable_id": deliverable.get('id'),
+                "file_name": deliverable.get('file_name', 'Unknown'),
+                "signed_url": signed['signed_url'],
+                "expires_in": signed['expires_in']
+            })
         
         # Log summary of failed files (dev only to avoid leaking detail)
         if failed_files and is_dev_env():
             logger.warning("Batch download: %s files failed to generate signed URLs", len(failed_files))
         
-        # Second pass: Update all files as downloaded in a single batch operation
+        # Mark all signed files as downloaded in a single update
+        deliverable_ids_to_update = [file_info['deliverable_id'] for file_info in files_with_urls]
         if deliverable_ids_to_update:
+            from datetime import datetime, timezone
+            downloaded_at_iso = datetime.now(timezone.utc).isoformat()
             try:
-                # Update all deliverables at once using IN clause
-                update_result = db_admin.table('booking_deliverables')\
+                await run_query(db_admin.table('booking_deliverables')\
                     .update({'downloaded_at': downloaded_at_iso})\
-                    .in_('id', deliverable_ids_to_update)\
-                    .execute()
-                
+                    .in_('id', deliverable_ids_to_update))
                 logger.info(f"Batch download: Marked {len(deliverable_ids_to_update)} files as downloaded at {downloaded_at_iso} for booking {booking_id}")
-                logger.info(f"Batch download: Updated deliverable IDs: {deliverable_ids_to_update}")
-            except Exception as batch_update_error:
-                # If batch update fails, try individual updates as fallback
-                log_exception_if_dev(logger, "Batch update failed, attempting individual updates", batch_update_error)
-                success_count = 0
-                for deliverable_id in deliverable_ids_to_update:
-                    try:
-                        db_admin.table('booking_deliverables')\
-                            .update({'downloaded_at': downloaded_at_iso})\
-                            .eq('id', deliverable_id)\
-                            .execute()
-                        success_count += 1
-                        logger.info(f"Fallback: Marked deliverable {deliverable_id} as downloaded")
-                    except Exception as individual_error:
-                        log_exception_if_dev(logger, "Failed to update deliverable", individual_error)
-                if is_dev_env():
-                    logger.warning("Fallback update: Successfully updated %s of %s files", success_count, len(deliverable_ids_to_update))
+            except Exception as update_error:
+                # Download tracking is best effort; don't fail the download
+                log_exception_if_dev(logger, "Failed to update downloaded_at for deliverables", update_error)
         
         # Log final summary
         total_deliverables = len(deliverables_result.data)
@@ -886,6 +674,80 @@ async def download_deliverables_batch(
         raise HTTPException(status_code=500, detail="Failed to generate download URLs")
 
 
+@router.get("/download-deliverables/{booking_id}/zip")
+@limiter.limit("10 per minute")
+async def download_deliverables_zip(
+    request: Request,
+    booking_id: str,
+    current_user: Dict[str, Any] = Depends(require_auth),
+    client: Client = Depends(get_authenticated_client_dep)
+):
+    """
+    Stream all deliverable files of a booking as one ZIP
+    Requires authentication - will return 401 if not authenticated.
+    - Same access rules as /download-deliverables/{booking_id}
+    - Files are stored (not recompressed) and streamed from storage as the response is written
+    - Supports single byte-range requests (and If-Range) so interrupted downloads can resume
+    - Files missing from storage are left out; X-Skipped-Files counts them
+    """
+    try:
+        user_id = current_user.get('sub')
+        if not user_id:
+            raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
+        
+        await get_downloadable_booking(client, booking_id, user_id)
+        
+        deliverables_result = await run_query(client.table('booking_deliverables')\
+            .select(ARCHIVE_DELIVERABLE_FIELDS)\
+            .eq('booking_id', booking_id)\
+            .order('created_at')\
+            .order('id'))
+        
+        archive = await DeliverablesArchive.build(booking_id, deliverables_result.data or [])
+        if not archive.layout.members:
+            raise HTTPException(status_code=404, detail="No files available for download")
+        
+        total_size = archive.total_size
+        range_header = request.headers.get('range')
+        if_range = request.headers.get('if-range')
+        if if_range and if_range != archive.etag:
+            # The archive changed since the partial download started; send all of it
+            range_header = None
+        
+        try:
+            byte_range = parse_range(range_header, total_size)
+        except ValueError:
+            raise HTTPException(
+                status_code=416,
+                detail="Requested range not satisfiable",
+                headers={"Content-Range": f"bytes */{total_size}"}
+            )
+        
+        start, end = byte_range or (0, total_size - 1)
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": archive.etag,
+            "Content-Length": str(end - start + 1),
+            "Content-Disposition": f'attachment; filename="EZ_Deliverables_{booking_id[:8]}.zip"',
+            "X-Skipped-Files": str(archive.skipped_count),
+        }
+        if byte_range:
+            headers["Content-Range"] = f"bytes {start}-{end}/{total_size}"
+        
+        return StreamingResponse(
+            archive.stream(start, end),
+            status_code=206 if byte_range else 200,
+            media_type="application/zip",
+            headers=headers
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_if_dev(logger, "Error preparing deliverables archive", e)
+        raise HTTPException(status_code=500, detail="Failed to prepare download")
+
+
 @router.get("/download-deliverable/{deliverable_id}")
 @limiter.limit("30 per minute")
 async def download_deliverable(
@@ -908,11 +770,10 @@ async def download_deliverable(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Get deliverable and booking info
-        deliverable_result = client.table('booking_deliverables')\
+        deliverable_result = await run_query(client.table('booking_deliverables')\
             .select('id, booking_id, file_url, file_name')\
             .eq('id', deliverable_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not deliverable_result.data:
             raise HTTPException(status_code=404, detail="Deliverable not found")
@@ -921,11 +782,10 @@ async def download_deliverable(
         booking_id = deliverable.get('booking_id')
         
         # Get booking to verify client/creative and payment status
-        booking_result = client.table('bookings')\
+        booking_result = await run_query(client.table('bookings')\
             .select('id, client_user_id, creative_user_id, client_status, payment_status, amount_paid, price')\
             .eq('id', booking_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not booking_result.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -962,24 +822,10 @@ async def download_deliverable(
         # Generate signed URL (expires in 1 hour = 3600 seconds)
         bucket_name = "booking-deliverables"
         try:
-            # Create signed URL using Supabase Storage
-            # The Python client uses create_signed_url method
-            signed_url_result = db_admin.storage.from_(bucket_name).create_signed_url(
-                file_path,
-                3600  # expires in 1 hour (seconds)
-            )
-            
-            # The result should be a dict with 'signedURL' or 'signed_url' key
-            if isinstance(signed_url_result, dict):
-                signed_url = signed_url_result.get('signedURL') or signed_url_result.get('signed_url') or signed_url_result.get('url')
-            elif isinstance(signed_url_result, str):
-                signed_url = signed_url_result
-            else:
-                # Try to get the URL from the result object
-                signed_url = getattr(signed_url_result, 'signedURL', None) or getattr(signed_url_result, 'signed_url', None) or getattr(signed_url_result, 'url', None)
-            
-            if not signed_url:
+            signed = await create_signed_url(bucket_name, normalize_storage_path(file_path, bucket_name), 3600)
+            if 'error' in signed:
                 raise HTTPException(status_code=500, detail="Failed to generate download URL")
+            signed_url = signed['signed_url']
             
             # Mark the file as downloaded (update downloaded_at timestamp)
             # Use db_admin to bypass RLS since this is a system tracking update
@@ -988,10 +834,9 @@ async def download_deliverable(
                 # Format timestamp as ISO 8601 string for PostgreSQL
                 downloaded_at_iso = datetime.now(timezone.utc).isoformat()
                 # Execute update - Supabase Python client may not return data, but update still works
-                db_admin.table('booking_deliverables')\
+                await run_query(db_admin.table('booking_deliverables')\
                     .update({'downloaded_at': downloaded_at_iso})\
-                    .eq('id', deliverable_id)\
-                    .execute()
+                    .eq('id', deliverable_id))
                 logger.info(f"Updated downloaded_at for deliverable {deliverable_id} to {downloaded_at_iso}")
             except Exception as update_error:
                 # Log error but don't fail the download
@@ -1001,7 +846,7 @@ async def download_deliverable(
                 "success": True,
                 "signed_url": signed_url,
                 "file_name": deliverable.get('file_name'),
-                "expires_in": 3600
+                "expires_in": signed['expires_in']
             }
             
         except Exception as url_error:
@@ -1035,7 +880,7 @@ async def get_creative_deliverables(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Single optimized query: Get deliverables with booking and service info
-        deliverables_result = client.table('booking_deliverables')\
+        deliverables_result = await run_query(client.table('booking_deliverables')\
             .select('''
                 id,
                 booking_id,
@@ -1054,8 +899,7 @@ async def get_creative_deliverables(
                     )
                 )
             ''')\
-            .eq('bookings.creative_user_id', user_id)\
-            .execute()
+            .eq('bookings.creative_user_id', user_id))
         
         if not deliverables_result.data or len(deliverables_result.data) == 0:
             return {
@@ -1077,10 +921,9 @@ async def get_creative_deliverables(
         # Fetch client names (only if we have client IDs)
         users_map = {}
         if client_user_ids:
-            users_result = client.table('users')\
+            users_result = await run_query(client.table('users')\
                 .select('user_id, name')\
-                .in_('user_id', client_user_ids)\
-                .execute()
+                .in_('user_id', client_user_ids))
             
             if users_result.data:
                 users_map = {u['user_id']: u['name'] for u in users_result.data}
@@ -1146,11 +989,10 @@ async def delete_deliverable(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Get deliverable info including booking
-        deliverable_result = client.table('booking_deliverables')\
+        deliverable_result = await run_query(client.table('booking_deliverables')\
             .select('id, booking_id, file_url, file_name')\
             .eq('id', deliverable_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not deliverable_result.data:
             raise HTTPException(status_code=404, detail="Deliverable not found")
@@ -1163,11 +1005,10 @@ async def delete_deliverable(
             raise HTTPException(status_code=400, detail="File URL not found for deliverable")
         
         # Verify booking exists and user is the creative
-        booking_result = client.table('bookings')\
+        booking_result = await run_query(client.table('bookings')\
             .select('id, creative_user_id')\
             .eq('id', booking_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not booking_result.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -1183,7 +1024,8 @@ async def delete_deliverable(
         # Delete from storage
         bucket_name = "booking-deliverables"
         try:
-            db_admin.storage.from_(bucket_name).remove([file_path])
+            await run_blocking(db_admin.storage.from_(bucket_name).remove, [file_path])
+            signed_url_cache.invalidate(bucket_name, normalize_storage_path(file_path, bucket_name))
             logger.info(f"Deleted file from storage: {file_path}")
         except Exception as storage_error:
             log_exception_if_dev(logger, "Failed to delete file from storage", storage_error)
@@ -1191,10 +1033,9 @@ async def delete_deliverable(
             # This prevents orphaned database records
         
         # Delete from database
-        delete_result = db_admin.table('booking_deliverables')\
+        delete_result = await run_query(db_admin.table('booking_deliverables')\
             .delete()\
-            .eq('id', deliverable_id)\
-            .execute()
+            .eq('id', deliverable_id))
         
         if not delete_result.data and is_dev_env():
             logger.warning("Deliverable may not have been deleted from database")
@@ -1,5 +1,5 @@
 """Invoices router for booking endpoints"""
-from fastapi import APIRouter, HTTPException, Request, Depends, Response
+from fastapi import APIRouter, HTTPException, Request, Depends
 from typing import Dict, Any
 import logging
 import stripe
@@ -7,9 +7,12 @@ from core.limiter import limiter
 from core.verify import require_auth
 from core.safe_errors import log_exception_if_dev
 from db.db_session import get_authenticated_client_dep
+from db.query_executor import run_query
 from supabase import Client
-from services.compliance.compliance_service import ComplianceService
-from services.invoice.invoice_service import InvoiceService
+from services.invoice.order_documents import (
+    OrderDocuments, BOOKING_DOCUMENT_FIELDS, ORDER_DOCUMENT_URL_EXPIRES_IN, booking_document_filename
+)
+from services.stripe.checkout_session_index import CheckoutSessionIndex
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -24,11 +27,11 @@ async def download_compliance_sheet(
     client: Client = Depends(get_authenticated_client_dep)
 ):
     """
-    Generate and download compliance sheet PDF for a booking
+    Get a download URL for the compliance sheet PDF of a booking
     Requires authentication - will return 401 if not authenticated.
     - Verifies user is the client for this booking
     - Only available for canceled, completed, and download status orders
-    - Generates PDF with compliance information
+    - Returns a signed URL (valid for one hour) to the stored compliance sheet
     """
     try:
         user_id = current_user.get('sub')
@@ -36,11 +39,10 @@ async def download_compliance_sheet(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Get booking to verify client and status
-        booking_result = client.table('bookings')\
-            .select('id, client_user_id, client_status, service_id, order_date, price, payment_option, approved_at, canceled_date, creative_user_id, split_deposit_amount')\
+        booking_result = await run_query(client.table('bookings')\
+            .select(BOOKING_DOCUMENT_FIELDS)\
             .eq('id', booking_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not booking_result.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -60,73 +62,16 @@ async def download_compliance_sheet(
                 detail=f"Compliance sheet is only available for orders with status: canceled, completed, or download. Current status: {client_status}"
             )
         
-        # Get service information
-        service_id = booking.get('service_id')
-        service_result = client.table('creative_services')\
-            .select('title, description')\
-            .eq('id', service_id)\
-            .single()\
-            .execute()
+        # Signed URL of the stored sheet (pre-rendered when the order reached this status)
+        url = await OrderDocuments.get_booking_document_url('compliance_sheet', booking)
         
-        service_name = service_result.data.get('title', 'Unknown Service') if service_result.data else 'Unknown Service'
-        
-        # Get creative information
-        creative_user_id = booking.get('creative_user_id')
-        creative_result = client.table('creatives')\
-            .select('display_name')\
-            .eq('user_id', creative_user_id)\
-            .single()\
-            .execute()
-        
-        creative_name = creative_result.data.get('display_name', 'Unknown Creative') if creative_result.data else 'Unknown Creative'
-        
-        # Get user information for creative name fallback
-        if not creative_name or creative_name == 'Unknown Creative':
-            user_result = client.table('users')\
-                .select('name')\
-                .eq('user_id', creative_user_id)\
-                .single()\
-                .execute()
-            if user_result.data:
-                creative_name = user_result.data.get('name', 'Unknown Creative')
-        
-        # Check for completed_date (this might be in a different field or calculated)
-        # For now, we'll use approved_at as a proxy if status is completed
-        completed_date = None
-        if client_status == 'completed':
-            # Try to get from booking updates or use approved_at as fallback
-            completed_date = booking.get('approved_at')
-        
-        # Prepare order data for compliance sheet
-        order_data = {
-            'id': booking.get('id'),
-            'service_name': service_name,
-            'creative_name': creative_name,
-            'order_date': booking.get('order_date'),
-            'price': float(booking.get('price', 0)),
-            'payment_option': booking.get('payment_option', 'later'),
-            'client_status': booking.get('client_status'),
-            'approved_at': booking.get('approved_at'),
-            'canceled_date': booking.get('canceled_date'),
-            'completed_date': completed_date,
-            'split_deposit_amount': booking.get('split_deposit_amount')
+        return {
+            'success': True,
+            'url': url,
+            'filename': booking_document_filename('compliance_sheet', booking_id),
+            'expires_in': ORDER_DOCUMENT_URL_EXPIRES_IN
         }
         
-        # Generate compliance sheet PDF
-        pdf_content = ComplianceService.generate_compliance_sheet(order_data)
-        
-        # Generate filename
-        filename = f"EZ_Compliance_Sheet_{booking_id[:8]}.pdf"
-        
-        # Return PDF as response
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
-        )
-        
     except HTTPException:
         raise
     except Exception as e:
@@ -152,11 +97,10 @@ async def get_invoices(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Get booking to verify client and status
-        booking_result = client.table('bookings')\
+        booking_result = await run_query(client.table('bookings')\
             .select('id, client_user_id, client_status, service_id, order_date, price, payment_option, approved_at, canceled_date, creative_user_id, amount_paid')\
             .eq('id', booking_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not booking_result.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -192,58 +136,32 @@ async def get_invoices(
             'download_url': f'/api/bookings/invoice/ez/{booking_id}'
         })
         
-        # Get Stripe receipts
+        # Get Stripe receipts from the local checkout session index
         try:
-            # Get creative's Stripe account ID
-            creative_user_id = booking.get('creative_user_id')
-            creative_result = client.table('creatives')\
-                .select('stripe_account_id')\
-                .eq('user_id', creative_user_id)\
-                .single()\
-                .execute()
+            sessions_by_booking = await CheckoutSessionIndex.get_paid_session_ids([booking_id], client)
+            booking_sessions = sessions_by_booking.get(str(booking_id), [])
             
-            if creative_result.data and creative_result.data.get('stripe_account_id'):
-                stripe_account_id = creative_result.data.get('stripe_account_id')
-                
-                # List all checkout sessions for this booking
-                # We'll search by metadata.booking_id
-                checkout_sessions = stripe.checkout.Session.list(
-                    limit=100,
-                    stripe_account=stripe_account_id
-                )
-                
-                # Filter sessions for this booking_id
-                booking_sessions = [
-                    session for session in checkout_sessions.data
-                    if session.metadata and session.metadata.get('booking_id') == booking_id
-                    and session.payment_status == 'paid'
-                ]
-                
-                # Sort sessions by creation date (oldest first) to ensure correct order for split payments
-                # First payment (deposit) should be Payment 1, second payment (final) should be Payment 2
-                booking_sessions.sort(key=lambda s: s.created if hasattr(s, 'created') else 0)
-                
-                # For split payments, there should be 2 sessions
-                # For upfront/later, there should be 1 session
-                payment_option = booking.get('payment_option', 'later').lower()
-                
-                if payment_option == 'split' and len(booking_sessions) >= 2:
-                    # Split payment: 2 Stripe receipts
-                    for idx, session in enumerate(booking_sessions[:2], 1):
-                        invoices.append({
-                            'type': 'stripe_receipt',
-                            'name': f'Stripe Receipt - Payment {idx}',
-                            'session_id': session.id,
-                            'download_url': f'/api/bookings/invoice/stripe/{booking_id}?session_id={session.id}'
-                        })
-                elif len(booking_sessions) >= 1:
-                    # Single payment: 1 Stripe receipt
+            # For split payments, there should be 2 sessions
+            # For upfront/later, there should be 1 session
+            payment_option = booking.get('payment_option', 'later').lower()
+            
+            if payment_option == 'split' and len(booking_sessions) >= 2:
+                # Split payment: 2 Stripe receipts
+                for idx, session_id in enumerate(booking_sessions[:2], 1):
                     invoices.append({
                         'type': 'stripe_receipt',
-                        'name': 'Stripe Receipt',
-                        'session_id': booking_sessions[0].id,
-                        'download_url': f'/api/bookings/invoice/stripe/{booking_id}?session_id={booking_sessions[0].id}'
+                        'name': f'Stripe Receipt - Payment {idx}',
+                        'session_id': session_id,
+                        'download_url': f'/api/bookings/invoice/stripe/{booking_id}?session_id={session_id}'
                     })
+            elif len(booking_sessions) >= 1:
+                # Single payment: 1 Stripe receipt
+                invoices.append({
+                    'type': 'stripe_receipt',
+                    'name': 'Stripe Receipt',
+                    'session_id': booking_sessions[0],
+                    'download_url': f'/api/bookings/invoice/stripe/{booking_id}?session_id={booking_sessions[0]}'
+                })
         except Exception as e:
             log_exception_if_dev(logger, "Could not retrieve Stripe receipts", e)
             # Continue without Stripe receipts
@@ -270,7 +188,8 @@ async def download_ez_invoice(
     client: Client = Depends(get_authenticated_client_dep)
 ):
     """
-    Generate and download EZ platform invoice PDF for a booking
+    Get a download URL for the EZ platform invoice PDF of a booking
+    Returns a signed URL (valid for one hour) to the stored invoice
     """
     try:
         user_id = current_user.get('sub')
@@ -278,11 +197,10 @@ async def download_ez_invoice(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Get booking to verify client and status
-        booking_result = client.table('bookings')\
-            .select('id, client_user_id, client_status, service_id, order_date, price, payment_option, approved_at, canceled_date, creative_user_id, amount_paid, booking_date, split_deposit_amount')\
+        booking_result = await run_query(client.table('bookings')\
+            .select(BOOKING_DOCUMENT_FIELDS)\
             .eq('id', booking_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not booking_result.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -309,89 +227,17 @@ async def download_ez_invoice(
                 detail=f"Invoice is only available for orders with status: canceled, completed, or download, or when payment has been received. Current status: {client_status}, Amount paid: ${amount_paid:.2f}"
             )
         
-        # Get service information
-        service_id = booking.get('service_id')
-        service_result = client.table('creative_services')\
-            .select('title, description')\
-            .eq('id', service_id)\
-            .single()\
-            .execute()
-        
-        service_name = service_result.data.get('title', 'Unknown Service') if service_result.data else 'Unknown Service'
-        service_description = service_result.data.get('description', '') if service_result.data else ''
+        # Signed URL of the stored invoice (pre-rendered for final statuses, stored on first
+        # download for paid in-progress orders)
+        url = await OrderDocuments.get_booking_document_url('invoice', booking)
         
-        # Get creative information
-        creative_user_id = booking.get('creative_user_id')
-        creative_result = client.table('creatives')\
-            .select('display_name')\
-            .eq('user_id', creative_user_id)\
-            .single()\
-            .execute()
-        
-        creative_name = creative_result.data.get('display_name', 'Unknown Creative') if creative_result.data else 'Unknown Creative'
-        
-        # Get user information
-        client_user_id = booking.get('client_user_id')
-        client_user_result = client.table('users')\
-            .select('name, email')\
-            .eq('user_id', client_user_id)\
-            .single()\
-            .execute()
-        
-        client_name = client_user_result.data.get('name', 'Unknown Client') if client_user_result.data else 'Unknown Client'
-        client_email = client_user_result.data.get('email', '') if client_user_result.data else ''
-        
-        # Get creative user info for email
-        creative_user_result = client.table('users')\
-            .select('name, email')\
-            .eq('user_id', creative_user_id)\
-            .single()\
-            .execute()
-        
-        creative_email = creative_user_result.data.get('email', '') if creative_user_result.data else ''
-        if not creative_name or creative_name == 'Unknown Creative':
-            creative_name = creative_user_result.data.get('name', 'Unknown Creative') if creative_user_result.data else 'Unknown Creative'
-        
-        # Check for completed_date
-        completed_date = None
-        if client_status == 'completed':
-            completed_date = booking.get('approved_at')
-        
-        # Prepare order data for invoice
-        order_data = {
-            'id': booking.get('id'),
-            'service_name': service_name,
-            'service_description': service_description,
-            'creative_name': creative_name,
-            'creative_email': creative_email,
-            'client_name': client_name,
-            'client_email': client_email,
-            'order_date': booking.get('order_date'),
-            'booking_date': booking.get('booking_date'),
-            'price': float(booking.get('price', 0)),
-            'payment_option': booking.get('payment_option', 'later'),
-            'amount_paid': float(booking.get('amount_paid', 0)),
-            'approved_at': booking.get('approved_at'),
-            'completed_date': completed_date,
-            'description': service_description,
-            'split_deposit_amount': booking.get('split_deposit_amount')
+        return {
+            'success': True,
+            'url': url,
+            'filename': booking_document_filename('invoice', booking_id),
+            'expires_in': ORDER_DOCUMENT_URL_EXPIRES_IN
         }
         
-        # Generate invoice PDF
-        pdf_content = InvoiceService.generate_client_invoice(order_data)
-        
-        # Generate filename
-        filename = f"EZ_Invoice_{booking_id[:8]}.pdf"
-        
-        # Return PDF as response
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
-        )
-        
     except HTTPException:
         raise
     except Exception as e:
@@ -418,11 +264,10 @@ async def download_stripe_receipt(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Get booking to verify client
-        booking_result = client.table('bookings')\
+        booking_result = await run_query(client.table('bookings')\
             .select('id, client_user_id, client_status, creative_user_id')\
             .eq('id', booking_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not booking_result.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -451,11 +296,10 @@ async def download_stripe_receipt(
         
         # Get creative's Stripe account ID
         creative_user_id = booking.get('creative_user_id')
-        creative_result = client.table('creatives')\
+        creative_result = await run_query(client.table('creatives')\
             .select('stripe_account_id')\
             .eq('user_id', creative_user_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not creative_result.data:
             raise HTTPException(status_code=404, detail="Creative not found")
@@ -5,6 +5,7 @@ import logging
 from core.verify import get_current_user_optional
 from core.safe_errors import log_exception_if_dev
 from db.db_session import get_authenticated_client_dep
+from db.query_executor import run_blocking
 from services.booking.booking_service import BookingService
 from supabase import Client
 
@@ -21,7 +22,7 @@ async def get_calendar_settings(
 ):
     """Get calendar settings for a service. Works without auth for invite page (public services only via RLS)."""
     try:
-        settings = BookingService.get_calendar_settings(service_id, client)
+        settings = await run_blocking(BookingService.get_calendar_settings, service_id, client)
         
         if not settings:
             raise HTTPException(status_code=404, detail="Calendar settings not found")
@@ -43,11 +44,11 @@ async def get_weekly_schedule(
     """Get weekly schedule for a service. Works without auth for invite page (public services only via RLS)."""
     try:
         # First get calendar settings to get the calendar_setting_id
-        calendar_settings = BookingService.get_calendar_settings(service_id, client)
+        calendar_settings = await run_blocking(BookingService.get_calendar_settings, service_id, client)
         if not calendar_settings:
             raise HTTPException(status_code=404, detail="Calendar settings not found")
         
-        schedule = BookingService.get_weekly_schedule(calendar_settings["id"], client)
+        schedule = await run_blocking(BookingService.get_weekly_schedule, calendar_settings["id"], client)
         
         return {"success": True, "data": schedule}
     except HTTPException:
@@ -66,18 +67,18 @@ async def get_time_slots(
     """Get all time slots for a service. Works without auth for invite page (public services only via RLS)."""
     try:
         # First get calendar settings to get the calendar_setting_id
-        calendar_settings = BookingService.get_calendar_settings(service_id, client)
+        calendar_settings = await run_blocking(BookingService.get_calendar_settings, service_id, client)
         if not calendar_settings:
             raise HTTPException(status_code=404, detail="Calendar settings not found")
         
         # Get weekly schedule
-        weekly_schedule = BookingService.get_weekly_schedule(calendar_settings["id"], client)
+        weekly_schedule = await run_blocking(BookingService.get_weekly_schedule, calendar_settings["id"], client)
         
         # Get time slots for each day
         all_time_slots = []
         for day in weekly_schedule:
             if day["is_enabled"]:
-                day_slots = BookingService.get_time_slots(day["id"], client)
+                day_slots = await run_blocking(BookingService.get_time_slots, day["id"], client)
                 all_time_slots.extend(day_slots)
         
         return {"success": True, "data": all_time_slots}
@@ -114,7 +115,7 @@ async def get_available_dates(
             except ValueError:
                 raise HTTPException(status_code=400, detail="Invalid end_date format. Use YYYY-MM-DD")
         
-        available_dates = BookingService.get_available_dates(service_id, client, start, end)
+        available_dates = await run_blocking(BookingService.get_available_dates, service_id, client, start, end)
         
         return {"success": True, "data": available_dates}
     except HTTPException:
@@ -139,7 +140,7 @@ async def get_available_time_slots(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid booking_date format. Use YYYY-MM-DD")
         
-        time_slots = BookingService.get_available_time_slots(service_id, booking_date_obj, client)
+        time_slots = await run_blocking(BookingService.get_available_time_slots, service_id, booking_date_obj, client)
         
         return {"success": True, "data": time_slots}
     except HTTPException:
@@ -157,7 +158,7 @@ async def get_service_booking_data(
 ):
     """Get complete booking data for a service. Works without auth for invite page (public services only via RLS)."""
     try:
-        booking_data = BookingService.get_service_booking_data(service_id, client)
+        booking_data = await run_blocking(BookingService.get_service_booking_data, service_id, client)
         
         if "error" in booking_data:
             raise HTTPException(status_code=404, detail=booking_data["error"])
@@ -0,0 +1,195 @@
+"""Resumable upload session endpoints for booking deliverables"""
+from fastapi import APIRouter, HTTPException, Request, Depends, Path, Header
+from typing import Dict, Any, Optional
+import logging
+from pydantic import BaseModel
+from core.limiter import limiter
+from core.verify import require_auth
+from core.safe_errors import log_exception_if_dev, is_dev_env
+from db.db_session import get_authenticated_client_dep
+from db.query_executor import run_query
+from supabase import Client
+from services.booking.upload_sessions import UploadSessions, UPLOAD_CHUNK_SIZE, session_state
+from services.booking.storage_limits import check_storage_limit
+from util.storage_setup import ensure_bucket_exists
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+class CreateUploadSessionRequest(BaseModel):
+    booking_id: str
+    file_name: str
+    file_size: int
+    file_type: Optional[str] = None
+    storage_path: Optional[str] = None  # From get-upload-paths (with extension); generated if omitted
+
+
+def _require_user_id(current_user: Dict[str, Any]) -> str:
+    user_id = current_user.get('sub')
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
+    return user_id
+
+
+@router.post("/upload-sessions")
+@limiter.limit("60 per minute")
+async def create_upload_session(
+    request: Request,
+    session_request: CreateUploadSessionRequest,
+    current_user: Dict[str, Any] = Depends(require_auth),
+    client: Client = Depends(get_authenticated_client_dep)
+):
+    """
+    Start a resumable upload of one deliverable file
+    Requires authentication - will return 401 if not authenticated.
+    - Verifies user is the creative for this booking and the file fits their storage limit
+    - Returns the session: PUT chunks of chunk_size bytes to /upload-sessions/{session_id}/chunks/{index}
+      with an "Upload-Checksum: sha256 <base64 digest>" header, then POST .../complete
+    """
+    try:
+        user_id = _require_user_id(current_user)
+        booking_id = session_request.booking_id
+
+        # Verify booking exists and user is the creative
+        booking_result = await run_query(client.table('bookings')\
+            .select('id, creative_user_id')\
+            .eq('id', booking_id)\
+            .single())
+
+        if not booking_result.data:
+            raise HTTPException(status_code=404, detail="Booking not found")
+
+        if booking_result.data.get('creative_user_id') != user_id:
+            raise HTTPException(status_code=403, detail="You are not authorized to upload files for this booking")
+
+        bucket_name = "booking-deliverables"
+        if not ensure_bucket_exists(bucket_name, is_public=False):
+            if is_dev_env():
+                logger.error("Failed to ensure bucket exists")
+            raise HTTPException(status_code=500, detail="Storage bucket not available. Please contact support.")
+
+        is_allowed, error_message = await check_storage_limit(user_id, session_request.file_size, client)
+        if not is_allowed:
+            raise HTTPException(status_code=403, detail=error_message)
+
+        session = await UploadSessions.create_session(
+            booking_id=booking_id,
+            creative_user_id=user_id,
+            file_name=session_request.file_name,
+            file_size=session_request.file_size,
+            file_type=session_request.file_type,
+            storage_path=session_request.storage_path
+        )
+        return {"success": True, "session": session}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_if_dev(logger, "Error creating upload session", e)
+        raise HTTPException(status_code=500, detail="Failed to start upload")
+
+
+@router.get("/upload-sessions/{session_id}")
+@limiter.limit("120 per minute")
+async def get_upload_session(
+    request: Request,
+    session_id: str,
+    current_user: Dict[str, Any] = Depends(require_auth)
+):
+    """
+    Upload session state: upload_offset / next_chunk to resume from, and status
+    ('uploading', 'scanning', 'completed', 'rejected', 'failed' or 'aborted')
+    """
+    try:
+        user_id = _require_user_id(current_user)
+        session = await UploadSessions.get_session(session_id, user_id)
+        return {"success": True, "session": session_state(session)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_if_dev(logger, "Error fetching upload session", e)
+        raise HTTPException(status_code=500, detail="Failed to fetch upload session")
+
+
+@router.put("/upload-sessions/{session_id}/chunks/{chunk_index}")
+@limiter.limit("600 per minute")
+async def put_upload_chunk(
+    request: Request,
+    session_id: str,
+    chunk_index: int = Path(..., ge=0),
+    upload_checksum: Optional[str] = Header(None),
+    current_user: Dict[str, Any] = Depends(require_auth)
+):
+    """
+    Upload one chunk (raw request body) of a resumable upload
+    - Every chunk but the last must be exactly chunk_size bytes
+    - Upload-Checksum (sha256, sha1 or md5, base64 digest) is verified before the chunk is stored;
+      a mismatch returns 460 and the chunk should be resent
+    - Out-of-order chunks return 409; GET the session for next_chunk
+    """
+    try:
+        user_id = _require_user_id(current_user)
+
+        content_length = request.headers.get('content-length')
+        if content_length and int(content_length) > UPLOAD_CHUNK_SIZE:
+            raise HTTPException(status_code=413, detail=f"Chunks can be at most {UPLOAD_CHUNK_SIZE} bytes")
+
+        # Read at most one chunk, whatever the client declared
+        body = bytearray()
+        async for part in request.stream():
+            body += part
+            if len(body) > UPLOAD_CHUNK_SIZE:
+                raise HTTPException(status_code=413, detail=f"Chunks can be at most {UPLOAD_CHUNK_SIZE} bytes")
+
+        session = await UploadSessions.put_chunk(session_id, user_id, chunk_index, bytes(body), upload_checksum)
+        return {"success": True, "session": session}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_if_dev(logger, "Error uploading chunk", e)
+        raise HTTPException(status_code=500, detail="Failed to upload chunk, please resend it")
+
+
+@router.post("/upload-sessions/{session_id}/complete", status_code=202)
+@limiter.limit("60 per minute")
+async def complete_upload_session(
+    request: Request,
+    session_id: str,
+    current_user: Dict[str, Any] = Depends(require_auth)
+):
+    """
+    Finish a resumable upload once every chunk is in
+    - The file is scanned and registered as a deliverable in the background; poll the session
+      until status is 'completed' (deliverable_id is set) or 'rejected'
+    - A session whose finalization failed can be completed again
+    """
+    try:
+        user_id = _require_user_id(current_user)
+        session = await UploadSessions.complete_session(session_id, user_id)
+        return {"success": True, "session": session}
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_if_dev(logger, "Error completing upload session", e)
+        raise HTTPException(status_code=500, detail="Failed to complete upload")
+
+
+@router.delete("/upload-sessions/{session_id}")
+@limiter.limit("60 per minute")
+async def abort_upload_session(
+    request: Request,
+    session_id: str,
+    current_user: Dict[str, Any] = Depends(require_auth)
+):
+    """Cancel an unfinished resumable upload"""
+    try:
+        user_id = _require_user_id(current_user)
+        session = await UploadSessions.abort_session(session_id, user_id)
+        return {"success": True, "session": session}
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_if_dev(logger, "Error aborting upload session", e)
+        raise HTTPException(status_code=500, detail="Failed to cancel upload")
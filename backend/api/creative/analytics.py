@@ -1,18 +1,77 @@
-"""Creative analytics endpoints"""
+"""Creative analytics endpoints
+
+All endpoints read the per-creative rollup tables maintained by the bookings trigger
+(see migration 20260126000000_add_creative_analytics_rollups.sql), so their cost depends on
+the size of the requested period rather than on the creative's whole booking history.
+"""
 from fastapi import APIRouter, Depends, Query, HTTPException
 from core.verify import get_current_user
 from core.safe_errors import log_exception_if_dev
 from db.db_session import get_authenticated_client_dep
+from db.query_executor import run_query
 from supabase import Client
 from schemas.creative import AnalyticsMetricsResponse
 from schemas.analytics import IncomeOverTimeResponse, ServiceBreakdownResponse, ClientLeaderboardResponse
-from datetime import datetime, timedelta
-from typing import Literal
+from services.creative.analytics_engine import PERIOD_BUCKET_NAMES, bucket_daily_amounts, period_bucket
+from datetime import datetime, date, timedelta
+from typing import Literal, List, Tuple
 import logging
 
 router = APIRouter(prefix="/analytics", tags=["creative-analytics"])
 logger = logging.getLogger(__name__)
 
+# How far back available_periods looks for each period type
+AVAILABLE_PERIODS_LOOKBACK = {"week": 52, "month": 24, "year": 10}
+# date_trunc() granularity for each period type
+PERIOD_GRANULARITY = {"week": "week", "month": "month", "year": "year"}
+
+
+def _period_range(time_period: str, period_offset: int, today: date) -> Tuple[date, date]:
+    """Return [start, end) dates of the week/month/year period_offset periods away from today"""
+    if time_period == "week":
+        # Weeks start on Monday
+        start = today - timedelta(days=today.weekday()) + timedelta(weeks=period_offset)
+        return start, start + timedelta(days=7)
+    if time_period == "month":
+        year, month_index = divmod(today.year * 12 + (today.month - 1) + period_offset, 12)
+        start = date(year, month_index + 1, 1)
+        next_year, next_month_index = divmod(year * 12 + month_index + 1, 12)
+        return start, date(next_year, next_month_index + 1, 1)
+    start = date(today.year + period_offset, 1, 1)
+    return start, date(start.year + 1, 1, 1)
+
+
+def _period_offset(time_period: str, period_start: date, current_start: date) -> int:
+    """Offset of a period (by its start date) relative to the current period (0 = current, -1 = previous)"""
+    if time_period == "week":
+        return (period_start - current_start).days // 7
+    if time_period == "month":
+        return (period_start.year - current_start.year) * 12 + (period_start.month - current_start.month)
+    return period_start.year - current_start.year
+
+
+async def _get_available_periods(db: Client, user_id: str, time_period: str, account_created_at: datetime, today: date) -> List[int]:
+    """Period offsets (most recent first) that have income, always including the current period"""
+    lookback = AVAILABLE_PERIODS_LOOKBACK[time_period]
+    current_start, _ = _period_range(time_period, 0, today)
+    oldest_start, _ = _period_range(time_period, -lookback, today)
+    window_start = max(oldest_start, account_created_at.date())
+
+    periods_result = await run_query(db.rpc("get_creative_income_periods", {
+        "p_creative_user_id": user_id,
+        "p_granularity": PERIOD_GRANULARITY[time_period],
+        "p_start": window_start.isoformat(),
+        "p_end": (today + timedelta(days=1)).isoformat()
+    }))
+
+    offsets = {0}
+    for row in (periods_result.data or []):
+        offset = _period_offset(time_period, date.fromisoformat(row["period_start"]), current_start)
+        if -lookback <= offset <= 0:
+            offsets.add(offset)
+
+    return sorted(offsets, reverse=True)
+
 
 @router.get("/metrics", response_model=AnalyticsMetricsResponse)
 async def get_analytics_metrics(
@@ -30,11 +89,10 @@ async def get_analytics_metrics(
         user_id = current_user.get("sub")
         
         # Get creative details including subscription tier
-        creative_result = db.table("creatives")\
+        creative_result = await run_query(db.table("creatives")\
             .select("subscription_tier_id, subscription_tiers(name)")\
             .eq("user_id", user_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not creative_result.data:
             return {
@@ -48,47 +106,22 @@ async def get_analytics_metrics(
         # Capitalize first letter for display
         plan_display = plan_name.capitalize() if plan_name else "Plain"
         
-        # Get all bookings for this creative
-        bookings_result = db.table("bookings")\
-            .select("price, amount_paid, payment_status, creative_status")\
+        # Totals are maintained per creative by the bookings trigger:
+        # - total_earnings: amount_paid of completed, fully paid bookings
+        # - unpaid_pending: remaining balance of awaiting_payment / in_progress bookings
+        # - completed_projects: bookings with creative_status completed
+        totals_result = await run_query(db.table("creative_analytics_totals")\
+            .select("total_earnings, unpaid_pending, completed_projects")\
             .eq("creative_user_id", user_id)\
-            .execute()
+            .limit(1))
         
-        bookings = bookings_result.data if bookings_result.data else []
-        
-        # Calculate metrics
-        total_earnings = 0
-        unpaid_pending = 0
-        completed_projects = 0
-        
-        for booking in bookings:
-            price = float(booking.get("price", 0))
-            amount_paid = float(booking.get("amount_paid", 0))
-            payment_status = booking.get("payment_status")
-            creative_status = booking.get("creative_status")
-            
-            # Count completed projects
-            if creative_status == "completed":
-                completed_projects += 1
-                # Add to total earnings if fully paid
-                if payment_status == "fully_paid":
-                    total_earnings += amount_paid
-            
-            # Calculate unpaid pending
-            # Include bookings that are:
-            # 1. Awaiting payment (approved but not paid)
-            # 2. Partially paid (split payment with remaining balance)
-            # 3. In progress with payment later option
-            if creative_status in ["awaiting_payment", "in_progress"]:
-                remaining_balance = price - amount_paid
-                if remaining_balance > 0:
-                    unpaid_pending += remaining_balance
+        totals = totals_result.data[0] if totals_result.data else {}
         
         return {
-            "total_earnings": round(total_earnings, 2),
+            "total_earnings": round(float(totals.get("total_earnings") or 0), 2),
             "plan": plan_display,
-            "unpaid_pending": round(unpaid_pending, 2),
-            "completed_projects": completed_projects
+            "unpaid_pending": round(float(totals.get("unpaid_pending") or 0), 2),
+            "completed_projects": int(totals.get("completed_projects") or 0)
         }
     except HTTPException:
         raise
@@ -112,11 +145,10 @@ async def get_income_over_time(
         user_id = current_user.get("sub")
         
         # Get creative's account creation date
-        creative_result = db.table("creatives")\
+        creative_result = await run_query(db.table("creatives")\
             .select("created_at")\
             .eq("user_id", user_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not creative_result.data:
             return {
@@ -128,266 +160,55 @@ async def get_income_over_time(
         
         account_created_at = datetime.fromisoformat(creative_result.data["created_at"].replace("Z", "+00:00"))
         now = datetime.now(account_created_at.tzinfo)
+        today = now.date()
         
-        # Calculate period boundaries
-        if time_period == "week":
-            # Calculate week start (Monday)
-            current_week_start = now - timedelta(days=now.weekday())
-            period_start = current_week_start + timedelta(weeks=period_offset)
-            period_end = period_start + timedelta(days=7)
-            
-            # Week hasn't started yet if period_start is in the future
-            if period_start > now:
-                return {"data": [], "total": 0, "available_periods": [0], "account_created_at": account_created_at.isoformat()}
-            
-            # Get bookings in this week
-            bookings_result = db.table("bookings")\
-                .select("order_date, price, amount_paid, payment_status, creative_status")\
-                .eq("creative_user_id", user_id)\
-                .gte("order_date", period_start.isoformat())\
-                .lt("order_date", period_end.isoformat())\
-                .eq("payment_status", "fully_paid")\
-                .eq("creative_status", "completed")\
-                .execute()
-            
-            # Initialize data for all 7 days
-            day_names = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-            data = {day: 0.0 for day in day_names}
-
-            # Aggregate income by day
-            for booking in (bookings_result.data or []):
-                order_date = datetime.fromisoformat(booking["order_date"].replace("Z", "+00:00"))
-                day_name = day_names[order_date.weekday()]
-                data[day_name] += float(booking["amount_paid"])
-
-            # Determine current day index (only for current period)
-            current_day_index = now.weekday() if period_offset == 0 else 6
-
-            # Build response
-            income_data = []
-            for i, day in enumerate(day_names):
-                # For current period, only show data up to today
-                if period_offset == 0 and i > current_day_index:
-                    income = None
-                else:
-                    income = round(data[day], 2)
-
-                income_data.append({
-                    "name": day,
-                    "income": income,
-                    "is_current": (period_offset == 0 and i == current_day_index)
-                })
-
-        elif time_period == "month":
-            # Calculate month start
-            if period_offset == 0:
-                period_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        period_start, period_end = _period_range(time_period, period_offset, today)
+        
+        # Period hasn't started yet
+        if period_start > today:
+            return {"data": [], "total": 0, "available_periods": [0], "account_created_at": account_created_at.isoformat()}
+        
+        # Daily income buckets (completed + fully paid bookings) for this period only
+        income_result = await run_query(db.table("creative_daily_income")\
+            .select("day, income")\
+            .eq("creative_user_id", user_id)\
+            .gte("day", period_start.isoformat())\
+            .lt("day", period_end.isoformat()))
+        
+        days = []
+        amounts = []
+        for row in (income_result.data or []):
+            days.append(date.fromisoformat(row["day"]))
+            amounts.append(float(row["income"] or 0))
+        
+        # week: Mon..Sun, month: Week 1..4 (days 29-31 count towards week 4), year: Jan..Dec
+        bucket_names = PERIOD_BUCKET_NAMES[time_period]
+        buckets = bucket_daily_amounts(time_period, days, amounts)
+        
+        # Bucket of today (only for current period); past periods are complete
+        current_index = period_bucket(time_period, today) if period_offset == 0 else len(bucket_names) - 1
+        
+        income_data = []
+        for i, name in enumerate(bucket_names):
+            # For current period, only show data up to today
+            if period_offset == 0 and i > current_index:
+                income = None
             else:
-                # Go back |period_offset| months
-                month = now.month + period_offset
-                year = now.year
-                while month < 1:
-                    month += 12
-                    year -= 1
-                period_start = now.replace(year=year, month=month, day=1, hour=0, minute=0, second=0, microsecond=0)
-            
-            # Calculate next month for period_end
-            next_month = period_start.month + 1
-            next_year = period_start.year
-            if next_month > 12:
-                next_month = 1
-                next_year += 1
-            period_end = period_start.replace(year=next_year, month=next_month)
-            
-            if period_start > now:
-                return {"data": [], "total": 0, "available_periods": [0], "account_created_at": account_created_at.isoformat()}
-            
-            # Get bookings in this month
-            bookings_result = db.table("bookings")\
-                .select("order_date, price, amount_paid, payment_status, creative_status")\
-                .eq("creative_user_id", user_id)\
-                .gte("order_date", period_start.isoformat())\
-                .lt("order_date", period_end.isoformat())\
-                .eq("payment_status", "fully_paid")\
-                .eq("creative_status", "completed")\
-                .execute()
-            
-            # Group by week
-            week_data = {1: 0.0, 2: 0.0, 3: 0.0, 4: 0.0}
-            for booking in (bookings_result.data or []):
-                order_date = datetime.fromisoformat(booking["order_date"].replace("Z", "+00:00"))
-                week_num = (order_date.day - 1) // 7 + 1
-                week_num = min(week_num, 4)  # Cap at week 4
-                week_data[week_num] += float(booking["amount_paid"])
-            
-            # Determine current week
-            current_week = (now.day - 1) // 7 + 1 if period_offset == 0 else 4
-            current_week = min(current_week, 4)
+                income = round(buckets[i], 2)
             
-            income_data = []
-            for week in range(1, 5):
-                if period_offset == 0 and week > current_week:
-                    income = None
-                else:
-                    income = round(week_data[week], 2)
-                
-                income_data.append({
-                    "name": f"Week {week}",
-                    "income": income,
-                    "is_current": (period_offset == 0 and week == current_week)
-                })
+            income_data.append({
+                "name": name,
+                "income": income,
+                "is_current": (period_offset == 0 and i == current_index)
+            })
         
-        else:  # year
-            # Calculate year start
-            period_start = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-            period_start = period_start.replace(year=period_start.year + period_offset)
-            period_end = period_start.replace(year=period_start.year + 1)
-            
-            if period_start > now:
-                return {"data": [], "total": 0, "available_periods": [0], "account_created_at": account_created_at.isoformat()}
-            
-            # Get bookings in this year
-            bookings_result = db.table("bookings")\
-                .select("order_date, price, amount_paid, payment_status, creative_status")\
-                .eq("creative_user_id", user_id)\
-                .gte("order_date", period_start.isoformat())\
-                .lt("order_date", period_end.isoformat())\
-                .eq("payment_status", "fully_paid")\
-                .eq("creative_status", "completed")\
-                .execute()
-
-            # Group by month
-            month_names = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-            month_data = {month: 0.0 for month in month_names}
-
-            for booking in (bookings_result.data or []):
-                order_date = datetime.fromisoformat(booking["order_date"].replace("Z", "+00:00"))
-                month_name = month_names[order_date.month - 1]
-                month_data[month_name] += float(booking["amount_paid"])
-
-            # Determine current month
-            current_month_index = now.month - 1 if period_offset == 0 else 11
-
-            income_data = []
-            for i, month in enumerate(month_names):
-                if period_offset == 0 and i > current_month_index:
-                    income = None
-                else:
-                    income = round(month_data[month], 2)
-
-                income_data.append({
-                    "name": month,
-                    "income": income,
-                    "is_current": (period_offset == 0 and i == current_month_index)
-                })
-
         # Calculate total (excluding null values)
         total = sum(item["income"] for item in income_data if item["income"] is not None)
-
+        
         # Calculate available periods based on actual payment data
         # Always include current period (0) even if there's no data yet
-
-        if time_period == "week":
-            # Get all paid bookings to find which weeks have data
-            all_bookings_result = db.table("bookings")\
-                .select("order_date, amount_paid, payment_status, creative_status")\
-                .eq("creative_user_id", user_id)\
-                .eq("payment_status", "fully_paid")\
-                .eq("creative_status", "completed")\
-                .gte("order_date", account_created_at.isoformat())\
-                .lte("order_date", now.isoformat())\
-                .execute()
-
-            # Calculate week start (Monday) for current week
-            current_week_start = now - timedelta(days=now.weekday())
-            current_week_start = current_week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-
-            # Find unique weeks that have payments
-            weeks_with_data = set()
-            for booking in (all_bookings_result.data or []):
-                order_date = datetime.fromisoformat(booking["order_date"].replace("Z", "+00:00"))
-                # Calculate which week this booking belongs to (week offset from current week)
-                booking_week_start = order_date - timedelta(days=order_date.weekday())
-                booking_week_start = booking_week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-
-                # Calculate offset (negative = weeks ago, 0 = this week)
-                days_diff = (booking_week_start - current_week_start).days
-                week_offset = days_diff // 7
-
-                # Only include past weeks (offset <= 0) and within reasonable range
-                if week_offset <= 0 and week_offset >= -52:
-                    weeks_with_data.add(week_offset)
-
-            # Always include current week (0) even if there's no data
-            weeks_with_data.add(0)
-
-            # Sort and create list (most recent first: 0, -1, -2, ...)
-            available_periods = sorted(weeks_with_data, reverse=True)
-
-        elif time_period == "month":
-            # Get all paid bookings to find which months have data
-            all_bookings_result = db.table("bookings")\
-                .select("order_date, amount_paid, payment_status, creative_status")\
-                .eq("creative_user_id", user_id)\
-                .eq("payment_status", "fully_paid")\
-                .eq("creative_status", "completed")\
-                .gte("order_date", account_created_at.isoformat())\
-                .lte("order_date", now.isoformat())\
-                .execute()
-
-            # Find unique months that have payments
-            months_with_data = set()
-            current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-            for booking in (all_bookings_result.data or []):
-                order_date = datetime.fromisoformat(booking["order_date"].replace("Z", "+00:00"))
-                booking_month_start = order_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-                # Calculate month offset
-                months_diff = (now.year - booking_month_start.year) * 12 + (now.month - booking_month_start.month)
-
-                # Only include past months (offset <= 0) and within reasonable range
-                if months_diff <= 0 and months_diff >= -24:
-                    months_with_data.add(months_diff)
-
-            # Always include current month (0) even if there's no data
-            months_with_data.add(0)
-
-            # Sort and create list (most recent first: 0, -1, -2, ...)
-            available_periods = sorted(months_with_data, reverse=True)
-
-        else:  # year
-            # Get all paid bookings to find which years have data
-            all_bookings_result = db.table("bookings")\
-                .select("order_date, amount_paid, payment_status, creative_status")\
-                .eq("creative_user_id", user_id)\
-                .eq("payment_status", "fully_paid")\
-                .eq("creative_status", "completed")\
-                .gte("order_date", account_created_at.isoformat())\
-                .lte("order_date", now.isoformat())\
-                .execute()
-
-            # Find unique years that have payments
-            years_with_data = set()
-            current_year = now.year
-
-            for booking in (all_bookings_result.data or []):
-                order_date = datetime.fromisoformat(booking["order_date"].replace("Z", "+00:00"))
-                booking_year = order_date.year
-
-                # Calculate year offset
-                year_offset = current_year - booking_year
-
-                # Only include past years (offset <= 0) and within reasonable range
-                if year_offset <= 0 and year_offset >= -10:
-                    years_with_data.add(year_offset)
-
-            # Always include current year (0) even if there's no data
-            years_with_data.add(0)
-
-            # Sort and create list (most recent first: 0, -1, -2, ...)
-            available_periods = sorted(years_with_data, reverse=True)
-
+        available_periods = await _get_available_periods(db, user_id, time_period, account_created_at, today)
+        
         return {
             "data": income_data,
             "total": round(total, 2),
@@ -422,11 +243,10 @@ async def get_service_breakdown(
         user_id = current_user.get("sub")
 
         # Get creative's account creation date for available_periods calculation
-        creative_result = db.table("creatives")\
+        creative_result = await run_query(db.table("creatives")\
         .select("created_at")\
         .eq("user_id", user_id)\
-        .single()\
-        .execute()
+        .single())
 
         if not creative_result.data:
             return {
@@ -436,98 +256,47 @@ async def get_service_breakdown(
             }
 
         account_created_at = datetime.fromisoformat(creative_result.data["created_at"].replace("Z", "+00:00"))
-        now = datetime.now(account_created_at.tzinfo)
+        today = datetime.now(account_created_at.tzinfo).date()
+
+        # Calculate period boundaries based on period_offset (all-time is unbounded)
+        if time_period == "all-time":
+            period_start, period_end = None, None
+        else:
+            period_start, period_end = _period_range(time_period, period_offset, today)
+
+        # Revenue per service, summed server-side from the daily per-service rollup
+        revenue_result = await run_query(db.rpc("get_creative_service_revenue", {
+            "p_creative_user_id": user_id,
+            "p_start": period_start.isoformat() if period_start else None,
+            "p_end": period_end.isoformat() if period_end else None
+        }))
+
+        service_revenue = {
+            row["service_id"]: float(row["revenue"] or 0)
+            for row in (revenue_result.data or [])
+            if row.get("service_id")
+        }
 
-        # Calculate period boundaries based on period_offset
-        if time_period == "week":
-            # Calculate week start (Monday) for current week
-            current_week_start = now - timedelta(days=now.weekday())
-            current_week_start = current_week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-            # Apply offset
-            period_start = current_week_start + timedelta(weeks=period_offset)
-            period_end = period_start + timedelta(days=7)
-        elif time_period == "month":
-            # Calculate month start for current month
-            current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            # Apply offset
-            if period_offset == 0:
-                period_start = current_month_start
-            else:
-                month = now.month + period_offset
-                year = now.year
-                while month < 1:
-                    month += 12
-                    year -= 1
-                while month > 12:
-                    month -= 12
-                    year += 1
-                period_start = now.replace(year=year, month=month, day=1, hour=0, minute=0, second=0, microsecond=0)
-            # Calculate next month for period_end
-            next_month = period_start.month + 1
-            next_year = period_start.year
-            if next_month > 12:
-                next_month = 1
-                next_year += 1
-            period_end = period_start.replace(year=next_year, month=next_month)
-        elif time_period == "year":
-            # Calculate year start for current year
-            current_year_start = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-            # Apply offset
-            period_start = current_year_start.replace(year=current_year_start.year + period_offset)
-            period_end = period_start.replace(year=period_start.year + 1)
-        else:  # all-time
-            period_start = datetime(2000, 1, 1)  # Effectively no start limit
-            period_end = None
-
-        # Get all completed and paid bookings with service details
+        # Get service details
         # Note: We don't filter by is_active to include historical data from deleted services
-        bookings_query = db.table("bookings")\
-            .select("service_id, amount_paid, creative_services!inner(title, color)")\
-            .eq("creative_user_id", user_id)\
-            .eq("payment_status", "fully_paid")\
-            .eq("creative_status", "completed")
-
-        # Only add time filter if not all-time
-        if time_period != "all-time":
-            bookings_query = bookings_query.gte("order_date", period_start.isoformat())
-            if period_end:
-                bookings_query = bookings_query.lt("order_date", period_end.isoformat())
-
-        bookings_result = bookings_query.execute()
-
-        bookings = bookings_result.data if bookings_result.data else []
-
-        # Aggregate revenue by service
-        service_revenue = {}
         service_info = {}
-
-        for booking in bookings:
-            service_id = booking.get("service_id")
-            amount_paid = float(booking.get("amount_paid", 0))
-            service_data = booking.get("creative_services")
-
-            # Handle case where service might be deleted (shouldn't happen with inner join, but safety check)
-            if not service_data:
-                continue
-
-            if service_id:
-                if service_id not in service_revenue:
-                    service_revenue[service_id] = 0
-                    service_info[service_id] = {
-                        "title": service_data.get("title", "Unknown Service"),
-                        "color": service_data.get("color", "#3b82f6")
-                    }
-
-                service_revenue[service_id] += amount_paid
+        if service_revenue:
+            services_result = await run_query(db.table("creative_services")\
+                .select("id, title, color")\
+                .in_("id", list(service_revenue.keys())))
+            service_info = {s["id"]: s for s in (services_result.data or [])}
 
         # Build response data
         data = []
         for service_id, revenue in service_revenue.items():
-            info = service_info[service_id]
+            info = service_info.get(service_id)
+            # Service row no longer exists - skip it, as the previous inner join did
+            if not info:
+                continue
             data.append({
-                "name": info["title"],
+                "name": info.get("title") or "Unknown Service",
                 "value": round(revenue, 2),
-                "color": info["color"],
+                "color": info.get("color") or "#3b82f6",
                 "service_id": service_id
             })
 
@@ -539,92 +308,10 @@ async def get_service_breakdown(
 
         # Calculate available periods based on actual payment data
         # Always include current period (0) even if there's no data yet
-        available_periods = [0]
-
-        if time_period == "week":
-            # Get all paid bookings to find which weeks have data
-            all_bookings_result = db.table("bookings")\
-                .select("order_date, amount_paid, payment_status, creative_status")\
-                .eq("creative_user_id", user_id)\
-                .eq("payment_status", "fully_paid")\
-                .eq("creative_status", "completed")\
-                .gte("order_date", account_created_at.isoformat())\
-                .lte("order_date", now.isoformat())\
-                .execute()
-
-            # Calculate week start (Monday) for current week
-            current_week_start = now - timedelta(days=now.weekday())
-            current_week_start = current_week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-
-            # Find unique weeks that have payments
-            weeks_with_data = set()
-            for booking in (all_bookings_result.data or []):
-                order_date = datetime.fromisoformat(booking["order_date"].replace("Z", "+00:00"))
-                booking_week_start = order_date - timedelta(days=order_date.weekday())
-                booking_week_start = booking_week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-
-                days_diff = (booking_week_start - current_week_start).days
-                week_offset = days_diff // 7
-
-                if week_offset <= 0 and week_offset >= -52:
-                    weeks_with_data.add(week_offset)
-
-            weeks_with_data.add(0)
-            available_periods = sorted(weeks_with_data, reverse=True)
-
-        elif time_period == "month":
-            # Get all paid bookings to find which months have data
-            all_bookings_result = db.table("bookings")\
-                .select("order_date, amount_paid, payment_status, creative_status")\
-                .eq("creative_user_id", user_id)\
-                .eq("payment_status", "fully_paid")\
-                .eq("creative_status", "completed")\
-                .gte("order_date", account_created_at.isoformat())\
-                .lte("order_date", now.isoformat())\
-                .execute()
-
-            months_with_data = set()
-            current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-            for booking in (all_bookings_result.data or []):
-                order_date = datetime.fromisoformat(booking["order_date"].replace("Z", "+00:00"))
-                booking_month_start = order_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-
-                months_diff = (now.year - booking_month_start.year) * 12 + (now.month - booking_month_start.month)
-
-                if months_diff <= 0 and months_diff >= -24:
-                    months_with_data.add(months_diff)
-
-            months_with_data.add(0)
-            available_periods = sorted(months_with_data, reverse=True)
-
-        elif time_period == "year":
-            # Get all paid bookings to find which years have data
-            all_bookings_result = db.table("bookings")\
-                .select("order_date, amount_paid, payment_status, creative_status")\
-                .eq("creative_user_id", user_id)\
-                .eq("payment_status", "fully_paid")\
-                .eq("creative_status", "completed")\
-                .gte("order_date", account_created_at.isoformat())\
-                .lte("order_date", now.isoformat())\
-                .execute()
-
-            years_with_data = set()
-            current_year = now.year
-
-            for booking in (all_bookings_result.data or []):
-                order_date = datetime.fromisoformat(booking["order_date"].replace("Z", "+00:00"))
-                booking_year = order_date.year
-
-                year_offset = current_year - booking_year
-
-                if year_offset <= 0 and year_offset >= -10:
-                    years_with_data.add(year_offset)
-
-            years_with_data.add(0)
-            available_periods = sorted(years_with_data, reverse=True)
-        else:  # all-time
+        if time_period == "all-time":
             available_periods = [0]  # Only one option for all-time
+        else:
+            available_periods = await _get_available_periods(db, user_id, time_period, account_created_at, today)
 
         return {
             "data": data,
@@ -652,81 +339,39 @@ async def get_client_leaderboard(
     try:
         user_id = current_user.get("sub")
 
-        # Get all fully paid bookings for this creative
-        # Include all fully_paid bookings regardless of creative_status to capture recent payments
-        # (e.g., split payments that are fully paid but not yet completed)
-        bookings_result = db.table("bookings")\
-            .select("id, client_user_id, amount_paid, updated_at, payment_status, creative_status")\
+        # Per-client totals of fully paid bookings (any creative_status, so split payments that are
+        # fully paid but not yet completed are included). last_payment_date is the latest updated_at.
+        totals_result = await run_query(db.table("creative_client_totals")\
+            .select("client_user_id, total_paid, services_amount, last_payment_date")\
             .eq("creative_user_id", user_id)\
-            .eq("payment_status", "fully_paid")\
-            .execute()
+            .order("total_paid", desc=True)\
+            .limit(8))
 
-        bookings = bookings_result.data if bookings_result.data else []
+        totals = totals_result.data if totals_result.data else []
 
-        if not bookings:
+        if not totals:
             return {"data": []}
 
-        # Note: We now rely on updated_at which is explicitly set to payment timestamp
-        # when payment is verified in verify_payment_and_update_booking.
-        # This is more reliable and faster than querying Stripe for all sessions.
-
-        # Aggregate data by client
-        client_data = {}
-
-        for booking in bookings:
-            booking_id = booking.get("id")
-            client_user_id = booking.get("client_user_id")
-            amount_paid = float(booking.get("amount_paid", 0))
-
-            # Use updated_at which is now explicitly set to payment timestamp when payment is verified
-            payment_date = booking.get("updated_at")
-
-            if not client_user_id:
-                continue
-
-            if client_user_id not in client_data:
-                client_data[client_user_id] = {
-                    "total_paid": 0.0,
-                    "services_amount": 0,
-                    "last_payment_date": None
-                }
-
-            client_data[client_user_id]["total_paid"] += amount_paid
-            client_data[client_user_id]["services_amount"] += 1
-
-            # Track latest payment date
-            if payment_date:
-                if client_data[client_user_id]["last_payment_date"] is None:
-                    client_data[client_user_id]["last_payment_date"] = payment_date
-                else:
-                    # Compare dates and keep the latest
-                    if payment_date > client_data[client_user_id]["last_payment_date"]:
-                        client_data[client_user_id]["last_payment_date"] = payment_date
-
         # Get client display names
-        client_user_ids = list(client_data.keys())
-        clients_result = db.table("clients")\
+        client_user_ids = [t["client_user_id"] for t in totals]
+        clients_result = await run_query(db.table("clients")\
             .select("user_id, display_name")\
-            .in_("user_id", client_user_ids)\
-            .execute()
+            .in_("user_id", client_user_ids))
 
         clients_map = {c["user_id"]: c.get("display_name", "Unknown Client") for c in (clients_result.data or [])}
 
-        # Build response data
+        # Build response data (already sorted by total_paid and limited to the top 8)
         leaderboard_data = []
-        for client_user_id, data in client_data.items():
+        for row in totals:
+            client_user_id = row["client_user_id"]
             leaderboard_data.append({
                 "id": client_user_id,
                 "name": clients_map.get(client_user_id, "Unknown Client"),
-                "services_amount": data["services_amount"],
-                "total_paid": round(data["total_paid"], 2),
-                "last_payment_date": data["last_payment_date"] or ""
+                "services_amount": int(row.get("services_amount") or 0),
+                "total_paid": round(float(row.get("total_paid") or 0), 2),
+                "last_payment_date": row.get("last_payment_date") or ""
             })
 
-        # Sort by total_paid (descending) and take top 8
-        leaderboard_data.sort(key=lambda x: x["total_paid"], reverse=True)
-        leaderboard_data = leaderboard_data[:8]
-
         return {"data": leaderboard_data}
     except HTTPException:
         raise
@@ -1,7 +1,8 @@
 import logging
 from fastapi import APIRouter, Request, HTTPException, UploadFile, File, Depends
 from typing import List, Dict, Any
-from services.file_scanning.scanner_service import ScannerService
+from services.file_scanning.scanner_service import ScannerService, CLAMAV_ENABLED
+from services.file_scanning.clamd_pool import clamd_pool
 from schemas.file_scanning import FileScanResponse, FileScanResult
 from core.limiter import limiter
 from core.verify import require_auth
@@ -113,3 +114,17 @@ async def scan_single_file(
         log_exception_if_dev(logger, "File scanning error", e)
         raise HTTPException(status_code=500, detail="Failed to scan file")
 
+@router.get("/status")
+@limiter.limit("30 per minute")
+async def get_scanner_status(
+    request: Request,
+    current_user: Dict[str, Any] = Depends(require_auth)
+):
+    """
+    ClamAV scanner status: circuit state, connection pool and scan queue metrics
+    Requires authentication - will return 401 if not authenticated.
+    """
+    return {
+        "enabled": CLAMAV_ENABLED,
+        **clamd_pool.stats()
+    }
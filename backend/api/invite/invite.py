@@ -5,6 +5,7 @@ from supabase import Client
 from core.limiter import limiter
 from core.verify import require_auth
 from core.safe_errors import log_exception_if_dev
+from core.identity import identity_cache
 from db.db_session import get_authenticated_client_dep
 from services.invite import InviteController
 from schemas.invite import (
@@ -65,17 +66,13 @@ async def validate_invite_token(
                 try:
                     # Client respects RLS policy "public_users_select_own"
                     # This policy allows users to SELECT their own user record (user_id = auth.uid())
-                    user_response = client.table("users") \
-                        .select("roles") \
-                        .eq("user_id", user_id) \
-                        .single() \
-                        .execute()
+                    identity = await identity_cache.get_with_role(user_id, client, 'client')
                     
-                    if user_response.data:
+                    if identity is not None:
                         user_info = {
                             "user_id": user_id,
-                            "roles": user_response.data.get('roles', []),
-                            "has_client_role": 'client' in user_response.data.get('roles', [])
+                            "roles": identity.roles,
+                            "has_client_role": identity.has_role('client')
                         }
                     else:
                         # User authenticated but not found in database - log this as it's a data inconsistency
@@ -1,5 +1,6 @@
 import logging
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Depends, Query
+from fastapi.responses import StreamingResponse
 from typing import Optional, List, Dict, Any
 from supabase import Client
 from core.limiter import limiter
@@ -7,7 +8,10 @@ from core.verify import require_auth
 from core.safe_errors import log_exception_if_dev
 from db.db_session import get_authenticated_client_dep
 from services.notifications import NotificationsController
-from schemas.notifications import NotificationResponse, UnreadCountResponse
+from services.notifications.notification_hub import notification_hub
+from schemas.notifications import (
+    NotificationResponse, NotificationPageResponse, UnreadCountResponse, MarkAllReadRequest, MarkAllReadResponse
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/notifications", tags=["notifications"])
@@ -22,7 +26,8 @@ async def get_notifications(
     limit: Optional[int] = 25,
     offset: Optional[int] = 0,
     unread_only: Optional[bool] = False,
-    role_context: Optional[str] = None
+    role_context: Optional[str] = None,
+    cursor: Optional[str] = None
 ):
     """
     Get notifications for the current user, filtered by their role context.
@@ -32,6 +37,7 @@ async def get_notifications(
         role_context: Optional role context ('client', 'creative', 'advocate'). 
                      If provided, only notifications with this role in target_roles will be returned.
                      If not provided, returns notifications for all of the user's roles.
+        cursor: Optional cursor from /notifications/page; replaces offset for deep pages.
     """
     try:
         user_id = current_user.get('sub')
@@ -39,7 +45,7 @@ async def get_notifications(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         return await NotificationsController.get_notifications(
-            user_id, limit, offset, unread_only, role_context, client
+            user_id, limit, offset, unread_only, role_context, client, cursor=cursor
         )
     except HTTPException:
         raise
@@ -48,6 +54,41 @@ async def get_notifications(
         raise HTTPException(status_code=500, detail="Failed to fetch notifications")
 
 
+@router.get("/page", response_model=NotificationPageResponse)
+@limiter.limit("10 per second")
+async def get_notifications_page(
+    request: Request,
+    current_user: Dict[str, Any] = Depends(require_auth),
+    client: Client = Depends(get_authenticated_client_dep),
+    limit: int = Query(25, ge=1, le=100),
+    cursor: Optional[str] = None,
+    unread_only: Optional[bool] = False,
+    role_context: Optional[str] = None
+):
+    """
+    Get one page of notifications (newest first) and the cursor of the next page.
+    Requires authentication - will return 401 if not authenticated.
+    
+    Args:
+        cursor: next_cursor of the previous page; omit for the first page.
+        role_context: Optional role context ('client', 'creative', 'advocate'). 
+                     If provided, only notifications with this role in target_roles will be returned.
+    """
+    try:
+        user_id = current_user.get('sub')
+        if not user_id:
+            raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
+        
+        return await NotificationsController.get_notifications_page(
+            user_id, limit, cursor, unread_only, role_context, client
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_if_dev(logger, "Error fetching notifications page", e)
+        raise HTTPException(status_code=500, detail="Failed to fetch notifications")
+
+
 @router.get("/unread-count", response_model=UnreadCountResponse)
 @limiter.limit("10 per second")
 async def get_unread_count(
@@ -77,6 +118,82 @@ async def get_unread_count(
         raise HTTPException(status_code=500, detail="Failed to fetch unread count")
 
 
+@router.get("/stream")
+@limiter.limit("30 per minute")
+async def stream_notifications(
+    request: Request,
+    current_user: Dict[str, Any] = Depends(require_auth),
+    role_context: Optional[str] = None
+):
+    """
+    Server-sent events announcing the current user's notification changes.
+    Requires authentication - will return 401 if not authenticated.
+    
+    Events: 'ready' on connect (load notifications then), 'created' and 'read' (data has
+    notification_id; refetch), 'resync' (refetch everything) and 'reauth' (the access token
+    expired; reconnect with a fresh one). Idle connections get a keepalive comment and cause no
+    database queries.
+    
+    Args:
+        role_context: Optional role context ('client', 'creative', 'advocate').
+                     If provided, 'created' events for notifications aimed at other roles are skipped.
+    """
+    try:
+        user_id = current_user.get('sub')
+        if not user_id:
+            raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
+        
+        if not notification_hub.can_subscribe(user_id):
+            raise HTTPException(status_code=429, detail="Too many open notification streams")
+        
+        expires_at = current_user.get('exp')
+        return StreamingResponse(
+            notification_hub.stream(
+                user_id,
+                role_context,
+                float(expires_at) if isinstance(expires_at, (int, float)) else None
+            ),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no"  # Don't let nginx buffer the stream
+            }
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_if_dev(logger, "Error opening notification stream", e)
+        raise HTTPException(status_code=500, detail="Failed to open notification stream")
+
+
+@router.put("/read-all", response_model=MarkAllReadResponse)
+@limiter.limit("20 per minute")
+async def mark_all_notifications_as_read(
+    request: Request,
+    mark_request: MarkAllReadRequest,
+    current_user: Dict[str, Any] = Depends(require_auth),
+    client: Client = Depends(get_authenticated_client_dep)
+):
+    """
+    Mark all unread notifications as read, optionally only up to a cursor (the newest
+    notification the user has seen) and only for one role context.
+    Requires authentication - will return 401 if not authenticated.
+    """
+    try:
+        user_id = current_user.get('sub')
+        if not user_id:
+            raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
+        
+        return await NotificationsController.mark_all_as_read(
+            user_id, mark_request.role_context, mark_request.up_to, client
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_exception_if_dev(logger, "Error marking all notifications as read", e)
+        raise HTTPException(status_code=500, detail="Failed to mark notifications as read")
+
+
 @router.put("/{notification_id}/read", response_model=NotificationResponse)
 @limiter.limit("20 per minute")
 async def mark_notification_as_read(
@@ -6,9 +6,10 @@ from core.verify import require_auth
 from core.safe_errors import log_exception_if_dev
 from typing import Dict, Any, Optional
 from db.db_session import get_authenticated_client_dep
+from db.query_executor import run_query
 from supabase import Client
 from services.payment_requests.payment_request_service import PaymentRequestService
-from services.invoice.invoice_service import InvoiceService
+from services.invoice.pdf_renderer import pdf_renderer
 from pydantic import BaseModel
 import stripe
 
@@ -43,11 +44,10 @@ async def create_payment_request(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Verify user is a creative and check Stripe account setup
-        creative_result = client.table('creatives')\
+        creative_result = await run_query(client.table('creatives')\
             .select('user_id, stripe_account_id, stripe_onboarding_complete, stripe_payouts_enabled')\
             .eq('user_id', user_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not creative_result.data:
             raise HTTPException(status_code=403, detail="Only creatives can create payment requests")
@@ -159,11 +159,10 @@ async def get_creative_payment_requests(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Verify user is a creative
-        creative_result = client.table('creatives')\
+        creative_result = await run_query(client.table('creatives')\
             .select('user_id')\
             .eq('user_id', user_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not creative_result.data:
             raise HTTPException(status_code=403, detail="Only creatives can view their payment requests")
@@ -239,11 +238,10 @@ async def get_payment_requests_by_booking(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Get booking to verify user has access
-        booking_result = client.table('bookings')\
+        booking_result = await run_query(client.table('bookings')\
             .select('client_user_id, creative_user_id')\
             .eq('id', booking_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not booking_result.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -336,11 +334,10 @@ async def verify_payment_request(
             raise HTTPException(status_code=400, detail="payment_request_id is required")
         
         # Verify the payment request belongs to this user - only select field we need
-        pr_result = client.table('payment_requests')\
+        pr_result = await run_query(client.table('payment_requests')\
             .select('client_user_id')\
             .eq('id', payment_request_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not pr_result.data:
             raise HTTPException(status_code=404, detail="Payment request not found")
@@ -381,11 +378,10 @@ async def get_payment_request_invoices(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Get payment request to verify client and status
-        pr_result = client.table('payment_requests')\
+        pr_result = await run_query(client.table('payment_requests')\
             .select('id, client_user_id, status, creative_user_id, stripe_session_id')\
             .eq('id', payment_request_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not pr_result.data:
             raise HTTPException(status_code=404, detail="Payment request not found")
@@ -418,11 +414,10 @@ async def get_payment_request_invoices(
             try:
                 # Get creative's Stripe account ID
                 creative_user_id = payment_request.get('creative_user_id')
-                creative_result = client.table('creatives')\
+                creative_result = await run_query(client.table('creatives')\
                     .select('stripe_account_id')\
                     .eq('user_id', creative_user_id)\
-                    .single()\
-                    .execute()
+                    .single())
                 
                 if creative_result.data and creative_result.data.get('stripe_account_id'):
                     stripe_account_id = creative_result.data.get('stripe_account_id')
@@ -476,11 +471,10 @@ async def download_payment_request_ez_invoice(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Get payment request to verify client and status
-        pr_result = client.table('payment_requests')\
+        pr_result = await run_query(client.table('payment_requests')\
             .select('id, client_user_id, status, creative_user_id, amount, notes, created_at, paid_at, booking_id')\
             .eq('id', payment_request_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not pr_result.data:
             raise HTTPException(status_code=404, detail="Payment request not found")
@@ -500,20 +494,18 @@ async def download_payment_request_ez_invoice(
         
         # Get creative information
         creative_user_id = payment_request.get('creative_user_id')
-        creative_result = client.table('creatives')\
+        creative_result = await run_query(client.table('creatives')\
             .select('display_name')\
             .eq('user_id', creative_user_id)\
-            .single()\
-            .execute()
+            .single())
         
         creative_name = creative_result.data.get('display_name', 'Unknown Creative') if creative_result.data else 'Unknown Creative'
         
         # Get creative user info for email
-        creative_user_result = client.table('users')\
+        creative_user_result = await run_query(client.table('users')\
             .select('name, email')\
             .eq('user_id', creative_user_id)\
-            .single()\
-            .execute()
+            .single())
         
         creative_email = creative_user_result.data.get('email', '') if creative_user_result.data else ''
         if not creative_name or creative_name == 'Unknown Creative':
@@ -521,11 +513,10 @@ async def download_payment_request_ez_invoice(
         
         # Get client information
         client_user_id = payment_request.get('client_user_id')
-        client_user_result = client.table('users')\
+        client_user_result = await run_query(client.table('users')\
             .select('name, email')\
             .eq('user_id', client_user_id)\
-            .single()\
-            .execute()
+            .single())
         
         client_name = client_user_result.data.get('name', 'Unknown Client') if client_user_result.data else 'Unknown Client'
         client_email = client_user_result.data.get('email', '') if client_user_result.data else ''
@@ -536,20 +527,18 @@ async def download_payment_request_ez_invoice(
         booking_id = payment_request.get('booking_id')
         
         if booking_id:
-            booking_result = client.table('bookings')\
+            booking_result = await run_query(client.table('bookings')\
                 .select('service_id')\
                 .eq('id', booking_id)\
-                .single()\
-                .execute()
+                .single())
             
             if booking_result.data:
                 service_id = booking_result.data.get('service_id')
                 if service_id:
-                    service_result = client.table('creative_services')\
+                    service_result = await run_query(client.table('creative_services')\
                         .select('title, description')\
                         .eq('id', service_id)\
-                        .single()\
-                        .execute()
+                        .single())
                     
                     if service_result.data:
                         service_name = service_result.data.get('title', 'Direct Payment Request')
@@ -576,7 +565,7 @@ async def download_payment_request_ez_invoice(
         }
         
         # Generate invoice PDF
-        pdf_content = InvoiceService.generate_client_invoice(order_data)
+        pdf_content = await pdf_renderer.render('invoice', order_data)
         
         # Generate filename
         filename = f"EZ_Invoice_PaymentRequest_{payment_request_id[:8]}.pdf"
@@ -616,11 +605,10 @@ async def get_payment_request_stripe_receipt(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Get payment request to verify client
-        pr_result = client.table('payment_requests')\
+        pr_result = await run_query(client.table('payment_requests')\
             .select('id, client_user_id, status, creative_user_id, stripe_session_id')\
             .eq('id', payment_request_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not pr_result.data:
             raise HTTPException(status_code=404, detail="Payment request not found")
@@ -644,11 +632,10 @@ async def get_payment_request_stripe_receipt(
         
         # Get creative's Stripe account ID
         creative_user_id = payment_request.get('creative_user_id')
-        creative_result = client.table('creatives')\
+        creative_result = await run_query(client.table('creatives')\
             .select('stripe_account_id')\
             .eq('user_id', creative_user_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not creative_result.data or not creative_result.data.get('stripe_account_id'):
             raise HTTPException(status_code=404, detail="Stripe account not found for this creative")
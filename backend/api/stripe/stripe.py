@@ -6,6 +6,7 @@ from core.verify import require_auth
 from core.safe_errors import log_exception_if_dev
 from typing import Dict, Any
 from db.db_session import get_authenticated_client_dep
+from db.query_executor import run_query
 from supabase import Client
 
 router = APIRouter()
@@ -28,7 +29,7 @@ async def create_stripe_connect_account(
             raise HTTPException(status_code=401, detail="Authentication failed: User ID not found")
         
         # Get user email
-        user_result = client.table('users').select('email').eq('user_id', user_id).single().execute()
+        user_result = await run_query(client.table('users').select('email').eq('user_id', user_id).single())
         if not user_result.data:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -155,11 +156,10 @@ async def verify_payment(
             raise HTTPException(status_code=400, detail="booking_id is required")
         
         # Verify the booking belongs to this user
-        booking_result = client.table('bookings')\
+        booking_result = await run_query(client.table('bookings')\
             .select('client_user_id')\
             .eq('id', booking_id)\
-            .single()\
-            .execute()
+            .single())
         
         if not booking_result.data:
             raise HTTPException(status_code=404, detail="Booking not found")
@@ -1,8 +1,8 @@
 from fastapi import APIRouter
 from .stripe import router as stripe_router
+from .webhooks import router as webhooks_router
 
 router = APIRouter()
 
 router.include_router(stripe_router)
-
-
+router.include_router(webhooks_router)
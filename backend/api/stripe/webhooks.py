@@ -0,0 +1,34 @@
+import logging
+from fastapi import APIRouter, Request, HTTPException
+from services.stripe.webhook_service import StripeWebhookService, stripe_webhook_worker
+from core.safe_errors import log_exception_if_dev, is_dev_env
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.post("/webhook")
+async def stripe_webhook(request: Request):
+    """Receive Stripe webhook events (platform and Connect endpoints)
+    Authenticated by the Stripe-Signature header, not by user session, and not rate limited:
+    Stripe retries with backoff on non-2xx responses.
+    The event is stored and acknowledged immediately; it is applied by the background worker.
+    """
+    payload = await request.body()
+    sig_header = request.headers.get('stripe-signature')
+
+    event = StripeWebhookService.construct_event(payload, sig_header)
+
+    try:
+        is_new = await StripeWebhookService.record_event(event, payload)
+    except Exception as e:
+        log_exception_if_dev(logger, "Error storing Stripe webhook event", e)
+        # Non-2xx makes Stripe redeliver the event later
+        raise HTTPException(status_code=500, detail="Failed to store webhook event")
+
+    if is_new:
+        stripe_webhook_worker.enqueue(event.id)
+    elif is_dev_env():
+        logger.info(f"Duplicate Stripe webhook event {event.id} acknowledged")
+
+    return {"received": True}
@@ -0,0 +1,207 @@
+import os
+import time
+import asyncio
+import logging
+import contextlib
+from contextvars import ContextVar
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+from dotenv import load_dotenv
+from supabase import Client
+from db.query_executor import run_query
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How long an identity is reused across requests in this process (seconds, 0 disables). Other
+# workers don't see this worker's invalidations, so this bounds how stale their copy can be.
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "15"))
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+
+# Everything the identity is built from, in one request (profiles are one-to-one embeds on user_id)
+IDENTITY_SELECT = (
+    "user_id, roles, first_login, "
+    "creatives(title, subscription_tier_id, stripe_account_id), "
+    "clients(user_id), "
+    "advocates(tier)"
+)
+
+# Identities already loaded by the current request, keyed by user_id (None outside a request)
+_request_identities: ContextVar[Optional[Dict[str, "UserIdentity"]]] = ContextVar("request_identities", default=None)
+
+
+def _embedded_row(value: Any) -> Optional[Dict[str, Any]]:
+    """One-to-one embeds come back as an object (or a one-element list on older PostgREST)"""
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value if isinstance(value, dict) else None
+
+
+class UserIdentity:
+    """A user's roles, which role profiles exist, and the creative billing fields"""
+
+    __slots__ = ('user_id', 'roles', 'first_login', 'creative', 'client', 'advocate')
+
+    def __init__(self, row: Dict[str, Any]):
+        self.user_id: str = str(row.get('user_id'))
+        self.roles: List[str] = list(row.get('roles') or [])
+        self.first_login: bool = bool(row.get('first_login'))
+        self.creative: Optional[Dict[str, Any]] = _embedded_row(row.get('creatives'))
+        self.client: Optional[Dict[str, Any]] = _embedded_row(row.get('clients'))
+        self.advocate: Optional[Dict[str, Any]] = _embedded_row(row.get('advocates'))
+
+    def has_role(self, role: str) -> bool:
+        return role in self.roles
+
+    def has_profile(self, role: str) -> bool:
+        """Whether the creatives/clients/advocates row for this role exists"""
+        return getattr(self, role, None) is not None if role in ('creative', 'client', 'advocate') else False
+
+    @property
+    def subscription_tier_id(self) -> Optional[str]:
+        return (self.creative or {}).get('subscription_tier_id')
+
+    @property
+    def stripe_account_id(self) -> Optional[str]:
+        return (self.creative or {}).get('stripe_account_id')
+
+
+@contextlib.contextmanager
+def request_identity_scope() -> Iterator[None]:
+    """Identities loaded inside this block are loaded at most once (opened per request by the auth middleware)"""
+    token = _request_identities.set({})
+    try:
+        yield
+    finally:
+        _request_identities.reset(token)
+
+
+class IdentityCache:
+    """
+    Roles and role profiles of users, loaded with one query and shared by every service a request
+    goes through, then kept for IDENTITY_CACHE_TTL seconds for the user's next requests.
+
+    Code that changes roles, creates or deletes role profiles, or changes a creative's
+    subscription tier or Stripe account calls invalidate(user_id) afterwards.
+    """
+
+    def __init__(self, ttl: float = IDENTITY_CACHE_TTL, max_size: int = IDENTITY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[UserIdentity, float]]" = OrderedDict()
+        # Invalidation stamps: a load that started before the user's last invalidation isn't stored
+        self._clock = 0
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    def _cached(self, user_id: str) -> Optional[UserIdentity]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        identity, stored_at = entry
+        if time.monotonic() - stored_at >= self.ttl:
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return identity
+
+    def _store(self, identity: UserIdentity, started: int) -> None:
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        if self._invalidated.get(identity.user_id, -1) > started:
+            return
+        self._entries[identity.user_id] = (identity, time.monotonic())
+        self._entries.move_to_end(identity.user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def _load(self, user_id: str, client: Client) -> Optional[UserIdentity]:
+        started = self._clock
+        result = await run_query(client.table('users')\
+            .select(IDENTITY_SELECT)\
+            .eq('user_id', user_id)\
+            .limit(1))
+        if not result.data:
+            return None
+        identity = UserIdentity(result.data[0])
+        self._store(identity, started)
+        return identity
+
+    async def _load_shared(self, user_id: str, client: Client) -> Optional[UserIdentity]:
+        """Concurrent requests of the same user wait on one load"""
+        future = self._loading.get(user_id)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The request doing the load went away; load for this one
+                return await self._load(user_id, client)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        try:
+            identity = await self._load(user_id, client)
+            future.set_result(identity)
+            return identity
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved for the case nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            if self._loading.get(user_id) is future:
+                del self._loading[user_id]
+
+    async def get(self, user_id: str, client: Client, fresh: bool = False) -> Optional[UserIdentity]:
+        """
+        The user's identity, or None if the user row doesn't exist (or isn't visible to client).
+        fresh reloads it from the database (and replaces the request's and the process's copy).
+        """
+        scope = _request_identities.get()
+        if scope is not None and not fresh and user_id in scope:
+            return scope[user_id]
+
+        identity = None if fresh else self._cached(user_id)
+        if identity is None:
+            identity = await (self._load(user_id, client) if fresh else self._load_shared(user_id, client))
+
+        if scope is not None and identity is not None:
+            scope[user_id] = identity
+        return identity
+
+    async def get_with_role(self, user_id: str, client: Client, role: str, with_profile: bool = False) -> Optional[UserIdentity]:
+        """
+        Like get, but an identity without `role` (or without its profile, with with_profile) is
+        reloaded before the caller acts on its absence: it may have just been added through
+        another worker.
+        """
+        identity = await self.get(user_id, client)
+        if identity is not None and identity.has_role(role) and (not with_profile or identity.has_profile(role)):
+            return identity
+        return await self.get(user_id, client, fresh=True)
+
+    def invalidate(self, user_id: str) -> None:
+        """Forget the user's identity (call after changing roles, role profiles, tier or Stripe account)"""
+        self._clock += 1
+        self._invalidated[user_id] = self._clock
+        self._invalidated.move_to_end(user_id)
+        while len(self._invalidated) > self.max_size:
+            self._invalidated.popitem(last=False)
+        self._entries.pop(user_id, None)
+        # Callers arriving after this don't join a load that may predate the change
+        self._loading.pop(user_id, None)
+        scope = _request_identities.get()
+        if scope is not None:
+            scope.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+identity_cache = IdentityCache()
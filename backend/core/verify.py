@@ -4,14 +4,19 @@ from jose.utils import base64url_decode
 import os
 from dotenv import load_dotenv
 from fastapi.responses import JSONResponse
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import hashlib
 import logging
 import base64
 import json
+import time
 import httpx
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.backends import default_backend
-from core.safe_errors import is_dev_env
+from core.safe_errors import is_dev_env, log_exception_if_dev
+from core.identity import request_identity_scope
 
 load_dotenv()
 
@@ -22,62 +27,235 @@ if not SUPABASE_URL:
     raise ValueError("SUPABASE_URL environment variable is required for ES256 JWT validation")
 
 # Cache for JWKS (public keys for ES256)
-_jwks_cache: Optional[Dict] = None
-_jwks_cache_time: Optional[float] = None
 JWKS_CACHE_TTL = 3600  # Cache for 1 hour
+# Refresh in the background once keys are this close to expiring (stale-while-revalidate)
+JWKS_REFRESH_MARGIN = 300
+# Minimum delay between forced refreshes triggered by an unknown kid
+JWKS_MIN_REFRESH_INTERVAL = 30
 
-def get_jwks() -> Dict:
+# Cache of already-verified tokens (keyed by token hash, bounded by the token's exp)
+VERIFIED_TOKEN_CACHE_SIZE = int(os.getenv("VERIFIED_TOKEN_CACHE_SIZE", "10000"))
+
+
+def _build_public_key(key: Dict[str, Any]) -> Optional[Any]:
+    """Convert an ES256 (P-256) JWK into a cryptography public key object."""
+    if key.get('kty') != 'EC' or key.get('crv') != 'P-256':
+        return None
+    x = base64url_decode(key['x'].encode())
+    y = base64url_decode(key['y'].encode())
+    public_numbers = ec.EllipticCurvePublicNumbers(
+        int.from_bytes(x, 'big'),
+        int.from_bytes(y, 'big'),
+        ec.SECP256R1()
+    )
+    return public_numbers.public_key(default_backend())
+
+
+class JWKSKeyStore:
     """
-    Fetch JWKS (JSON Web Key Set) from Supabase for ES256 token validation.
-    Caches the result for 1 hour.
+    Holds public key objects per kid, built once per JWKS fetch.
+
+    Keys are fetched asynchronously. Once the keys are close to expiring a
+    background refresh is scheduled while the current keys keep being served,
+    so request handling never waits on the JWKS endpoint after the first fetch.
     """
-    global _jwks_cache, _jwks_cache_time
-    import time
-    
-    # Return cached JWKS if still valid
-    if _jwks_cache and _jwks_cache_time:
-        if time.time() - _jwks_cache_time < JWKS_CACHE_TTL:
-            return _jwks_cache
-    
-    # Fetch JWKS from Supabase
-    if not SUPABASE_URL:
-        raise ValueError("SUPABASE_URL not configured - cannot fetch JWKS")
-    jwks_url = f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json"
-    try:
-        response = httpx.get(jwks_url, timeout=10)
-        response.raise_for_status()
-        _jwks_cache = response.json()
-        _jwks_cache_time = time.time()
-        if is_dev_env():
-            logger.info(f"Fetched JWKS from Supabase: {len(_jwks_cache.get('keys', []))} keys")
-        return _jwks_cache
-    except Exception as e:
-        if is_dev_env():
-            logger.error(f"Failed to fetch JWKS from {jwks_url}: {e}")
-        if _jwks_cache:
+
+    def __init__(self, jwks_url: str):
+        self.jwks_url = jwks_url
+        self._jwks: Optional[Dict] = None
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at: float = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def jwks(self) -> Optional[Dict]:
+        return self._jwks
+
+    def _age(self) -> float:
+        return time.monotonic() - self._fetched_at
+
+    async def refresh(self, force: bool = False) -> None:
+        """Fetch the JWKS and rebuild the key map (single-flight)."""
+        async with self._lock:
+            # Another coroutine may have refreshed while we were waiting for the lock
+            if self._keys and not force and self._age() < JWKS_CACHE_TTL - JWKS_REFRESH_MARGIN:
+                return
+            if self._keys and force and self._age() < JWKS_MIN_REFRESH_INTERVAL:
+                return
+            try:
+                async with httpx.AsyncClient(timeout=10) as http_client:
+                    response = await http_client.get(self.jwks_url)
+                response.raise_for_status()
+                jwks = response.json()
+                keys = {}
+                for key in jwks.get('keys', []):
+                    kid = key.get('kid')
+                    if not kid:
+                        continue
+                    public_key = _build_public_key(key)
+                    if public_key is not None:
+                        keys[kid] = public_key
+                self._jwks = jwks
+                self._keys = keys
+                self._fetched_at = time.monotonic()
+                if is_dev_env():
+                    logger.info(f"Fetched JWKS from Supabase: {len(jwks.get('keys', []))} keys")
+            except Exception as e:
+                if is_dev_env():
+                    logger.error(f"Failed to fetch JWKS from {self.jwks_url}: {e}")
+                if self._keys:
+                    if is_dev_env():
+                        logger.warning("Using cached JWKS despite fetch failure")
+                    return
+                raise
+
+    def _schedule_refresh(self) -> None:
+        if self._refresh_task and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(self._background_refresh())
+
+    async def _background_refresh(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as e:
             if is_dev_env():
-                logger.warning("Using cached JWKS despite fetch failure")
-            return _jwks_cache
-        raise
+                logger.warning(f"Background JWKS refresh failed: {e}")
+
+    async def get_key(self, kid: str) -> Optional[Any]:
+        """Return the public key for kid, fetching or refreshing the JWKS as needed."""
+        if not self._keys:
+            await self.refresh()
+        elif self._age() >= JWKS_CACHE_TTL - JWKS_REFRESH_MARGIN:
+            # Serve the current keys and revalidate in the background
+            self._schedule_refresh()
+
+        public_key = self._keys.get(kid)
+        if public_key is None:
+            # Unknown kid - keys may have been rotated, refresh once (rate limited)
+            await self.refresh(force=True)
+            public_key = self._keys.get(kid)
+        return public_key
+
+
+class VerifiedTokenCache:
+    """
+    LRU cache of verified token claims keyed by the token's SHA-256 hash.
+    Entries are only served until the token's exp, so expired tokens are re-verified (and rejected).
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        claims, exp = entry
+        if exp <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return claims
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        if self.max_size <= 0:
+            return
+        exp = claims.get('exp')
+        if not isinstance(exp, (int, float)):
+            return
+        key = self._key(token)
+        self._entries[key] = (claims, float(exp))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
 
-def get_public_key_from_jwks(kid: str) -> Optional[Any]:
+
+jwks_store = JWKSKeyStore(f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json")
+verified_token_cache = VerifiedTokenCache(VERIFIED_TOKEN_CACHE_SIZE)
+
+
+async def get_jwks() -> Dict:
+    """
+    Fetch JWKS (JSON Web Key Set) from Supabase for ES256 token validation.
+    Cached for 1 hour and refreshed in the background before expiry.
+    """
+    if not jwks_store.jwks:
+        await jwks_store.refresh()
+    return jwks_store.jwks
+
+
+async def get_public_key_from_jwks(kid: str) -> Optional[Any]:
     """
     Get the public key from JWKS for a specific key ID (kid).
+    Key objects are pre-built once per JWKS fetch.
     """
-    jwks = get_jwks()
-    for key in jwks.get('keys', []):
-        if key.get('kid') == kid:
-            # Convert JWK to cryptography public key for ES256
-            if key.get('kty') == 'EC' and key.get('crv') == 'P-256':
-                x = base64url_decode(key['x'].encode())
-                y = base64url_decode(key['y'].encode())
-                public_numbers = ec.EllipticCurvePublicNumbers(
-                    int.from_bytes(x, 'big'),
-                    int.from_bytes(y, 'big'),
-                    ec.SECP256R1()
-                )
-                return public_numbers.public_key(default_backend())
-    return None
+    return await jwks_store.get_key(kid)
+
+
+def decode_token_header(token: str) -> Dict[str, Any]:
+    """Decode the (unverified) JWT header. Raises ValueError on malformed tokens."""
+    parts = token.split('.')
+    if len(parts) < 1 or not parts[0]:
+        raise ValueError("Token has no header part")
+    header_b64 = parts[0]
+    padding = 4 - len(header_b64) % 4
+    if padding != 4:
+        header_b64 += '=' * padding
+    header = json.loads(base64.urlsafe_b64decode(header_b64))
+    if not isinstance(header, dict):
+        raise ValueError("Invalid JSON in header")
+    return header
+
+
+async def verify_es256_token(token: str) -> Dict[str, Any]:
+    """
+    Verify a Supabase ES256 access token and return its claims.
+    Already-verified tokens are served from verified_token_cache until they expire.
+
+    Raises:
+        JWTError: If the token is malformed, uses an unsupported algorithm or fails verification
+    """
+    claims = verified_token_cache.get(token)
+    if claims is not None:
+        return claims
+
+    try:
+        header = decode_token_header(token)
+    except Exception:
+        raise JWTError("Invalid token header")
+
+    token_alg = header.get('alg', 'unknown')
+    token_kid = header.get('kid', None)
+    if not token_kid:
+        raise JWTError("Token missing 'kid' (key ID) - required for ES256 validation")
+
+    if token_alg != 'ES256':
+        raise JWTError(f"Unsupported algorithm: {token_alg}. Only ES256 is supported.")
+
+    public_key = await get_public_key_from_jwks(token_kid)
+    if not public_key:
+        raise JWTError(f"Could not find public key for kid: {token_kid}")
+
+    claims = jwt.decode(
+        token,
+        public_key,
+        algorithms=["ES256"],
+        audience="authenticated"
+    )
+    if is_dev_env():
+        logger.debug(f"Successfully validated ES256 token with kid: {token_kid}")
+    verified_token_cache.put(token, claims)
+    return claims
 
 # ES256 only - no symmetric key needed
 
@@ -139,89 +317,48 @@ async def jwt_auth_middleware(request: Request, call_next):
             token = auth.split(" ")[1]
 
     if token:
-        # First, decode header to determine algorithm
-        token_alg = None
-        token_kid = None
-        try:
-            parts = token.split('.')
-            if len(parts) >= 1:
-                header_b64 = parts[0]
-                padding = 4 - len(header_b64) % 4
-                if padding != 4:
-                    header_b64 += '=' * padding
-                header_json = base64.urlsafe_b64decode(header_b64)
-                header = json.loads(header_json)
-                token_alg = header.get('alg', 'unknown')
-                token_kid = header.get('kid', None)
-        except Exception:
-            pass
-        
         # Validate using ES256 only (asymmetric keys from JWKS)
         try:
-            if not token_kid:
-                raise JWTError("Token missing 'kid' (key ID) - required for ES256 validation")
-            
-            if token_alg != 'ES256':
-                raise JWTError(f"Unsupported algorithm: {token_alg}. Only ES256 is supported.")
-            
-            public_key = get_public_key_from_jwks(token_kid)
-            if not public_key:
-                raise JWTError(f"Could not find public key for kid: {token_kid}")
-            
-            user = jwt.decode(
-                token,
-                public_key,
-                algorithms=["ES256"],
-                audience="authenticated"
-            )
-            if is_dev_env():
-                logger.debug(f"Successfully validated ES256 token with kid: {token_kid}")
+            user = await verify_es256_token(token)
             
             # Store token for reuse in dependencies
             request.state.token = token
         except JWTError as e:
                 # Log the actual error for debugging (but don't expose to client)
                 error_msg = str(e)
-                # Only log for non-OPTIONS requests to reduce noise
-                if request.method != "OPTIONS":
+                # Log at ERROR level only in dev to avoid leaking details in production
+                if is_dev_env():
                     # Decode JWT header to see what algorithm it claims to use
                     try:
-                        parts = token.split('.')
-                        if len(parts) >= 1:
-                            # Decode header (add padding if needed)
-                            header_b64 = parts[0]
-                            # Add padding if needed
-                            padding = 4 - len(header_b64) % 4
-                            if padding != 4:
-                                header_b64 += '=' * padding
-                            header_json = base64.urlsafe_b64decode(header_b64)
-                            header = json.loads(header_json)
-                            token_alg = header.get('alg', 'unknown')
-                            token_typ = header.get('typ', 'unknown')
-                            
-                            # Log at ERROR level only in dev to avoid leaking details in production
-                            if is_dev_env():
-                                logger.error(f"=== JWT VALIDATION FAILURE ===")
-                                logger.error(f"Error: {error_msg}")
-                                logger.error(f"Token algorithm: {token_alg}")
-                                logger.error(f"Token type: {token_typ}")
-                                logger.error(f"Expected algorithm: ES256")
-                                logger.error(f"Path: {request.url.path}")
-                                logger.error(f"SUPABASE_URL: {SUPABASE_URL}")
-                                
-                                if token_alg != 'ES256':
-                                    logger.error(f"❌ UNSUPPORTED ALGORITHM: Token uses '{token_alg}' but only ES256 is supported!")
-                                    logger.error(f"Ensure your Supabase project is configured to use ES256 (asymmetric keys).")
-                                else:
-                                    logger.error(f"❌ ES256 VALIDATION FAILED: {error_msg}")
-                                    logger.error(f"Check that SUPABASE_URL is correct and JWKS endpoint is accessible.")
-                                logger.error(f"==============================")
+                        header = decode_token_header(token)
+                        token_alg = header.get('alg', 'unknown')
+                        token_typ = header.get('typ', 'unknown')
+                        
+                        logger.error(f"=== JWT VALIDATION FAILURE ===")
+                        logger.error(f"Error: {error_msg}")
+                        logger.error(f"Token algorithm: {token_alg}")
+                        logger.error(f"Token type: {token_typ}")
+                        logger.error(f"Expected algorithm: ES256")
+                        logger.error(f"Path: {request.url.path}")
+                        logger.error(f"SUPABASE_URL: {SUPABASE_URL}")
+                        
+                        if token_alg != 'ES256':
+                            logger.error(f"❌ UNSUPPORTED ALGORITHM: Token uses '{token_alg}' but only ES256 is supported!")
+                            logger.error(f"Ensure your Supabase project is configured to use ES256 (asymmetric keys).")
+                        else:
+                            logger.error(f"❌ ES256 VALIDATION FAILED: {error_msg}")
+                            logger.error(f"Check that SUPABASE_URL is correct and JWKS endpoint is accessible.")
+                        logger.error(f"==============================")
                     except Exception as decode_error:
-                        if is_dev_env():
-                            logger.error(f"Could not decode JWT header for debugging: {decode_error}")
-                            logger.error(f"JWT validation failed: {error_msg} (path: {request.url.path})")
+                        logger.error(f"Could not decode JWT header for debugging: {decode_error}")
+                        logger.error(f"JWT validation failed: {error_msg} (path: {request.url.path})")
                 # Token is invalid or expired - don't set user
                 pass
+        except Exception as e:
+            # JWKS endpoint unreachable with no cached keys - treat as unauthenticated
+            log_exception_if_dev(logger, "JWT validation error", e)
 
     request.state.user = user  # Always set it (None if no valid token)
-    return await call_next(request)
+    # Services share one identity lookup (roles, role profiles) per user for the whole request
+    with request_identity_scope():
+        return await call_next(request)
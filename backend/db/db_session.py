@@ -1,5 +1,7 @@
 import os
+import httpx
 from supabase import create_client, Client
+from postgrest import SyncPostgrestClient, SyncRequestBuilder
 from dotenv import load_dotenv
 from fastapi import Request, Depends
 from typing import Optional
@@ -50,13 +52,75 @@ except Exception as e:
         logger.error(f"SUPABASE_SERVICE_ROLE_KEY length: {len(SUPABASE_SERVICE_ROLE_KEY) if SUPABASE_SERVICE_ROLE_KEY else 0}")
     raise ValueError("Invalid Supabase configuration")
 
+class _RLSSession:
+    """
+    Minimal stand-in for the postgrest httpx session that injects a user's JWT.
+
+    Every request is delegated to the shared postgrest session of db_client, so
+    keep-alive connections (and HTTP/2 streams) are reused across requests while
+    RLS still evaluates auth.uid() from the per-request Authorization header.
+    """
+
+    __slots__ = ("_session", "_auth_headers")
+
+    def __init__(self, session: httpx.Client, token: str):
+        self._session = session
+        self._auth_headers = {"Authorization": f"Bearer {token}"}
+
+    def request(self, method: str, url: str, *, headers=None, **kwargs) -> httpx.Response:
+        merged_headers = httpx.Headers(headers)
+        merged_headers.update(self._auth_headers)
+        return self._session.request(method, url, headers=merged_headers, **kwargs)
+
+    def __getattr__(self, name: str):
+        return getattr(self._session, name)
+
+
+class AuthenticatedClient:
+    """
+    Lightweight per-request Supabase client that respects RLS.
+
+    Exposes the query entry points used by services (table/from_/rpc) on top of
+    the shared connection pool; anything else (storage, auth, ...) is delegated
+    to the shared anon client, matching the previous per-request client which
+    only authenticated its postgrest session.
+    """
+
+    __slots__ = ("_session",)
+
+    def __init__(self, token: str):
+        self._session = _RLSSession(db_client.postgrest.session, token)
+
+    @property
+    def session(self) -> _RLSSession:
+        return self._session
+
+    @property
+    def postgrest(self) -> "AuthenticatedClient":
+        return self
+
+    def table(self, table_name: str) -> SyncRequestBuilder:
+        return SyncRequestBuilder(self._session, f"/{table_name}")
+
+    def from_(self, table_name: str) -> SyncRequestBuilder:
+        return self.table(table_name)
+
+    def rpc(self, func: str, params: dict, count=None, head: bool = False, get: bool = False):
+        # SyncPostgrestClient.rpc only relies on self.session, so reuse its builder logic
+        return SyncPostgrestClient.rpc(self, func, params, count=count, head=head, get=get)
+
+    def __getattr__(self, name: str):
+        return getattr(db_client, name)
+
+
 def get_authenticated_client(request: Request) -> Client:
     """
-    Create an authenticated Supabase client from the JWT token in the request.
+    Get an authenticated Supabase client from the JWT token in the request.
     This respects RLS policies based on the authenticated user.
     
     OPTIMIZED: Reuses token stored in request.state.token by middleware
-    to avoid redundant token extraction.
+    to avoid redundant token extraction, and returns a lightweight wrapper over
+    the shared connection pool instead of calling create_client per request.
     
     Args:
         request: FastAPI Request object containing JWT token
@@ -84,53 +148,16 @@ def get_authenticated_client(request: Request) -> Client:
     if not token:
         return db_client
     
-    # Create client and authenticate with JWT token for RLS
-    # The JWT token must be set in the Authorization header for RLS policies to work
-    # For Supabase Python client, we need to set the token on the postgrest client's session
+    # Reuse the client cached on the request so multiple dependencies share one wrapper
+    cached_client = getattr(request.state, 'db_client', None)
+    if cached_client is not None:
+        return cached_client
+    
+    # The JWT token must be sent in the Authorization header for RLS policies to work.
+    # Only the header is swapped per request; the underlying httpx session is shared.
     try:
-        # Create a new client instance
-        client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-        
-        # Set the JWT token on the postgrest client's session headers
-        # This is required for RLS policies to evaluate auth.uid() correctly
-        if hasattr(client, 'postgrest'):
-            try:
-                # The postgrest client uses a session object with headers
-                # We need to set the Authorization header with the JWT token
-                if hasattr(client.postgrest, 'session'):
-                    # Set headers on the session object
-                    if not hasattr(client.postgrest.session, 'headers'):
-                        # If headers don't exist, try to create them
-                        client.postgrest.session.headers = {}
-                    client.postgrest.session.headers['Authorization'] = f'Bearer {token}'
-                    client.postgrest.session.headers['apikey'] = SUPABASE_ANON_KEY
-                    if is_dev_env():
-                        logger.debug("Set JWT token on postgrest session headers")
-                elif hasattr(client.postgrest, 'headers'):
-                    # Fallback: set headers directly if session doesn't exist
-                    client.postgrest.headers['Authorization'] = f'Bearer {token}'
-                    client.postgrest.headers['apikey'] = SUPABASE_ANON_KEY
-                    if is_dev_env():
-                        logger.debug("Set JWT token on postgrest headers")
-                else:
-                    # Last resort: try using the auth() method if available
-                    if hasattr(client.postgrest, 'auth'):
-                        client.postgrest.auth(token)
-                        if is_dev_env():
-                            logger.debug("Set JWT token using postgrest auth() method")
-            except Exception as header_error:
-                if is_dev_env():
-                    logger.warning(f"Could not set JWT headers on postgrest client: {header_error}")
-                # Try alternative method
-                try:
-                    if hasattr(client.postgrest, 'auth'):
-                        client.postgrest.auth(token)
-                        if is_dev_env():
-                            logger.debug("Set JWT token using postgrest auth() method (fallback)")
-                except Exception as auth_error:
-                    if is_dev_env():
-                        logger.error(f"Failed to set JWT token via any method: {auth_error}")
-        
+        client = AuthenticatedClient(token)
+        request.state.db_client = client
         if is_dev_env():
             logger.debug(f"Created authenticated Supabase client with JWT token (token length: {len(token)})")
     except Exception as e:
@@ -0,0 +1,71 @@
+import os
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+from dotenv import load_dotenv
+from core.safe_errors import is_dev_env
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Maximum number of blocking Supabase calls allowed in flight at once per worker.
+# Extra calls queue on the executor instead of stalling the event loop.
+DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", "32"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Return the shared thread pool used to offload blocking Supabase calls.
+    The pool is created lazily so importing this module has no side effects.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=max(1, DB_MAX_CONCURRENCY),
+            thread_name_prefix="supabase-db",
+        )
+        if is_dev_env():
+            logger.info(f"Created Supabase query executor with {DB_MAX_CONCURRENCY} workers")
+    return _executor
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a blocking callable (Supabase storage call, synchronous service method, ...)
+    on the shared executor and await its result without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def run_query(query: Any) -> Any:
+    """
+    Execute a built PostgREST query off the event loop.
+
+    Usage:
+        result = await run_query(
+            client.table("users").select("roles").eq("user_id", user_id).single()
+        )
+
+    Args:
+        query: Any Supabase/PostgREST request builder exposing a synchronous execute()
+
+    Returns:
+        The APIResponse returned by query.execute()
+    """
+    return await run_blocking(query.execute)
+
+
+def shutdown_executor() -> None:
+    """Release executor threads (called on application shutdown)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
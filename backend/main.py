@@ -17,9 +17,17 @@ from api.file_scanning.file_scanning_router import router as file_scanning_route
 from api.payment_requests.payment_requests_router import router as payment_requests_router
 from api.subscriptions import subscriptions
 from core.limiter import limiter
-from core.verify import jwt_auth_middleware
+from core.verify import jwt_auth_middleware, jwks_store
 # Import database module to trigger connection test
 from db import db_session
+from db.query_executor import shutdown_executor
+from services.invoice.pdf_renderer import pdf_renderer
+from services.booking.upload_sessions import UploadSessions
+from services.stripe.webhook_service import stripe_webhook_worker
+from services.email.email_outbox import email_outbox_worker
+from services.notifications.notification_hub import notification_hub
+from services.file_scanning.clamd_pool import clamd_pool
+from services.file_scanning.scanner_service import CLAMAV_ENABLED
 import os
 from dotenv import load_dotenv
 
@@ -102,6 +110,66 @@ app.include_router(file_scanning_router)
 
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+@app.on_event("startup")
+async def warm_jwks_cache():
+    # Fetch signing keys up front so the first authenticated request doesn't wait on JWKS
+    try:
+        await jwks_store.refresh()
+    except Exception as e:
+        logger.warning(f"Initial JWKS fetch failed, will retry on first request: {e}")
+
+@app.on_event("startup")
+async def start_stripe_webhook_worker():
+    # Apply stored Stripe webhook events in the background (also re-queues unfinished ones)
+    await stripe_webhook_worker.start()
+
+@app.on_event("shutdown")
+async def stop_stripe_webhook_worker():
+    await stripe_webhook_worker.stop()
+
+@app.on_event("startup")
+async def start_email_outbox_worker():
+    # Deliver queued notification emails in the background (also picks up retries and leftovers)
+    await email_outbox_worker.start()
+
+@app.on_event("shutdown")
+async def stop_email_outbox_worker():
+    await email_outbox_worker.stop()
+
+@app.on_event("startup")
+async def start_notification_hub():
+    # Join the broker that fans notification events out to the other workers' streams
+    await notification_hub.start()
+
+@app.on_event("shutdown")
+async def stop_notification_hub():
+    await notification_hub.stop()
+
+@app.on_event("startup")
+async def start_clamd_health_checks():
+    # Keep ClamAV availability current in the background so scans never ping clamd inline
+    if CLAMAV_ENABLED:
+        await clamd_pool.start()
+
+@app.on_event("shutdown")
+async def stop_clamd_pool():
+    await clamd_pool.stop()
+
+@app.on_event("shutdown")
+async def shutdown_pdf_renderer():
+    # Stop the PDF render processes (the pool is created on the first render)
+    pdf_renderer.shutdown()
+
+@app.on_event("shutdown")
+async def close_upload_sessions_client():
+    # Close the connection pool used to forward resumable upload chunks to Storage
+    await UploadSessions.shutdown()
+
+@app.on_event("shutdown")
+async def shutdown_db_executor():
+    # Release the thread pool used to offload blocking Supabase calls
+    shutdown_executor()
+
 @app.get("/")
 async def read_root():
     # Test database connection and return status
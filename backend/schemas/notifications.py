@@ -17,6 +17,21 @@ class NotificationResponse(BaseModel):
     updated_at: str
 
 
+class NotificationPageResponse(BaseModel):
+    notifications: List[NotificationResponse]
+    next_cursor: Optional[str] = None  # None on the last page
+
+
 class UnreadCountResponse(BaseModel):
     count: int
 
+
+class MarkAllReadRequest(BaseModel):
+    role_context: Optional[str] = None
+    up_to: Optional[str] = None  # Cursor of the newest notification seen; newer ones stay unread
+
+
+class MarkAllReadResponse(BaseModel):
+    success: bool
+    updated: int
+
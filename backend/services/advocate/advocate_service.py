@@ -1,9 +1,11 @@
 from fastapi import HTTPException, UploadFile
 from db.db_session import db_admin
+from db.query_executor import run_query, run_blocking
 from schemas.advocate import AdvocateSetupResponse, AdvocateUpdateRequest, AdvocateUpdateResponse
 import uuid
 from services.email.email_service import email_service
 from core.safe_errors import log_exception_if_dev
+from core.identity import identity_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,7 +16,7 @@ class AdvocateController:
         """Set up advocate profile in the advocates table with hardcoded demo values"""
         try:
             # Get user profile data including name, profile_picture_url, and avatar_source
-            user_result = db_admin.table('users').select('roles, name, email, profile_picture_url, avatar_source').eq('user_id', user_id).single().execute()
+            user_result = await run_query(db_admin.table('users').select('roles, name, email, profile_picture_url, avatar_source').eq('user_id', user_id).single())
             if not user_result.data:
                 raise HTTPException(status_code=404, detail="User not found")
             
@@ -25,7 +27,7 @@ class AdvocateController:
             if 'advocate' not in user_roles:
                 user_roles.append('advocate')
                 # Update user's roles in the database
-                update_result = db_admin.table('users').update({'roles': user_roles}).eq('user_id', user_id).execute()
+                update_result = await run_query(db_admin.table('users').update({'roles': user_roles}).eq('user_id', user_id))
                 if not update_result.data:
                     raise HTTPException(status_code=500, detail="Failed to update user roles")
             
@@ -86,13 +88,14 @@ class AdvocateController:
             }
             
             # Insert or update advocate profile (upsert)
-            result = db_admin.table('advocates').upsert(advocate_data).execute()
+            result = await run_query(db_admin.table('advocates').upsert(advocate_data))
             
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to create advocate profile")
             
             # Mark setup as complete by setting first_login to False
-            user_update_result = db_admin.table('users').update({'first_login': False}).eq('user_id', user_id).execute()
+            user_update_result = await run_query(db_admin.table('users').update({'first_login': False}).eq('user_id', user_id))
+            identity_cache.invalidate(user_id)
             
             if not user_update_result.data:
                 raise HTTPException(status_code=500, detail="Failed to update user first_login status")
@@ -127,7 +130,7 @@ class AdvocateController:
         """Get the current user's advocate profile"""
         try:
             # Query the advocates table
-            result = db_admin.table('advocates').select('*').eq('user_id', user_id).single().execute()
+            result = await run_query(db_admin.table('advocates').select('*').eq('user_id', user_id).single())
             
             if not result.data:
                 raise HTTPException(status_code=404, detail="Advocate profile not found")
@@ -161,7 +164,7 @@ class AdvocateController:
                 )
             
             # Update the advocate profile
-            result = db_admin.table('advocates').update(update_dict).eq('user_id', user_id).execute()
+            result = await run_query(db_admin.table('advocates').update(update_dict).eq('user_id', user_id))
             
             if not result.data:
                 raise HTTPException(status_code=404, detail="Advocate profile not found")
@@ -192,7 +195,7 @@ class AdvocateController:
                 raise HTTPException(status_code=400, detail="File size must be less than 5MB")
             
             # Get current profile to find old photo URL
-            current_profile = db_admin.table('advocates').select('profile_banner_url').eq('user_id', user_id).single().execute()
+            current_profile = await run_query(db_admin.table('advocates').select('profile_banner_url').eq('user_id', user_id).single())
             old_photo_url = None
             if current_profile.data and current_profile.data.get('profile_banner_url'):
                 old_photo_url = current_profile.data['profile_banner_url']
@@ -206,7 +209,8 @@ class AdvocateController:
             file_path = f"advocates/{unique_filename}"
             
             try:
-                upload_result = db_admin.storage.from_(bucket_name).upload(
+                upload_result = await run_blocking(
+                    db_admin.storage.from_(bucket_name).upload,
                     path=file_path,
                     file=content,
                     file_options={"content-type": file.content_type}
@@ -219,10 +223,10 @@ class AdvocateController:
             public_url = db_admin.storage.from_(bucket_name).get_public_url(file_path)
             
             # Update the advocate profile with the new photo URL
-            update_result = db_admin.table('advocates').update({
+            update_result = await run_query(db_admin.table('advocates').update({
                 'profile_banner_url': public_url,
                 'profile_source': 'custom'
-            }).eq('user_id', user_id).execute()
+            }).eq('user_id', user_id))
             
             if not update_result.data:
                 raise HTTPException(status_code=500, detail="Failed to update profile with new photo URL")
@@ -235,7 +239,7 @@ class AdvocateController:
                     
                     if old_file_path.startswith('advocates/'):
                         try:
-                            db_admin.storage.from_(bucket_name).remove([old_file_path])
+                            await run_blocking(db_admin.storage.from_(bucket_name).remove, [old_file_path])
                         except Exception as delete_error:
                             log_exception_if_dev(logger, "Failed to delete old profile photo", delete_error)
                 except Exception as delete_error:
@@ -129,7 +129,7 @@ class AuthController:
         response.delete_cookie(key="sb-refresh-token", path="/", samesite="lax")
 
     @staticmethod
-    def validate_jwt_token(token: str) -> Dict[str, Any]:
+    async def validate_jwt_token(token: str) -> Dict[str, Any]:
         """
         Validate a JWT token and return its payload using ES256 (asymmetric keys).
         This ensures only valid Supabase tokens are accepted.
@@ -197,7 +197,7 @@ class AuthController:
             if token_alg != 'ES256':
                 raise JWTError(f"Unsupported algorithm: {token_alg}. Only ES256 is supported.")
             
-            public_key = get_public_key_from_jwks(token_kid)
+            public_key = await get_public_key_from_jwks(token_kid)
             if not public_key:
                 raise JWTError(f"Could not find public key for kid: {token_kid}")
             
@@ -252,7 +252,7 @@ class AuthController:
 
         # Validate access_token cryptographically (this should always be a JWT)
         try:
-            AuthController.validate_jwt_token(access_token)
+            await AuthController.validate_jwt_token(access_token)
         except HTTPException:
             raise
 
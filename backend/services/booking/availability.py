@@ -0,0 +1,138 @@
+from typing import List, Optional, Dict, Any, Iterator
+from datetime import datetime, date, time, timedelta
+
+# Index matches date.weekday()
+WEEKDAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+WEEKDAY_INDEX = {name: index for index, name in enumerate(WEEKDAY_NAMES)}
+
+
+def parse_minute_of_day(value: Any) -> Optional[int]:
+    """Minutes since midnight of a time value ('HH:MM[:SS]', optionally followed by '+tz' or ' ...')"""
+    if value is None:
+        return None
+    parts = str(value).split('+')[0].split(' ')[0].split(':')
+    if len(parts) < 2:
+        return None
+    try:
+        hours, minutes = int(parts[0]), int(parts[1])
+    except ValueError:
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+def iter_minutes(mask: int) -> Iterator[int]:
+    """Set bits of a minute bitmap, earliest first"""
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+def booked_minute_masks(bookings: Optional[List[Dict[str, Any]]]) -> Dict[date, int]:
+    """Bookings rows (booking_date, start_time) as one bitmap of booked start minutes per date"""
+    masks: Dict[date, int] = {}
+    # Bookings share a handful of start times and dates; parse each distinct value once
+    bits: Dict[Any, int] = {}
+    days: Dict[Any, Optional[date]] = {}
+    for booking in bookings or []:
+        start_time = booking.get('start_time')
+        bit = bits.get(start_time)
+        if bit is None:
+            minute = parse_minute_of_day(start_time)
+            bit = bits[start_time] = 0 if minute is None else 1 << minute
+        booking_date = booking.get('booking_date')
+        if booking_date in days:
+            day = days[booking_date]
+        else:
+            try:
+                day = date.fromisoformat(str(booking_date)[:10]) if booking_date else None
+            except ValueError:
+                day = None
+            days[booking_date] = day
+        if not bit or day is None:
+            continue
+        masks[day] = masks.get(day, 0) | bit
+    return masks
+
+
+class WeeklyAvailability:
+    """
+    A service's weekly schedule compiled into one bitmap per weekday: bit m is set when an enabled
+    time slot starts at minute m of that day. Slot times are parsed once here, so a date is
+    available when its weekday bitmap minus the date's booked bitmap is non-zero, and the free
+    slots of a date are the set bits of that difference.
+    """
+
+    def __init__(self, weekly_schedule: Optional[List[Dict[str, Any]]]):
+        """weekly_schedule: rows of weekly_schedule with their nested time_slots"""
+        self.day_masks = [0] * 7
+        self._slots: List[Dict[int, List[Dict[str, Any]]]] = [{} for _ in range(7)]
+
+        compiled = set()
+        for day_schedule in weekly_schedule or []:
+            day_name = day_schedule.get('day_of_week')
+            # The first row of a weekday is the one that counts
+            if day_name not in WEEKDAY_INDEX or day_name in compiled:
+                continue
+            compiled.add(day_name)
+            if not day_schedule.get('is_enabled'):
+                continue
+
+            weekday = WEEKDAY_INDEX[day_name]
+            slots_at = self._slots[weekday]
+            for slot in day_schedule.get('time_slots') or []:
+                if not slot.get('is_enabled', True):
+                    continue
+                minute = parse_minute_of_day(slot.get('slot_time'))
+                if minute is None:
+                    continue
+                self.day_masks[weekday] |= 1 << minute
+                slots_at.setdefault(minute, []).append({
+                    "id": slot["id"],
+                    "slot_time": slot["slot_time"],
+                    "is_enabled": slot.get('is_enabled', True),
+                    "day_of_week": day_name
+                })
+
+    @property
+    def has_slots(self) -> bool:
+        return any(self.day_masks)
+
+    def free_mask(self, day: date, booked_mask: int = 0) -> int:
+        return self.day_masks[day.weekday()] & ~booked_mask
+
+    def available_dates(
+        self,
+        start_date: date,
+        end_date: date,
+        booked_masks: Dict[date, int],
+        earliest: datetime
+    ) -> List[Dict[str, Any]]:
+        """Dates in [start_date, end_date] with a free slot; a date must start at or after `earliest`"""
+        first_date = earliest.date() if earliest.time() == time.min else earliest.date() + timedelta(days=1)
+        current_date = max(start_date, first_date)
+        if current_date > end_date or not self.has_slots:
+            return []
+
+        day_masks = self.day_masks
+        weekday = current_date.weekday()
+        one_day = timedelta(days=1)
+        available_dates = []
+        while current_date <= end_date:
+            day_mask = day_masks[weekday]
+            if day_mask and day_mask & ~booked_masks.get(current_date, 0):
+                available_dates.append({
+                    "date": current_date.isoformat(),
+                    "day_of_week": WEEKDAY_NAMES[weekday],
+                    "is_available": True
+                })
+            current_date += one_day
+            weekday = (weekday + 1) % 7
+        return available_dates
+
+    def available_slots(self, day: date, booked_mask: int = 0) -> List[Dict[str, Any]]:
+        """The day's time slots (in time order) whose start minute isn't booked"""
+        slots_at = self._slots[day.weekday()]
+        return [slot for minute in iter_minutes(self.free_mask(day, booked_mask)) for slot in slots_at[minute]]
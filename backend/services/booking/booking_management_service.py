@@ -4,6 +4,10 @@ import logging
 from fastapi import HTTPException
 from supabase import Client
 from db.db_session import db_admin
+from db.query_executor import run_query
+from services.notifications.notifications_service import NotificationsController
+from services.notifications.notification_hub import notification_hub
+from services.invoice.order_documents import OrderDocuments
 from core.safe_errors import log_exception_if_dev
 from schemas.booking import (
     CreateBookingRequest, CreateBookingResponse,
@@ -16,30 +20,6 @@ from schemas.booking import (
 logger = logging.getLogger(__name__)
 
 
-async def _send_notification_email(notification_data: Dict[str, Any], recipient_user_id: str, recipient_name: str, client: Client = None):
-    """Helper function to send email after notification creation"""
-    try:
-        from services.notifications.notifications_service import NotificationsController
-        # Get recipient email
-        recipient_email = None
-        if client:
-            try:
-                user_result = client.table('users').select('email').eq('user_id', recipient_user_id).single().execute()
-                if user_result.data:
-                    recipient_email = user_result.data.get('email')
-            except:
-                pass
-        
-        await NotificationsController.send_notification_email(
-            notification_data=notification_data,
-            recipient_email=recipient_email,
-            recipient_name=recipient_name,
-            client=client
-        )
-    except Exception as e:
-        log_exception_if_dev(logger, "Failed to send notification email", e)
-
-
 class BookingManagementService:
     """Service for handling booking CRUD operations"""
     
@@ -60,11 +40,10 @@ class BookingManagementService:
         
         try:
             # Get service details including creative_user_id
-            service_response = client.table('creative_services')\
+            service_response = await run_query(client.table('creative_services')\
                 .select('creative_user_id, price, payment_option, split_deposit_amount, title')\
                 .eq('id', booking_data.service_id)\
-                .single()\
-                .execute()
+                .single())
 
             if not service_response.data:
                 raise HTTPException(status_code=404, detail="Service not found")
@@ -102,9 +81,8 @@ class BookingManagementService:
             }
             
             # Insert booking into database
-            booking_response = client.table('bookings')\
-                .insert(booking_insert)\
-                .execute()
+            booking_response = await run_query(client.table('bookings')\
+                .insert(booking_insert))
             
             if not booking_response.data or len(booking_response.data) == 0:
                 raise HTTPException(status_code=500, detail="Failed to create booking")
@@ -114,17 +92,15 @@ class BookingManagementService:
             logger.info(f"Booking created successfully: {booking['id']} for user {user_id}")
             
             # Get client and creative display names for notifications
-            client_response = client.table("clients") \
+            client_response = await run_query(client.table("clients") \
                 .select("display_name") \
                 .eq("user_id", user_id) \
-                .single() \
-                .execute()
+                .single())
             
-            creative_response = client.table("creatives") \
+            creative_response = await run_query(client.table("creatives") \
                 .select("display_name") \
                 .eq("user_id", service['creative_user_id']) \
-                .single() \
-                .execute()
+                .single())
             
             client_display_name = client_response.data.get("display_name", "A client") if client_response.data else "A client"
             creative_display_name = creative_response.data.get("display_name", "A creative") if creative_response.data else "A creative"
@@ -174,19 +150,17 @@ class BookingManagementService:
             
             # Create notifications (don't fail booking creation if notification creation fails)
             try:
-                client_notif_result = client.table("notifications") \
-                    .insert(client_notification_data) \
-                    .execute()
+                client_notif_result = await run_query(client.table("notifications") \
+                    .insert(client_notification_data))
+                notification_hub.publish_created(client_notif_result.data)
                 logger.info(f"Client notification created: {client_notif_result.data}")
                 
                 # Send email notification
                 if client_notif_result.data:
-                    from services.notifications.notifications_service import NotificationsController
                     await NotificationsController.send_notification_email(
                         notification_data=client_notification_data,
                         recipient_email=client_response.data.get('email') if client_response.data else None,
-                        recipient_name=client_display_name,
-                        client=client
+                        recipient_name=client_display_name
                     )
             except Exception as notif_error:
                 log_exception_if_dev(logger, "Failed to create client notification", notif_error)
@@ -194,19 +168,17 @@ class BookingManagementService:
             try:
                 # Use db_admin to bypass RLS policies for notification insertion
                 # The client user doesn't have permission to create notifications for the creative user
-                creative_notif_result = db_admin.table("notifications") \
-                    .insert(creative_notification_data) \
-                    .execute()
+                creative_notif_result = await run_query(db_admin.table("notifications") \
+                    .insert(creative_notification_data))
+                notification_hub.publish_created(creative_notif_result.data)
                 logger.info(f"Creative notification created: {creative_notif_result.data}")
                 
                 # Send email notification
                 if creative_notif_result.data:
-                    from services.notifications.notifications_service import NotificationsController
                     await NotificationsController.send_notification_email(
                         notification_data=creative_notification_data,
                         recipient_email=creative_response.data.get('primary_contact') if creative_response.data else None,
-                        recipient_name=creative_display_name,
-                        client=db_admin
+                        recipient_name=creative_display_name
                     )
             except Exception as notif_error:
                 log_exception_if_dev(logger, "Failed to create creative notification", notif_error)
@@ -241,11 +213,10 @@ class BookingManagementService:
         
         try:
             # Fetch the booking to verify it exists and belongs to this creative
-            booking_response = client.table('bookings')\
+            booking_response = await run_query(client.table('bookings')\
                 .select('id, creative_user_id, client_user_id, service_id, creative_status, price, payment_option')\
                 .eq('id', booking_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not booking_response.data:
                 raise HTTPException(status_code=404, detail="Booking not found")
@@ -276,14 +247,13 @@ class BookingManagementService:
                 client_status = 'payment_required'
             
             # Update booking status
-            update_response = client.table('bookings')\
+            update_response = await run_query(client.table('bookings')\
                 .update({
                     'creative_status': creative_status,
                     'client_status': client_status,
                     'approved_at': datetime.utcnow().isoformat()
                 })\
-                .eq('id', booking_id)\
-                .execute()
+                .eq('id', booking_id))
             
             if not update_response.data or len(update_response.data) == 0:
                 raise HTTPException(status_code=500, detail="Failed to update booking status")
@@ -291,23 +261,20 @@ class BookingManagementService:
             logger.info(f"Booking approved successfully: {booking_id} by creative {user_id}")
             
             # Get service, creative, and client details for notifications
-            service_response = client.table('creative_services')\
+            service_response = await run_query(client.table('creative_services')\
                 .select('title')\
                 .eq('id', booking['service_id'])\
-                .single()\
-                .execute()
+                .single())
             
-            creative_response = client.table('creatives')\
+            creative_response = await run_query(client.table('creatives')\
                 .select('display_name')\
                 .eq('user_id', user_id)\
-                .single()\
-                .execute()
+                .single())
             
-            client_response = db_admin.table('clients')\
+            client_response = await run_query(db_admin.table('clients')\
                 .select('display_name')\
                 .eq('user_id', booking['client_user_id'])\
-                .single()\
-                .execute()
+                .single())
             
             service_title = service_response.data.get('title', 'Service') if service_response.data else 'Service'
             creative_display_name = creative_response.data.get('display_name', 'Creative') if creative_response.data else 'Creative'
@@ -359,22 +326,16 @@ class BookingManagementService:
             
             # Create notification for client
             try:
-                notification_result = db_admin.table("notifications")\
-                    .insert(notification_data)\
-                    .execute()
+                notification_result = await run_query(db_admin.table("notifications")\
+                    .insert(notification_data))
+                notification_hub.publish_created(notification_result.data)
                 logger.info(f"Client approval notification created: {notification_result.data}")
                 
                 # Send email notification
                 if notification_result.data:
-                    from services.notifications.notifications_service import NotificationsController
-                    # Get client email
-                    client_user_result = db_admin.table('users').select('email, name').eq('user_id', booking['client_user_id']).single().execute()
-                    client_email = client_user_result.data.get('email') if client_user_result.data else None
                     await NotificationsController.send_notification_email(
                         notification_data=notification_data,
-                        recipient_email=client_email,
-                        recipient_name=client_display_name,
-                        client=db_admin
+                        recipient_name=client_display_name
                     )
             except Exception as notif_error:
                 log_exception_if_dev(logger, "Failed to create client approval notification", notif_error)
@@ -403,22 +364,16 @@ class BookingManagementService:
                     "updated_at": datetime.utcnow().isoformat()
                 }
                 
-                creative_notification_result = db_admin.table("notifications")\
-                    .insert(creative_notification_data)\
-                    .execute()
+                creative_notification_result = await run_query(db_admin.table("notifications")\
+                    .insert(creative_notification_data))
+                notification_hub.publish_created(creative_notification_result.data)
                 logger.info(f"Creative approval notification created: {creative_notification_result.data}")
                 
                 # Send email notification
                 if creative_notification_result.data:
-                    from services.notifications.notifications_service import NotificationsController
-                    # Get creative email
-                    creative_user_result = db_admin.table('users').select('email, name').eq('user_id', user_id).single().execute()
-                    creative_email = creative_user_result.data.get('email') if creative_user_result.data else None
                     await NotificationsController.send_notification_email(
                         notification_data=creative_notification_data,
-                        recipient_email=creative_email,
-                        recipient_name=creative_display_name,
-                        client=db_admin
+                        recipient_name=creative_display_name
                     )
             except Exception as notif_error:
                 log_exception_if_dev(logger, "Failed to create creative approval notification", notif_error)
@@ -458,11 +413,10 @@ class BookingManagementService:
         
         try:
             # Fetch the booking
-            booking_response = client.table('bookings')\
+            booking_response = await run_query(client.table('bookings')\
                 .select('id, creative_user_id, client_user_id, service_id, creative_status')\
                 .eq('id', booking_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not booking_response.data:
                 raise HTTPException(status_code=404, detail="Booking not found")
@@ -482,13 +436,12 @@ class BookingManagementService:
                 )
             
             # Update booking status
-            update_response = client.table('bookings')\
+            update_response = await run_query(client.table('bookings')\
                 .update({
                     'creative_status': 'rejected',
                     'canceled_date': datetime.utcnow().isoformat()
                 })\
-                .eq('id', booking_id)\
-                .execute()
+                .eq('id', booking_id))
             
             if not update_response.data or len(update_response.data) == 0:
                 raise HTTPException(status_code=500, detail="Failed to update booking status")
@@ -496,17 +449,15 @@ class BookingManagementService:
             logger.info(f"Booking rejected successfully: {booking_id} by creative {user_id}")
             
             # Get service and creative details
-            service_response = client.table('creative_services')\
+            service_response = await run_query(client.table('creative_services')\
                 .select('title')\
                 .eq('id', booking['service_id'])\
-                .single()\
-                .execute()
+                .single())
             
-            creative_response = client.table('creatives')\
+            creative_response = await run_query(client.table('creatives')\
                 .select('display_name')\
                 .eq('user_id', user_id)\
-                .single()\
-                .execute()
+                .single())
             
             service_title = service_response.data.get('title', 'Service') if service_response.data else 'Service'
             creative_display_name = creative_response.data.get('display_name', 'Creative') if creative_response.data else 'Creative'
@@ -559,18 +510,18 @@ class BookingManagementService:
                 if user_id:  # creative user ID
                     notifications_to_insert.append(creative_notification_data)
                 
-                notification_result = db_admin.table("notifications")\
-                    .insert(notifications_to_insert)\
-                    .execute()
+                notification_result = await run_query(db_admin.table("notifications")\
+                    .insert(notifications_to_insert))
+                notification_hub.publish_created(notification_result.data)
                 logger.info(f"Rejection notifications created: {notification_result.data}")
                 
                 # Send email notifications
                 if notification_result.data:
                     # Send client email
-                    await _send_notification_email(client_notification_data, client_user_id, client_display_name, db_admin)
+                    await NotificationsController.send_notification_email(client_notification_data, recipient_name=client_display_name)
                     # Send creative email
                     if user_id:
-                        await _send_notification_email(creative_notification_data, user_id, creative_display_name, db_admin)
+                        await NotificationsController.send_notification_email(creative_notification_data, recipient_name=creative_display_name)
             except Exception as notif_error:
                 log_exception_if_dev(logger, "Failed to create rejection notifications", notif_error)
             
@@ -610,11 +561,10 @@ class BookingManagementService:
         
         try:
             # Fetch the booking
-            booking_response = client.table('bookings')\
+            booking_response = await run_query(client.table('bookings')\
                 .select('id, client_user_id, creative_user_id, service_id, client_status, creative_status')\
                 .eq('id', booking_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not booking_response.data:
                 raise HTTPException(status_code=404, detail="Booking not found")
@@ -637,25 +587,26 @@ class BookingManagementService:
             
             # Update booking status - only change client_status, leave creative_status unchanged
             # This maintains symmetry with reject_booking which only changes creative_status
-            update_response = client.table('bookings')\
+            update_response = await run_query(client.table('bookings')\
                 .update({
                     'client_status': 'cancelled',
                     'canceled_date': datetime.utcnow().isoformat()
                 })\
-                .eq('id', booking_id)\
-                .execute()
+                .eq('id', booking_id))
             
             if not update_response.data or len(update_response.data) == 0:
                 raise HTTPException(status_code=500, detail="Failed to update booking status")
             
             logger.info(f"Booking canceled successfully: {booking_id} by client {user_id}")
             
+            # Store the invoice and compliance sheet for the cancelled order
+            OrderDocuments.schedule_prerender(booking_id)
+            
             # Get service details
-            service_response = client.table('creative_services')\
+            service_response = await run_query(client.table('creative_services')\
                 .select('title')\
                 .eq('id', booking['service_id'])\
-                .single()\
-                .execute()
+                .single())
             
             service_title = service_response.data.get('title', 'Service') if service_response.data else 'Service'
             
@@ -706,23 +657,23 @@ class BookingManagementService:
                 if creative_user_id:
                     notifications_to_insert.append(creative_notification_data)
                 
-                notification_result = db_admin.table("notifications")\
-                    .insert(notifications_to_insert)\
-                    .execute()
+                notification_result = await run_query(db_admin.table("notifications")\
+                    .insert(notifications_to_insert))
+                notification_hub.publish_created(notification_result.data)
                 logger.info(f"Cancellation notifications created: {notification_result.data}")
                 
                 # Send email notifications
                 if notification_result.data:
                     # Get client name
-                    client_response = client.table('clients').select('display_name').eq('user_id', user_id).single().execute()
+                    client_response = await run_query(client.table('clients').select('display_name').eq('user_id', user_id).single())
                     client_display_name = client_response.data.get('display_name', 'Client') if client_response.data else 'Client'
                     # Get creative name
-                    creative_response = client.table('creatives').select('display_name').eq('user_id', creative_user_id).single().execute()
+                    creative_response = await run_query(client.table('creatives').select('display_name').eq('user_id', creative_user_id).single())
                     creative_display_name = creative_response.data.get('display_name', 'Creative') if creative_response.data else 'Creative'
                     
-                    await _send_notification_email(client_notification_data, user_id, client_display_name, db_admin)
+                    await NotificationsController.send_notification_email(client_notification_data, recipient_name=client_display_name)
                     if creative_user_id:
-                        await _send_notification_email(creative_notification_data, creative_user_id, creative_display_name, db_admin)
+                        await NotificationsController.send_notification_email(creative_notification_data, recipient_name=creative_display_name)
             except Exception as notif_error:
                 log_exception_if_dev(logger, "Failed to create cancellation notifications", notif_error)
             
@@ -758,11 +709,10 @@ class BookingManagementService:
         
         try:
             # Get booking details
-            booking_response = client.table('bookings')\
+            booking_response = await run_query(client.table('bookings')\
                 .select('id, client_user_id, creative_user_id, service_id, price, payment_option, split_deposit_amount, amount_paid')\
                 .eq('id', booking_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not booking_response.data:
                 raise HTTPException(status_code=404, detail="Booking not found")
@@ -778,20 +728,18 @@ class BookingManagementService:
                 raise HTTPException(status_code=400, detail="Client user ID not found for this booking")
             
             # Get service details
-            service_response = client.table('creative_services')\
+            service_response = await run_query(client.table('creative_services')\
                 .select('id, title')\
                 .eq('id', booking.get('service_id'))\
-                .single()\
-                .execute()
+                .single())
             
             service_title = service_response.data.get('title', 'service') if service_response.data else 'service'
             
             # Get creative display name
-            creative_response = client.table('creatives')\
+            creative_response = await run_query(client.table('creatives')\
                 .select('display_name')\
                 .eq('user_id', creative_user_id)\
-                .single()\
-                .execute()
+                .single())
             
             creative_display_name = creative_response.data.get('display_name', 'Your creative') if creative_response.data else 'Your creative'
             
@@ -842,17 +790,17 @@ class BookingManagementService:
             
             # Insert notification using db_admin to bypass RLS
             try:
-                notification_result = db_admin.table("notifications")\
-                    .insert(client_notification_data)\
-                    .execute()
+                notification_result = await run_query(db_admin.table("notifications")\
+                    .insert(client_notification_data))
+                notification_hub.publish_created(notification_result.data)
                 logger.info(f"Payment reminder notification created: {notification_result.data}")
                 
                 # Send email notification
                 if notification_result.data:
                     # Get client name
-                    client_response = client.table('clients').select('display_name').eq('user_id', client_user_id).single().execute()
+                    client_response = await run_query(client.table('clients').select('display_name').eq('user_id', client_user_id).single())
                     client_display_name = client_response.data.get('display_name', 'Client') if client_response.data else 'Client'
-                    await _send_notification_email(client_notification_data, client_user_id, client_display_name, db_admin)
+                    await NotificationsController.send_notification_email(client_notification_data, recipient_name=client_display_name)
                 
                 notification_id = None
                 if notification_result.data and len(notification_result.data) > 0:
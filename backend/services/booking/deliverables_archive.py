@@ -0,0 +1,218 @@
+"""
+ZIP export of a booking's deliverables
+
+Deliverables are mostly already-compressed media, so they are stored in the archive as-is and
+streamed from Storage straight into the response, a chunk at a time. Sizes come from Storage
+(not the client-reported file_size_bytes) so the archive layout, and with it range requests,
+match the bytes actually served. Each member's CRC-32 is saved to booking_deliverables.content_crc32
+the first time the member streams through, so a resumed download doesn't have to re-read files
+it skips.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import zlib
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+from core.safe_errors import log_exception_if_dev, is_dev_env
+from db.db_session import db_admin
+from db.query_executor import run_query, run_blocking
+from util.signed_urls import normalize_storage_path, create_signed_url
+from util.zip_stream import ZipLayout, ZipMember, stream_zip
+
+logger = logging.getLogger(__name__)
+
+DELIVERABLES_BUCKET = "booking-deliverables"
+ARCHIVE_CHUNK_SIZE = 256 * 1024
+ARCHIVE_FETCH_TIMEOUT = httpx.Timeout(30.0)
+# Entries per Storage list request when looking up object sizes
+STORAGE_LIST_PAGE_SIZE = 1000
+
+# Deliverable columns needed to build an archive
+ARCHIVE_DELIVERABLE_FIELDS = 'id, file_url, file_name, created_at, content_crc32'
+
+
+def _parse_timestamp(value: Optional[str]) -> datetime:
+    if not value:
+        return datetime(1980, 1, 1)
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return datetime(1980, 1, 1)
+
+
+def _archive_names(file_names: List[str]) -> List[str]:
+    """Member names: path separators removed and duplicates numbered ("take.wav", "take (2).wav")"""
+    names = []
+    seen = set()
+    for position, file_name in enumerate(file_names):
+        name = (file_name or '').replace('/', '_').replace('\\', '_').strip() or f"file-{position + 1}"
+        candidate = name
+        counter = 2
+        while candidate.lower() in seen:
+            stem, dot, extension = name.rpartition('.')
+            candidate = f"{stem} ({counter}).{extension}" if dot and stem else f"{name} ({counter})"
+            counter += 1
+        seen.add(candidate.lower())
+        names.append(candidate)
+    return names
+
+
+async def _object_sizes(paths: List[str]) -> Dict[str, int]:
+    """Sizes of the stored objects at paths (missing objects are left out), one list per folder"""
+    folders: Dict[str, set] = {}
+    for path in paths:
+        folder, _, name = path.rpartition('/')
+        folders.setdefault(folder, set()).add(name)
+
+    async def list_folder(folder: str, names: set) -> Dict[str, int]:
+        bucket = db_admin.storage.from_(DELIVERABLES_BUCKET)
+        sizes = {}
+        offset = 0
+        while True:
+            entries = await run_blocking(bucket.list, folder, {
+                'limit': STORAGE_LIST_PAGE_SIZE,
+                'offset': offset,
+                'sortBy': {'column': 'name', 'order': 'asc'}
+            })
+            for entry in entries or []:
+                metadata = entry.get('metadata') or {}
+                if entry.get('name') in names and metadata.get('size') is not None:
+                    sizes[f"{folder}/{entry['name']}" if folder else entry['name']] = int(metadata['size'])
+            if len(entries or []) < STORAGE_LIST_PAGE_SIZE or len(sizes) == len(names):
+                return sizes
+            offset += STORAGE_LIST_PAGE_SIZE
+
+    sizes: Dict[str, int] = {}
+    for folder_sizes in await asyncio.gather(*(list_folder(folder, names) for folder, names in folders.items())):
+        sizes.update(folder_sizes)
+    return sizes
+
+
+class DeliverablesArchive:
+    """A booking's deliverables as a streamable, range-addressable ZIP"""
+
+    def __init__(self, booking_id: str, deliverable_ids: List[str], paths: List[str], layout: ZipLayout, skipped_count: int):
+        self.booking_id = booking_id
+        self.deliverable_ids = deliverable_ids
+        self.paths = paths
+        self.layout = layout
+        self.skipped_count = skipped_count
+        self.etag = '"' + hashlib.sha256(json.dumps(
+            [[deliverable_id, path, member.name, member.size] for deliverable_id, path, member in zip(deliverable_ids, paths, layout.members)],
+            separators=(',', ':')
+        ).encode('utf-8')).hexdigest()[:32] + '"'
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @property
+    def total_size(self) -> int:
+        return self.layout.total_size
+
+    @staticmethod
+    async def build(booking_id: str, deliverables: List[Dict[str, Any]]) -> 'DeliverablesArchive':
+        """
+        Archive of the given deliverable rows (ARCHIVE_DELIVERABLE_FIELDS), in order
+
+        Deliverables without a stored object are skipped and counted in skipped_count.
+        """
+        candidates: List[Tuple[Dict[str, Any], str]] = [
+            (deliverable, normalize_storage_path(deliverable['file_url'], DELIVERABLES_BUCKET))
+            for deliverable in deliverables
+            if deliverable.get('file_url')
+        ]
+        sizes = await _object_sizes([path for _, path in candidates])
+        available = [(deliverable, path) for deliverable, path in candidates if path in sizes]
+
+        names = _archive_names([deliverable.get('file_name') for deliverable, _ in available])
+        members = [
+            ZipMember(
+                name=name,
+                size=sizes[path],
+                modified=_parse_timestamp(deliverable.get('created_at')),
+                crc32=deliverable.get('content_crc32')
+            )
+            for name, (deliverable, path) in zip(names, available)
+        ]
+        if is_dev_env() and len(available) < len(deliverables):
+            logger.warning("Deliverables archive for booking %s: %s files missing from storage", booking_id, len(deliverables) - len(available))
+        return DeliverablesArchive(
+            booking_id,
+            [str(deliverable['id']) for deliverable, _ in available],
+            [path for _, path in available],
+            ZipLayout(members),
+            len(deliverables) - len(available)
+        )
+
+    async def _read_member(self, index: int, offset: int, length: int) -> AsyncIterator[bytes]:
+        signed = await create_signed_url(DELIVERABLES_BUCKET, self.paths[index], 3600)
+        if 'error' in signed:
+            raise IOError(f"Could not sign {self.paths[index]}: {signed['error']}")
+
+        partial = offset > 0 or length != self.layout.members[index].size
+        headers = {'Range': f"bytes={offset}-{offset + length - 1}"} if partial else {}
+        async with self._http.stream('GET', signed['signed_url'], headers=headers) as response:
+            response.raise_for_status()
+            # A server that ignores Range sends the whole object; skip to the offset
+            skip = offset if partial and response.status_code == 200 else 0
+            remaining = length
+            async for chunk in response.aiter_bytes(ARCHIVE_CHUNK_SIZE):
+                if skip:
+                    dropped = min(skip, len(chunk))
+                    chunk = chunk[dropped:]
+                    skip -= dropped
+                if not chunk:
+                    continue
+                chunk = chunk[:remaining]
+                remaining -= len(chunk)
+                yield chunk
+                if remaining <= 0:
+                    break
+
+    async def _member_crc(self, index: int) -> int:
+        """CRC-32 of a member the requested range skips, read from Storage"""
+        crc = 0
+        async for chunk in self._read_member(index, 0, self.layout.members[index].size):
+            crc = zlib.crc32(chunk, crc)
+        await self._save_crc(index, crc)
+        return crc
+
+    async def _save_crc(self, index: int, crc: int) -> None:
+        try:
+            await run_query(db_admin.table('booking_deliverables')\
+                .update({'content_crc32': crc})\
+                .eq('id', self.deliverable_ids[index]))
+        except Exception as e:
+            # Only costs a re-read on the next resumed download
+            log_exception_if_dev(logger, "Failed to save deliverable CRC", e)
+
+    async def stream(self, start: int, end: int) -> AsyncIterator[bytes]:
+        """
+        Bytes start..end (inclusive) of the archive
+        The deliverables are marked downloaded once a range reaching the end of the archive has
+        been sent in full (a fresh download or the last part of a resumed one).
+        """
+        async with httpx.AsyncClient(timeout=ARCHIVE_FETCH_TIMEOUT) as http:
+            self._http = http
+            try:
+                async for chunk in stream_zip(self.layout, start, end, self._read_member, self._member_crc, self._save_crc):
+                    yield chunk
+            except Exception as e:
+                # The response has started; aborting lets the client resume with a range request
+                log_exception_if_dev(logger, f"Deliverables archive for booking {self.booking_id} failed mid-stream", e)
+                raise
+            finally:
+                self._http = None
+        if end >= self.total_size - 1:
+            await self.mark_downloaded()
+
+    async def mark_downloaded(self) -> None:
+        if not self.deliverable_ids:
+            return
+        try:
+            await run_query(db_admin.table('booking_deliverables')\
+                .update({'downloaded_at': datetime.now(timezone.utc).isoformat()})\
+                .in_('id', self.deliverable_ids))
+        except Exception as e:
+            log_exception_if_dev(logger, "Failed to update downloaded_at for deliverables", e)
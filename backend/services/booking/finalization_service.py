@@ -4,6 +4,10 @@ import logging
 from fastapi import HTTPException
 from supabase import Client
 from db.db_session import db_admin
+from db.query_executor import run_query
+from services.notifications.notifications_service import NotificationsController
+from services.notifications.notification_hub import notification_hub
+from services.invoice.order_documents import OrderDocuments
 from schemas.booking import (
     FinalizeServiceRequest, FinalizeServiceResponse
 )
@@ -12,31 +16,6 @@ from core.safe_errors import is_dev_env
 logger = logging.getLogger(__name__)
 
 
-async def _send_notification_email(notification_data: Dict[str, Any], recipient_user_id: str, recipient_name: str, client: Client = None):
-    """Helper function to send email after notification creation"""
-    try:
-        from services.notifications.notifications_service import NotificationsController
-        # Get recipient email
-        recipient_email = None
-        if client:
-            try:
-                user_result = client.table('users').select('email').eq('user_id', recipient_user_id).single().execute()
-                if user_result.data:
-                    recipient_email = user_result.data.get('email')
-            except:
-                pass
-        
-        await NotificationsController.send_notification_email(
-            notification_data=notification_data,
-            recipient_email=recipient_email,
-            recipient_name=recipient_name,
-            client=client
-        )
-    except Exception as e:
-        if is_dev_env():
-            logger.warning(f"Failed to send notification email: {str(e)}")
-
-
 class FinalizationService:
     """Service for handling booking finalization operations"""
     
@@ -61,9 +40,9 @@ class FinalizationService:
             booking_id = finalize_request.booking_id
             
             # Get booking details
-            booking_result = client.table('bookings').select(
+            booking_result = await run_query(client.table('bookings').select(
                 'id, creative_user_id, client_user_id, service_id, price, payment_option, payment_status, amount_paid, creative_status, client_status'
-            ).eq('id', booking_id).single().execute()
+            ).eq('id', booking_id).single())
             
             if not booking_result.data:
                 raise HTTPException(status_code=404, detail="Booking not found")
@@ -143,10 +122,9 @@ class FinalizationService:
             if has_files:
                 deliverables_data = []
                 # Get existing file URLs for this booking to prevent duplicates
-                existing_deliverables = db_admin.table('booking_deliverables')\
+                existing_deliverables = await run_query(db_admin.table('booking_deliverables')\
                     .select('file_url')\
-                    .eq('booking_id', booking_id)\
-                    .execute()
+                    .eq('booking_id', booking_id))
                 
                 existing_file_urls = set()
                 if existing_deliverables.data:
@@ -175,7 +153,7 @@ class FinalizationService:
                 
                 if deliverables_data:
                     try:
-                        db_admin.table('booking_deliverables').insert(deliverables_data).execute()
+                        await run_query(db_admin.table('booking_deliverables').insert(deliverables_data))
                     except Exception as insert_error:
                         error_str = str(insert_error)
                         # Check if it's a unique constraint violation (duplicate file_url)
@@ -195,15 +173,18 @@ class FinalizationService:
                 'updated_at': datetime.utcnow().isoformat()
             }
             
-            update_result = client.table('bookings').update(update_data).eq('id', booking_id).execute()
+            update_result = await run_query(client.table('bookings').update(update_data).eq('id', booking_id))
             
             if not update_result.data:
                 raise HTTPException(status_code=500, detail="Failed to update booking status")
             
+            # Store the invoice and compliance sheet for completed / download orders
+            OrderDocuments.schedule_prerender(booking_id)
+            
             # Get service, creative, and client details for notifications
-            service_response = db_admin.table('creative_services').select('title').eq('id', booking['service_id']).single().execute()
-            creative_response = db_admin.table('creatives').select('display_name').eq('user_id', user_id).single().execute()
-            client_response = db_admin.table('clients').select('display_name').eq('user_id', booking['client_user_id']).single().execute()
+            service_response = await run_query(db_admin.table('creative_services').select('title').eq('id', booking['service_id']).single())
+            creative_response = await run_query(db_admin.table('creatives').select('display_name').eq('user_id', user_id).single())
+            client_response = await run_query(db_admin.table('clients').select('display_name').eq('user_id', booking['client_user_id']).single())
             
             service_title = service_response.data.get('title', 'Service') if service_response.data else 'Service'
             creative_display_name = creative_response.data.get('display_name', 'Creative') if creative_response.data else 'Creative'
@@ -234,13 +215,14 @@ class FinalizationService:
                         "created_at": datetime.utcnow().isoformat(),
                         "updated_at": datetime.utcnow().isoformat()
                     }
-                    notification_result = db_admin.table("notifications").insert(client_notification_data).execute()
+                    notification_result = await run_query(db_admin.table("notifications").insert(client_notification_data))
+                    notification_hub.publish_created(notification_result.data)
                     if is_dev_env():
                         logger.info(f"Payment required notification created for client: {booking['client_user_id']}")
                     
                     # Send email notification
                     if notification_result.data:
-                        await _send_notification_email(client_notification_data, booking['client_user_id'], client_display_name, db_admin)
+                        await NotificationsController.send_notification_email(client_notification_data, recipient_name=client_display_name)
                 
                 elif client_status == 'locked':
                     # Client: Payment to unlock notification
@@ -264,13 +246,14 @@ class FinalizationService:
                         "created_at": datetime.utcnow().isoformat(),
                         "updated_at": datetime.utcnow().isoformat()
                     }
-                    notification_result = db_admin.table("notifications").insert(client_notification_data).execute()
+                    notification_result = await run_query(db_admin.table("notifications").insert(client_notification_data))
+                    notification_hub.publish_created(notification_result.data)
                     if is_dev_env():
                         logger.info(f"Payment to unlock notification created for client: {booking['client_user_id']}")
                     
                     # Send email notification
                     if notification_result.data:
-                        await _send_notification_email(client_notification_data, booking['client_user_id'], client_display_name, db_admin)
+                        await NotificationsController.send_notification_email(client_notification_data, recipient_name=client_display_name)
                     
                     # Creative: Files sent notification
                     creative_notification_data = {
@@ -293,13 +276,14 @@ class FinalizationService:
                         "created_at": datetime.utcnow().isoformat(),
                         "updated_at": datetime.utcnow().isoformat()
                     }
-                    creative_notification_result = db_admin.table("notifications").insert(creative_notification_data).execute()
+                    creative_notification_result = await run_query(db_admin.table("notifications").insert(creative_notification_data))
+                    notification_hub.publish_created(creative_notification_result.data)
                     if is_dev_env():
                         logger.info(f"Files sent notification created for creative: {user_id}")
                     
                     # Send email notification
                     if creative_notification_result.data:
-                        await _send_notification_email(creative_notification_data, user_id, creative_display_name, db_admin)
+                        await NotificationsController.send_notification_email(creative_notification_data, recipient_name=creative_display_name)
                 
                 elif client_status == 'completed':
                     # Both: Service complete notification
@@ -321,13 +305,14 @@ class FinalizationService:
                         "created_at": datetime.utcnow().isoformat(),
                         "updated_at": datetime.utcnow().isoformat()
                     }
-                    client_notification_result = db_admin.table("notifications").insert(client_notification_data).execute()
+                    client_notification_result = await run_query(db_admin.table("notifications").insert(client_notification_data))
+                    notification_hub.publish_created(client_notification_result.data)
                     if is_dev_env():
                         logger.info(f"Service complete notification created for client: {booking['client_user_id']}")
                     
                     # Send email notification
                     if client_notification_result.data:
-                        await _send_notification_email(client_notification_data, booking['client_user_id'], client_display_name, db_admin)
+                        await NotificationsController.send_notification_email(client_notification_data, recipient_name=client_display_name)
                     
                     creative_notification_data = {
                         "recipient_user_id": user_id,
@@ -347,13 +332,14 @@ class FinalizationService:
                         "created_at": datetime.utcnow().isoformat(),
                         "updated_at": datetime.utcnow().isoformat()
                     }
-                    creative_notification_result = db_admin.table("notifications").insert(creative_notification_data).execute()
+                    creative_notification_result = await run_query(db_admin.table("notifications").insert(creative_notification_data))
+                    notification_hub.publish_created(creative_notification_result.data)
                     if is_dev_env():
                         logger.info(f"Service complete notification created for creative: {user_id}")
                     
                     # Send email notification
                     if creative_notification_result.data:
-                        await _send_notification_email(creative_notification_data, user_id, creative_display_name, db_admin)
+                        await NotificationsController.send_notification_email(creative_notification_data, recipient_name=creative_display_name)
                 
                 elif client_status == 'download':
                     # Client: Files ready notification
@@ -376,13 +362,14 @@ class FinalizationService:
                         "created_at": datetime.utcnow().isoformat(),
                         "updated_at": datetime.utcnow().isoformat()
                     }
-                    client_notification_result = db_admin.table("notifications").insert(client_notification_data).execute()
+                    client_notification_result = await run_query(db_admin.table("notifications").insert(client_notification_data))
+                    notification_hub.publish_created(client_notification_result.data)
                     if is_dev_env():
                         logger.info(f"Files ready notification created for client: {booking['client_user_id']}")
                     
                     # Send email notification
                     if client_notification_result.data:
-                        await _send_notification_email(client_notification_data, booking['client_user_id'], client_display_name, db_admin)
+                        await NotificationsController.send_notification_email(client_notification_data, recipient_name=client_display_name)
                     
                     # Creative: Files sent notification
                     creative_notification_data = {
@@ -405,13 +392,14 @@ class FinalizationService:
                         "created_at": datetime.utcnow().isoformat(),
                         "updated_at": datetime.utcnow().isoformat()
                     }
-                    creative_notification_result = db_admin.table("notifications").insert(creative_notification_data).execute()
+                    creative_notification_result = await run_query(db_admin.table("notifications").insert(creative_notification_data))
+                    notification_hub.publish_created(creative_notification_result.data)
                     if is_dev_env():
                         logger.info(f"Files sent notification created for creative: {user_id}")
                     
                     # Send email notification
                     if creative_notification_result.data:
-                        await _send_notification_email(creative_notification_data, user_id, creative_display_name, db_admin)
+                        await NotificationsController.send_notification_email(creative_notification_data, recipient_name=creative_display_name)
                     
             except Exception as notif_error:
                 if is_dev_env():
@@ -444,9 +432,9 @@ class FinalizationService:
         
         try:
             # Get booking details
-            booking_result = client.table('bookings').select(
+            booking_result = await run_query(client.table('bookings').select(
                 'id, client_user_id, client_status, creative_status'
-            ).eq('id', booking_id).single().execute()
+            ).eq('id', booking_id).single())
             
             if not booking_result.data:
                 raise HTTPException(status_code=404, detail="Booking not found")
@@ -465,14 +453,16 @@ class FinalizationService:
                 )
             
             # Update client_status to 'completed', keep creative_status unchanged
-            update_response = client.table('bookings')\
+            update_response = await run_query(client.table('bookings')\
                 .update({'client_status': 'completed'})\
-                .eq('id', booking_id)\
-                .execute()
+                .eq('id', booking_id))
             
             if not update_response.data or len(update_response.data) == 0:
                 raise HTTPException(status_code=500, detail="Failed to update booking status")
             
+            # The documents show the client status, so store the 'completed' versions
+            OrderDocuments.schedule_prerender(booking_id)
+            
             if is_dev_env():
                 logger.info(f"Booking {booking_id} marked as complete after download by client {user_id}")
             
@@ -5,7 +5,9 @@ import os
 from fastapi import HTTPException
 from supabase import Client
 from db.db_session import db_admin
-from core.safe_errors import log_exception_if_dev, is_dev_env
+from db.query_executor import run_query, run_blocking
+from core.safe_errors import log_exception_if_dev
+from services.stripe.checkout_session_index import CheckoutSessionIndex
 from schemas.booking import (
     OrdersListResponse, OrderResponse, OrderFile, Invoice,
     CalendarSessionsResponse, CalendarSessionResponse
@@ -13,22 +15,28 @@ from schemas.booking import (
 
 logger = logging.getLogger(__name__)
 
+# Client statuses for which the EZ invoice and Stripe receipts are listed
+INVOICE_STATUSES = ['canceled', 'cancelled', 'completed', 'download']
+
+# How long cached creative dashboard stats are served without touching bookings or Stripe
+DASHBOARD_STATS_TTL_SECONDS = int(os.getenv("DASHBOARD_STATS_TTL_SECONDS", "60"))
+
 class OrderService:
     """Service for handling order retrieval operations"""
     
     @staticmethod
-    def _get_invoices_for_booking(booking: Dict[str, Any], client: Client) -> List[Invoice]:
-        """Get invoices for a booking if status allows it"""
+    def _get_invoices_for_booking(booking: Dict[str, Any], session_ids: Optional[List[str]] = None) -> List[Invoice]:
+        """Get invoices for a booking if status allows it
+        
+        Args:
+            booking: Booking row
+            session_ids: Paid checkout session IDs for the booking, oldest first
+                (from CheckoutSessionIndex.get_paid_session_ids)
+        """
         try:
             client_status = booking.get('client_status', '').lower()
-            allowed_statuses = ['canceled', 'cancelled', 'completed', 'download']
             
-            logger.info(f"[_get_invoices_for_booking] Checking invoices for booking {booking.get('id')}, status: '{client_status}' (raw: '{booking.get('client_status')}')")
-            logger.info(f"[_get_invoices_for_booking] Allowed statuses: {allowed_statuses}")
-            
-            if client_status not in allowed_statuses:
-                if is_dev_env():
-                    logger.warning("[_get_invoices_for_booking] Status not in allowed statuses, returning empty list")
+            if client_status not in INVOICE_STATUSES:
                 return []
             
             invoices = []
@@ -40,80 +48,53 @@ class OrderService:
                 name='EZ Platform Invoice',
                 download_url=f'/api/bookings/invoice/ez/{booking_id}'
             ))
-            logger.info(f"[_get_invoices_for_booking] Added EZ invoice for booking {booking_id}")
             
             # Get Stripe receipts
-            try:
-                import stripe
-                stripe_secret_key = os.getenv("STRIPE_SECRET_KEY")
-                if not stripe_secret_key:
-                    if is_dev_env():
-                        logger.warning("STRIPE_SECRET_KEY not found, skipping Stripe receipts for booking")
-                    return invoices
-                stripe.api_key = stripe_secret_key
-                
-                # Get creative's Stripe account ID
-                creative_user_id = booking.get('creative_user_id')
-                creative_result = client.table('creatives')\
-                    .select('stripe_account_id')\
-                    .eq('user_id', creative_user_id)\
-                    .single()\
-                    .execute()
-                
-                if creative_result.data and creative_result.data.get('stripe_account_id'):
-                    stripe_account_id = creative_result.data.get('stripe_account_id')
-                    
-                    # List all checkout sessions for this booking
-                    checkout_sessions = stripe.checkout.Session.list(
-                        limit=100,
-                        stripe_account=stripe_account_id
-                    )
-                    
-                    # Filter sessions for this booking_id
-                    booking_sessions = [
-                        session for session in checkout_sessions.data
-                        if session.metadata and session.metadata.get('booking_id') == booking_id
-                        and session.payment_status == 'paid'
-                    ]
-                    
-                    # Sort sessions by creation date (oldest first) to ensure correct order for split payments
-                    # First payment (deposit) should be Payment 1, second payment (final) should be Payment 2
-                    booking_sessions.sort(key=lambda s: s.created if hasattr(s, 'created') else 0)
-                    
-                    # For split payments, there should be 2 sessions
-                    # For upfront/later, there should be 1 session
-                    payment_option = booking.get('payment_option', 'later').lower()
-                    
-                    if payment_option == 'split' and len(booking_sessions) >= 2:
-                        # Split payment: 2 Stripe receipts
-                        for idx, session in enumerate(booking_sessions[:2], 1):
-                            invoices.append(Invoice(
-                                type='stripe_receipt',
-                                name=f'Stripe Receipt - Payment {idx}',
-                                session_id=session.id,
-                                download_url=f'/api/bookings/invoice/stripe/{booking_id}?session_id={session.id}'
-                            ))
-                    elif len(booking_sessions) >= 1:
-                        # Single payment: 1 Stripe receipt
-                        invoices.append(Invoice(
-                            type='stripe_receipt',
-                            name='Stripe Receipt',
-                            session_id=booking_sessions[0].id,
-                            download_url=f'/api/bookings/invoice/stripe/{booking_id}?session_id={booking_sessions[0].id}'
-                        ))
-            except Exception as e:
-                log_exception_if_dev(logger, "Could not retrieve Stripe receipts for booking", e)
-                # Continue without Stripe receipts
+            booking_sessions = session_ids or []
+            
+            # For split payments, there should be 2 sessions
+            # For upfront/later, there should be 1 session
+            payment_option = booking.get('payment_option', 'later').lower()
+            
+            if payment_option == 'split' and len(booking_sessions) >= 2:
+                # Split payment: 2 Stripe receipts
+                for idx, session_id in enumerate(booking_sessions[:2], 1):
+                    invoices.append(Invoice(
+                        type='stripe_receipt',
+                        name=f'Stripe Receipt - Payment {idx}',
+                        session_id=session_id,
+                        download_url=f'/api/bookings/invoice/stripe/{booking_id}?session_id={session_id}'
+                    ))
+            elif len(booking_sessions) >= 1:
+                # Single payment: 1 Stripe receipt
+                invoices.append(Invoice(
+                    type='stripe_receipt',
+                    name='Stripe Receipt',
+                    session_id=booking_sessions[0],
+                    download_url=f'/api/bookings/invoice/stripe/{booking_id}?session_id={booking_sessions[0]}'
+                ))
             
-            logger.info(f"[_get_invoices_for_booking] Returning {len(invoices)} invoices for booking {booking_id}")
             return invoices
         except Exception as e:
             log_exception_if_dev(logger, "Error getting invoices for booking", e)
             return []
 
     @staticmethod
-    def _build_order_response(booking, services_dict, creatives_dict, users_dict, is_creative_view=False, files=None, client: Optional[Client] = None):
-        """Helper function to build an OrderResponse from booking data"""
+    async def _get_receipt_sessions(bookings: List[Dict[str, Any]], client: Client) -> Dict[str, List[str]]:
+        """Paid checkout sessions for every booking in a listing that can show invoices (one query)"""
+        booking_ids = [
+            b['id'] for b in bookings
+            if (b.get('client_status') or '').lower() in INVOICE_STATUSES
+        ]
+        return await CheckoutSessionIndex.get_paid_session_ids(booking_ids, client)
+
+    @staticmethod
+    def _build_order_response(booking, services_dict, creatives_dict, users_dict, is_creative_view=False, files=None, client: Optional[Client] = None, receipt_sessions: Optional[Dict[str, List[str]]] = None):
+        """Helper function to build an OrderResponse from booking data
+        
+        Invoices are included for client views when a client is passed; receipt_sessions is the
+        mapping returned by _get_receipt_sessions for the whole listing.
+        """
         service = services_dict.get(booking['service_id'], {})
         creative = creatives_dict.get(booking.get('creative_user_id', ''), {})
         user = users_dict.get(booking.get('creative_user_id' if not is_creative_view else 'client_user_id', ''), {})
@@ -213,7 +194,9 @@ class OrderService:
             order_invoices = None
             if client and not is_creative_view:
                 try:
-                    order_invoices = OrderService._get_invoices_for_booking(booking, client)
+                    order_invoices = OrderService._get_invoices_for_booking(
+                        booking, (receipt_sessions or {}).get(str(booking.get('id')), [])
+                    )
                     logger.info(f"[_build_order_response] Got {len(order_invoices) if order_invoices else 0} invoices for booking {booking.get('id')}, invoices: {order_invoices}")
                     # Ensure we return an empty list instead of None if no invoices
                     if order_invoices is None:
@@ -273,11 +256,10 @@ class OrderService:
         
         try:
             # Fetch bookings for this client
-            bookings_response = client.table('bookings')\
+            bookings_response = await run_query(client.table('bookings')\
                 .select('id, service_id, order_date, booking_date, start_time, price, payment_option, split_deposit_amount, notes, client_status, creative_status, creative_user_id, canceled_date, approved_at, amount_paid')\
                 .eq('client_user_id', user_id)\
-                .order('order_date', desc=True)\
-                .execute()
+                .order('order_date', desc=True))
             
             if not bookings_response.data:
                 return OrdersListResponse(success=True, orders=[])
@@ -287,24 +269,21 @@ class OrderService:
             creative_user_ids = list(set([b['creative_user_id'] for b in bookings_response.data]))
             
             # Fetch services
-            services_response = client.table('creative_services')\
+            services_response = await run_query(client.table('creative_services')\
                 .select('id, title, description, delivery_time, color')\
-                .in_('id', service_ids)\
-                .execute()
+                .in_('id', service_ids))
             services_dict = {s['id']: s for s in (services_response.data or [])}
             
             # Fetch creatives
-            creatives_response = client.table('creatives')\
+            creatives_response = await run_query(client.table('creatives')\
                 .select('user_id, display_name, title')\
-                .in_('user_id', creative_user_ids)\
-                .execute()
+                .in_('user_id', creative_user_ids))
             creatives_dict = {c['user_id']: c for c in (creatives_response.data or [])}
             
             # Fetch users
-            users_response = client.table('users')\
+            users_response = await run_query(client.table('users')\
                 .select('user_id, name, email, profile_picture_url')\
-                .in_('user_id', creative_user_ids)\
-                .execute()
+                .in_('user_id', creative_user_ids))
             users_dict = {u['user_id']: u for u in (users_response.data or [])}
             
             # Fetch deliverables (files) for orders that have files (locked, download statuses)
@@ -317,10 +296,9 @@ class OrderService:
                     
                     # Query with UUID objects (Supabase handles UUID conversion)
                     # Include file_url for deduplication
-                    deliverables_response = client.table('booking_deliverables')\
+                    deliverables_response = await run_query(client.table('booking_deliverables')\
                         .select('id, booking_id, file_name, file_type, file_size_bytes, file_url')\
-                        .in_('booking_id', booking_ids)\
-                        .execute()
+                        .in_('booking_id', booking_ids))
                     
                     logger.info(f"[get_client_orders] Query response: {deliverables_response}")
                     logger.info(f"[get_client_orders] Fetched {len(deliverables_response.data or [])} deliverables for {len(booking_ids)} bookings")
@@ -374,6 +352,9 @@ class OrderService:
                     log_exception_if_dev(logger, "Error fetching deliverables in get_client_orders", e)
                     deliverables_dict = {}
             
+            # Resolve Stripe receipts for the whole listing with one local query
+            receipt_sessions = await OrderService._get_receipt_sessions(bookings_response.data, client)
+            
             orders = []
             for booking in bookings_response.data:
                 booking_id_str = str(booking['id'])  # Convert to string for dictionary lookup
@@ -390,7 +371,8 @@ class OrderService:
                     users_dict, 
                     is_creative_view=False,
                     files=booking_files,
-                    client=client
+                    client=client,
+                    receipt_sessions=receipt_sessions
                 )
                 
                 logger.info(f"[get_client_orders] Order {order.id} has files: {order.files}")
@@ -420,12 +402,11 @@ class OrderService:
         
         try:
             # Fetch bookings for this client with in_progress status
-            bookings_response = client.table('bookings')\
+            bookings_response = await run_query(client.table('bookings')\
                 .select('id, service_id, order_date, booking_date, start_time, price, payment_option, split_deposit_amount, notes, client_status, creative_status, creative_user_id, canceled_date, approved_at, amount_paid')\
                 .eq('client_user_id', user_id)\
                 .eq('client_status', 'in_progress')\
-                .order('order_date', desc=True)\
-                .execute()
+                .order('order_date', desc=True))
             
             if not bookings_response.data:
                 return OrdersListResponse(success=True, orders=[])
@@ -435,27 +416,27 @@ class OrderService:
             creative_user_ids = list(set([b['creative_user_id'] for b in bookings_response.data]))
             
             # Fetch services, creatives, and users
-            services_response = client.table('creative_services')\
+            services_response = await run_query(client.table('creative_services')\
                 .select('id, title, description, delivery_time, color')\
-                .in_('id', service_ids)\
-                .execute()
+                .in_('id', service_ids))
             services_dict = {s['id']: s for s in (services_response.data or [])}
             
-            creatives_response = client.table('creatives')\
+            creatives_response = await run_query(client.table('creatives')\
                 .select('user_id, display_name, title')\
-                .in_('user_id', creative_user_ids)\
-                .execute()
+                .in_('user_id', creative_user_ids))
             creatives_dict = {c['user_id']: c for c in (creatives_response.data or [])}
             
-            users_response = client.table('users')\
+            users_response = await run_query(client.table('users')\
                 .select('user_id, name, email, profile_picture_url')\
-                .in_('user_id', creative_user_ids)\
-                .execute()
+                .in_('user_id', creative_user_ids))
             users_dict = {u['user_id']: u for u in (users_response.data or [])}
             
+            # Resolve Stripe receipts for the whole listing with one local query
+            receipt_sessions = await OrderService._get_receipt_sessions(bookings_response.data, client)
+            
             orders = []
             for booking in bookings_response.data:
-                order = OrderService._build_order_response(booking, services_dict, creatives_dict, users_dict, is_creative_view=False, client=client)
+                order = OrderService._build_order_response(booking, services_dict, creatives_dict, users_dict, is_creative_view=False, client=client, receipt_sessions=receipt_sessions)
                 orders.append(order)
             
             return OrdersListResponse(success=True, orders=orders)
@@ -482,12 +463,11 @@ class OrderService:
         
         try:
             # Fetch bookings for this client
-            bookings_response = client.table('bookings')\
+            bookings_response = await run_query(client.table('bookings')\
                 .select('id, service_id, order_date, booking_date, start_time, price, payment_option, split_deposit_amount, notes, client_status, creative_status, creative_user_id, canceled_date, approved_at, amount_paid')\
                 .eq('client_user_id', user_id)\
                 .in_('client_status', ['payment_required', 'locked', 'download'])\
-                .order('order_date', desc=True)\
-                .execute()
+                .order('order_date', desc=True))
             
             if not bookings_response.data:
                 return OrdersListResponse(success=True, orders=[])
@@ -497,22 +477,19 @@ class OrderService:
             creative_user_ids = list(set([b['creative_user_id'] for b in bookings_response.data]))
             
             # Fetch services, creatives, and users
-            services_response = client.table('creative_services')\
+            services_response = await run_query(client.table('creative_services')\
                 .select('id, title, description, delivery_time, color')\
-                .in_('id', service_ids)\
-                .execute()
+                .in_('id', service_ids))
             services_dict = {s['id']: s for s in (services_response.data or [])}
             
-            creatives_response = client.table('creatives')\
+            creatives_response = await run_query(client.table('creatives')\
                 .select('user_id, display_name, title')\
-                .in_('user_id', creative_user_ids)\
-                .execute()
+                .in_('user_id', creative_user_ids))
             creatives_dict = {c['user_id']: c for c in (creatives_response.data or [])}
             
-            users_response = client.table('users')\
+            users_response = await run_query(client.table('users')\
                 .select('user_id, name, email, profile_picture_url')\
-                .in_('user_id', creative_user_ids)\
-                .execute()
+                .in_('user_id', creative_user_ids))
             users_dict = {u['user_id']: u for u in (users_response.data or [])}
             
             # Fetch deliverables (files) for locked and download orders
@@ -524,10 +501,9 @@ class OrderService:
                 try:
                     # Query with UUID objects (Supabase handles UUID conversion)
                     # Include file_url for deduplication
-                    deliverables_response = client.table('booking_deliverables')\
+                    deliverables_response = await run_query(client.table('booking_deliverables')\
                         .select('id, booking_id, file_name, file_type, file_size_bytes, file_url')\
-                        .in_('booking_id', booking_ids)\
-                        .execute()
+                        .in_('booking_id', booking_ids))
                     
                     logger.info(f"[get_client_action_needed_orders] Fetched {len(deliverables_response.data or [])} deliverables for {len(booking_ids)} bookings")
                     logger.info(f"[get_client_action_needed_orders] Booking IDs: {booking_ids}")
@@ -577,6 +553,9 @@ class OrderService:
                     log_exception_if_dev(logger, "Error fetching deliverables", e)
                     deliverables_dict = {}
             
+            # Resolve Stripe receipts for the whole listing with one local query
+            receipt_sessions = await OrderService._get_receipt_sessions(bookings_response.data, client)
+            
             orders = []
             for booking in bookings_response.data:
                 booking_id_str = str(booking['id'])  # Convert to string for dictionary lookup
@@ -590,7 +569,8 @@ class OrderService:
                     users_dict, 
                     is_creative_view=False,
                     files=booking_files,
-                    client=client
+                    client=client,
+                    receipt_sessions=receipt_sessions
                 )
                 orders.append(order)
             
@@ -618,20 +598,18 @@ class OrderService:
         
         try:
             # Fetch bookings for this client with completed or canceled status
-            bookings_response = client.table('bookings')\
+            bookings_response = await run_query(client.table('bookings')\
                 .select('id, service_id, order_date, booking_date, start_time, price, payment_option, split_deposit_amount, notes, client_status, creative_status, creative_user_id, canceled_date, approved_at, amount_paid')\
                 .eq('client_user_id', user_id)\
                 .in_('client_status', ['completed', 'cancelled'])\
-                .order('order_date', desc=True)\
-                .execute()
+                .order('order_date', desc=True))
             
             # Also get orders where creative rejected (these show as canceled to client)
-            rejected_bookings_response = client.table('bookings')\
+            rejected_bookings_response = await run_query(client.table('bookings')\
                 .select('id, service_id, order_date, booking_date, start_time, price, payment_option, split_deposit_amount, notes, client_status, creative_status, creative_user_id, canceled_date, approved_at, amount_paid')\
                 .eq('client_user_id', user_id)\
                 .eq('creative_status', 'rejected')\
-                .order('order_date', desc=True)\
-                .execute()
+                .order('order_date', desc=True))
             
             # Combine both queries
             all_bookings = (bookings_response.data or []) + (rejected_bookings_response.data or [])
@@ -644,27 +622,27 @@ class OrderService:
             creative_user_ids = list(set([b['creative_user_id'] for b in all_bookings]))
             
             # Fetch services, creatives, and users
-            services_response = client.table('creative_services')\
+            services_response = await run_query(client.table('creative_services')\
                 .select('id, title, description, delivery_time, color')\
-                .in_('id', service_ids)\
-                .execute()
+                .in_('id', service_ids))
             services_dict = {s['id']: s for s in (services_response.data or [])}
             
-            creatives_response = client.table('creatives')\
+            creatives_response = await run_query(client.table('creatives')\
                 .select('user_id, display_name, title')\
-                .in_('user_id', creative_user_ids)\
-                .execute()
+                .in_('user_id', creative_user_ids))
             creatives_dict = {c['user_id']: c for c in (creatives_response.data or [])}
             
-            users_response = client.table('users')\
+            users_response = await run_query(client.table('users')\
                 .select('user_id, name, email, profile_picture_url')\
-                .in_('user_id', creative_user_ids)\
-                .execute()
+                .in_('user_id', creative_user_ids))
             users_dict = {u['user_id']: u for u in (users_response.data or [])}
             
+            # Resolve Stripe receipts for the whole listing with one local query
+            receipt_sessions = await OrderService._get_receipt_sessions(all_bookings, client)
+            
             orders = []
             for booking in all_bookings:
-                order = OrderService._build_order_response(booking, services_dict, creatives_dict, users_dict, is_creative_view=False, client=client)
+                order = OrderService._build_order_response(booking, services_dict, creatives_dict, users_dict, is_creative_view=False, client=client, receipt_sessions=receipt_sessions)
                 orders.append(order)
             
             return OrdersListResponse(success=True, orders=orders)
@@ -699,7 +677,7 @@ class OrderService:
             # - Are not cancelled
             today = date.today().isoformat()
             
-            bookings_response = client.table('bookings')\
+            bookings_response = await run_query(client.table('bookings')\
                 .select('id, service_id, order_date, booking_date, start_time, end_time, price, payment_option, split_deposit_amount, notes, client_status, creative_status, creative_user_id, canceled_date, approved_at, amount_paid')\
                 .eq('client_user_id', user_id)\
                 .not_.is_('booking_date', 'null')\
@@ -708,8 +686,7 @@ class OrderService:
                 .neq('client_status', 'cancelled')\
                 .order('booking_date', desc=False)\
                 .order('start_time', desc=False)\
-                .limit(25)\
-                .execute()
+                .limit(25))
             
             if not bookings_response.data:
                 return OrdersListResponse(success=True, orders=[])
@@ -719,27 +696,27 @@ class OrderService:
             creative_user_ids = list(set([b['creative_user_id'] for b in bookings_response.data]))
             
             # Fetch services, creatives, and users
-            services_response = client.table('creative_services')\
+            services_response = await run_query(client.table('creative_services')\
                 .select('id, title, description, delivery_time, color')\
-                .in_('id', service_ids)\
-                .execute()
+                .in_('id', service_ids))
             services_dict = {s['id']: s for s in (services_response.data or [])}
             
-            creatives_response = client.table('creatives')\
+            creatives_response = await run_query(client.table('creatives')\
                 .select('user_id, display_name, title')\
-                .in_('user_id', creative_user_ids)\
-                .execute()
+                .in_('user_id', creative_user_ids))
             creatives_dict = {c['user_id']: c for c in (creatives_response.data or [])}
             
-            users_response = client.table('users')\
+            users_response = await run_query(client.table('users')\
                 .select('user_id, name, email, profile_picture_url')\
-                .in_('user_id', creative_user_ids)\
-                .execute()
+                .in_('user_id', creative_user_ids))
             users_dict = {u['user_id']: u for u in (users_response.data or [])}
             
+            # Resolve Stripe receipts for the whole listing with one local query
+            receipt_sessions = await OrderService._get_receipt_sessions(bookings_response.data, client)
+            
             orders = []
             for booking in bookings_response.data:
-                order = OrderService._build_order_response(booking, services_dict, creatives_dict, users_dict, is_creative_view=False, client=client)
+                order = OrderService._build_order_response(booking, services_dict, creatives_dict, users_dict, is_creative_view=False, client=client, receipt_sessions=receipt_sessions)
                 orders.append(order)
             
             return OrdersListResponse(success=True, orders=orders)
@@ -766,11 +743,10 @@ class OrderService:
         
         try:
             # Fetch bookings for this creative
-            bookings_response = client.table('bookings')\
+            bookings_response = await run_query(client.table('bookings')\
                 .select('id, service_id, order_date, booking_date, start_time, price, payment_option, split_deposit_amount, notes, client_status, creative_status, client_user_id, canceled_date, approved_at, amount_paid')\
                 .eq('creative_user_id', user_id)\
-                .order('order_date', desc=True)\
-                .execute()
+                .order('order_date', desc=True))
             
             if not bookings_response.data:
                 return OrdersListResponse(success=True, orders=[])
@@ -780,17 +756,15 @@ class OrderService:
             client_user_ids = list(set([b['client_user_id'] for b in bookings_response.data]))
             
             # Fetch services
-            services_response = client.table('creative_services')\
+            services_response = await run_query(client.table('creative_services')\
                 .select('id, title, description, delivery_time, color')\
-                .in_('id', service_ids)\
-                .execute()
+                .in_('id', service_ids))
             services_dict = {s['id']: s for s in (services_response.data or [])}
             
             # Fetch users (clients)
-            users_response = client.table('users')\
+            users_response = await run_query(client.table('users')\
                 .select('user_id, name, email, profile_picture_url')\
-                .in_('user_id', client_user_ids)\
-                .execute()
+                .in_('user_id', client_user_ids))
             users_dict = {u['user_id']: u for u in (users_response.data or [])}
             
             # For creative view, we don't need creatives dict
@@ -825,12 +799,11 @@ class OrderService:
         
         try:
             # Fetch bookings for this creative, excluding completed/rejected orders
-            bookings_response = client.table('bookings')\
+            bookings_response = await run_query(client.table('bookings')\
                 .select('id, service_id, order_date, booking_date, start_time, price, payment_option, split_deposit_amount, notes, client_status, creative_status, client_user_id, canceled_date, approved_at, amount_paid')\
                 .eq('creative_user_id', user_id)\
                 .not_.in_('creative_status', ['completed', 'rejected'])\
-                .order('order_date', desc=True)\
-                .execute()
+                .order('order_date', desc=True))
             
             if not bookings_response.data:
                 return OrdersListResponse(success=True, orders=[])
@@ -840,17 +813,15 @@ class OrderService:
             client_user_ids = list(set([b['client_user_id'] for b in bookings_response.data]))
             
             # Fetch services
-            services_response = client.table('creative_services')\
+            services_response = await run_query(client.table('creative_services')\
                 .select('id, title, description, delivery_time, color')\
-                .in_('id', service_ids)\
-                .execute()
+                .in_('id', service_ids))
             services_dict = {s['id']: s for s in (services_response.data or [])}
             
             # Fetch users (clients)
-            users_response = client.table('users')\
+            users_response = await run_query(client.table('users')\
                 .select('user_id, name, email, profile_picture_url')\
-                .in_('user_id', client_user_ids)\
-                .execute()
+                .in_('user_id', client_user_ids))
             users_dict = {u['user_id']: u for u in (users_response.data or [])}
             
             creatives_dict = {}
@@ -884,12 +855,11 @@ class OrderService:
         
         try:
             # Fetch bookings for this creative, only completed/rejected orders
-            bookings_response = client.table('bookings')\
+            bookings_response = await run_query(client.table('bookings')\
                 .select('id, service_id, order_date, booking_date, start_time, price, payment_option, split_deposit_amount, notes, client_status, creative_status, client_user_id, canceled_date, approved_at, amount_paid')\
                 .eq('creative_user_id', user_id)\
                 .in_('creative_status', ['completed', 'rejected'])\
-                .order('order_date', desc=True)\
-                .execute()
+                .order('order_date', desc=True))
             
             if not bookings_response.data:
                 return OrdersListResponse(success=True, orders=[])
@@ -899,17 +869,15 @@ class OrderService:
             client_user_ids = list(set([b['client_user_id'] for b in bookings_response.data]))
             
             # Fetch services
-            services_response = client.table('creative_services')\
+            services_response = await run_query(client.table('creative_services')\
                 .select('id, title, description, delivery_time, color')\
-                .in_('id', service_ids)\
-                .execute()
+                .in_('id', service_ids))
             services_dict = {s['id']: s for s in (services_response.data or [])}
             
             # Fetch users (clients)
-            users_response = client.table('users')\
+            users_response = await run_query(client.table('users')\
                 .select('user_id, name, email, profile_picture_url')\
-                .in_('user_id', client_user_ids)\
-                .execute()
+                .in_('user_id', client_user_ids))
             users_dict = {u['user_id']: u for u in (users_response.data or [])}
             
             creatives_dict = {}
@@ -919,10 +887,9 @@ class OrderService:
             deliverables_dict = {}
             if booking_ids:
                 try:
-                    deliverables_response = client.table('booking_deliverables')\
+                    deliverables_response = await run_query(client.table('booking_deliverables')\
                         .select('id, booking_id, file_name, file_type, file_size_bytes, file_url, downloaded_at')\
-                        .in_('booking_id', booking_ids)\
-                        .execute()
+                        .in_('booking_id', booking_ids))
                     
                     for deliverable in (deliverables_response.data or []):
                         booking_id = str(deliverable['booking_id'])
@@ -993,6 +960,11 @@ class OrderService:
     async def get_creative_dashboard_stats(user_id: str, client: Client) -> Dict[str, Any]:
         """Get dashboard statistics for the current creative user (current month only)
         
+        Stats are cached per creative and month in creative_monthly_stats. A cached row younger
+        than DASHBOARD_STATS_TTL_SECONDS is returned as is; otherwise the booking counts are
+        recomputed with month-filtered queries and the Stripe net amount is advanced with only
+        the balance transactions created since the stored cursor.
+        
         Args:
             user_id: The creative user ID
             client: Authenticated Supabase client (required, respects RLS policies)
@@ -1008,136 +980,78 @@ class OrderService:
             raise ValueError("Authenticated client is required for this operation")
         
         try:
-            from datetime import datetime, timezone
-            import stripe
-            import os
+            from datetime import timezone
             
             # Get current month start and end timestamps
             now = datetime.now(timezone.utc)
             month_start = datetime(now.year, now.month, 1, tzinfo=timezone.utc)
             month_end = datetime(now.year, now.month + 1, 1, tzinfo=timezone.utc) if now.month < 12 else datetime(now.year + 1, 1, 1, tzinfo=timezone.utc)
-            month_start_timestamp = int(month_start.timestamp())
-            month_end_timestamp = int(month_end.timestamp())
+            month_key = month_start.date().isoformat()
             
-            # Get all bookings for this creative
-            bookings_response = client.table('bookings')\
-                .select('id, client_user_id, amount_paid, creative_status, order_date, updated_at')\
+            cached_result = await run_query(db_admin.table('creative_monthly_stats')\
+                .select('*')\
                 .eq('creative_user_id', user_id)\
-                .execute()
-            
-            bookings = bookings_response.data or []
-            
-            # Calculate stats for current month
-            # Filter bookings created this month (based on order_date)
-            bookings_this_month = []
-            for booking in bookings:
-                order_date_str = booking.get('order_date')
-                if order_date_str:
-                    try:
-                        order_date = datetime.fromisoformat(order_date_str.replace('Z', '+00:00'))
-                        if month_start <= order_date < month_end:
-                            bookings_this_month.append(booking)
-                    except (ValueError, AttributeError):
-                        continue
-            
-            # New clients this month: count unique clients from bookings created this month
-            new_clients_this_month = len(set(b['client_user_id'] for b in bookings_this_month))
-            
-            # Total bookings created this month
-            total_bookings_this_month = len(bookings_this_month)
+                .eq('month', month_key)\
+                .limit(1))
+            cached = cached_result.data[0] if cached_result.data else None
+            
+            if cached and cached.get('refreshed_at'):
+                refreshed_at = datetime.fromisoformat(cached['refreshed_at'].replace('Z', '+00:00'))
+                if (now - refreshed_at).total_seconds() < DASHBOARD_STATS_TTL_SECONDS:
+                    return OrderService._dashboard_stats_response(cached)
+            
+            # Bookings created this month (based on order_date)
+            bookings_response = await run_query(client.table('bookings')\
+                .select('client_user_id, amount_paid')\
+                .eq('creative_user_id', user_id)\
+                .gte('order_date', month_start.isoformat())\
+                .lt('order_date', month_end.isoformat()))
+            bookings_this_month = bookings_response.data or []
             
             # Completed sessions this month: sessions with completed status, updated within this month
-            completed_sessions_this_month = 0
-            for booking in bookings:
-                if booking.get('creative_status') == 'completed':
-                    updated_at_str = booking.get('updated_at')
-                    if updated_at_str:
-                        try:
-                            updated_at = datetime.fromisoformat(updated_at_str.replace('Z', '+00:00'))
-                            if month_start <= updated_at < month_end:
-                                completed_sessions_this_month += 1
-                        except (ValueError, AttributeError):
-                            # If no valid updated_at, check order_date as fallback
-                            order_date_str = booking.get('order_date')
-                            if order_date_str:
-                                try:
-                                    order_date = datetime.fromisoformat(order_date_str.replace('Z', '+00:00'))
-                                    if month_start <= order_date < month_end:
-                                        completed_sessions_this_month += 1
-                                except (ValueError, AttributeError):
-                                    continue
+            completed_response = await run_query(client.table('bookings')\
+                .select('id', count='exact')\
+                .eq('creative_user_id', user_id)\
+                .eq('creative_status', 'completed')\
+                .gte('updated_at', month_start.isoformat())\
+                .lt('updated_at', month_end.isoformat())\
+                .limit(1))
+            
+            stats = {
+                'creative_user_id': user_id,
+                'month': month_key,
+                # New clients this month: count unique clients from bookings created this month
+                'total_clients': len(set(b['client_user_id'] for b in bookings_this_month)),
+                # Total bookings created this month
+                'total_bookings': len(bookings_this_month),
+                'completed_sessions': completed_response.count or 0,
+                'refreshed_at': now.isoformat(),
+            }
             
             # Get monthly amount from Stripe if account is connected
-            monthly_amount = 0.0
             try:
-                # Get creative's Stripe account ID
-                creative_result = client.table('creatives')\
-                    .select('stripe_account_id')\
-                    .eq('user_id', user_id)\
-                    .single()\
-                    .execute()
-                
-                if creative_result.data and creative_result.data.get('stripe_account_id'):
-                    stripe_account_id = creative_result.data.get('stripe_account_id')
-                    stripe_secret_key = os.getenv("STRIPE_SECRET_KEY")
-                    
-                    if stripe_secret_key:
-                        stripe.api_key = stripe_secret_key
-                        
-                        # Get balance transactions for current month from Stripe
-                        # This gives us the actual net amounts after all fees
-                        balance_transactions = stripe.BalanceTransaction.list(
-                            created={'gte': month_start_timestamp, 'lt': month_end_timestamp},
-                            stripe_account=stripe_account_id,
-                            limit=100  # Adjust if needed
-                        )
-                        
-                        # Sum up all positive net amounts (this matches Stripe Express dashboard)
-                        # The net field already accounts for all fees (platform + Stripe processing)
-                        # We sum positive net amounts which represent earnings
-                        for transaction in balance_transactions.data:
-                            # Include all transactions with positive net (earnings)
-                            # Exclude negative transactions (refunds, chargebacks, fees)
-                            if transaction.net > 0:
-                                # Convert from cents to dollars
-                                monthly_amount += transaction.net / 100
-                        
-                        # If there are more than 100 transactions, paginate
-                        while balance_transactions.has_more:
-                            balance_transactions = stripe.BalanceTransaction.list(
-                                created={'gte': month_start_timestamp, 'lt': month_end_timestamp},
-                                stripe_account=stripe_account_id,
-                                limit=100,
-                                starting_after=balance_transactions.data[-1].id
-                            )
-                            
-                            for transaction in balance_transactions.data:
-                                if transaction.net > 0:
-                                    monthly_amount += transaction.net / 100
-                    
+                stats.update(await OrderService._sync_monthly_stripe_net(
+                    user_id, client, cached, month_start, month_end
+                ))
             except Exception as stripe_error:
-                # If Stripe fetch fails, fall back to database calculation
-                logger.warning(f"Failed to fetch monthly amount from Stripe, falling back to database calculation: {stripe_error}")
-                
-                # Fallback: Calculate from bookings (less accurate but better than nothing)
-                for booking in bookings:
-                    order_date_str = booking.get('order_date')
-                    if order_date_str:
-                        try:
-                            order_date = datetime.fromisoformat(order_date_str.replace('Z', '+00:00'))
-                            if month_start <= order_date < month_end:
-                                amount_paid = booking.get('amount_paid', 0)
-                                if amount_paid:
-                                    monthly_amount += float(amount_paid)
-                        except (ValueError, AttributeError):
-                            continue
+                # If Stripe fetch fails, fall back to the last synced amount, or to the database
+                logger.warning(f"Failed to fetch monthly amount from Stripe, falling back to cached/database amount: {stripe_error}")
+                if cached and cached.get('stripe_synced_at'):
+                    stats['stripe_net_cents'] = cached.get('stripe_net_cents') or 0
+                else:
+                    # Fallback: Calculate from bookings (less accurate but better than nothing)
+                    stats['stripe_net_cents'] = int(round(sum(float(b.get('amount_paid') or 0) for b in bookings_this_month) * 100))
+                    stats['fallback'] = True
             
-            return {
-                'total_clients': new_clients_this_month,
-                'monthly_amount': round(monthly_amount, 2),
-                'total_bookings': total_bookings_this_month,
-                'completed_sessions': completed_sessions_this_month
-            }
+            fallback = stats.pop('fallback', False)
+            if not fallback:
+                try:
+                    await run_query(db_admin.table('creative_monthly_stats')\
+                        .upsert(stats, on_conflict='creative_user_id,month'))
+                except Exception as cache_error:
+                    log_exception_if_dev(logger, "Failed to cache creative dashboard stats", cache_error)
+            
+            return OrderService._dashboard_stats_response(stats)
             
         except HTTPException:
             raise
@@ -1145,6 +1059,100 @@ class OrderService:
             log_exception_if_dev(logger, "Error fetching creative dashboard stats", e)
             raise HTTPException(status_code=500, detail="Failed to fetch creative dashboard stats")
 
+    @staticmethod
+    def _dashboard_stats_response(stats: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'total_clients': stats.get('total_clients') or 0,
+            'monthly_amount': round((stats.get('stripe_net_cents') or 0) / 100, 2),
+            'total_bookings': stats.get('total_bookings') or 0,
+            'completed_sessions': stats.get('completed_sessions') or 0
+        }
+
+    @staticmethod
+    async def _sync_monthly_stripe_net(
+        user_id: str,
+        client: Client,
+        cached: Optional[Dict[str, Any]],
+        month_start: datetime,
+        month_end: datetime
+    ) -> Dict[str, Any]:
+        """Advance the cached Stripe net amount for the month with newer balance transactions
+        
+        Balance transactions are immutable, so the cached sum stays valid and only transactions
+        created after stripe_cursor are fetched (normally a single small page).
+        
+        Returns:
+            The stripe_* columns to store for the month
+        """
+        import stripe
+        
+        # Get creative's Stripe account ID
+        creative_result = await run_query(client.table('creatives')\
+            .select('stripe_account_id')\
+            .eq('user_id', user_id)\
+            .single())
+        
+        stripe_account_id = creative_result.data.get('stripe_account_id') if creative_result.data else None
+        stripe_secret_key = os.getenv("STRIPE_SECRET_KEY")
+        if not stripe_account_id or not stripe_secret_key:
+            return {
+                'stripe_account_id': stripe_account_id,
+                'stripe_net_cents': 0,
+                'stripe_cursor': None,
+                'stripe_synced_at': None
+            }
+        stripe.api_key = stripe_secret_key
+        
+        # Start over when nothing was synced yet or the creative reconnected another account
+        net_cents = 0
+        cursor = None
+        if cached and cached.get('stripe_account_id') == stripe_account_id and cached.get('stripe_synced_at'):
+            net_cents = cached.get('stripe_net_cents') or 0
+            cursor = cached.get('stripe_cursor')
+        
+        params = {
+            'created': {'gte': int(month_start.timestamp()), 'lt': int(month_end.timestamp())},
+            'stripe_account': stripe_account_id,
+            'limit': 100
+        }
+        
+        if cursor:
+            # ending_before pages towards newer transactions; each page is still newest-first
+            while True:
+                page = await run_blocking(stripe.BalanceTransaction.list, ending_before=cursor, **params)
+                if not page.data:
+                    break
+                net_cents += sum(t.net for t in page.data if t.net > 0)
+                cursor = page.data[0].id
+                if not page.has_more:
+                    break
+        else:
+            # First sync of the month: page from newest to oldest and remember the newest
+            starting_after = None
+            while True:
+                if starting_after:
+                    page = await run_blocking(stripe.BalanceTransaction.list, starting_after=starting_after, **params)
+                else:
+                    page = await run_blocking(stripe.BalanceTransaction.list, **params)
+                if not page.data:
+                    break
+                if cursor is None:
+                    cursor = page.data[0].id
+                # Sum up all positive net amounts (this matches Stripe Express dashboard)
+                # The net field already accounts for all fees (platform + Stripe processing)
+                # Negative transactions (refunds, chargebacks, fees) are excluded
+                net_cents += sum(t.net for t in page.data if t.net > 0)
+                if not page.has_more:
+                    break
+                starting_after = page.data[-1].id
+        
+        return {
+            'stripe_account_id': stripe_account_id,
+            'stripe_net_cents': net_cents,
+            'stripe_cursor': cursor,
+            'stripe_synced_at': datetime.utcnow().isoformat()
+        }
+
     @staticmethod
     async def get_creative_calendar_sessions(user_id: str, year: int, month: int, client: Client) -> CalendarSessionsResponse:
         """Get calendar sessions for the current creative user for a specific month
@@ -1173,14 +1181,13 @@ class OrderService:
             month_end_str = (next_month_start - timedelta(days=1)).strftime('%Y-%m-%d')
             
             # Fetch bookings for this creative in the specified month
-            bookings_response = client.table('bookings')\
+            bookings_response = await run_query(client.table('bookings')\
                 .select('id, service_id, booking_date, start_time, end_time, notes, creative_status, client_user_id')\
                 .eq('creative_user_id', user_id)\
                 .gte('booking_date', month_start_str)\
                 .lte('booking_date', month_end_str)\
                 .order('booking_date', desc=False)\
-                .order('start_time', desc=False)\
-                .execute()
+                .order('start_time', desc=False))
             
             if not bookings_response.data:
                 return CalendarSessionsResponse(success=True, sessions=[])
@@ -1192,19 +1199,17 @@ class OrderService:
             # Fetch services
             services_dict = {}
             if service_ids:
-                services_response = client.table('creative_services')\
+                services_response = await run_query(client.table('creative_services')\
                     .select('id, title')\
-                    .in_('id', service_ids)\
-                    .execute()
+                    .in_('id', service_ids))
                 services_dict = {s['id']: s for s in (services_response.data or [])}
             
             # Fetch users (clients)
             users_dict = {}
             if client_user_ids:
-                users_response = client.table('users')\
+                users_response = await run_query(client.table('users')\
                     .select('user_id, name')\
-                    .in_('user_id', client_user_ids)\
-                    .execute()
+                    .in_('user_id', client_user_ids))
                 users_dict = {u['user_id']: u for u in (users_response.data or [])}
             
             sessions = []
@@ -1290,14 +1295,13 @@ class OrderService:
                 raise HTTPException(status_code=400, detail="Invalid date format. Expected YYYY-MM-DD")
             
             # Fetch bookings for this creative in the specified date range
-            bookings_response = client.table('bookings')\
+            bookings_response = await run_query(client.table('bookings')\
                 .select('id, service_id, booking_date, start_time, end_time, notes, creative_status, client_user_id')\
                 .eq('creative_user_id', user_id)\
                 .gte('booking_date', start_date)\
                 .lte('booking_date', end_date)\
                 .order('booking_date', desc=False)\
-                .order('start_time', desc=False)\
-                .execute()
+                .order('start_time', desc=False))
             
             if not bookings_response.data:
                 return CalendarSessionsResponse(success=True, sessions=[])
@@ -1309,19 +1313,17 @@ class OrderService:
             # Fetch services
             services_dict = {}
             if service_ids:
-                services_response = client.table('creative_services')\
+                services_response = await run_query(client.table('creative_services')\
                     .select('id, title')\
-                    .in_('id', service_ids)\
-                    .execute()
+                    .in_('id', service_ids))
                 services_dict = {s['id']: s for s in (services_response.data or [])}
             
             # Fetch users (clients)
             users_dict = {}
             if client_user_ids:
-                users_response = client.table('users')\
+                users_response = await run_query(client.table('users')\
                     .select('user_id, name')\
-                    .in_('user_id', client_user_ids)\
-                    .execute()
+                    .in_('user_id', client_user_ids))
                 users_dict = {u['user_id']: u for u in (users_response.data or [])}
             
             sessions = []
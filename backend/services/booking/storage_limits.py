@@ -0,0 +1,103 @@
+"""Creative storage limits (subscription tier storage_amount_bytes against creative_storage_usage)"""
+import os
+import time
+import logging
+from typing import Dict, Optional, Tuple
+from supabase import Client
+from core.safe_errors import log_exception_if_dev
+from db.query_executor import run_query
+
+logger = logging.getLogger(__name__)
+
+
+def format_storage_size(bytes: int) -> str:
+    """Format bytes to human-readable size"""
+    if bytes == 0:
+        return "0 B"
+    k = 1024
+    sizes = ['B', 'KB', 'MB', 'GB']
+    i = int(bytes.bit_length() / 10) if bytes > 0 else 0
+    i = min(i, len(sizes) - 1)
+    return f"{(bytes / (k ** i)):.2f} {sizes[i]}"
+
+
+# Subscription tier storage limits rarely change; cache them per process
+STORAGE_LIMIT_CACHE_TTL = int(os.getenv("STORAGE_LIMIT_CACHE_TTL", "300"))
+_tier_storage_limits: Dict[str, Tuple[int, float]] = {}
+
+
+async def get_tier_storage_limit(subscription_tier_id: str, client: Client) -> Optional[int]:
+    """storage_amount_bytes of a subscription tier (None if the tier doesn't exist), cached for STORAGE_LIMIT_CACHE_TTL seconds"""
+    cached = _tier_storage_limits.get(subscription_tier_id)
+    if cached and time.monotonic() - cached[1] < STORAGE_LIMIT_CACHE_TTL:
+        return cached[0]
+    
+    tier_result = await run_query(client.table('subscription_tiers')\
+        .select('storage_amount_bytes')\
+        .eq('id', subscription_tier_id)\
+        .limit(1))
+    if not tier_result.data:
+        return None
+    
+    storage_limit_bytes = tier_result.data[0].get('storage_amount_bytes') or 0
+    _tier_storage_limits[subscription_tier_id] = (storage_limit_bytes, time.monotonic())
+    return storage_limit_bytes
+
+
+async def check_storage_limit(
+    user_id: str,
+    new_files_size: int,
+    client: Client
+) -> tuple[bool, str]:
+    """
+    Check if uploading new files would exceed storage limit.
+    Returns (is_allowed, error_message)
+    
+    Storage used comes from creative_storage_usage, which triggers on booking_deliverables keep
+    up to date (util/reconcile_storage_usage.py repairs drift).
+    """
+    try:
+        # Creative's subscription tier and storage usage in one query
+        creative_result = await run_query(client.table('creatives')\
+            .select('subscription_tier_id, creative_storage_usage(used_bytes)')\
+            .eq('user_id', user_id)\
+            .limit(1))
+        
+        if not creative_result.data:
+            # No creative profile found, allow upload (shouldn't happen but be safe)
+            return True, ""
+        
+        creative = creative_result.data[0]
+        subscription_tier_id = creative.get('subscription_tier_id')
+        if not subscription_tier_id:
+            # No subscription tier, allow upload
+            return True, ""
+        
+        storage_limit_bytes = await get_tier_storage_limit(subscription_tier_id, client)
+        if not storage_limit_bytes:
+            # No tier data or no storage limit set, allow upload
+            return True, ""
+        
+        usage = creative.get('creative_storage_usage') or {}
+        if isinstance(usage, list):
+            usage = usage[0] if usage else {}
+        current_storage_used = usage.get('used_bytes') or 0
+        
+        # Check if adding new files would exceed limit
+        total_after_upload = current_storage_used + new_files_size
+        
+        if total_after_upload > storage_limit_bytes:
+            overage = total_after_upload - storage_limit_bytes
+            remaining = max(0, storage_limit_bytes - current_storage_used)
+            error_msg = (
+                f"Uploading these files would exceed your storage limit by {format_storage_size(overage)}. "
+                f"You have {format_storage_size(remaining)} remaining out of {format_storage_size(storage_limit_bytes)} total storage."
+            )
+            return False, error_msg
+        
+        return True, ""
+    
+    except Exception as e:
+        log_exception_if_dev(logger, "Error checking storage limit", e)
+        # On error, allow upload (fail open) but log the error
+        return True, ""
@@ -0,0 +1,531 @@
+"""
+Resumable deliverable uploads
+
+A client opens an upload session, PUTs the file in UPLOAD_CHUNK_SIZE chunks (each with an
+Upload-Checksum header, TUS checksum-extension format) and completes the session. The backend
+verifies every chunk and forwards it to a Supabase Storage TUS upload of the final object, so no
+chunk is stored twice and nothing has to be reassembled. Session state (offset, per-chunk SHA-256)
+lives in deliverable_upload_sessions: after a dropped connection the client reads the session and
+continues from upload_offset, re-sending a chunk is harmless, and a session stays resumable for 24
+hours (the lifetime of the TUS upload).
+
+Completing a session scans the stored object (streamed to ClamAV, like direct uploads) in the
+background and registers the deliverable; the client polls the session until it is 'completed' or
+'rejected'. The finalizing process holds a lease on the session (scan_heartbeat_at) while it works;
+if it dies, the next read of the session finds the lease stale and starts finalization again.
+"""
+import os
+import hmac
+import uuid
+import base64
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+import httpx
+from fastapi import HTTPException
+from core.safe_errors import log_exception_if_dev, is_dev_env
+from db.db_session import db_admin, SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+from db.query_executor import run_query, run_blocking
+from services.booking.storage_limits import check_storage_limit
+from services.file_scanning.scanner_service import ScannerService
+from util.file_validator import FileValidator
+from util.signed_urls import create_signed_url, signed_url_cache
+
+logger = logging.getLogger(__name__)
+
+DELIVERABLES_BUCKET = "booking-deliverables"
+# Supabase Storage's TUS endpoint takes 6 MiB chunks (only the last may be shorter)
+UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024
+UPLOAD_CHECKSUM_ALGORITHMS = ('sha256', 'sha1', 'md5')
+TUS_TIMEOUT = httpx.Timeout(60.0)
+SCAN_READ_SIZE = 256 * 1024
+# A finalization renews its lease every UPLOAD_SCAN_HEARTBEAT_SECONDS; a 'scanning' session whose
+# lease is older than UPLOAD_SCAN_STALE_SECONDS (process died mid-scan) is finalized again
+UPLOAD_SCAN_HEARTBEAT_SECONDS = 60
+UPLOAD_SCAN_STALE_SECONDS = 300
+
+UPLOAD_SESSION_FIELDS = 'id, booking_id, creative_user_id, storage_path, file_name, file_type, file_size, chunk_size, upload_offset, chunk_checksums, tus_url, status, error, deliverable_id, expires_at, scan_heartbeat_at'
+
+# Keeps scheduled finalizations referenced until they finish
+_background_tasks: Set[asyncio.Task] = set()
+
+_http: Optional[httpx.AsyncClient] = None
+
+
+def _get_http() -> httpx.AsyncClient:
+    # One client for the process, so chunk PATCHes reuse connections to Storage
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(timeout=TUS_TIMEOUT)
+    return _http
+
+
+def _tus_headers(**headers: str) -> Dict[str, str]:
+    return {
+        'Authorization': f"Bearer {SUPABASE_SERVICE_ROLE_KEY}",
+        'apikey': SUPABASE_SERVICE_ROLE_KEY or '',
+        'Tus-Resumable': '1.0.0',
+        **headers
+    }
+
+
+def _tus_metadata(values: Dict[str, str]) -> str:
+    return ','.join(f"{key} {base64.b64encode(value.encode('utf-8')).decode('ascii')}" for key, value in values.items())
+
+
+def parse_upload_checksum(header: Optional[str]) -> Tuple[str, bytes]:
+    """(algorithm, digest) from an "Upload-Checksum: <algorithm> <base64 digest>" header"""
+    if not header:
+        raise HTTPException(status_code=400, detail="Upload-Checksum header is required")
+    algorithm, _, encoded = header.strip().partition(' ')
+    algorithm = algorithm.lower()
+    if algorithm not in UPLOAD_CHECKSUM_ALGORITHMS:
+        raise HTTPException(status_code=400, detail=f"Unsupported checksum algorithm. Use one of: {', '.join(UPLOAD_CHECKSUM_ALGORITHMS)}")
+    try:
+        return algorithm, base64.b64decode(encoded.strip(), validate=True)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Upload-Checksum header")
+
+
+def _scan_lease_is_stale(session: Dict[str, Any]) -> bool:
+    heartbeat = session.get('scan_heartbeat_at')
+    if not heartbeat:
+        return True
+    heartbeat_at = datetime.fromisoformat(heartbeat.replace('Z', '+00:00'))
+    return heartbeat_at <= datetime.now(timezone.utc) - timedelta(seconds=UPLOAD_SCAN_STALE_SECONDS)
+
+
+def session_state(session: Dict[str, Any]) -> Dict[str, Any]:
+    """What clients see of a session"""
+    chunk_size = session['chunk_size']
+    file_size = session['file_size']
+    return {
+        "session_id": session['id'],
+        "booking_id": session['booking_id'],
+        "storage_path": session['storage_path'],
+        "file_name": session['file_name'],
+        "file_size": file_size,
+        "chunk_size": chunk_size,
+        "total_chunks": -(-file_size // chunk_size),
+        "upload_offset": session['upload_offset'],
+        "next_chunk": session['upload_offset'] // chunk_size,
+        "status": session['status'],
+        "error": session.get('error'),
+        "deliverable_id": session.get('deliverable_id'),
+        "expires_at": session.get('expires_at')
+    }
+
+
+class _StoredObject:
+    """
+    A stored object as the minimal file interface ScannerService uses (filename, size, read,
+    seek(0)), streamed from Storage so scanning a multi-GB upload doesn't buffer it
+    """
+
+    def __init__(self, path: str, filename: str, size: int):
+        self.filename = filename
+        self.size = size
+        self._path = path
+        self._response: Optional[httpx.Response] = None
+        self._chunks = None
+        self._buffer = bytearray()
+
+    async def seek(self, position: int) -> None:
+        if position != 0:
+            raise ValueError("Stored objects can only be rewound")
+        await self.close()
+
+    async def read(self, size: int = -1) -> bytes:
+        if self._chunks is None:
+            signed = await create_signed_url(DELIVERABLES_BUCKET, self._path, 3600)
+            if 'error' in signed:
+                raise IOError(signed['error'])
+            http = _get_http()
+            self._response = await http.send(http.build_request('GET', signed['signed_url']), stream=True)
+            self._response.raise_for_status()
+            self._chunks = self._response.aiter_bytes(SCAN_READ_SIZE)
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += await self._chunks.__anext__()
+            except StopAsyncIteration:
+                break
+        size = len(self._buffer) if size < 0 else min(size, len(self._buffer))
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    async def close(self) -> None:
+        if self._response is not None:
+            await self._response.aclose()
+        self._response = None
+        self._chunks = None
+        self._buffer = bytearray()
+
+
+class UploadSessions:
+    """Chunked, resumable uploads of booking deliverables (see module docstring)"""
+
+    @staticmethod
+    async def create_session(
+        booking_id: str,
+        creative_user_id: str,
+        file_name: str,
+        file_size: int,
+        file_type: Optional[str] = None,
+        storage_path: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Open a session and the TUS upload behind it
+
+        storage_path may be a path handed out by get-upload-paths (with the file extension
+        appended); otherwise one is generated the same way.
+        """
+        if file_size <= 0:
+            raise HTTPException(status_code=400, detail="File is empty")
+        if file_size > FileValidator.MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File size ({file_size / (1024*1024):.1f}MB) exceeds limit ({FileValidator.MAX_FILE_SIZE / (1024*1024)}MB)"
+            )
+        extension = os.path.splitext(file_name)[1].lower()
+        if extension in FileValidator.DANGEROUS_EXTENSIONS:
+            raise HTTPException(status_code=400, detail=f"File type {extension} is not allowed for security reasons")
+
+        if storage_path:
+            storage_path = storage_path.strip().lstrip('/')
+            if not storage_path.startswith(f"{booking_id}/") or '..' in storage_path.split('/'):
+                raise HTTPException(status_code=400, detail="Invalid storage path for this booking")
+        else:
+            storage_path = f"{booking_id}/{uuid.uuid4().hex}{extension}"
+
+        content_type = file_type or 'application/octet-stream'
+        response = await _get_http().post(
+            f"{SUPABASE_URL}/storage/v1/upload/resumable",
+            headers=_tus_headers(**{
+                'Upload-Length': str(file_size),
+                'Upload-Metadata': _tus_metadata({
+                    'bucketName': DELIVERABLES_BUCKET,
+                    'objectName': storage_path,
+                    'contentType': content_type,
+                    'cacheControl': '3600'
+                }),
+                'x-upsert': 'false'
+            })
+        )
+        if response.status_code == 409:
+            raise HTTPException(status_code=409, detail="A file already exists at this storage path")
+        if response.status_code != 201 or not response.headers.get('location'):
+            if is_dev_env():
+                logger.error(f"Failed to create TUS upload ({response.status_code}): {response.text[:200]}")
+            raise HTTPException(status_code=502, detail="Failed to start upload")
+        tus_url = str(response.url.join(response.headers['location']))
+
+        insert_result = await run_query(db_admin.table('deliverable_upload_sessions').insert({
+            'booking_id': booking_id,
+            'creative_user_id': creative_user_id,
+            'storage_path': storage_path,
+            'file_name': file_name,
+            'file_type': content_type,
+            'file_size': file_size,
+            'chunk_size': UPLOAD_CHUNK_SIZE,
+            'tus_url': tus_url
+        }))
+        if not insert_result.data:
+            raise HTTPException(status_code=500, detail="Failed to create upload session")
+        return session_state(insert_result.data[0])
+
+    @staticmethod
+    async def get_session(session_id: str, creative_user_id: str) -> Dict[str, Any]:
+        """
+        The creative's session row; expired sessions are marked and refused, and a session whose
+        finalization was abandoned (stale scan lease) is finalized again
+        """
+        result = await run_query(db_admin.table('deliverable_upload_sessions')\
+            .select(UPLOAD_SESSION_FIELDS)\
+            .eq('id', session_id)\
+            .eq('creative_user_id', creative_user_id)\
+            .limit(1))
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        session = result.data[0]
+
+        expires_at = datetime.fromisoformat(session['expires_at'].replace('Z', '+00:00'))
+        if session['status'] == 'uploading' and expires_at <= datetime.now(timezone.utc):
+            await UploadSessions._set_status(session, 'failed', error="Upload session expired")
+            raise HTTPException(status_code=410, detail="Upload session expired, please start the upload again")
+        if session['status'] == 'scanning' and _scan_lease_is_stale(session):
+            await UploadSessions._start_finalization(session)
+        return session
+
+    @staticmethod
+    async def _set_status(session: Dict[str, Any], status: str, expected_status: Optional[str] = None, **fields: Any) -> bool:
+        """Move a session to status (only from expected_status if given); returns whether it moved"""
+        query = db_admin.table('deliverable_upload_sessions')\
+            .update({'status': status, 'updated_at': datetime.now(timezone.utc).isoformat(), **fields})\
+            .eq('id', session['id'])
+        if expected_status:
+            query = query.eq('status', expected_status)
+        result = await run_query(query)
+        if result.data:
+            session.update(result.data[0])
+        return bool(result.data)
+
+    @staticmethod
+    async def _start_finalization(session: Dict[str, Any]) -> bool:
+        """
+        Take the scan lease (moving the session to 'scanning') and finalize in the background.
+        The update is guarded on the state the session was read in (status, and the stale lease
+        when taking over an abandoned scan), so concurrent callers start one finalization.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        query = db_admin.table('deliverable_upload_sessions')\
+            .update({'status': 'scanning', 'error': None, 'scan_heartbeat_at': now, 'updated_at': now})\
+            .eq('id', session['id'])\
+            .eq('status', session['status'])
+        if session['status'] == 'scanning':
+            heartbeat = session.get('scan_heartbeat_at')
+            query = query.eq('scan_heartbeat_at', heartbeat) if heartbeat else query.is_('scan_heartbeat_at', 'null')
+        result = await run_query(query)
+        if not result.data:
+            return False
+        session.update(result.data[0])
+        task = asyncio.create_task(UploadSessions.finalize_session(dict(session)))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        return True
+
+    @staticmethod
+    async def _renew_scan_lease(session_id: str) -> None:
+        """Heartbeat of a running finalization (cancelled when it ends)"""
+        while True:
+            await asyncio.sleep(UPLOAD_SCAN_HEARTBEAT_SECONDS)
+            try:
+                await run_query(db_admin.table('deliverable_upload_sessions')\
+                    .update({'scan_heartbeat_at': datetime.now(timezone.utc).isoformat()})\
+                    .eq('id', session_id)\
+                    .eq('status', 'scanning'))
+            except Exception as e:
+                log_exception_if_dev(logger, "Failed to renew upload scan lease", e)
+
+    @staticmethod
+    async def _reject(session: Dict[str, Any], error_message: str) -> None:
+        """Delete the stored object and mark the session rejected"""
+        await run_blocking(db_admin.storage.from_(DELIVERABLES_BUCKET).remove, [session['storage_path']])
+        signed_url_cache.invalidate(DELIVERABLES_BUCKET, session['storage_path'])
+        await UploadSessions._set_status(session, 'rejected', error=error_message)
+
+    @staticmethod
+    async def _registered_deliverable_id(session: Dict[str, Any]) -> Optional[str]:
+        existing = await run_query(db_admin.table('booking_deliverables')\
+            .select('id')\
+            .eq('booking_id', session['booking_id'])\
+            .eq('file_url', session['storage_path'])\
+            .limit(1))
+        return existing.data[0]['id'] if existing.data else None
+
+    @staticmethod
+    async def _tus_offset(session: Dict[str, Any]) -> Optional[int]:
+        """Bytes Storage has accepted for the session's TUS upload (None if the upload is gone)"""
+        response = await _get_http().head(session['tus_url'], headers=_tus_headers())
+        if response.status_code in (404, 410):
+            return None
+        response.raise_for_status()
+        return int(response.headers['upload-offset'])
+
+    @staticmethod
+    async def _resync(session: Dict[str, Any]) -> None:
+        """Align the session with the TUS upload's offset (after a PATCH whose outcome was lost)"""
+        offset = await UploadSessions._tus_offset(session)
+        if offset is None:
+            await UploadSessions._set_status(session, 'failed', error="Upload expired in storage")
+            raise HTTPException(status_code=410, detail="Upload expired, please start the upload again")
+        checksums: List[Optional[str]] = list(session['chunk_checksums'])[:offset // session['chunk_size']]
+        checksums += [None] * (offset // session['chunk_size'] - len(checksums))
+        result = await run_query(db_admin.table('deliverable_upload_sessions')\
+            .update({
+                'upload_offset': offset,
+                'chunk_checksums': checksums,
+                'updated_at': datetime.now(timezone.utc).isoformat()
+            })\
+            .eq('id', session['id']))
+        if result.data:
+            session.update(result.data[0])
+
+    @staticmethod
+    async def put_chunk(session_id: str, creative_user_id: str, chunk_index: int, chunk: bytes, checksum_header: Optional[str]) -> Dict[str, Any]:
+        """
+        Verify a chunk against its checksum and append it to the upload
+
+        Chunks must arrive in order. A chunk that was already accepted is acknowledged again if its
+        checksum matches (a retry after a lost response); anything else out of order is answered
+        with 409 and the session state, whose next_chunk says where to continue.
+        """
+        algorithm, expected_digest = parse_upload_checksum(checksum_header)
+        if not hmac.compare_digest(hashlib.new(algorithm, chunk).digest(), expected_digest):
+            # 460 Checksum Mismatch, as in the TUS checksum extension
+            raise HTTPException(status_code=460, detail="Chunk checksum mismatch, please resend the chunk")
+        chunk_sha256 = hashlib.sha256(chunk).hexdigest()
+
+        session = await UploadSessions.get_session(session_id, creative_user_id)
+        if session['status'] != 'uploading':
+            raise HTTPException(status_code=409, detail=f"Upload session is {session['status']}")
+
+        chunk_size = session['chunk_size']
+        offset = session['upload_offset']
+        next_chunk = offset // chunk_size
+        if chunk_index < next_chunk:
+            stored = session['chunk_checksums'][chunk_index] if chunk_index < len(session['chunk_checksums']) else None
+            if stored is None or stored == chunk_sha256:
+                return session_state(session)
+            raise HTTPException(status_code=409, detail="Chunk was already received with different content")
+        if chunk_index > next_chunk:
+            raise HTTPException(status_code=409, detail=f"Expected chunk {next_chunk}")
+
+        expected_length = min(chunk_size, session['file_size'] - offset)
+        if len(chunk) != expected_length:
+            raise HTTPException(status_code=400, detail=f"Chunk {chunk_index} must be {expected_length} bytes")
+
+        response = await _get_http().patch(
+            session['tus_url'],
+            content=chunk,
+            headers=_tus_headers(**{
+                'Upload-Offset': str(offset),
+                'Content-Type': 'application/offset+octet-stream'
+            })
+        )
+        if response.status_code == 409:
+            # Storage is at a different offset (an earlier PATCH landed but its response was lost)
+            await UploadSessions._resync(session)
+            if session['upload_offset'] > offset:
+                return session_state(session)
+            raise HTTPException(status_code=409, detail=f"Expected chunk {session['upload_offset'] // chunk_size}")
+        if response.status_code in (404, 410):
+            await UploadSessions._set_status(session, 'failed', error="Upload expired in storage")
+            raise HTTPException(status_code=410, detail="Upload expired, please start the upload again")
+        if response.status_code != 204:
+            if is_dev_env():
+                logger.error(f"TUS PATCH failed ({response.status_code}): {response.text[:200]}")
+            raise HTTPException(status_code=502, detail="Failed to store chunk, please resend it")
+
+        new_offset = int(response.headers.get('upload-offset', offset + len(chunk)))
+        result = await run_query(db_admin.table('deliverable_upload_sessions')\
+            .update({
+                'upload_offset': new_offset,
+                'chunk_checksums': list(session['chunk_checksums']) + [chunk_sha256],
+                'updated_at': datetime.now(timezone.utc).isoformat()
+            })\
+            .eq('id', session['id'])\
+            .eq('upload_offset', offset))
+        if result.data:
+            session.update(result.data[0])
+        else:
+            # A concurrent request for the same chunk moved the session first
+            session = await UploadSessions.get_session(session_id, creative_user_id)
+        return session_state(session)
+
+    @staticmethod
+    async def complete_session(session_id: str, creative_user_id: str) -> Dict[str, Any]:
+        """Start finalization (scan, then register the deliverable) once every chunk is in"""
+        session = await UploadSessions.get_session(session_id, creative_user_id)
+        if session['status'] in ('scanning', 'completed', 'rejected'):
+            return session_state(session)
+        if session['status'] not in ('uploading', 'failed'):
+            raise HTTPException(status_code=409, detail=f"Upload session is {session['status']}")
+        if session['upload_offset'] < session['file_size']:
+            raise HTTPException(status_code=409, detail=f"Upload incomplete, expected chunk {session['upload_offset'] // session['chunk_size']}")
+
+        await UploadSessions._start_finalization(session)
+        return session_state(session)
+
+    @staticmethod
+    async def finalize_session(session: Dict[str, Any]) -> None:
+        """
+        Scan the uploaded object and register it, or delete it if the scan rejects it or it no
+        longer fits the creative's storage limit (checked again here: other uploads may have
+        finished since the session was opened)
+        """
+        stored_object = _StoredObject(session['storage_path'], session['file_name'], session['file_size'])
+        heartbeat = asyncio.create_task(UploadSessions._renew_scan_lease(session['id']))
+        try:
+            try:
+                is_safe, error_message, _ = await ScannerService().scan_and_validate(
+                    stored_object,
+                    max_size=FileValidator.MAX_FILE_SIZE,
+                    allowed_extensions=None,  # Allow all file types except dangerous ones
+                    fail_if_scanner_unavailable=False  # Same policy as direct uploads
+                )
+            finally:
+                await stored_object.close()
+
+            if not is_safe:
+                await UploadSessions._reject(session, error_message or "File validation failed")
+                return
+
+            # Registered before (e.g. a retried finalization): already counted in storage usage
+            deliverable_id = await UploadSessions._registered_deliverable_id(session)
+            if deliverable_id is None:
+                is_allowed, quota_error = await check_storage_limit(session['creative_user_id'], session['file_size'], db_admin)
+                if not is_allowed:
+                    await UploadSessions._reject(session, quota_error)
+                    return
+
+                insert_result = await run_query(db_admin.table('booking_deliverables').upsert({
+                    'booking_id': session['booking_id'],
+                    'file_url': session['storage_path'],
+                    'file_name': session['file_name'],
+                    'file_size_bytes': session['file_size'],
+                    'file_type': session.get('file_type') or 'application/octet-stream'
+                }, on_conflict='booking_id,file_url', ignore_duplicates=True))
+                if insert_result.data:
+                    deliverable_id = insert_result.data[0]['id']
+                else:
+                    # Registered concurrently
+                    deliverable_id = await UploadSessions._registered_deliverable_id(session)
+
+            await UploadSessions._set_status(session, 'completed', deliverable_id=deliverable_id)
+            if is_dev_env():
+                logger.info(f"Resumable upload {session['id']} registered as deliverable {deliverable_id}")
+        except Exception as e:
+            log_exception_if_dev(logger, f"Failed to finalize upload session {session['id']}", e)
+            try:
+                # Completing the session again retries finalization
+                await UploadSessions._set_status(session, 'failed', error="Failed to finalize upload")
+            except Exception as status_error:
+                log_exception_if_dev(logger, "Failed to mark upload session failed", status_error)
+        finally:
+            heartbeat.cancel()
+
+    @staticmethod
+    async def abort_session(session_id: str, creative_user_id: str) -> Dict[str, Any]:
+        """Cancel an unfinished upload and discard what was stored"""
+        try:
+            session = await UploadSessions.get_session(session_id, creative_user_id)
+        except HTTPException as e:
+            if e.status_code != 410:
+                raise
+            session = (await run_query(db_admin.table('deliverable_upload_sessions')\
+                .select(UPLOAD_SESSION_FIELDS)\
+                .eq('id', session_id)\
+                .limit(1))).data[0]
+        if session['status'] not in ('uploading', 'failed'):
+            raise HTTPException(status_code=409, detail=f"Upload session is {session['status']}")
+
+        try:
+            await _get_http().delete(session['tus_url'], headers=_tus_headers())
+            if session['upload_offset'] >= session['file_size']:
+                await run_blocking(db_admin.storage.from_(DELIVERABLES_BUCKET).remove, [session['storage_path']])
+        except Exception as e:
+            # Storage expires unfinished TUS uploads on its own
+            log_exception_if_dev(logger, "Failed to discard aborted upload", e)
+
+        await UploadSessions._set_status(session, 'aborted')
+        return session_state(session)
+
+    @staticmethod
+    async def shutdown() -> None:
+        global _http
+        if _http is not None:
+            await _http.aclose()
+            _http = None
@@ -1,8 +1,10 @@
 from fastapi import HTTPException, UploadFile
 from db.db_session import db_admin
+from db.query_executor import run_query, run_blocking
 from schemas.client import ClientSetupRequest, ClientSetupResponse, ClientCreativesListResponse, ClientCreativeResponse, ClientUpdateRequest, ClientUpdateResponse
 from core.validation import validate_email
 from core.safe_errors import log_exception_if_dev, is_dev_env
+from core.identity import identity_cache
 from supabase import Client
 import uuid
 from services.email.email_service import email_service
@@ -22,7 +24,7 @@ class ClientController:
         """
         try:
             # Get user profile data (using authenticated client - respects RLS)
-            user_result = client.table('users').select('roles, profile_picture_url, avatar_source').eq('user_id', user_id).single().execute()
+            user_result = await run_query(client.table('users').select('roles, profile_picture_url, avatar_source').eq('user_id', user_id).single())
             if not user_result.data:
                 raise HTTPException(status_code=404, detail="User not found")
             
@@ -33,7 +35,7 @@ class ClientController:
             if 'client' not in user_roles:
                 user_roles.append('client')
                 # Update user's roles in the database (using authenticated client - respects RLS)
-                update_result = client.table('users').update({'roles': user_roles}).eq('user_id', user_id).execute()
+                update_result = await run_query(client.table('users').update({'roles': user_roles}).eq('user_id', user_id))
                 if not update_result.data:
                     raise HTTPException(status_code=500, detail="Failed to update user roles")
             
@@ -54,13 +56,14 @@ class ClientController:
             }
             
             # Insert or update client profile (upsert) (using authenticated client - respects RLS)
-            result = client.table('clients').upsert(client_data).execute()
+            result = await run_query(client.table('clients').upsert(client_data))
             
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to create client profile")
             
             # Mark setup as complete by setting first_login to False
-            user_update_result = client.table('users').update({'first_login': False}).eq('user_id', user_id).execute()
+            user_update_result = await run_query(client.table('users').update({'first_login': False}).eq('user_id', user_id))
+            identity_cache.invalidate(user_id)
             
             if not user_update_result.data:
                 raise HTTPException(status_code=500, detail="Failed to update user first_login status")
@@ -99,7 +102,7 @@ class ClientController:
         """
         try:
             # Query the clients table using authenticated client (respects RLS)
-            result = client.table('clients').select('*').eq('user_id', user_id).single().execute()
+            result = await run_query(client.table('clients').select('*').eq('user_id', user_id).single())
             
             if not result.data:
                 raise HTTPException(status_code=404, detail="Client profile not found")
@@ -142,7 +145,7 @@ class ClientController:
                 )
             
             # Update the client profile using authenticated client (respects RLS)
-            result = client.table('clients').update(update_dict).eq('user_id', user_id).execute()
+            result = await run_query(client.table('clients').update(update_dict).eq('user_id', user_id))
             
             if not result.data:
                 raise HTTPException(status_code=404, detail="Client profile not found")
@@ -173,7 +176,7 @@ class ClientController:
                 raise HTTPException(status_code=400, detail="File size must be less than 5MB")
             
             # Get current profile to find old photo URL
-            current_profile = client.table('clients').select('profile_banner_url').eq('user_id', user_id).single().execute()
+            current_profile = await run_query(client.table('clients').select('profile_banner_url').eq('user_id', user_id).single())
             old_photo_url = None
             if current_profile.data and current_profile.data.get('profile_banner_url'):
                 old_photo_url = current_profile.data['profile_banner_url']
@@ -187,7 +190,8 @@ class ClientController:
             file_path = f"clients/{unique_filename}"
             
             try:
-                upload_result = db_admin.storage.from_(bucket_name).upload(
+                upload_result = await run_blocking(
+                    db_admin.storage.from_(bucket_name).upload,
                     path=file_path,
                     file=content,
                     file_options={"content-type": file.content_type}
@@ -200,10 +204,10 @@ class ClientController:
             public_url = db_admin.storage.from_(bucket_name).get_public_url(file_path)
             
             # Update the client profile with the new photo URL
-            update_result = client.table('clients').update({
+            update_result = await run_query(client.table('clients').update({
                 'profile_banner_url': public_url,
                 'profile_source': 'custom'
-            }).eq('user_id', user_id).execute()
+            }).eq('user_id', user_id))
             
             if not update_result.data:
                 raise HTTPException(status_code=500, detail="Failed to update profile with new photo URL")
@@ -216,7 +220,7 @@ class ClientController:
                     
                     if old_file_path.startswith('clients/'):
                         try:
-                            db_admin.storage.from_(bucket_name).remove([old_file_path])
+                            await run_blocking(db_admin.storage.from_(bucket_name).remove, [old_file_path])
                         except Exception as delete_error:
                             log_exception_if_dev(logger, "Failed to delete old profile photo", delete_error)
                 except Exception as delete_error:
@@ -244,9 +248,9 @@ class ClientController:
         """
         try:
             # Get creative user IDs first
-            relationships_result = client.table('creative_client_relationships').select(
+            relationships_result = await run_query(client.table('creative_client_relationships').select(
                 'id, status, total_spent, projects_count, creative_user_id'
-            ).eq('client_user_id', user_id).order('updated_at', desc=True).execute()
+            ).eq('client_user_id', user_id).order('updated_at', desc=True))
             
             if not relationships_result.data:
                 return ClientCreativesListResponse(creatives=[], total_count=0)
@@ -254,13 +258,13 @@ class ClientController:
             creative_user_ids = [rel['creative_user_id'] for rel in relationships_result.data]
             
             # Batch fetch all creative and user data to avoid N+1 queries
-            creatives_result = client.table('creatives').select(
+            creatives_result = await run_query(client.table('creatives').select(
                 'display_name, title, user_id, avatar_background_color, profile_banner_url, primary_contact, secondary_contact, description, availability_location, profile_highlights, profile_highlight_values'
-            ).in_('user_id', creative_user_ids).execute()
+            ).in_('user_id', creative_user_ids))
             
-            users_result = client.table('users').select(
+            users_result = await run_query(client.table('users').select(
                 'name, email, profile_picture_url, user_id'
-            ).in_('user_id', creative_user_ids).execute()
+            ).in_('user_id', creative_user_ids))
             
             # Create lookup maps
             creative_data_map = {c['user_id']: c for c in creatives_result.data}
@@ -271,9 +275,9 @@ class ClientController:
             for creative_user_id in creative_user_ids:
                 try:
                     # Try using count parameter instead of counting data length
-                    service_count_result = client.table('creative_services').select(
+                    service_count_result = await run_query(client.table('creative_services').select(
                         'id', count='exact'
-                    ).eq('creative_user_id', creative_user_id).eq('is_active', True).execute()
+                    ).eq('creative_user_id', creative_user_id).eq('is_active', True))
                     
                     # Use the count from the result
                     count = service_count_result.count if hasattr(service_count_result, 'count') else 0
@@ -284,9 +288,9 @@ class ClientController:
                     log_exception_if_dev(logger, "Error getting service count for creative", e)
                     # Fallback to counting data length
                     try:
-                        service_count_result = client.table('creative_services').select(
+                        service_count_result = await run_query(client.table('creative_services').select(
                             'id'
-                        ).eq('creative_user_id', creative_user_id).eq('is_active', True).execute()
+                        ).eq('creative_user_id', creative_user_id).eq('is_active', True))
                         count = len(service_count_result.data) if service_count_result.data else 0
                         services_count_map[creative_user_id] = count
                         if is_dev_env():
@@ -379,9 +383,9 @@ class ClientController:
         try:
             # Single optimized query with JOIN to get services, creative names, and photos
             # This replaces multiple individual queries with one efficient query
-            services_result = db_admin.rpc('get_client_connected_services_with_photos', {
+            services_result = await run_query(db_admin.rpc('get_client_connected_services_with_photos', {
                 'client_user_id': user_id
-            }).execute()
+            }))
             
             if not services_result.data:
                 return {"services": [], "total_count": 0}
@@ -424,9 +428,9 @@ class ClientController:
         """Fallback method using optimized batch queries"""
         try:
             # Get creative user IDs
-            relationships_result = db_admin.table('creative_client_relationships').select(
+            relationships_result = await run_query(db_admin.table('creative_client_relationships').select(
                 'creative_user_id'
-            ).eq('client_user_id', user_id).execute()
+            ).eq('client_user_id', user_id))
             
             if not relationships_result.data:
                 return {"services": [], "total_count": 0}
@@ -434,21 +438,21 @@ class ClientController:
             creative_user_ids = [rel['creative_user_id'] for rel in relationships_result.data]
             
             # Get all services from these creatives
-            services_result = db_admin.table('creative_services').select(
+            services_result = await run_query(db_admin.table('creative_services').select(
                 'id, title, description, price, delivery_time, status, color, is_active, created_at, updated_at, creative_user_id, requires_booking, payment_option, split_deposit_amount'
-            ).in_('creative_user_id', creative_user_ids).eq('is_active', True).order('created_at', desc=True).execute()
+            ).in_('creative_user_id', creative_user_ids).eq('is_active', True).order('created_at', desc=True))
             
             if not services_result.data:
                 return {"services": [], "total_count": 0}
             
             # Batch fetch creative names to avoid N+1 queries
-            creatives_result = db_admin.table('creatives').select(
+            creatives_result = await run_query(db_admin.table('creatives').select(
                 'user_id, display_name'
-            ).in_('user_id', creative_user_ids).execute()
+            ).in_('user_id', creative_user_ids))
             
-            users_result = db_admin.table('users').select(
+            users_result = await run_query(db_admin.table('users').select(
                 'user_id, name'
-            ).in_('user_id', creative_user_ids).execute()
+            ).in_('user_id', creative_user_ids))
             
             # Create lookup maps
             creative_names = {c['user_id']: c.get('display_name') for c in creatives_result.data}
@@ -456,9 +460,9 @@ class ClientController:
             
             # Get photos for all services
             service_ids = [service['id'] for service in services_result.data]
-            photos_result = db_admin.table('service_photos').select(
+            photos_result = await run_query(db_admin.table('service_photos').select(
                 'service_id, photo_url, photo_filename, photo_size_bytes, is_primary, display_order'
-            ).in_('service_id', service_ids).order('service_id').order('display_order', desc=False).execute()
+            ).in_('service_id', service_ids).order('service_id').order('display_order', desc=False))
             
             # Group photos by service_id
             photos_by_service = {}
@@ -517,9 +521,9 @@ class ClientController:
         """
         try:
             # Get creative user IDs that this client is connected to
-            relationships_result = client.table('creative_client_relationships').select(
+            relationships_result = await run_query(client.table('creative_client_relationships').select(
                 'creative_user_id'
-            ).eq('client_user_id', user_id).execute()
+            ).eq('client_user_id', user_id))
             
             if not relationships_result.data:
                 return {"services": [], "bundles": [], "total_count": 0}
@@ -527,14 +531,14 @@ class ClientController:
             creative_user_ids = [rel['creative_user_id'] for rel in relationships_result.data]
             
             # Get all services from these creatives
-            services_result = client.table('creative_services').select(
+            services_result = await run_query(client.table('creative_services').select(
                 'id, title, description, price, delivery_time, status, color, payment_option, split_deposit_amount, is_active, created_at, updated_at, creative_user_id, requires_booking'
-            ).in_('creative_user_id', creative_user_ids).eq('is_active', True).eq('status', 'Public').order('created_at', desc=True).execute()
+            ).in_('creative_user_id', creative_user_ids).eq('is_active', True).eq('status', 'Public').order('created_at', desc=True))
             
             # Get all bundles from these creatives
-            bundles_result = client.table('creative_bundles').select(
+            bundles_result = await run_query(client.table('creative_bundles').select(
                 'id, title, description, color, status, pricing_option, fixed_price, discount_percentage, is_active, created_at, updated_at, creative_user_id'
-            ).in_('creative_user_id', creative_user_ids).eq('is_active', True).eq('status', 'Public').order('created_at', desc=True).execute()
+            ).in_('creative_user_id', creative_user_ids).eq('is_active', True).eq('status', 'Public').order('created_at', desc=True))
             
             if not services_result.data and not bundles_result.data:
                 return {"services": [], "bundles": [], "total_count": 0}
@@ -545,17 +549,17 @@ class ClientController:
                 *[bundle['creative_user_id'] for bundle in bundles_result.data or []]
             ]))
             
-            creatives_result = client.table('creatives').select(
+            creatives_result = await run_query(client.table('creatives').select(
                 'user_id, display_name, title, profile_banner_url'
-            ).in_('user_id', all_creative_user_ids).execute()
+            ).in_('user_id', all_creative_user_ids))
             
             # Create creative lookup map
             creatives_map = {c['user_id']: c for c in creatives_result.data}
             
             # Get user details for these creatives
-            users_result = client.table('users').select(
+            users_result = await run_query(client.table('users').select(
                 'user_id, name'
-            ).in_('user_id', all_creative_user_ids).execute()
+            ).in_('user_id', all_creative_user_ids))
             
             # Create user lookup map
             users_map = {u['user_id']: u for u in users_result.data}
@@ -567,9 +571,9 @@ class ClientController:
                 service_ids = [service['id'] for service in services_result.data]
                 
                 # Fetch photos for all services
-                photos_result = client.table('service_photos').select(
+                photos_result = await run_query(client.table('service_photos').select(
                     'service_id, photo_url, photo_filename, photo_size_bytes, is_primary, display_order'
-                ).in_('service_id', service_ids).order('service_id').order('display_order', desc=False).execute()
+                ).in_('service_id', service_ids).order('service_id').order('display_order', desc=False))
                 
                 # Group photos by service_id
                 photos_by_service = {}
@@ -623,21 +627,21 @@ class ClientController:
                     user_data = users_map.get(creative_user_id, {})
                     
                     # Get services for this bundle
-                    bundle_services_result = client.table('bundle_services').select(
+                    bundle_services_result = await run_query(client.table('bundle_services').select(
                         'service_id'
-                    ).eq('bundle_id', bundle_data['id']).execute()
+                    ).eq('bundle_id', bundle_data['id']))
                     
                     service_ids = [bs['service_id'] for bs in bundle_services_result.data] if bundle_services_result.data else []
                     
                     # Get service details
-                    bundle_services_data = client.table('creative_services').select(
+                    bundle_services_data = await run_query(client.table('creative_services').select(
                         'id, title, description, price, delivery_time, status, color'
-                    ).in_('id', service_ids).execute()
+                    ).in_('id', service_ids))
                     
                     # Fetch photos for bundle services
-                    bundle_photos_result = client.table('service_photos').select(
+                    bundle_photos_result = await run_query(client.table('service_photos').select(
                         'service_id, photo_url, photo_filename, photo_size_bytes, is_primary, display_order'
-                    ).in_('service_id', service_ids).order('service_id').order('display_order', desc=False).execute()
+                    ).in_('service_id', service_ids).order('service_id').order('display_order', desc=False))
                     
                     # Group photos by service_id
                     bundle_photos_by_service = {}
@@ -0,0 +1,257 @@
+"""
+Columnar aggregation of a creative's bookings for analytics
+
+Bookings are parsed once into parallel arrays (epoch seconds, amounts in cents, service and
+client indexes, status flags) and every rollup the analytics endpoints need - daily income,
+daily per-service revenue, per-client totals and headline metrics - is computed in a single
+pass over those arrays. Used to rebuild / verify the rollup tables and to bucket day rows for
+the income chart.
+"""
+from array import array
+from datetime import datetime, date, timezone, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SECONDS_PER_DAY = 86400
+EPOCH_DATE = date(1970, 1, 1)
+
+# Status flags (bit mask per booking)
+FLAG_EARNING = 1      # creative_status completed and payment_status fully_paid
+FLAG_COMPLETED = 2    # creative_status completed
+FLAG_PENDING = 4      # awaiting_payment / in_progress: remaining balance counts as unpaid
+FLAG_FULLY_PAID = 8   # payment_status fully_paid (client leaderboard)
+
+PENDING_STATUSES = ('awaiting_payment', 'in_progress')
+
+# Chart buckets for each period type
+PERIOD_BUCKET_NAMES = {
+    "week": ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"],
+    "month": ["Week 1", "Week 2", "Week 3", "Week 4"],
+    "year": ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"],
+}
+
+
+def to_cents(value: Any) -> int:
+    """Convert a numeric column (number or numeric string) to integer cents"""
+    if value is None:
+        return 0
+    return int(round(float(value) * 100))
+
+
+def parse_epoch(value: Optional[str]) -> int:
+    """Parse an ISO timestamp into epoch seconds (-1 when missing)"""
+    if not value:
+        return -1
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def epoch_day_to_date(epoch_day: int) -> date:
+    return EPOCH_DATE + timedelta(days=epoch_day)
+
+
+def period_bucket(time_period: str, day: date) -> int:
+    """Index of the chart bucket a day falls into (weekday, week of month capped at 4, or month)"""
+    if time_period == "week":
+        return day.weekday()
+    if time_period == "month":
+        return min((day.day - 1) // 7, 3)
+    return day.month - 1
+
+
+def bucket_daily_amounts(time_period: str, days: Iterable[date], amounts: Iterable[float]) -> List[float]:
+    """Sum daily amounts of a single period into its chart buckets"""
+    buckets = [0.0] * len(PERIOD_BUCKET_NAMES[time_period])
+    for day, amount in zip(days, amounts):
+        buckets[period_bucket(time_period, day)] += amount
+    return buckets
+
+
+class BookingColumns:
+    """A creative's bookings as parallel typed arrays
+
+    services / clients hold the distinct IDs; service_idx / client_idx point into them.
+    """
+
+    __slots__ = (
+        'order_ts', 'updated_ts', 'amount_cents', 'price_cents',
+        'service_idx', 'client_idx', 'flags', 'services', 'clients',
+    )
+
+    def __init__(self):
+        self.order_ts = array('q')
+        self.updated_ts = array('q')
+        self.amount_cents = array('q')
+        self.price_cents = array('q')
+        self.service_idx = array('l')
+        self.client_idx = array('l')
+        self.flags = array('B')
+        self.services: List[str] = []
+        self.clients: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.order_ts)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> "BookingColumns":
+        """Build columns from booking rows
+
+        Rows need: order_date, updated_at, amount_paid, price, service_id, client_user_id,
+        payment_status, creative_status.
+        """
+        columns = cls()
+        service_lookup: Dict[str, int] = {}
+        client_lookup: Dict[str, int] = {}
+
+        for row in rows:
+            service_id = row.get('service_id')
+            client_id = row.get('client_user_id')
+
+            s_idx = service_lookup.get(service_id)
+            if s_idx is None:
+                s_idx = service_lookup[service_id] = len(columns.services)
+                columns.services.append(service_id)
+            c_idx = client_lookup.get(client_id)
+            if c_idx is None:
+                c_idx = client_lookup[client_id] = len(columns.clients)
+                columns.clients.append(client_id)
+
+            creative_status = row.get('creative_status')
+            fully_paid = row.get('payment_status') == 'fully_paid'
+            flags = 0
+            if fully_paid:
+                flags |= FLAG_FULLY_PAID
+            if creative_status == 'completed':
+                flags |= FLAG_COMPLETED
+                if fully_paid:
+                    flags |= FLAG_EARNING
+            elif creative_status in PENDING_STATUSES:
+                flags |= FLAG_PENDING
+
+            columns.order_ts.append(parse_epoch(row.get('order_date')))
+            columns.updated_ts.append(parse_epoch(row.get('updated_at')))
+            columns.amount_cents.append(to_cents(row.get('amount_paid')))
+            columns.price_cents.append(to_cents(row.get('price')))
+            columns.service_idx.append(s_idx)
+            columns.client_idx.append(c_idx)
+            columns.flags.append(flags)
+
+        return columns
+
+
+class AnalyticsRollups:
+    """Every analytics aggregate of one creative, in the shape of the rollup tables (amounts in cents)"""
+
+    __slots__ = ('total_earnings', 'unpaid_pending', 'completed_projects', 'daily_income', 'daily_service', 'client_totals')
+
+    def __init__(self):
+        self.total_earnings = 0
+        self.unpaid_pending = 0
+        self.completed_projects = 0
+        # epoch day -> [income_cents, booking_count]
+        self.daily_income: Dict[int, List[int]] = {}
+        # (epoch day, service index) -> [revenue_cents, booking_count]
+        self.daily_service: Dict[Tuple[int, int], List[int]] = {}
+        # client index -> [total_paid_cents, services_amount, last_payment_epoch]
+        self.client_totals: Dict[int, List[int]] = {}
+
+
+def aggregate(columns: BookingColumns) -> AnalyticsRollups:
+    """Compute all rollups in one pass over the columns"""
+    rollups = AnalyticsRollups()
+    daily_income = rollups.daily_income
+    daily_service = rollups.daily_service
+    client_totals = rollups.client_totals
+    total_earnings = 0
+    unpaid_pending = 0
+    completed_projects = 0
+
+    for order_ts, updated_ts, amount, price, s_idx, c_idx, flags in zip(
+        columns.order_ts, columns.updated_ts, columns.amount_cents, columns.price_cents,
+        columns.service_idx, columns.client_idx, columns.flags,
+    ):
+        if flags & FLAG_COMPLETED:
+            completed_projects += 1
+        elif flags & FLAG_PENDING and price > amount:
+            unpaid_pending += price - amount
+
+        if flags & FLAG_EARNING:
+            total_earnings += amount
+            if order_ts >= 0:
+                day = order_ts // SECONDS_PER_DAY
+                bucket = daily_income.get(day)
+                if bucket is None:
+                    daily_income[day] = [amount, 1]
+                else:
+                    bucket[0] += amount
+                    bucket[1] += 1
+                key = (day, s_idx)
+                bucket = daily_service.get(key)
+                if bucket is None:
+                    daily_service[key] = [amount, 1]
+                else:
+                    bucket[0] += amount
+                    bucket[1] += 1
+
+        if flags & FLAG_FULLY_PAID:
+            totals = client_totals.get(c_idx)
+            if totals is None:
+                client_totals[c_idx] = [amount, 1, updated_ts]
+            else:
+                totals[0] += amount
+                totals[1] += 1
+                if updated_ts > totals[2]:
+                    totals[2] = updated_ts
+
+    rollups.total_earnings = total_earnings
+    rollups.unpaid_pending = unpaid_pending
+    rollups.completed_projects = completed_projects
+    return rollups
+
+
+def rollup_rows(creative_user_id: str, columns: BookingColumns, rollups: AnalyticsRollups) -> Dict[str, List[Dict[str, Any]]]:
+    """Rows for each rollup table, as written by the bookings trigger"""
+    def amount(cents: int) -> float:
+        return cents / 100
+
+    def timestamp(epoch: int) -> Optional[str]:
+        return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat() if epoch >= 0 else None
+
+    return {
+        'creative_analytics_totals': [{
+            'creative_user_id': creative_user_id,
+            'total_earnings': amount(rollups.total_earnings),
+            'unpaid_pending': amount(rollups.unpaid_pending),
+            'completed_projects': rollups.completed_projects,
+        }],
+        'creative_daily_income': [
+            {
+                'creative_user_id': creative_user_id,
+                'day': epoch_day_to_date(day).isoformat(),
+                'income': amount(cents),
+                'booking_count': count,
+            }
+            for day, (cents, count) in sorted(rollups.daily_income.items())
+        ],
+        'creative_daily_service_revenue': [
+            {
+                'creative_user_id': creative_user_id,
+                'day': epoch_day_to_date(day).isoformat(),
+                'service_id': columns.services[s_idx],
+                'revenue': amount(cents),
+                'booking_count': count,
+            }
+            for (day, s_idx), (cents, count) in sorted(rollups.daily_service.items())
+        ],
+        'creative_client_totals': [
+            {
+                'creative_user_id': creative_user_id,
+                'client_user_id': columns.clients[c_idx],
+                'total_paid': amount(cents),
+                'services_amount': count,
+                'last_payment_date': timestamp(last_epoch),
+            }
+            for c_idx, (cents, count, last_epoch) in rollups.client_totals.items()
+        ],
+    }
@@ -3,6 +3,7 @@ import logging
 from fastapi import HTTPException
 from core.safe_errors import log_exception_if_dev
 from db.db_session import db_admin
+from db.query_executor import run_query
 from schemas.creative import (
     CreateBundleRequest, CreateBundleResponse,
     UpdateBundleRequest, UpdateBundleResponse, DeleteBundleResponse,
@@ -24,7 +25,7 @@ class BundleService:
         
         try:
             # Validate that the user has a creative profile
-            creative_result = client.table('creatives').select('user_id').eq('user_id', user_id).single().execute()
+            creative_result = await run_query(client.table('creatives').select('user_id').eq('user_id', user_id).single())
             if not creative_result.data:
                 raise HTTPException(status_code=404, detail="Creative profile not found. Please complete your creative setup first.")
             
@@ -33,9 +34,9 @@ class BundleService:
                 raise HTTPException(status_code=422, detail="Bundle must contain at least 2 services")
             
             # Check that all services exist and belong to the user
-            services_result = client.table('creative_services').select(
+            services_result = await run_query(client.table('creative_services').select(
                 'id, title, price, status'
-            ).eq('creative_user_id', user_id).eq('is_active', True).in_('id', bundle_request.service_ids).execute()
+            ).eq('creative_user_id', user_id).eq('is_active', True).in_('id', bundle_request.service_ids))
             
             if not services_result.data or len(services_result.data) != len(bundle_request.service_ids):
                 raise HTTPException(status_code=422, detail="One or more services not found or don't belong to you")
@@ -73,7 +74,7 @@ class BundleService:
             }
             
             # Insert the bundle
-            bundle_result = client.table('creative_bundles').insert(bundle_data).execute()
+            bundle_result = await run_query(client.table('creative_bundles').insert(bundle_data))
             
             if not bundle_result.data:
                 raise HTTPException(status_code=500, detail="Failed to create bundle")
@@ -86,11 +87,11 @@ class BundleService:
                 for service_id in bundle_request.service_ids
             ]
             
-            bundle_services_result = client.table('bundle_services').insert(bundle_services_data).execute()
+            bundle_services_result = await run_query(client.table('bundle_services').insert(bundle_services_data))
             
             if not bundle_services_result.data:
                 # If bundle services insertion fails, clean up the bundle
-                client.table('creative_bundles').delete().eq('id', bundle_id).execute()
+                await run_query(client.table('creative_bundles').delete().eq('id', bundle_id))
                 raise HTTPException(status_code=500, detail="Failed to associate services with bundle")
             
             return CreateBundleResponse(
@@ -113,9 +114,9 @@ class BundleService:
         
         try:
             # Verify the bundle exists and belongs to the user
-            bundle_result = client.table('creative_bundles').select(
+            bundle_result = await run_query(client.table('creative_bundles').select(
                 'id, creative_user_id, is_active'
-            ).eq('id', bundle_id).single().execute()
+            ).eq('id', bundle_id).single())
 
             if not bundle_result.data:
                 raise HTTPException(status_code=404, detail="Bundle not found")
@@ -156,9 +157,9 @@ class BundleService:
                     raise HTTPException(status_code=422, detail="Bundle must contain at least 2 services")
 
                 # Check that all services exist and belong to the user
-                services_result = client.table('creative_services').select(
+                services_result = await run_query(client.table('creative_services').select(
                     'id, title, price, status'
-                ).eq('creative_user_id', user_id).eq('is_active', True).in_('id', bundle_request.service_ids).execute()
+                ).eq('creative_user_id', user_id).eq('is_active', True).in_('id', bundle_request.service_ids))
 
                 if not services_result.data or len(services_result.data) != len(bundle_request.service_ids):
                     raise HTTPException(status_code=422, detail="One or more services not found or don't belong to you")
@@ -171,14 +172,14 @@ class BundleService:
             # Update the bundle
             if update_data:
                 update_data['updated_at'] = 'now()'
-                result = client.table('creative_bundles').update(update_data).eq('id', bundle_id).execute()
+                result = await run_query(client.table('creative_bundles').update(update_data).eq('id', bundle_id))
                 if not result.data:
                     raise HTTPException(status_code=500, detail="Failed to update bundle")
 
             # Update bundle-service relationships if service_ids are provided
             if bundle_request.service_ids is not None:
                 # Delete existing bundle-service relationships
-                client.table('bundle_services').delete().eq('bundle_id', bundle_id).execute()
+                await run_query(client.table('bundle_services').delete().eq('bundle_id', bundle_id))
 
                 # Insert new bundle-service relationships
                 bundle_services_data = [
@@ -186,7 +187,7 @@ class BundleService:
                     for service_id in bundle_request.service_ids
                 ]
 
-                bundle_services_result = client.table('bundle_services').insert(bundle_services_data).execute()
+                bundle_services_result = await run_query(client.table('bundle_services').insert(bundle_services_data))
 
                 if not bundle_services_result.data:
                     raise HTTPException(status_code=500, detail="Failed to update bundle services")
@@ -207,9 +208,9 @@ class BundleService:
         
         try:
             # Verify the bundle exists and belongs to the user
-            bundle_result = client.table('creative_bundles').select(
+            bundle_result = await run_query(client.table('creative_bundles').select(
                 'id, creative_user_id, is_active, title'
-            ).eq('id', bundle_id).single().execute()
+            ).eq('id', bundle_id).single())
             
             if not bundle_result.data:
                 raise HTTPException(status_code=404, detail="Bundle not found")
@@ -223,10 +224,10 @@ class BundleService:
                 raise HTTPException(status_code=400, detail="Bundle is already deleted")
             
             # Soft delete by setting is_active to False
-            result = client.table('creative_bundles').update({
+            result = await run_query(client.table('creative_bundles').update({
                 'is_active': False,
                 'updated_at': 'now()'
-            }).eq('id', bundle_id).execute()
+            }).eq('id', bundle_id))
             
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to delete bundle")
@@ -3,6 +3,7 @@ import logging
 from fastapi import HTTPException, Request
 from core.safe_errors import log_exception_if_dev
 from db.db_session import db_admin
+from db.query_executor import run_query
 from schemas.creative import CalendarSettingsRequest
 from supabase import Client
 from core.timezone_utils import (
@@ -28,7 +29,7 @@ class CalendarService:
                 print(f"DEBUG: User timezone detected: {user_timezone}")
             
             # First, delete existing calendar settings for this service
-            db_admin.table('calendar_settings').delete().eq('service_id', service_id).execute()
+            await run_query(db_admin.table('calendar_settings').delete().eq('service_id', service_id))
             
             # Insert new calendar settings
             calendar_data = {
@@ -45,7 +46,7 @@ class CalendarService:
                 'is_active': True
             }
             
-            calendar_result = db_admin.table('calendar_settings').insert(calendar_data).execute()
+            calendar_result = await run_query(db_admin.table('calendar_settings').insert(calendar_data))
             if not calendar_result.data:
                 raise HTTPException(status_code=500, detail="Failed to save calendar settings")
             
@@ -61,7 +62,7 @@ class CalendarService:
                         'is_enabled': day_schedule.enabled
                     }
                     
-                    weekly_result = db_admin.table('weekly_schedule').insert(weekly_data).execute()
+                    weekly_result = await run_query(db_admin.table('weekly_schedule').insert(weekly_data))
                     if not weekly_result.data:
                         continue  # Skip this day if insertion fails
                     
@@ -99,7 +100,7 @@ class CalendarService:
                                 print(f"WARNING: Skipping invalid time block: start={start_time_str}, end={end_time_str} (end_time must be > start_time)")
                         
                         if time_blocks_data:
-                            db_admin.table('time_blocks').insert(time_blocks_data).execute()
+                            await run_query(db_admin.table('time_blocks').insert(time_blocks_data))
                     
                     # Save time slots (always use time slot mode, convert to UTC)
                     if day_schedule.time_slots:
@@ -117,7 +118,7 @@ class CalendarService:
                             })
                         
                         if time_slots_data:
-                            db_admin.table('time_slots').insert(time_slots_data).execute()
+                            await run_query(db_admin.table('time_slots').insert(time_slots_data))
 
         except HTTPException:
             raise
@@ -139,9 +140,9 @@ class CalendarService:
         
         try:
             # Verify service exists and belongs to user (using authenticated client - respects RLS)
-            service_result = client.table('creative_services').select(
+            service_result = await run_query(client.table('creative_services').select(
                 'id, creative_user_id, is_active'
-            ).eq('id', service_id).single().execute()
+            ).eq('id', service_id).single())
             
             if not service_result.data:
                 raise HTTPException(status_code=404, detail="Service not found")
@@ -153,9 +154,9 @@ class CalendarService:
                 raise HTTPException(status_code=400, detail="Cannot access calendar settings for deleted service")
             
             # OPTIMIZED: Use nested selects to fetch all related data in fewer queries
-            calendar_result = client.table('calendar_settings').select(
+            calendar_result = await run_query(client.table('calendar_settings').select(
                 '*, weekly_schedule(id, day_of_week, is_enabled, time_blocks(start_time, end_time), time_slots(slot_time, is_enabled))'
-            ).eq('service_id', service_id).eq('is_active', True).limit(1).execute()
+            ).eq('service_id', service_id).eq('is_active', True).limit(1))
             
             if not calendar_result.data:
                 return None  # No calendar settings configured
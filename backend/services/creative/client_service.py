@@ -4,6 +4,7 @@ from fastapi import HTTPException
 from core.safe_errors import log_exception_if_dev
 from schemas.creative import CreativeClientsListResponse, CreativeClientResponse
 from supabase import Client
+from db.query_executor import run_query
 
 logger = logging.getLogger(__name__)
 
@@ -27,9 +28,9 @@ class ClientService:
         
         try:
             # Get creative_client_relationships for this creative
-            relationships_result = client.table('creative_client_relationships').select(
+            relationships_result = await run_query(client.table('creative_client_relationships').select(
                 'id, status, total_spent, projects_count, client_user_id'
-            ).eq('creative_user_id', user_id).order('updated_at', desc=True).execute()
+            ).eq('creative_user_id', user_id).order('updated_at', desc=True))
             
             if not relationships_result.data:
                 return CreativeClientsListResponse(clients=[], total_count=0)
@@ -37,13 +38,13 @@ class ClientService:
             client_user_ids = [rel['client_user_id'] for rel in relationships_result.data]
             
             # Batch fetch client and user data to avoid N+1 queries
-            clients_result = client.table('clients').select(
+            clients_result = await run_query(client.table('clients').select(
                 'user_id, display_name, email'
-            ).in_('user_id', client_user_ids).execute()
+            ).in_('user_id', client_user_ids))
             
-            users_result = client.table('users').select(
+            users_result = await run_query(client.table('users').select(
                 'user_id, name, profile_picture_url'
-            ).in_('user_id', client_user_ids).execute()
+            ).in_('user_id', client_user_ids))
             
             # Create lookup maps
             client_data_map = {c['user_id']: c for c in clients_result.data}
@@ -52,9 +53,9 @@ class ClientService:
             # Check for active bookings for each client
             # A client is active if they have at least one booking that is not cancelled or completed
             # (client_status not in ['cancelled', 'completed'] AND creative_status not in ['rejected', 'completed'])
-            all_bookings_result = client.table('bookings').select(
+            all_bookings_result = await run_query(client.table('bookings').select(
                 'client_user_id, client_status, creative_status'
-            ).eq('creative_user_id', user_id).in_('client_user_id', client_user_ids).execute()
+            ).eq('creative_user_id', user_id).in_('client_user_id', client_user_ids))
             
             # Filter for active bookings and create set of client_user_ids with active bookings
             active_client_ids = set()
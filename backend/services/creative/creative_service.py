@@ -1,5 +1,6 @@
 from fastapi import HTTPException, UploadFile
 from db.db_session import db_admin
+from db.query_executor import run_query, run_blocking
 from schemas.creative import CreativeSetupRequest, CreativeSetupResponse, CreativeClientsListResponse, CreativeClientResponse, CreativeServicesListResponse, CreativeServiceResponse, CreateServiceRequest, CreateServiceResponse, DeleteServiceResponse, UpdateServiceResponse, CreativeProfileSettingsRequest, CreativeProfileSettingsResponse, ProfilePhotoUploadResponse, CreateBundleRequest, CreateBundleResponse, CreativeBundleResponse, CreativeBundlesListResponse, BundleServiceResponse, UpdateBundleRequest, UpdateBundleResponse, DeleteBundleResponse, PublicServicesAndBundlesResponse, CalendarSettingsRequest
 from core.validation import validate_contact_field
 from supabase import Client
@@ -18,6 +19,7 @@ from core.timezone_utils import (
 )
 from services.email.email_service import email_service
 from core.safe_errors import log_exception_if_dev
+from core.identity import identity_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -63,7 +65,7 @@ class CreativeController:
         """
         try:
             # Get user profile data (using authenticated client - respects RLS)
-            user_result = client.table('users').select('roles, profile_picture_url, avatar_source').eq('user_id', user_id).single().execute()
+            user_result = await run_query(client.table('users').select('roles, profile_picture_url, avatar_source').eq('user_id', user_id).single())
             if not user_result.data:
                 raise HTTPException(status_code=404, detail="User not found")
             
@@ -74,7 +76,7 @@ class CreativeController:
             if 'creative' not in user_roles:
                 user_roles.append('creative')
                 # Update user's roles in the database (using authenticated client - respects RLS)
-                update_result = client.table('users').update({'roles': user_roles}).eq('user_id', user_id).execute()
+                update_result = await run_query(client.table('users').update({'roles': user_roles}).eq('user_id', user_id))
                 if not update_result.data:
                     raise HTTPException(status_code=500, detail="Failed to update user roles")
             
@@ -115,9 +117,9 @@ class CreativeController:
             
             # Validate subscription_tier_id and get storage limit from subscription_tier
             # Using authenticated client - RLS allows authenticated users to read subscription_tiers
-            subscription_result = client.table('subscription_tiers').select(
+            subscription_result = await run_query(client.table('subscription_tiers').select(
                 'id, storage_amount_bytes, is_active'
-            ).eq('id', setup_request.subscription_tier_id).single().execute()
+            ).eq('id', setup_request.subscription_tier_id).single())
             
             if not subscription_result.data:
                 raise HTTPException(status_code=404, detail="Subscription tier not found")
@@ -138,13 +140,14 @@ class CreativeController:
             }
             
             # Insert or update creative profile (upsert) (using authenticated client - respects RLS)
-            result = client.table('creatives').upsert(creative_data).execute()
+            result = await run_query(client.table('creatives').upsert(creative_data))
             
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to create creative profile")
             
             # Mark setup as complete by setting first_login to False
-            user_update_result = client.table('users').update({'first_login': False}).eq('user_id', user_id).execute()
+            user_update_result = await run_query(client.table('users').update({'first_login': False}).eq('user_id', user_id))
+            identity_cache.invalidate(user_id)
             
             if not user_update_result.data:
                 raise HTTPException(status_code=500, detail="Failed to update user first_login status")
@@ -202,7 +205,7 @@ class CreativeController:
         try:
             
             # Query the creatives table
-            creative_result = client.table('creatives').select('*').eq('user_id', user_id).single().execute()
+            creative_result = await run_query(client.table('creatives').select('*').eq('user_id', user_id).single())
             
             if not creative_result.data:
                 raise HTTPException(status_code=404, detail="Creative profile not found")
@@ -213,9 +216,9 @@ class CreativeController:
             # subscription_tiers has RLS policy allowing authenticated users to read
             subscription_tier_id = profile_data.get('subscription_tier_id')
             if subscription_tier_id:
-                subscription_result = client.table('subscription_tiers').select(
+                subscription_result = await run_query(client.table('subscription_tiers').select(
                     'storage_amount_bytes, name'
-                ).eq('id', subscription_tier_id).single().execute()
+                ).eq('id', subscription_tier_id).single())
                 
                 if subscription_result.data:
                     tier_name = subscription_result.data.get('name', 'basic')
@@ -249,9 +252,9 @@ class CreativeController:
         
         try:
             # Get creative_client_relationships for this creative
-            relationships_result = client.table('creative_client_relationships').select(
+            relationships_result = await run_query(client.table('creative_client_relationships').select(
                 'id, status, total_spent, projects_count, client_user_id'
-            ).eq('creative_user_id', user_id).order('updated_at', desc=True).execute()
+            ).eq('creative_user_id', user_id).order('updated_at', desc=True))
             
             if not relationships_result.data:
                 return CreativeClientsListResponse(clients=[], total_count=0)
@@ -259,13 +262,13 @@ class CreativeController:
             client_user_ids = [rel['client_user_id'] for rel in relationships_result.data]
             
             # Batch fetch client and user data to avoid N+1 queries
-            clients_result = client.table('clients').select(
+            clients_result = await run_query(client.table('clients').select(
                 'user_id, display_name, email'
-            ).in_('user_id', client_user_ids).execute()
+            ).in_('user_id', client_user_ids))
             
-            users_result = client.table('users').select(
+            users_result = await run_query(client.table('users').select(
                 'user_id, name, profile_picture_url'
-            ).in_('user_id', client_user_ids).execute()
+            ).in_('user_id', client_user_ids))
             
             # Create lookup maps
             client_data_map = {c['user_id']: c for c in clients_result.data}
@@ -322,9 +325,9 @@ class CreativeController:
         """Get all services associated with the creative"""
         try:
             # Query the creative_services table for this creative user
-            result = db_admin.table('creative_services').select(
+            result = await run_query(db_admin.table('creative_services').select(
                 'id, title, description, price, delivery_time, status, color, is_active, created_at, updated_at, requires_booking'
-            ).eq('creative_user_id', user_id).eq('is_active', True).order('created_at', desc=True).execute()
+            ).eq('creative_user_id', user_id).eq('is_active', True).order('created_at', desc=True))
             
             if not result.data:
                 return CreativeServicesListResponse(services=[], total_count=0)
@@ -372,7 +375,7 @@ class CreativeController:
         
         try:
             # Validate that the user has a creative profile (using authenticated client - respects RLS)
-            creative_result = client.table('creatives').select('user_id').eq('user_id', user_id).single().execute()
+            creative_result = await run_query(client.table('creatives').select('user_id').eq('user_id', user_id).single())
             if not creative_result.data:
                 raise HTTPException(status_code=404, detail="Creative profile not found. Please complete your creative setup first.")
             
@@ -405,7 +408,7 @@ class CreativeController:
             }
             
             # Insert the service (using authenticated client - respects RLS)
-            result = client.table('creative_services').insert(service_data).execute()
+            result = await run_query(client.table('creative_services').insert(service_data))
             
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to create service")
@@ -470,7 +473,7 @@ class CreativeController:
                     calendar_settings = None
             
             # Validate that the user has a creative profile (using authenticated client - respects RLS)
-            creative_result = client.table('creatives').select('user_id').eq('user_id', user_id).single().execute()
+            creative_result = await run_query(client.table('creatives').select('user_id').eq('user_id', user_id).single())
             if not creative_result.data:
                 raise HTTPException(status_code=404, detail="Creative profile not found. Please complete your creative setup first.")
             
@@ -503,7 +506,7 @@ class CreativeController:
             }
             
             # Insert the service (using authenticated client - respects RLS)
-            result = client.table('creative_services').insert(service_data).execute()
+            result = await run_query(client.table('creative_services').insert(service_data))
             
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to create service")
@@ -543,7 +546,7 @@ class CreativeController:
                 print(f"DEBUG: Request headers: {dict(request.headers)}")
             
             # First, delete existing calendar settings for this service
-            db_admin.table('calendar_settings').delete().eq('service_id', service_id).execute()
+            await run_query(db_admin.table('calendar_settings').delete().eq('service_id', service_id))
             
             # Insert new calendar settings
             calendar_data = {
@@ -560,7 +563,7 @@ class CreativeController:
                 'is_active': True
             }
             
-            calendar_result = db_admin.table('calendar_settings').insert(calendar_data).execute()
+            calendar_result = await run_query(db_admin.table('calendar_settings').insert(calendar_data))
             if not calendar_result.data:
                 raise HTTPException(status_code=500, detail="Failed to save calendar settings")
             
@@ -576,7 +579,7 @@ class CreativeController:
                         'is_enabled': day_schedule.enabled
                     }
                     
-                    weekly_result = db_admin.table('weekly_schedule').insert(weekly_data).execute()
+                    weekly_result = await run_query(db_admin.table('weekly_schedule').insert(weekly_data))
                     if not weekly_result.data:
                         continue  # Skip this day if insertion fails
                     
@@ -614,7 +617,7 @@ class CreativeController:
                                 print(f"WARNING: Skipping invalid time block: start={start_time_str}, end={end_time_str} (end_time must be > start_time)")
                         
                         if time_blocks_data:
-                            db_admin.table('time_blocks').insert(time_blocks_data).execute()
+                            await run_query(db_admin.table('time_blocks').insert(time_blocks_data))
                     
                     # Save time slots (always use time slot mode, convert to UTC)
                     if day_schedule.time_slots:
@@ -632,7 +635,7 @@ class CreativeController:
                             })
                         
                         if time_slots_data:
-                            db_admin.table('time_slots').insert(time_slots_data).execute()
+                            await run_query(db_admin.table('time_slots').insert(time_slots_data))
             
         except Exception as e:
             log_exception_if_dev(logger, "Failed to save calendar settings", e)
@@ -659,7 +662,7 @@ class CreativeController:
                     })
                 
                 if photos_data:
-                    db_admin.table('service_photos').insert(photos_data).execute()
+                    await run_query(db_admin.table('service_photos').insert(photos_data))
             
         except Exception as e:
             log_exception_if_dev(logger, "Failed to save service photos", e)
@@ -675,16 +678,8 @@ class CreativeController:
             # Upload photos to Supabase Storage and save metadata
             if photo_files:
                 import asyncio
-                from supabase import create_client, Client
-                import os
-                
-                supabase_url = os.getenv("SUPABASE_URL")
-                supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-                
-                if not supabase_url or not supabase_key:
-                    raise HTTPException(status_code=500, detail="Storage configuration missing")
-                
-                supabase: Client = create_client(supabase_url, supabase_key)
+                # Reuse the shared service-role client and its keep-alive connections
+                supabase: Client = db_admin
                 
                 async def upload_single_photo(photo_file, index):
                     """Upload a single photo and return metadata"""
@@ -698,7 +693,8 @@ class CreativeController:
                         filename = f"service-photos/{service_id}/{index}_{photo_file.filename}"
                         
                         # Upload file to storage
-                        result = supabase.storage.from_("creative-assets").upload(
+                        result = await run_blocking(
+                            supabase.storage.from_("creative-assets").upload,
                             filename, 
                             file_content,
                             file_options={
@@ -740,7 +736,7 @@ class CreativeController:
                 
                 # Batch insert all photo metadata
                 if photos_data:
-                    db_admin.table('service_photos').insert(photos_data).execute()
+                    await run_query(db_admin.table('service_photos').insert(photos_data))
             
         except Exception as e:
             log_exception_if_dev(logger, "Failed to save service photos", e)
@@ -757,9 +753,9 @@ class CreativeController:
         """
         try:
             # Get all current photos for this service
-            current_photos_result = db_admin.table('service_photos').select(
+            current_photos_result = await run_query(db_admin.table('service_photos').select(
                 'id, photo_url, photo_filename, photo_size_bytes, is_primary, display_order'
-            ).eq('service_id', service_id).order('display_order', desc=False).execute()
+            ).eq('service_id', service_id).order('display_order', desc=False))
             
             current_photos = current_photos_result.data or []
             
@@ -810,28 +806,20 @@ class CreativeController:
                 # Delete files from storage
                 if files_to_delete:
                     try:
-                        db_admin.storage.from_("creative-assets").remove(files_to_delete)
+                        await run_blocking(db_admin.storage.from_("creative-assets").remove, files_to_delete)
                     except Exception as e:
                         log_exception_if_dev(logger, "Failed to delete photos from storage", e)
                 
                 # Delete photo records from database
                 if photo_ids_to_delete:
-                    db_admin.table('service_photos').delete().in_('id', photo_ids_to_delete).execute()
+                    await run_query(db_admin.table('service_photos').delete().in_('id', photo_ids_to_delete))
             
             # Upload new photos and get their metadata
             new_photos_metadata = []
             if new_photo_files:
                 import asyncio
-                from supabase import create_client, Client
-                import os
-                
-                supabase_url = os.getenv("SUPABASE_URL")
-                supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-                
-                if not supabase_url or not supabase_key:
-                    raise HTTPException(status_code=500, detail="Storage configuration missing")
-                
-                supabase: Client = create_client(supabase_url, supabase_key)
+                # Reuse the shared service-role client and its keep-alive connections
+                supabase: Client = db_admin
                 
                 async def upload_single_photo(photo_file, index):
                     """Upload a single photo and return metadata"""
@@ -845,7 +833,8 @@ class CreativeController:
                         filename = f"service-photos/{service_id}/{index}_{photo_file.filename}"
                         
                         # Upload file to storage
-                        result = supabase.storage.from_("creative-assets").upload(
+                        result = await run_blocking(
+                            supabase.storage.from_("creative-assets").upload,
                             filename, 
                             file_content,
                             file_options={
@@ -908,14 +897,14 @@ class CreativeController:
             # Update display order and is_primary for kept photos
             if all_photos:
                 for photo_update in all_photos:
-                    db_admin.table('service_photos').update({
+                    await run_query(db_admin.table('service_photos').update({
                         'display_order': photo_update['display_order'],
                         'is_primary': photo_update['is_primary']
-                    }).eq('id', photo_update['id']).execute()
+                    }).eq('id', photo_update['id']))
             
             # Insert new photos
             if new_photos_to_insert:
-                db_admin.table('service_photos').insert(new_photos_to_insert).execute()
+                await run_query(db_admin.table('service_photos').insert(new_photos_to_insert))
             
         except Exception as e:
             log_exception_if_dev(logger, "Failed to update service photos", e)
@@ -926,7 +915,7 @@ class CreativeController:
         """Delete all photos associated with a service from storage and database"""
         try:
             # Get all photos for this service BEFORE deleting from database
-            photos_result = db_admin.table('service_photos').select('photo_url, photo_filename').eq('service_id', service_id).execute()
+            photos_result = await run_query(db_admin.table('service_photos').select('photo_url, photo_filename').eq('service_id', service_id))
             
             print(f"Found {len(photos_result.data) if photos_result.data else 0} photos to delete for service {service_id}")
             
@@ -967,14 +956,14 @@ class CreativeController:
                     
                     # First, let's try to list files in the bucket to see what's there
                     try:
-                        list_result = db_admin.storage.from_("creative-assets").list()
+                        list_result = await run_blocking(db_admin.storage.from_("creative-assets").list)
                         print(f"Files in bucket before deletion: {list_result}")
                     except Exception as e:
                         print(f"Failed to list files in bucket: {e}")
                     
                     try:
                         # Try to delete files from storage
-                        result = db_admin.storage.from_("creative-assets").remove(files_to_delete)
+                        result = await run_blocking(db_admin.storage.from_("creative-assets").remove, files_to_delete)
                         print(f"Storage deletion result: {result}")
                         print(f"Storage deletion result type: {type(result)}")
                         print(f"Storage deletion result dir: {dir(result)}")
@@ -995,7 +984,7 @@ class CreativeController:
                         
                         # List files again to see if they were actually deleted
                         try:
-                            list_result_after = db_admin.storage.from_("creative-assets").list()
+                            list_result_after = await run_blocking(db_admin.storage.from_("creative-assets").list)
                             print(f"Files in bucket after deletion: {list_result_after}")
                         except Exception as e:
                             print(f"Failed to list files after deletion: {e}")
@@ -1017,7 +1006,7 @@ class CreativeController:
                 
                 # Delete photo records from database AFTER storage cleanup
                 print(f"Deleting photo records from database for service {service_id}")
-                db_admin.table('service_photos').delete().eq('service_id', service_id).execute()
+                await run_query(db_admin.table('service_photos').delete().eq('service_id', service_id))
                 print(f"Successfully deleted photo records from database")
             
         except Exception as e:
@@ -1038,9 +1027,9 @@ class CreativeController:
         
         try:
             # Verify service exists and belongs to user (using authenticated client - respects RLS)
-            service_result = client.table('creative_services').select(
+            service_result = await run_query(client.table('creative_services').select(
                 'id, creative_user_id, is_active'
-            ).eq('id', service_id).single().execute()
+            ).eq('id', service_id).single())
             
             if not service_result.data:
                 raise HTTPException(status_code=404, detail="Service not found")
@@ -1052,9 +1041,9 @@ class CreativeController:
                 raise HTTPException(status_code=400, detail="Cannot access calendar settings for deleted service")
             
             # OPTIMIZED: Use nested selects to fetch all related data in fewer queries
-            calendar_result = client.table('calendar_settings').select(
+            calendar_result = await run_query(client.table('calendar_settings').select(
                 '*, weekly_schedule(id, day_of_week, is_enabled, time_blocks(start_time, end_time), time_slots(slot_time, is_enabled))'
-            ).eq('service_id', service_id).eq('is_active', True).limit(1).execute()
+            ).eq('service_id', service_id).eq('is_active', True).limit(1))
             
             if not calendar_result.data:
                 return None  # No calendar settings configured
@@ -1127,9 +1116,9 @@ class CreativeController:
         
         try:
             # First, verify the service exists and belongs to the user (using authenticated client - respects RLS)
-            service_result = client.table('creative_services').select(
+            service_result = await run_query(client.table('creative_services').select(
                 'id, creative_user_id, is_active, title'
-            ).eq('id', service_id).single().execute()
+            ).eq('id', service_id).single())
             
             if not service_result.data:
                 raise HTTPException(status_code=404, detail="Service not found")
@@ -1145,19 +1134,19 @@ class CreativeController:
                 raise HTTPException(status_code=400, detail="Service is already deleted")
             
             # Soft delete by setting is_active to False and updating timestamp (using authenticated client - respects RLS)
-            result = client.table('creative_services').update({
+            result = await run_query(client.table('creative_services').update({
                 'is_active': False,
                 'updated_at': 'now()'
-            }).eq('id', service_id).execute()
+            }).eq('id', service_id))
             
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to delete service")
             
             # Also deactivate calendar settings for this service (using authenticated client - respects RLS)
-            client.table('calendar_settings').update({
+            await run_query(client.table('calendar_settings').update({
                 'is_active': False,
                 'updated_at': 'now()'
-            }).eq('service_id', service_id).execute()
+            }).eq('service_id', service_id))
             
             # Delete associated photos from storage and database
             await CreativeController._delete_service_photos(service_id)
@@ -1190,9 +1179,9 @@ class CreativeController:
         
         try:
             # Verify the service exists and belongs to the user (using authenticated client - respects RLS)
-            service_result = client.table('creative_services').select(
+            service_result = await run_query(client.table('creative_services').select(
                 'id, creative_user_id, is_active'
-            ).eq('id', service_id).single().execute()
+            ).eq('id', service_id).single())
 
             if not service_result.data:
                 raise HTTPException(status_code=404, detail="Service not found")
@@ -1228,7 +1217,7 @@ class CreativeController:
             }
 
             # Update the service (using authenticated client - respects RLS)
-            result = client.table('creative_services').update(update_data).eq('id', service_id).execute()
+            result = await run_query(client.table('creative_services').update(update_data).eq('id', service_id))
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to update service")
 
@@ -1270,9 +1259,9 @@ class CreativeController:
         
         try:
             # Verify the service exists and belongs to the user (using authenticated client - respects RLS)
-            service_result = client.table('creative_services').select(
+            service_result = await run_query(client.table('creative_services').select(
                 'id, creative_user_id, is_active'
-            ).eq('id', service_id).single().execute()
+            ).eq('id', service_id).single())
 
             if not service_result.data:
                 raise HTTPException(status_code=404, detail="Service not found")
@@ -1308,7 +1297,7 @@ class CreativeController:
                 'requires_booking': calendar_settings is not None,
             }
 
-            result = client.table('creative_services').update(update_data).eq('id', service_id).execute()
+            result = await run_query(client.table('creative_services').update(update_data).eq('id', service_id))
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to update service")
 
@@ -1372,7 +1361,7 @@ class CreativeController:
                 
                 # Check services (using authenticated client - respects RLS)
                 try:
-                    service_result = client.table('creative_services').select('id').eq('id', settings_request.primary_service_id).eq('creative_user_id', user_id).eq('is_active', True).execute()
+                    service_result = await run_query(client.table('creative_services').select('id').eq('id', settings_request.primary_service_id).eq('creative_user_id', user_id).eq('is_active', True))
                     service_exists = service_result.data and len(service_result.data) > 0
                 except Exception as e:
                     log_exception_if_dev(logger, "Service validation error", e)
@@ -1380,7 +1369,7 @@ class CreativeController:
 
                 # Check bundles (using authenticated client - respects RLS)
                 try:
-                    bundle_result = client.table('creative_bundles').select('id').eq('id', settings_request.primary_service_id).eq('creative_user_id', user_id).eq('is_active', True).execute()
+                    bundle_result = await run_query(client.table('creative_bundles').select('id').eq('id', settings_request.primary_service_id).eq('creative_user_id', user_id).eq('is_active', True))
                     bundle_exists = bundle_result.data and len(bundle_result.data) > 0
                 except Exception as e:
                     log_exception_if_dev(logger, "Bundle validation error", e)
@@ -1396,7 +1385,7 @@ class CreativeController:
                 
                 # Check services (using authenticated client - respects RLS)
                 try:
-                    service_result = client.table('creative_services').select('id').eq('id', settings_request.secondary_service_id).eq('creative_user_id', user_id).eq('is_active', True).execute()
+                    service_result = await run_query(client.table('creative_services').select('id').eq('id', settings_request.secondary_service_id).eq('creative_user_id', user_id).eq('is_active', True))
                     service_exists = service_result.data and len(service_result.data) > 0
                 except Exception as e:
                     log_exception_if_dev(logger, "Service validation error", e)
@@ -1404,7 +1393,7 @@ class CreativeController:
 
                 # Check bundles (using authenticated client - respects RLS)
                 try:
-                    bundle_result = client.table('creative_bundles').select('id').eq('id', settings_request.secondary_service_id).eq('creative_user_id', user_id).eq('is_active', True).execute()
+                    bundle_result = await run_query(client.table('creative_bundles').select('id').eq('id', settings_request.secondary_service_id).eq('creative_user_id', user_id).eq('is_active', True))
                     bundle_exists = bundle_result.data and len(bundle_result.data) > 0
                 except Exception as e:
                     log_exception_if_dev(logger, "Bundle validation error", e)
@@ -1470,7 +1459,7 @@ class CreativeController:
             
             # Check if creative profile exists, if not create it (using authenticated client - respects RLS)
             try:
-                existing_profile = client.table('creatives').select('user_id').eq('user_id', user_id).execute()
+                existing_profile = await run_query(client.table('creatives').select('user_id').eq('user_id', user_id))
                 profile_exists = existing_profile.data and len(existing_profile.data) > 0
             except:
                 profile_exists = False
@@ -1482,7 +1471,7 @@ class CreativeController:
                     **update_data
                 }
                 try:
-                    result = client.table('creatives').insert(create_data).execute()
+                    result = await run_query(client.table('creatives').insert(create_data))
                     if not result.data:
                         raise HTTPException(status_code=500, detail="Failed to create creative profile")
                 except Exception as e:
@@ -1491,12 +1480,13 @@ class CreativeController:
             else:
                 # Update existing creative profile (using authenticated client - respects RLS)
                 try:
-                    result = client.table('creatives').update(update_data).eq('user_id', user_id).execute()
+                    result = await run_query(client.table('creatives').update(update_data).eq('user_id', user_id))
                     if not result.data:
                         raise HTTPException(status_code=404, detail="Creative profile not found")
                 except Exception as e:
                     log_exception_if_dev(logger, "Failed to update creative profile", e)
                     raise HTTPException(status_code=500, detail="Failed to update creative profile")
+            identity_cache.invalidate(user_id)
 
             return CreativeProfileSettingsResponse(
                 success=True,
@@ -1534,7 +1524,7 @@ class CreativeController:
                 raise HTTPException(status_code=400, detail="File size must be less than 5MB")
             
             # Get current profile to find old photo URL (using authenticated client - respects RLS)
-            current_profile = client.table('creatives').select('profile_banner_url').eq('user_id', user_id).single().execute()
+            current_profile = await run_query(client.table('creatives').select('profile_banner_url').eq('user_id', user_id).single())
             old_photo_url = None
             if current_profile.data and current_profile.data.get('profile_banner_url'):
                 old_photo_url = current_profile.data['profile_banner_url']
@@ -1549,7 +1539,8 @@ class CreativeController:
             
             # Upload the new file
             try:
-                upload_result = db_admin.storage.from_(bucket_name).upload(
+                upload_result = await run_blocking(
+                    db_admin.storage.from_(bucket_name).upload,
                     path=file_path,
                     file=content,
                     file_options={"content-type": file.content_type}
@@ -1562,10 +1553,10 @@ class CreativeController:
             public_url = db_admin.storage.from_(bucket_name).get_public_url(file_path)
             
             # Update the creative profile with the new photo URL (using authenticated client - respects RLS)
-            update_result = client.table('creatives').update({
+            update_result = await run_query(client.table('creatives').update({
                 'profile_banner_url': public_url,
                 'profile_source': 'custom'
-            }).eq('user_id', user_id).execute()
+            }).eq('user_id', user_id))
             
             if not update_result.data:
                 raise HTTPException(status_code=500, detail="Failed to update profile with new photo URL")
@@ -1583,7 +1574,7 @@ class CreativeController:
                     if old_file_path.startswith('creatives/'):
                         # Only delete files from our creatives folder for safety
                         try:
-                            db_admin.storage.from_(bucket_name).remove([old_file_path])
+                            await run_blocking(db_admin.storage.from_(bucket_name).remove, [old_file_path])
                         except Exception as delete_error:
                             # Don't fail the upload if deletion fails, just log it
                             log_exception_if_dev(logger, "Failed to delete old profile photo", delete_error)
@@ -1617,7 +1608,7 @@ class CreativeController:
         
         try:
             # Validate that the user has a creative profile (using authenticated client - respects RLS)
-            creative_result = client.table('creatives').select('user_id').eq('user_id', user_id).single().execute()
+            creative_result = await run_query(client.table('creatives').select('user_id').eq('user_id', user_id).single())
             if not creative_result.data:
                 raise HTTPException(status_code=404, detail="Creative profile not found. Please complete your creative setup first.")
             
@@ -1626,9 +1617,9 @@ class CreativeController:
                 raise HTTPException(status_code=422, detail="Bundle must contain at least 2 services")
             
             # Check that all services exist and belong to the user (using authenticated client - respects RLS)
-            services_result = client.table('creative_services').select(
+            services_result = await run_query(client.table('creative_services').select(
                 'id, title, price, status'
-            ).eq('creative_user_id', user_id).eq('is_active', True).in_('id', bundle_request.service_ids).execute()
+            ).eq('creative_user_id', user_id).eq('is_active', True).in_('id', bundle_request.service_ids))
             
             if not services_result.data or len(services_result.data) != len(bundle_request.service_ids):
                 raise HTTPException(status_code=422, detail="One or more services not found or don't belong to you")
@@ -1666,7 +1657,7 @@ class CreativeController:
             }
             
             # Insert the bundle (using authenticated client - respects RLS)
-            bundle_result = client.table('creative_bundles').insert(bundle_data).execute()
+            bundle_result = await run_query(client.table('creative_bundles').insert(bundle_data))
             
             if not bundle_result.data:
                 raise HTTPException(status_code=500, detail="Failed to create bundle")
@@ -1679,11 +1670,11 @@ class CreativeController:
                 for service_id in bundle_request.service_ids
             ]
             
-            bundle_services_result = client.table('bundle_services').insert(bundle_services_data).execute()
+            bundle_services_result = await run_query(client.table('bundle_services').insert(bundle_services_data))
             
             if not bundle_services_result.data:
                 # If bundle services insertion fails, clean up the bundle (using authenticated client - respects RLS)
-                client.table('creative_bundles').delete().eq('id', bundle_id).execute()
+                await run_query(client.table('creative_bundles').delete().eq('id', bundle_id))
                 raise HTTPException(status_code=500, detail="Failed to associate services with bundle")
             
             return CreateBundleResponse(
@@ -1703,9 +1694,9 @@ class CreativeController:
         """Get all bundles associated with the creative - optimized with batch queries"""
         try:
             # Query the creative_bundles table for this creative user
-            bundles_result = db_admin.table('creative_bundles').select(
+            bundles_result = await run_query(db_admin.table('creative_bundles').select(
                 'id, title, description, color, status, pricing_option, fixed_price, discount_percentage, is_active, created_at, updated_at'
-            ).eq('creative_user_id', user_id).eq('is_active', True).order('created_at', desc=True).execute()
+            ).eq('creative_user_id', user_id).eq('is_active', True).order('created_at', desc=True))
             
             if not bundles_result.data:
                 return CreativeBundlesListResponse(bundles=[], total_count=0)
@@ -1713,9 +1704,9 @@ class CreativeController:
             bundle_ids = [bundle['id'] for bundle in bundles_result.data]
             
             # Batch fetch all bundle services to avoid N+1 queries
-            bundle_services_result = db_admin.table('bundle_services').select(
+            bundle_services_result = await run_query(db_admin.table('bundle_services').select(
                 'bundle_id, service_id'
-            ).in_('bundle_id', bundle_ids).execute()
+            ).in_('bundle_id', bundle_ids))
             
             # Group service IDs by bundle ID
             bundle_service_map = {}
@@ -1729,17 +1720,17 @@ class CreativeController:
                 all_service_ids.add(service_id)
             
             # Batch fetch all service details
-            services_result = db_admin.table('creative_services').select(
+            services_result = await run_query(db_admin.table('creative_services').select(
                 'id, title, description, price, delivery_time, status, color'
-            ).in_('id', list(all_service_ids)).execute()
+            ).in_('id', list(all_service_ids)))
             
             # Create service lookup map
             service_data_map = {s['id']: s for s in services_result.data}
             
             # Fetch photos for all bundle services
-            bundle_photos_result = db_admin.table('service_photos').select(
+            bundle_photos_result = await run_query(db_admin.table('service_photos').select(
                 'service_id, photo_url, photo_filename, photo_size_bytes, is_primary, display_order'
-            ).in_('service_id', list(all_service_ids)).order('service_id').order('display_order', desc=False).execute()
+            ).in_('service_id', list(all_service_ids)).order('service_id').order('display_order', desc=False))
             
             # Group photos by service_id
             bundle_photos_by_service = {}
@@ -1845,7 +1836,7 @@ class CreativeController:
             if public_only:
                 services_query = services_query.eq('status', 'Public')
             
-            services_result = services_query.order('created_at', desc=True).execute()
+            services_result = await run_query(services_query.order('created_at', desc=True))
             
             services = []
             if services_result.data:
@@ -1853,9 +1844,9 @@ class CreativeController:
                 service_ids = [service['id'] for service in services_result.data]
                 
                 # Get photos for all services
-                photos_result = client.table('service_photos').select(
+                photos_result = await run_query(client.table('service_photos').select(
                     'service_id, photo_url, photo_filename, photo_size_bytes, is_primary, display_order'
-                ).in_('service_id', service_ids).order('service_id').order('display_order', desc=False).execute()
+                ).in_('service_id', service_ids).order('service_id').order('display_order', desc=False))
                 
                 # Group photos by service_id
                 photos_by_service = {}
@@ -1899,27 +1890,27 @@ class CreativeController:
             if public_only:
                 bundles_query = bundles_query.eq('status', 'Public')
             
-            bundles_result = bundles_query.order('created_at', desc=True).execute()
+            bundles_result = await run_query(bundles_query.order('created_at', desc=True))
             
             bundles = []
             if bundles_result.data:
                 for bundle_data in bundles_result.data:
                     # Get services for this bundle
-                    bundle_services_result = client.table('bundle_services').select(
+                    bundle_services_result = await run_query(client.table('bundle_services').select(
                         'service_id'
-                    ).eq('bundle_id', bundle_data['id']).execute()
+                    ).eq('bundle_id', bundle_data['id']))
                     
                     service_ids = [bs['service_id'] for bs in bundle_services_result.data] if bundle_services_result.data else []
                     
                     # Get service details
-                    services_result = client.table('creative_services').select(
+                    services_result = await run_query(client.table('creative_services').select(
                         'id, title, description, price, delivery_time, status, color'
-                    ).in_('id', service_ids).execute()
+                    ).in_('id', service_ids))
                     
                     # Fetch photos for bundle services
-                    bundle_photos_result = client.table('service_photos').select(
+                    bundle_photos_result = await run_query(client.table('service_photos').select(
                         'service_id, photo_url, photo_filename, photo_size_bytes, is_primary, display_order'
-                    ).in_('service_id', service_ids).order('service_id').order('display_order', desc=False).execute()
+                    ).in_('service_id', service_ids).order('service_id').order('display_order', desc=False))
                     
                     # Group photos by service_id
                     bundle_photos_by_service = {}
@@ -2007,9 +1998,9 @@ class CreativeController:
         
         try:
             # Verify the bundle exists and belongs to the user (using authenticated client - respects RLS)
-            bundle_result = client.table('creative_bundles').select(
+            bundle_result = await run_query(client.table('creative_bundles').select(
                 'id, creative_user_id, is_active'
-            ).eq('id', bundle_id).single().execute()
+            ).eq('id', bundle_id).single())
 
             if not bundle_result.data:
                 raise HTTPException(status_code=404, detail="Bundle not found")
@@ -2050,9 +2041,9 @@ class CreativeController:
                     raise HTTPException(status_code=422, detail="Bundle must contain at least 2 services")
 
                 # Check that all services exist and belong to the user (using authenticated client - respects RLS)
-                services_result = client.table('creative_services').select(
+                services_result = await run_query(client.table('creative_services').select(
                     'id, title, price, status'
-                ).eq('creative_user_id', user_id).eq('is_active', True).in_('id', bundle_request.service_ids).execute()
+                ).eq('creative_user_id', user_id).eq('is_active', True).in_('id', bundle_request.service_ids))
 
                 if not services_result.data or len(services_result.data) != len(bundle_request.service_ids):
                     raise HTTPException(status_code=422, detail="One or more services not found or don't belong to you")
@@ -2065,14 +2056,14 @@ class CreativeController:
             # Update the bundle (using authenticated client - respects RLS)
             if update_data:
                 update_data['updated_at'] = 'now()'
-                result = client.table('creative_bundles').update(update_data).eq('id', bundle_id).execute()
+                result = await run_query(client.table('creative_bundles').update(update_data).eq('id', bundle_id))
                 if not result.data:
                     raise HTTPException(status_code=500, detail="Failed to update bundle")
 
             # Update bundle-service relationships if service_ids are provided (using authenticated client - respects RLS)
             if bundle_request.service_ids is not None:
                 # Delete existing bundle-service relationships
-                client.table('bundle_services').delete().eq('bundle_id', bundle_id).execute()
+                await run_query(client.table('bundle_services').delete().eq('bundle_id', bundle_id))
 
                 # Insert new bundle-service relationships
                 bundle_services_data = [
@@ -2080,7 +2071,7 @@ class CreativeController:
                     for service_id in bundle_request.service_ids
                 ]
 
-                bundle_services_result = client.table('bundle_services').insert(bundle_services_data).execute()
+                bundle_services_result = await run_query(client.table('bundle_services').insert(bundle_services_data))
 
                 if not bundle_services_result.data:
                     raise HTTPException(status_code=500, detail="Failed to update bundle services")
@@ -2107,9 +2098,9 @@ class CreativeController:
         
         try:
             # First, verify the bundle exists and belongs to the user (using authenticated client - respects RLS)
-            bundle_result = client.table('creative_bundles').select(
+            bundle_result = await run_query(client.table('creative_bundles').select(
                 'id, creative_user_id, is_active, title'
-            ).eq('id', bundle_id).single().execute()
+            ).eq('id', bundle_id).single())
             
             if not bundle_result.data:
                 raise HTTPException(status_code=404, detail="Bundle not found")
@@ -2125,10 +2116,10 @@ class CreativeController:
                 raise HTTPException(status_code=400, detail="Bundle is already deleted")
             
             # Soft delete by setting is_active to False and updating timestamp (using authenticated client - respects RLS)
-            result = client.table('creative_bundles').update({
+            result = await run_query(client.table('creative_bundles').update({
                 'is_active': False,
                 'updated_at': 'now()'
-            }).eq('id', bundle_id).execute()
+            }).eq('id', bundle_id))
             
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to delete bundle")
@@ -2167,7 +2158,7 @@ class CreativeController:
         
         try:
             # First verify the creative profile exists
-            creative_result = client.table('creatives').select('*').eq('user_id', user_id).single().execute()
+            creative_result = await run_query(client.table('creatives').select('*').eq('user_id', user_id).single())
             
             if not creative_result.data:
                 raise HTTPException(status_code=404, detail="Creative profile not found")
@@ -2188,12 +2179,12 @@ class CreativeController:
             
             # 1a. Delete service photos from storage (creative-assets bucket)
             import re
-            services_result = client.table('creative_services').select('id').eq('creative_user_id', user_id).execute()
+            services_result = await run_query(client.table('creative_services').select('id').eq('creative_user_id', user_id))
             if services_result.data:
                 for service in services_result.data:
                     service_id = service['id']
                     # Get all photos for this service with URLs
-                    photos_result = db_admin.table('service_photos').select('photo_url, photo_filename').eq('service_id', service_id).execute()
+                    photos_result = await run_query(db_admin.table('service_photos').select('photo_url, photo_filename').eq('service_id', service_id))
                     
                     if photos_result.data:
                         files_to_delete = []
@@ -2219,7 +2210,7 @@ class CreativeController:
                         if files_to_delete:
                             try:
                                 print(f"Deleting {len(files_to_delete)} service photos from storage")
-                                db_admin.storage.from_('creative-assets').remove(files_to_delete)
+                                await run_blocking(db_admin.storage.from_('creative-assets').remove, files_to_delete)
                                 deleted_items["service_photos"] += len(files_to_delete)
                             except Exception as e:
                                 log_exception_if_dev(logger, "Failed to delete service photos", e)
@@ -2230,7 +2221,7 @@ class CreativeController:
                 files_to_delete = []
                 
                 # Get creative profile to find profile photo URL
-                profile_result = client.table('creatives').select('profile_banner_url').eq('user_id', user_id).single().execute()
+                profile_result = await run_query(client.table('creatives').select('profile_banner_url').eq('user_id', user_id).single())
                 
                 if profile_result.data and profile_result.data.get('profile_banner_url'):
                     photo_url = profile_result.data['profile_banner_url']
@@ -2251,7 +2242,7 @@ class CreativeController:
                 # List and delete all files in creatives folder for this user
                 try:
                     # List all files in creatives folder (files are stored as creatives/{user_id}_{uuid}.ext)
-                    list_result = db_admin.storage.from_(bucket_name).list('creatives')
+                    list_result = await run_blocking(db_admin.storage.from_(bucket_name).list, 'creatives')
                     if list_result:
                         user_prefix = f"{user_id}_"
                         for file in list_result:
@@ -2263,7 +2254,7 @@ class CreativeController:
                     
                     # Also check if there's a subdirectory creatives/{user_id}/ (in case files are stored there)
                     try:
-                        user_dir_result = db_admin.storage.from_(bucket_name).list(f'creatives/{user_id}')
+                        user_dir_result = await run_blocking(db_admin.storage.from_(bucket_name).list, f'creatives/{user_id}')
                         if user_dir_result:
                             for file in user_dir_result:
                                 file_path = f"creatives/{user_id}/{file['name']}"
@@ -2279,7 +2270,7 @@ class CreativeController:
                 # Delete all profile photos at once
                 if files_to_delete:
                     print(f"Deleting {len(files_to_delete)} profile photos from storage: {files_to_delete}")
-                    db_admin.storage.from_(bucket_name).remove(files_to_delete)
+                    await run_blocking(db_admin.storage.from_(bucket_name).remove, files_to_delete)
                     deleted_items["profile_photos"] = len(files_to_delete)
                 else:
                     print("No profile photos found to delete")
@@ -2291,20 +2282,20 @@ class CreativeController:
             # 2a. Delete all notifications related to this creative
             try:
                 # Delete notifications where creative is the recipient
-                recipient_notifications = db_admin.table('notifications').delete().eq('recipient_user_id', user_id).execute()
+                recipient_notifications = await run_query(db_admin.table('notifications').delete().eq('recipient_user_id', user_id))
                 recipient_count = len(recipient_notifications.data) if recipient_notifications.data else 0
                 
                 # Delete notifications where creative is the related user
-                related_notifications = db_admin.table('notifications').delete().eq('related_user_id', user_id).execute()
+                related_notifications = await run_query(db_admin.table('notifications').delete().eq('related_user_id', user_id))
                 related_count = len(related_notifications.data) if related_notifications.data else 0
                 
                 # Also delete notifications related to creative's bookings
-                bookings_ids_result = client.table('bookings').select('id').eq('creative_user_id', user_id).execute()
+                bookings_ids_result = await run_query(client.table('bookings').select('id').eq('creative_user_id', user_id))
                 booking_notification_count = 0
                 if bookings_ids_result.data:
                     booking_ids = [b['id'] for b in bookings_ids_result.data]
                     # Delete notifications for these bookings
-                    booking_notifications = db_admin.table('notifications').delete().in_('related_entity_id', booking_ids).execute()
+                    booking_notifications = await run_query(db_admin.table('notifications').delete().in_('related_entity_id', booking_ids))
                     booking_notification_count = len(booking_notifications.data) if booking_notifications.data else 0
                 
                 deleted_items["notifications"] = recipient_count + related_count + booking_notification_count
@@ -2314,26 +2305,26 @@ class CreativeController:
             # 2b. Delete calendar-related data (time_slots, time_blocks, weekly_schedule, calendar_settings)
             try:
                 # Get calendar settings for all services
-                calendar_settings_result = client.table('calendar_settings').select('id').eq('creative_user_id', user_id).execute()
+                calendar_settings_result = await run_query(client.table('calendar_settings').select('id').eq('creative_user_id', user_id))
                 if calendar_settings_result.data:
                     calendar_setting_ids = [cs['id'] for cs in calendar_settings_result.data]
                     
                     # Get weekly schedules for these calendar settings
-                    weekly_schedules_result = client.table('weekly_schedule').select('id').in_('calendar_setting_id', calendar_setting_ids).execute()
+                    weekly_schedules_result = await run_query(client.table('weekly_schedule').select('id').in_('calendar_setting_id', calendar_setting_ids))
                     if weekly_schedules_result.data:
                         weekly_schedule_ids = [ws['id'] for ws in weekly_schedules_result.data]
                         
                         # Delete time_slots
-                        db_admin.table('time_slots').delete().in_('weekly_schedule_id', weekly_schedule_ids).execute()
+                        await run_query(db_admin.table('time_slots').delete().in_('weekly_schedule_id', weekly_schedule_ids))
                         
                         # Delete time_blocks
-                        db_admin.table('time_blocks').delete().in_('weekly_schedule_id', weekly_schedule_ids).execute()
+                        await run_query(db_admin.table('time_blocks').delete().in_('weekly_schedule_id', weekly_schedule_ids))
                         
                         # Delete weekly_schedule
-                        db_admin.table('weekly_schedule').delete().in_('id', weekly_schedule_ids).execute()
+                        await run_query(db_admin.table('weekly_schedule').delete().in_('id', weekly_schedule_ids))
                     
                     # Delete calendar_settings
-                    calendar_delete_result = db_admin.table('calendar_settings').delete().in_('id', calendar_setting_ids).execute()
+                    calendar_delete_result = await run_query(db_admin.table('calendar_settings').delete().in_('id', calendar_setting_ids))
                     if calendar_delete_result.data:
                         deleted_items["calendar_settings"] = len(calendar_delete_result.data)
             except Exception as e:
@@ -2341,7 +2332,7 @@ class CreativeController:
             
             # 2c. Delete bookings
             try:
-                bookings_delete_result = db_admin.table('bookings').delete().eq('creative_user_id', user_id).execute()
+                bookings_delete_result = await run_query(db_admin.table('bookings').delete().eq('creative_user_id', user_id))
                 if bookings_delete_result.data:
                     deleted_items["bookings"] = len(bookings_delete_result.data)
             except Exception as e:
@@ -2351,22 +2342,22 @@ class CreativeController:
             try:
                 if services_result.data:
                     service_ids = [s['id'] for s in services_result.data]
-                    db_admin.table('service_photos').delete().in_('service_id', service_ids).execute()
+                    await run_query(db_admin.table('service_photos').delete().in_('service_id', service_ids))
             except Exception as e:
                 log_exception_if_dev(logger, "Failed to delete service photos records", e)
             
             # 2e. Delete bundle_services (links between bundles and services)
             try:
-                bundles_result = client.table('creative_bundles').select('id').eq('creative_user_id', user_id).execute()
+                bundles_result = await run_query(client.table('creative_bundles').select('id').eq('creative_user_id', user_id))
                 if bundles_result.data:
                     bundle_ids = [b['id'] for b in bundles_result.data]
-                    db_admin.table('bundle_services').delete().in_('bundle_id', bundle_ids).execute()
+                    await run_query(db_admin.table('bundle_services').delete().in_('bundle_id', bundle_ids))
             except Exception as e:
                 print(f"Warning: Failed to delete bundle services: {str(e)}")
             
             # 2f. Delete bundles
             try:
-                bundles_delete_result = db_admin.table('creative_bundles').delete().eq('creative_user_id', user_id).execute()
+                bundles_delete_result = await run_query(db_admin.table('creative_bundles').delete().eq('creative_user_id', user_id))
                 if bundles_delete_result.data:
                     deleted_items["bundles"] = len(bundles_delete_result.data)
             except Exception as e:
@@ -2374,7 +2365,7 @@ class CreativeController:
             
             # 2g. Delete services
             try:
-                services_delete_result = db_admin.table('creative_services').delete().eq('creative_user_id', user_id).execute()
+                services_delete_result = await run_query(db_admin.table('creative_services').delete().eq('creative_user_id', user_id))
                 if services_delete_result.data:
                     deleted_items["services"] = len(services_delete_result.data)
             except Exception as e:
@@ -2382,7 +2373,7 @@ class CreativeController:
 
             # 2h. Delete creative-client relationships
             try:
-                relationships_delete_result = db_admin.table('creative_client_relationships').delete().eq('creative_user_id', user_id).execute()
+                relationships_delete_result = await run_query(db_admin.table('creative_client_relationships').delete().eq('creative_user_id', user_id))
                 if relationships_delete_result.data:
                     deleted_items["client_relationships"] = len(relationships_delete_result.data)
             except Exception as e:
@@ -2390,21 +2381,22 @@ class CreativeController:
             
             # 2i. Delete creative profile
             try:
-                db_admin.table('creatives').delete().eq('user_id', user_id).execute()
+                await run_query(db_admin.table('creatives').delete().eq('user_id', user_id))
             except Exception as e:
                 log_exception_if_dev(logger, "Failed to delete creative profile", e)
                 raise HTTPException(status_code=500, detail="Failed to delete creative profile")
             
             # ========== STEP 3: Update user roles to remove 'creative' ==========
             try:
-                user_result = db_admin.table('users').select('roles').eq('user_id', user_id).single().execute()
+                user_result = await run_query(db_admin.table('users').select('roles').eq('user_id', user_id).single())
                 if user_result.data:
                     current_roles = user_result.data.get('roles', [])
                     if 'creative' in current_roles:
                         updated_roles = [role for role in current_roles if role != 'creative']
-                        db_admin.table('users').update({'roles': updated_roles}).eq('user_id', user_id).execute()
+                        await run_query(db_admin.table('users').update({'roles': updated_roles}).eq('user_id', user_id))
             except Exception as e:
                 log_exception_if_dev(logger, "Failed to update user roles", e)
+            identity_cache.invalidate(user_id)
 
             return {
                 "success": True,
@@ -1,12 +1,12 @@
 """Photo management service for creative services and profiles"""
 from fastapi import HTTPException, UploadFile
 from db.db_session import db_admin
+from db.query_executor import run_query, run_blocking
 from supabase import Client
 from typing import List
 import re
 import uuid
 import asyncio
-import os
 
 
 class PhotoService:
@@ -17,9 +17,9 @@ class PhotoService:
         """Delete all photos associated with a service from storage and database"""
         try:
             # Get all photos for this service BEFORE deleting from database
-            photos_result = db_admin.table('service_photos').select(
+            photos_result = await run_query(db_admin.table('service_photos').select(
                 'photo_url, photo_filename'
-            ).eq('service_id', service_id).execute()
+            ).eq('service_id', service_id))
             
             print(f"Found {len(photos_result.data) if photos_result.data else 0} photos to delete for service {service_id}")
             
@@ -51,14 +51,14 @@ class PhotoService:
                 if files_to_delete:
                     print(f"Attempting to delete {len(files_to_delete)} files from storage: {files_to_delete}")
                     try:
-                        result = db_admin.storage.from_("creative-assets").remove(files_to_delete)
+                        result = await run_blocking(db_admin.storage.from_("creative-assets").remove, files_to_delete)
                         print(f"Storage deletion result: {result}")
                     except Exception as e:
                         print(f"Failed to delete photos from storage: {files_to_delete}, error: {str(e)}")
                 
                 # Delete photo records from database AFTER storage cleanup
                 print(f"Deleting photo records from database for service {service_id}")
-                db_admin.table('service_photos').delete().eq('service_id', service_id).execute()
+                await run_query(db_admin.table('service_photos').delete().eq('service_id', service_id))
                 print(f"Successfully deleted photo records from database")
             
         except Exception as e:
@@ -86,7 +86,7 @@ class PhotoService:
                     })
                 
                 if photos_data:
-                    db_admin.table('service_photos').insert(photos_data).execute()
+                    await run_query(db_admin.table('service_photos').insert(photos_data))
             
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to save service photos: {str(e)}")
@@ -100,14 +100,8 @@ class PhotoService:
             
             # Upload photos to Supabase Storage and save metadata
             if photo_files:
-                supabase_url = os.getenv("SUPABASE_URL")
-                supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-                
-                if not supabase_url or not supabase_key:
-                    raise HTTPException(status_code=500, detail="Storage configuration missing")
-                
-                from supabase import create_client, Client
-                supabase: Client = create_client(supabase_url, supabase_key)
+                # Reuse the shared service-role client and its keep-alive connections
+                supabase: Client = db_admin
                 
                 async def upload_single_photo(photo_file, index):
                     """Upload a single photo and return metadata"""
@@ -121,7 +115,8 @@ class PhotoService:
                         filename = f"service-photos/{service_id}/{index}_{photo_file.filename}"
                         
                         # Upload file to storage
-                        result = supabase.storage.from_("creative-assets").upload(
+                        result = await run_blocking(
+                            supabase.storage.from_("creative-assets").upload,
                             filename, 
                             file_content,
                             file_options={
@@ -163,7 +158,7 @@ class PhotoService:
                 
                 # Batch insert all photo metadata
                 if photos_data:
-                    db_admin.table('service_photos').insert(photos_data).execute()
+                    await run_query(db_admin.table('service_photos').insert(photos_data))
             
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to save service photos: {str(e)}")
@@ -183,9 +178,9 @@ class PhotoService:
         """
         try:
             # Get all current photos for this service
-            current_photos_result = db_admin.table('service_photos').select(
+            current_photos_result = await run_query(db_admin.table('service_photos').select(
                 'id, photo_url, photo_filename, photo_size_bytes, is_primary, display_order'
-            ).eq('service_id', service_id).order('display_order', desc=False).execute()
+            ).eq('service_id', service_id).order('display_order', desc=False))
             
             current_photos = current_photos_result.data or []
             
@@ -232,25 +227,19 @@ class PhotoService:
                 # Delete files from storage
                 if files_to_delete:
                     try:
-                        db_admin.storage.from_("creative-assets").remove(files_to_delete)
+                        await run_blocking(db_admin.storage.from_("creative-assets").remove, files_to_delete)
                     except Exception as e:
                         print(f"Failed to delete photos from storage: {str(e)}")
                 
                 # Delete photo records from database
                 if photo_ids_to_delete:
-                    db_admin.table('service_photos').delete().in_('id', photo_ids_to_delete).execute()
+                    await run_query(db_admin.table('service_photos').delete().in_('id', photo_ids_to_delete))
             
             # Upload new photos and get their metadata
             new_photos_metadata = []
             if new_photo_files:
-                supabase_url = os.getenv("SUPABASE_URL")
-                supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-                
-                if not supabase_url or not supabase_key:
-                    raise HTTPException(status_code=500, detail="Storage configuration missing")
-                
-                from supabase import create_client, Client
-                supabase: Client = create_client(supabase_url, supabase_key)
+                # Reuse the shared service-role client and its keep-alive connections
+                supabase: Client = db_admin
                 
                 async def upload_single_photo(photo_file, index):
                     """Upload a single photo and return metadata"""
@@ -264,7 +253,8 @@ class PhotoService:
                         filename = f"service-photos/{service_id}/{index}_{photo_file.filename}"
                         
                         # Upload file to storage
-                        result = supabase.storage.from_("creative-assets").upload(
+                        result = await run_blocking(
+                            supabase.storage.from_("creative-assets").upload,
                             filename, 
                             file_content,
                             file_options={
@@ -327,14 +317,14 @@ class PhotoService:
             # Update display order and is_primary for kept photos
             if all_photos:
                 for photo_update in all_photos:
-                    db_admin.table('service_photos').update({
+                    await run_query(db_admin.table('service_photos').update({
                         'display_order': photo_update['display_order'],
                         'is_primary': photo_update['is_primary']
-                    }).eq('id', photo_update['id']).execute()
+                    }).eq('id', photo_update['id']))
             
             # Insert new photos
             if new_photos_to_insert:
-                db_admin.table('service_photos').insert(new_photos_to_insert).execute()
+                await run_query(db_admin.table('service_photos').insert(new_photos_to_insert))
             
         except Exception as e:
             print(f"Failed to update service photos: {str(e)}")
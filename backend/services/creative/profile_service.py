@@ -1,12 +1,14 @@
 """Profile service for creative profiles"""
 from fastapi import HTTPException, UploadFile
 from db.db_session import db_admin
+from db.query_executor import run_query, run_blocking
 from schemas.creative import (
     CreativeSetupRequest, CreativeSetupResponse,
     CreativeProfileSettingsRequest, CreativeProfileSettingsResponse,
     ProfilePhotoUploadResponse
 )
 from core.validation import validate_contact_field
+from core.identity import identity_cache
 from supabase import Client
 import re
 import uuid
@@ -20,7 +22,7 @@ class ProfileService:
         """Set up creative profile in the creatives table"""
         try:
             # Get user profile data (using authenticated client - respects RLS)
-            user_result = client.table('users').select('roles, profile_picture_url, avatar_source').eq('user_id', user_id).single().execute()
+            user_result = await run_query(client.table('users').select('roles, profile_picture_url, avatar_source').eq('user_id', user_id).single())
             if not user_result.data:
                 raise HTTPException(status_code=404, detail="User not found")
             
@@ -30,7 +32,7 @@ class ProfileService:
             # If user doesn't have creative role, add it
             if 'creative' not in user_roles:
                 user_roles.append('creative')
-                update_result = client.table('users').update({'roles': user_roles}).eq('user_id', user_id).execute()
+                update_result = await run_query(client.table('users').update({'roles': user_roles}).eq('user_id', user_id))
                 if not update_result.data:
                     raise HTTPException(status_code=500, detail="Failed to update user roles")
             
@@ -65,9 +67,9 @@ class ProfileService:
             avatar_source = user_data.get('avatar_source', 'google')
             
             # Validate subscription_tier_id
-            subscription_result = client.table('subscription_tiers').select(
+            subscription_result = await run_query(client.table('subscription_tiers').select(
                 'id, storage_amount_bytes, is_active'
-            ).eq('id', setup_request.subscription_tier_id).single().execute()
+            ).eq('id', setup_request.subscription_tier_id).single())
             
             if not subscription_result.data:
                 raise HTTPException(status_code=404, detail="Subscription tier not found")
@@ -87,13 +89,14 @@ class ProfileService:
                 'profile_source': avatar_source,
             }
             
-            result = client.table('creatives').upsert(creative_data).execute()
+            result = await run_query(client.table('creatives').upsert(creative_data))
             
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to create creative profile")
             
             # Mark setup as complete by setting first_login to False
-            user_update_result = client.table('users').update({'first_login': False}).eq('user_id', user_id).execute()
+            user_update_result = await run_query(client.table('users').update({'first_login': False}).eq('user_id', user_id))
+            identity_cache.invalidate(user_id)
             
             if not user_update_result.data:
                 raise HTTPException(status_code=500, detail="Failed to update user first_login status")
@@ -115,7 +118,7 @@ class ProfileService:
             raise ValueError("Supabase client is required for this operation")
         
         try:
-            creative_result = client.table('creatives').select('*').eq('user_id', user_id).single().execute()
+            creative_result = await run_query(client.table('creatives').select('*').eq('user_id', user_id).single())
             
             if not creative_result.data:
                 raise HTTPException(status_code=404, detail="Creative profile not found")
@@ -125,9 +128,9 @@ class ProfileService:
             # Fetch subscription tier data
             subscription_tier_id = profile_data.get('subscription_tier_id')
             if subscription_tier_id:
-                subscription_result = client.table('subscription_tiers').select(
+                subscription_result = await run_query(client.table('subscription_tiers').select(
                     'storage_amount_bytes, name, fee_percentage'
-                ).eq('id', subscription_tier_id).single().execute()
+                ).eq('id', subscription_tier_id).single())
                 
                 if subscription_result.data:
                     tier_name = subscription_result.data.get('name', 'basic')
@@ -181,13 +184,13 @@ class ProfileService:
                 bundle_exists = False
                 
                 try:
-                    service_result = client.table('creative_services').select('id').eq('id', settings_request.primary_service_id).eq('creative_user_id', user_id).eq('is_active', True).execute()
+                    service_result = await run_query(client.table('creative_services').select('id').eq('id', settings_request.primary_service_id).eq('creative_user_id', user_id).eq('is_active', True))
                     service_exists = service_result.data and len(service_result.data) > 0
                 except Exception:
                     service_exists = False
                 
                 try:
-                    bundle_result = client.table('creative_bundles').select('id').eq('id', settings_request.primary_service_id).eq('creative_user_id', user_id).eq('is_active', True).execute()
+                    bundle_result = await run_query(client.table('creative_bundles').select('id').eq('id', settings_request.primary_service_id).eq('creative_user_id', user_id).eq('is_active', True))
                     bundle_exists = bundle_result.data and len(bundle_result.data) > 0
                 except Exception:
                     bundle_exists = False
@@ -200,13 +203,13 @@ class ProfileService:
                 bundle_exists = False
                 
                 try:
-                    service_result = client.table('creative_services').select('id').eq('id', settings_request.secondary_service_id).eq('creative_user_id', user_id).eq('is_active', True).execute()
+                    service_result = await run_query(client.table('creative_services').select('id').eq('id', settings_request.secondary_service_id).eq('creative_user_id', user_id).eq('is_active', True))
                     service_exists = service_result.data and len(service_result.data) > 0
                 except Exception:
                     service_exists = False
                 
                 try:
-                    bundle_result = client.table('creative_bundles').select('id').eq('id', settings_request.secondary_service_id).eq('creative_user_id', user_id).eq('is_active', True).execute()
+                    bundle_result = await run_query(client.table('creative_bundles').select('id').eq('id', settings_request.secondary_service_id).eq('creative_user_id', user_id).eq('is_active', True))
                     bundle_exists = bundle_result.data and len(bundle_result.data) > 0
                 except Exception:
                     bundle_exists = False
@@ -266,7 +269,7 @@ class ProfileService:
             
             # Check if creative profile exists
             try:
-                existing_profile = client.table('creatives').select('user_id').eq('user_id', user_id).execute()
+                existing_profile = await run_query(client.table('creatives').select('user_id').eq('user_id', user_id))
                 profile_exists = existing_profile.data and len(existing_profile.data) > 0
             except:
                 profile_exists = False
@@ -277,18 +280,19 @@ class ProfileService:
                     **update_data
                 }
                 try:
-                    result = client.table('creatives').insert(create_data).execute()
+                    result = await run_query(client.table('creatives').insert(create_data))
                     if not result.data:
                         raise HTTPException(status_code=500, detail="Failed to create creative profile")
                 except Exception as e:
                     raise HTTPException(status_code=500, detail=f"Failed to create creative profile: {str(e)}")
             else:
                 try:
-                    result = client.table('creatives').update(update_data).eq('user_id', user_id).execute()
+                    result = await run_query(client.table('creatives').update(update_data).eq('user_id', user_id))
                     if not result.data:
                         raise HTTPException(status_code=404, detail="Creative profile not found")
                 except Exception as e:
                     raise HTTPException(status_code=500, detail=f"Failed to update creative profile: {str(e)}")
+            identity_cache.invalidate(user_id)
             
             return CreativeProfileSettingsResponse(
                 success=True,
@@ -318,7 +322,7 @@ class ProfileService:
                 raise HTTPException(status_code=400, detail="File size must be less than 5MB")
             
             # Get current profile to find old photo URL
-            current_profile = client.table('creatives').select('profile_banner_url').eq('user_id', user_id).single().execute()
+            current_profile = await run_query(client.table('creatives').select('profile_banner_url').eq('user_id', user_id).single())
             old_photo_url = None
             if current_profile.data and current_profile.data.get('profile_banner_url'):
                 old_photo_url = current_profile.data['profile_banner_url']
@@ -332,7 +336,8 @@ class ProfileService:
             file_path = f"creatives/{unique_filename}"
             
             try:
-                upload_result = db_admin.storage.from_(bucket_name).upload(
+                upload_result = await run_blocking(
+                    db_admin.storage.from_(bucket_name).upload,
                     path=file_path,
                     file=content,
                     file_options={"content-type": file.content_type}
@@ -344,10 +349,10 @@ class ProfileService:
             public_url = db_admin.storage.from_(bucket_name).get_public_url(file_path)
             
             # Update the creative profile with the new photo URL
-            update_result = client.table('creatives').update({
+            update_result = await run_query(client.table('creatives').update({
                 'profile_banner_url': public_url,
                 'profile_source': 'custom'
-            }).eq('user_id', user_id).execute()
+            }).eq('user_id', user_id))
             
             if not update_result.data:
                 raise HTTPException(status_code=500, detail="Failed to update profile with new photo URL")
@@ -360,7 +365,7 @@ class ProfileService:
                     
                     if old_file_path.startswith('creatives/'):
                         try:
-                            db_admin.storage.from_(bucket_name).remove([old_file_path])
+                            await run_blocking(db_admin.storage.from_(bucket_name).remove, [old_file_path])
                         except Exception as delete_error:
                             print(f"Warning: Failed to delete old profile photo: {str(delete_error)}")
                 except Exception as delete_error:
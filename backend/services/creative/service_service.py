@@ -5,6 +5,7 @@ import json
 from fastapi import HTTPException, Request
 from core.safe_errors import log_exception_if_dev
 from db.db_session import db_admin
+from db.query_executor import run_query
 from schemas.creative import (
     CreateServiceRequest, CreateServiceResponse, DeleteServiceResponse,
     UpdateServiceResponse, CreativeServiceResponse, CreativeServicesListResponse,
@@ -51,7 +52,7 @@ class ServiceService:
         
         try:
             # Validate that the user has a creative profile
-            creative_result = client.table('creatives').select('user_id').eq('user_id', user_id).single().execute()
+            creative_result = await run_query(client.table('creatives').select('user_id').eq('user_id', user_id).single())
             if not creative_result.data:
                 raise HTTPException(status_code=404, detail="Creative profile not found. Please complete your creative setup first.")
             
@@ -98,7 +99,7 @@ class ServiceService:
             }
             
             # Insert the service
-            result = client.table('creative_services').insert(service_data).execute()
+            result = await run_query(client.table('creative_services').insert(service_data))
             
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to create service")
@@ -156,7 +157,7 @@ class ServiceService:
                     calendar_settings = None
 
             # Validate that the user has a creative profile
-            creative_result = client.table('creatives').select('user_id').eq('user_id', user_id).single().execute()
+            creative_result = await run_query(client.table('creatives').select('user_id').eq('user_id', user_id).single())
             if not creative_result.data:
                 raise HTTPException(status_code=404, detail="Creative profile not found. Please complete your creative setup first.")
             
@@ -207,7 +208,7 @@ class ServiceService:
             }
             
             # Insert the service
-            result = client.table('creative_services').insert(service_data).execute()
+            result = await run_query(client.table('creative_services').insert(service_data))
             
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to create service")
@@ -243,9 +244,9 @@ class ServiceService:
         
         try:
             # Verify the service exists and belongs to the user
-            service_result = client.table('creative_services').select(
+            service_result = await run_query(client.table('creative_services').select(
                 'id, creative_user_id, is_active'
-            ).eq('id', service_id).single().execute()
+            ).eq('id', service_id).single())
 
             if not service_result.data:
                 raise HTTPException(status_code=404, detail="Service not found")
@@ -295,7 +296,7 @@ class ServiceService:
             }
 
             # Update the service
-            result = client.table('creative_services').update(update_data).eq('id', service_id).execute()
+            result = await run_query(client.table('creative_services').update(update_data).eq('id', service_id))
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to update service")
 
@@ -335,9 +336,9 @@ class ServiceService:
         
         try:
             # Verify the service exists and belongs to the user
-            service_result = client.table('creative_services').select(
+            service_result = await run_query(client.table('creative_services').select(
                 'id, creative_user_id, is_active'
-            ).eq('id', service_id).single().execute()
+            ).eq('id', service_id).single())
 
             if not service_result.data:
                 raise HTTPException(status_code=404, detail="Service not found")
@@ -388,7 +389,7 @@ class ServiceService:
                 'requires_booking': calendar_settings is not None,
             }
 
-            result = client.table('creative_services').update(update_data).eq('id', service_id).execute()
+            result = await run_query(client.table('creative_services').update(update_data).eq('id', service_id))
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to update service")
 
@@ -415,9 +416,9 @@ class ServiceService:
         
         try:
             # Verify the service exists and belongs to the user
-            service_result = client.table('creative_services').select(
+            service_result = await run_query(client.table('creative_services').select(
                 'id, creative_user_id, is_active, title'
-            ).eq('id', service_id).single().execute()
+            ).eq('id', service_id).single())
             
             if not service_result.data:
                 raise HTTPException(status_code=404, detail="Service not found")
@@ -431,19 +432,19 @@ class ServiceService:
                 raise HTTPException(status_code=400, detail="Service is already deleted")
             
             # Soft delete by setting is_active to False
-            result = client.table('creative_services').update({
+            result = await run_query(client.table('creative_services').update({
                 'is_active': False,
                 'updated_at': 'now()'
-            }).eq('id', service_id).execute()
+            }).eq('id', service_id))
             
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to delete service")
             
             # Also deactivate calendar settings for this service
-            client.table('calendar_settings').update({
+            await run_query(client.table('calendar_settings').update({
                 'is_active': False,
                 'updated_at': 'now()'
-            }).eq('service_id', service_id).execute()
+            }).eq('service_id', service_id))
             
             # Delete associated photos from storage and database
             await PhotoService.delete_service_photos(service_id)
@@ -475,7 +476,7 @@ class ServiceService:
             if public_only:
                 services_query = services_query.eq('status', 'Public')
             
-            services_result = services_query.order('created_at', desc=True).execute()
+            services_result = await run_query(services_query.order('created_at', desc=True))
             
             services = []
             if services_result.data:
@@ -483,9 +484,9 @@ class ServiceService:
                 service_ids = [service['id'] for service in services_result.data]
                 
                 # Get photos for all services
-                photos_result = client.table('service_photos').select(
+                photos_result = await run_query(client.table('service_photos').select(
                     'service_id, photo_url, photo_filename, photo_size_bytes, is_primary, display_order'
-                ).in_('service_id', service_ids).order('service_id').order('display_order', desc=False).execute()
+                ).in_('service_id', service_ids).order('service_id').order('display_order', desc=False))
                 
                 # Group photos by service_id
                 photos_by_service = {}
@@ -530,27 +531,27 @@ class ServiceService:
             if public_only:
                 bundles_query = bundles_query.eq('status', 'Public')
             
-            bundles_result = bundles_query.order('created_at', desc=True).execute()
+            bundles_result = await run_query(bundles_query.order('created_at', desc=True))
             
             bundles = []
             if bundles_result.data:
                 for bundle_data in bundles_result.data:
                     # Get services for this bundle
-                    bundle_services_result = client.table('bundle_services').select(
+                    bundle_services_result = await run_query(client.table('bundle_services').select(
                         'service_id'
-                    ).eq('bundle_id', bundle_data['id']).execute()
+                    ).eq('bundle_id', bundle_data['id']))
                     
                     service_ids = [bs['service_id'] for bs in bundle_services_result.data] if bundle_services_result.data else []
                     
                     # Get service details
-                    services_result = client.table('creative_services').select(
+                    services_result = await run_query(client.table('creative_services').select(
                         'id, title, description, price, delivery_time, status, color'
-                    ).in_('id', service_ids).execute()
+                    ).in_('id', service_ids))
                     
                     # Fetch photos for bundle services
-                    bundle_photos_result = client.table('service_photos').select(
+                    bundle_photos_result = await run_query(client.table('service_photos').select(
                         'service_id, photo_url, photo_filename, photo_size_bytes, is_primary, display_order'
-                    ).in_('service_id', service_ids).order('service_id').order('display_order', desc=False).execute()
+                    ).in_('service_id', service_ids).order('service_id').order('display_order', desc=False))
                     
                     # Group photos by service_id
                     bundle_photos_by_service = {}
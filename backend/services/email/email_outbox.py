@@ -0,0 +1,552 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import resend
+from resend.exceptions import ResendError
+from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, Any, List, Set, Tuple
+from dotenv import load_dotenv
+from db.db_session import db_admin
+from db.query_executor import run_query
+from core.safe_errors import log_exception_if_dev, is_dev_env
+from services.email.email_service import email_service, RESEND_BATCH_LIMIT
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Background worker tuning
+EMAIL_OUTBOX_WORKERS = int(os.getenv("EMAIL_OUTBOX_WORKERS", "2"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_RETRY_BASE_DELAY = 15.0
+EMAIL_RETRY_MAX_DELAY = 3600.0
+# How often the database is polled for due rows (retries, rows written by other processes)
+EMAIL_OUTBOX_POLL_INTERVAL = float(os.getenv("EMAIL_OUTBOX_POLL_INTERVAL", "10"))
+EMAIL_OUTBOX_POLL_BATCH_SIZE = 100
+# Rows left in 'sending' longer than this (process died mid-send) are handed back to the queue
+EMAIL_OUTBOX_STALE_SECONDS = 600
+
+# Rows queued within this many seconds of each other are delivered together: one recipient lookup
+# and one Resend batch call (up to RESEND_BATCH_LIMIT emails) for the whole burst
+EMAIL_BATCH_WINDOW = float(os.getenv("EMAIL_BATCH_WINDOW", "0.5"))
+# Merge the notifications of one burst that go to the same address into a single digest email
+EMAIL_DIGEST_ENABLED = os.getenv("EMAIL_DIGEST_ENABLED", "false").lower() == "true"
+# Notification types that are always sent on their own (they carry attachments, which the batch
+# endpoint doesn't support)
+UNBATCHED_NOTIFICATION_TYPES = ('payment_received',)
+
+# Requests per second allowed per email provider (Resend's default API limit is 2/s)
+PROVIDER_RATE_LIMITS = {
+    'resend': float(os.getenv("RESEND_RATE_LIMIT_PER_SECOND", "2")),
+}
+
+# Arguments of EmailService.send_notification_email stored in the payload
+NOTIFICATION_EMAIL_FIELDS = (
+    'to_email', 'notification_type', 'title', 'message', 'recipient_role',
+    'recipient_name', 'booking_id', 'payment_request_id', 'metadata',
+)
+
+
+class ProviderRateLimiter:
+    """Token bucket shared by every outbox worker of this process for one provider"""
+
+    def __init__(self, rate_per_second: float):
+        self.rate = max(rate_per_second, 0.01)
+        self.capacity = max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _is_permanent_error(error: Exception) -> bool:
+    """Provider rejections that a retry won't fix (bad address, invalid payload, auth)"""
+    if isinstance(error, ResendError):
+        try:
+            status_code = int(error.code)
+        except (TypeError, ValueError):
+            return False
+        return 400 <= status_code < 500 and status_code != 429
+    return False
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _notification_email_args(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: payload.get(field) for field in NOTIFICATION_EMAIL_FIELDS}
+
+
+def _group_by_attempts(rows: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+    groups: Dict[int, List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault(row['attempts'], []).append(row)
+    return groups
+
+
+def _group_for_digests(rows: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """One group per email to send: per recipient address and role with digests on, else per row"""
+    if not EMAIL_DIGEST_ENABLED:
+        return [[row] for row in rows]
+    groups: Dict[Tuple[str, Optional[str]], List[Dict[str, Any]]] = {}
+    for row in rows:
+        key = (row['payload']['to_email'].lower(), row['payload'].get('recipient_role'))
+        groups.setdefault(key, []).append(row)
+    return list(groups.values())
+
+
+class EmailOutbox:
+    """Durable queue of transactional emails
+
+    Emails are written to email_outbox in the request that creates the notification and delivered
+    by EmailOutboxWorker, so the request never waits on the email provider. Rows that arrive
+    together are delivered together: their recipients are resolved with one bulk lookup and the
+    emails go out in Resend batch calls (optionally merged into per-recipient digests). Failed
+    deliveries are retried with exponential backoff up to EMAIL_MAX_ATTEMPTS; after that (or on a
+    permanent provider error) the row is dead-lettered with status 'dead' and its last error.
+    """
+
+    @staticmethod
+    async def enqueue_notification_email(
+        to_email: Optional[str],
+        notification_type: str,
+        title: str,
+        message: str,
+        recipient_role: str,
+        recipient_name: Optional[str] = None,
+        booking_id: Optional[str] = None,
+        payment_request_id: Optional[str] = None,
+        metadata: Optional[dict] = None,
+        recipient_user_id: Optional[str] = None,
+        notification_id: Optional[str] = None
+    ) -> Optional[str]:
+        """Store a notification email for delivery and wake a worker
+
+        to_email and recipient_name may be left out when recipient_user_id is given; the worker
+        resolves them at delivery time.
+
+        Returns:
+            The outbox row id, or None if nothing was queued (no RESEND_API_KEY or the insert failed)
+        """
+        if not resend.api_key:
+            if is_dev_env():
+                logger.warning(f"Skipping notification email to {to_email or recipient_user_id} - RESEND_API_KEY not configured")
+            return None
+
+        payload = {
+            'to_email': to_email,
+            'notification_type': notification_type,
+            'title': title,
+            'message': message,
+            'recipient_role': recipient_role,
+            'recipient_name': recipient_name,
+            'booking_id': booking_id,
+            'payment_request_id': payment_request_id,
+            'metadata': metadata or {},
+        }
+        insert_result = await run_query(db_admin.table('email_outbox')\
+            .insert({
+                'notification_id': notification_id,
+                'recipient_user_id': recipient_user_id,
+                'to_email': to_email,
+                'notification_type': notification_type,
+                'provider': 'resend',
+                'payload': payload,
+            }))
+
+        if not insert_result.data:
+            return None
+        outbox_id = insert_result.data[0]['id']
+        email_outbox_worker.enqueue(outbox_id)
+        return outbox_id
+
+    @staticmethod
+    async def deliver(outbox_id: str) -> str:
+        """Claim an outbox row and send it
+
+        Returns:
+            The resulting status ('sent', 'pending' when a retry is scheduled, 'dead', or 'skipped'
+            when the row is not due or another worker owns it)
+        """
+        statuses = await EmailOutbox.deliver_batch([outbox_id])
+        return statuses.get(outbox_id, 'skipped')
+
+    @staticmethod
+    async def deliver_batch(outbox_ids: List[str]) -> Dict[str, str]:
+        """Claim a set of outbox rows and send them with as few provider calls as possible
+
+        Returns:
+            The resulting status of each row, as for deliver()
+        """
+        statuses = {outbox_id: 'skipped' for outbox_id in outbox_ids}
+        rows = await EmailOutbox._claim(outbox_ids)
+        if not rows:
+            return statuses
+
+        if not resend.api_key:
+            # Nothing can be delivered without a key; keep the rows instead of burning attempts
+            for attempts, group in _group_by_attempts(rows).items():
+                await run_query(db_admin.table('email_outbox')\
+                    .update({
+                        'status': 'pending',
+                        'attempts': attempts - 1,
+                        'next_attempt_at': (_utc_now() + timedelta(seconds=EMAIL_RETRY_MAX_DELAY)).isoformat(),
+                        'last_error': 'RESEND_API_KEY not configured',
+                        'updated_at': _utc_now().isoformat()
+                    })\
+                    .in_('id', [row['id'] for row in group]))
+            statuses.update({row['id']: 'pending' for row in rows})
+            return statuses
+
+        lookup_error: Optional[Exception] = None
+        try:
+            await EmailOutbox._resolve_recipients(rows)
+        except Exception as e:
+            # Rows without an address are retried; rows that already have one can still go out
+            log_exception_if_dev(logger, "Failed to resolve email outbox recipients", e)
+            lookup_error = e
+
+        # Emails that must go out on their own, and (rows, params) messages that can share a batch call
+        single_rows: List[Dict[str, Any]] = []
+        messages: List[Tuple[List[Dict[str, Any]], Dict[str, Any]]] = []
+        pending_rows: List[Dict[str, Any]] = []
+        for row in rows:
+            payload = row['payload']
+            if not payload.get('to_email'):
+                if lookup_error:
+                    statuses[row['id']] = await EmailOutbox._record_failure(row['id'], row['attempts'], lookup_error)
+                else:
+                    statuses[row['id']] = await EmailOutbox._record_failure(
+                        row['id'], row['attempts'], Exception(f"No email address for user {row.get('recipient_user_id')}"), permanent=True
+                    )
+            elif payload.get('notification_type') in UNBATCHED_NOTIFICATION_TYPES:
+                single_rows.append(row)
+            else:
+                pending_rows.append(row)
+
+        if len(pending_rows) == 1:
+            # Nothing to coalesce with; a regular send keeps the inline logo
+            single_rows.extend(pending_rows)
+            pending_rows = []
+
+        for group in _group_for_digests(pending_rows):
+            try:
+                if len(group) > 1:
+                    first = group[0]['payload']
+                    params = email_service.build_digest_email(
+                        to_email=first['to_email'],
+                        recipient_role=first.get('recipient_role'),
+                        items=[row['payload'] for row in group],
+                        recipient_name=first.get('recipient_name')
+                    )
+                else:
+                    params = await email_service.build_notification_email(
+                        **_notification_email_args(group[0]['payload']), inline_attachments=False
+                    )
+            except Exception as e:
+                for row in group:
+                    statuses[row['id']] = await EmailOutbox._record_failure(row['id'], row['attempts'], e)
+                continue
+            messages.append((group, params))
+
+        for start in range(0, len(messages), RESEND_BATCH_LIMIT):
+            statuses.update(await EmailOutbox._send_batch(messages[start:start + RESEND_BATCH_LIMIT]))
+
+        for row in single_rows:
+            try:
+                params = await email_service.build_notification_email(**_notification_email_args(row['payload']))
+            except Exception as e:
+                statuses[row['id']] = await EmailOutbox._record_failure(row['id'], row['attempts'], e)
+                continue
+            statuses.update(await EmailOutbox._send_message([row], params))
+
+        return statuses
+
+    @staticmethod
+    async def _claim(outbox_ids: List[str]) -> List[Dict[str, Any]]:
+        """Mark the due rows among outbox_ids as 'sending' and return them
+
+        The status/attempts guard on the update makes concurrent workers race safely; each
+        returned row carries its new attempt number in 'attempts'.
+        """
+        row_result = await run_query(db_admin.table('email_outbox')\
+            .select('id, recipient_user_id, provider, payload, status, attempts, next_attempt_at')\
+            .in_('id', outbox_ids))
+
+        now = _utc_now()
+        due = [
+            row for row in (row_result.data or [])
+            if row.get('status') == 'pending'
+            and datetime.fromisoformat(row['next_attempt_at'].replace('Z', '+00:00')) <= now
+        ]
+        for row in due:
+            row['attempts'] = row.get('attempts') or 0
+
+        claimed: List[Dict[str, Any]] = []
+        # One guarded update per distinct attempt count (normally a single one for a burst)
+        for previous_attempts, group in _group_by_attempts(due).items():
+            claim_result = await run_query(db_admin.table('email_outbox')\
+                .update({
+                    'status': 'sending',
+                    'attempts': previous_attempts + 1,
+                    'updated_at': _utc_now().isoformat()
+                })\
+                .in_('id', [row['id'] for row in group])\
+                .eq('status', 'pending')\
+                .eq('attempts', previous_attempts))
+            claimed_ids = {row['id'] for row in (claim_result.data or [])}
+            for row in group:
+                if row['id'] in claimed_ids:
+                    row['attempts'] = previous_attempts + 1
+                    row['payload'] = dict(row.get('payload') or {})
+                    claimed.append(row)
+        return claimed
+
+    @staticmethod
+    async def _resolve_recipients(rows: List[Dict[str, Any]]) -> None:
+        """Fill in missing to_email / recipient_name payload fields with one lookup per table
+
+        Like the notification senders used to do per recipient: users first, then the
+        role-specific clients / creatives profile for whatever is still missing.
+        """
+        def missing(row: Dict[str, Any]) -> bool:
+            payload = row['payload']
+            return bool(row.get('recipient_user_id')) and not (payload.get('to_email') and payload.get('recipient_name'))
+
+        unresolved = [row for row in rows if missing(row)]
+        if not unresolved:
+            return
+
+        def apply(lookup: Dict[str, Dict[str, Any]], email_field: str, name_field: str) -> None:
+            for row in unresolved:
+                found = lookup.get(row['recipient_user_id'])
+                if not found:
+                    continue
+                payload = row['payload']
+                payload['to_email'] = payload.get('to_email') or found.get(email_field)
+                payload['recipient_name'] = payload.get('recipient_name') or found.get(name_field)
+
+        users_result = await run_query(db_admin.table('users')\
+            .select('user_id, email, name')\
+            .in_('user_id', list({row['recipient_user_id'] for row in unresolved})))
+        apply({user['user_id']: user for user in (users_result.data or [])}, 'email', 'name')
+
+        unresolved = [row for row in unresolved if missing(row)]
+        for role, table, email_field in (('client', 'clients', 'email'), ('creative', 'creatives', 'primary_contact')):
+            user_ids = list({row['recipient_user_id'] for row in unresolved if row['payload'].get('recipient_role') == role})
+            if not user_ids:
+                continue
+            profile_result = await run_query(db_admin.table(table)\
+                .select(f'user_id, {email_field}, display_name')\
+                .in_('user_id', user_ids))
+            apply({profile['user_id']: profile for profile in (profile_result.data or [])}, email_field, 'display_name')
+
+    @staticmethod
+    async def _send_batch(messages: List[Tuple[List[Dict[str, Any]], Dict[str, Any]]]) -> Dict[str, str]:
+        """Send up to RESEND_BATCH_LIMIT messages with one provider call"""
+        if len(messages) == 1:
+            rows, params = messages[0]
+            return await EmailOutbox._send_message(rows, params)
+
+        statuses: Dict[str, str] = {}
+        provider = messages[0][0][0].get('provider') or 'resend'
+        try:
+            await email_outbox_worker.rate_limiter(provider).acquire()
+            message_ids = await email_service.deliver_batch([params for _, params in messages])
+        except Exception as e:
+            if _is_permanent_error(e):
+                # Resend rejects the whole batch for one invalid email; find it by sending one by one
+                for rows, params in messages:
+                    statuses.update(await EmailOutbox._send_message(rows, params))
+                return statuses
+            for rows, _ in messages:
+                for row in rows:
+                    statuses[row['id']] = await EmailOutbox._record_failure(row['id'], row['attempts'], e)
+            return statuses
+
+        await asyncio.gather(*(
+            EmailOutbox._mark_sent(row, message_id)
+            for (rows, _), message_id in zip(messages, message_ids)
+            for row in rows
+        ))
+        statuses.update({row['id']: 'sent' for rows, _ in messages for row in rows})
+        return statuses
+
+    @staticmethod
+    async def _send_message(rows: List[Dict[str, Any]], params: Dict[str, Any]) -> Dict[str, str]:
+        """Send one email (possibly a digest covering several rows) on its own"""
+        try:
+            await email_outbox_worker.rate_limiter(rows[0].get('provider') or 'resend').acquire()
+            response = await email_service.deliver(params)
+        except Exception as e:
+            return {row['id']: await EmailOutbox._record_failure(row['id'], row['attempts'], e) for row in rows}
+
+        message_id = (response or {}).get('id')
+        await asyncio.gather(*(EmailOutbox._mark_sent(row, message_id) for row in rows))
+        return {row['id']: 'sent' for row in rows}
+
+    @staticmethod
+    async def _mark_sent(row: Dict[str, Any], provider_message_id: Optional[str]) -> None:
+        await run_query(db_admin.table('email_outbox')\
+            .update({
+                'status': 'sent',
+                'to_email': row['payload'].get('to_email'),
+                'provider_message_id': provider_message_id,
+                'sent_at': _utc_now().isoformat(),
+                'last_error': None,
+                'updated_at': _utc_now().isoformat()
+            })\
+            .eq('id', row['id']))
+
+    @staticmethod
+    async def _record_failure(outbox_id: str, attempts: int, error: Exception, permanent: bool = False) -> str:
+        """Schedule a retry with exponential backoff, or dead-letter the row"""
+        permanent = permanent or _is_permanent_error(error)
+        update = {
+            'last_error': str(error)[:1000],
+            'updated_at': _utc_now().isoformat()
+        }
+        if permanent or attempts >= EMAIL_MAX_ATTEMPTS:
+            update['status'] = 'dead'
+            logger.error(f"Email outbox row {outbox_id} dead-lettered after {attempts} attempt(s): {error}")
+        else:
+            delay = min(EMAIL_RETRY_MAX_DELAY, EMAIL_RETRY_BASE_DELAY * (2 ** (attempts - 1)))
+            delay += random.uniform(0, delay / 4)
+            update['status'] = 'pending'
+            update['next_attempt_at'] = (_utc_now() + timedelta(seconds=delay)).isoformat()
+            if is_dev_env():
+                logger.warning(f"Email outbox row {outbox_id} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+
+        await run_query(db_admin.table('email_outbox')\
+            .update(update)\
+            .eq('id', outbox_id))
+        return update['status']
+
+    @staticmethod
+    async def get_due_ids(limit: int = EMAIL_OUTBOX_POLL_BATCH_SIZE) -> List[str]:
+        """Pending rows whose next attempt is due, oldest first"""
+        result = await run_query(db_admin.table('email_outbox')\
+            .select('id')\
+            .eq('status', 'pending')\
+            .lte('next_attempt_at', _utc_now().isoformat())\
+            .order('next_attempt_at')\
+            .limit(limit))
+        return [row['id'] for row in (result.data or [])]
+
+    @staticmethod
+    async def reset_stale_sending() -> None:
+        """Hand rows left in 'sending' by a dead process back to the queue"""
+        stale_before = (_utc_now() - timedelta(seconds=EMAIL_OUTBOX_STALE_SECONDS)).isoformat()
+        await run_query(db_admin.table('email_outbox')\
+            .update({'status': 'pending', 'last_error': 'Interrupted during sending'})\
+            .eq('status', 'sending')\
+            .lt('updated_at', stale_before))
+
+
+class EmailOutboxWorker:
+    """In-process workers that drain the email outbox
+
+    New rows are enqueued directly by EmailOutbox.enqueue_notification_email. A poll loop also
+    picks up rows whose retry is due and rows written while no worker was running. Each worker
+    collects ids for EMAIL_BATCH_WINDOW seconds after the first one arrives and delivers them with
+    EmailOutbox.deliver_batch.
+    """
+
+    def __init__(self, concurrency: int = EMAIL_OUTBOX_WORKERS):
+        self._concurrency = max(1, concurrency)
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._rate_limiters: Dict[str, ProviderRateLimiter] = {}
+
+    def rate_limiter(self, provider: str) -> ProviderRateLimiter:
+        limiter = self._rate_limiters.get(provider)
+        if limiter is None:
+            limiter = self._rate_limiters[provider] = ProviderRateLimiter(PROVIDER_RATE_LIMITS.get(provider, 1.0))
+        return limiter
+
+    def enqueue(self, outbox_id: str) -> None:
+        if self._queue is None or outbox_id in self._queued:
+            # Worker not started (e.g. scripts) - the row stays pending and is picked up by the next poll
+            return
+        self._queued.add(outbox_id)
+        self._queue.put_nowait(outbox_id)
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"email-outbox-worker-{i}")
+            for i in range(self._concurrency)
+        ]
+        self._tasks.append(asyncio.create_task(self._poll(), name="email-outbox-poll"))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._queued = set()
+
+    async def _poll(self) -> None:
+        while True:
+            try:
+                await EmailOutbox.reset_stale_sending()
+                for outbox_id in await EmailOutbox.get_due_ids():
+                    self.enqueue(outbox_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_exception_if_dev(logger, "Failed to poll the email outbox", e)
+            await asyncio.sleep(EMAIL_OUTBOX_POLL_INTERVAL)
+
+    async def _collect_batch(self) -> List[str]:
+        """Wait for an id, then gather whatever else arrives within the batch window"""
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + EMAIL_BATCH_WINDOW
+        while len(batch) < RESEND_BATCH_LIMIT:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(remaining, 0.05))
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect_batch()
+            try:
+                statuses = await EmailOutbox.deliver_batch(batch)
+                if is_dev_env():
+                    logger.info(f"Email outbox batch of {len(batch)}: {statuses}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Bookkeeping failed (e.g. database unreachable); the rows are retried by the poll loop
+                log_exception_if_dev(logger, f"Error delivering {len(batch)} email outbox row(s)", e)
+            finally:
+                for outbox_id in batch:
+                    self._queued.discard(outbox_id)
+                    self._queue.task_done()
+
+
+email_outbox_worker = EmailOutboxWorker()
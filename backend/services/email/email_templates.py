@@ -0,0 +1,142 @@
+"""
+Email templates
+
+Templates live in services/email/templates and are rendered in two passes:
+1. Skeleton pass ([[ ]] / [% %] delimiters): fills in everything that only depends on the template,
+   the notification type and the recipient role - the shared layout, per-type colours and button
+   text, role-specific sections. The resulting source is compiled once per
+   (template, notification type, role) and memoized.
+2. Email pass ({{ }} / {% %}): renders the compiled skeleton with the per-email values (names,
+   message, links, amounts). Values are HTML-escaped.
+"""
+import os
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, Template
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates")
+
+# Templates that are rendered directly (layout.html and _macros.html are only extended / imported)
+EMAIL_TEMPLATES = ("welcome.html", "booking_confirmation.html", "notification.html", "payment_receipt.html", "digest.html")
+
+NOTIFICATION_STYLES = {
+    'booking_created': {
+        'header_gradient': 'linear-gradient(135deg, #667eea 0%, #764ba2 100%)',
+        'accent_color': '#667eea',
+        'button_color': '#667eea',
+        'button_text': 'View Booking Request'
+    },
+    'booking_placed': {
+        'header_gradient': 'linear-gradient(135deg, #667eea 0%, #764ba2 100%)',
+        'accent_color': '#667eea',
+        'button_color': '#667eea',
+        'button_text': 'View Your Booking'
+    },
+    'booking_approved': {
+        'header_gradient': 'linear-gradient(135deg, #10b981 0%, #059669 100%)',
+        'accent_color': '#10b981',
+        'button_color': '#10b981',
+        'button_text': 'View Booking'
+    },
+    'booking_rejected': {
+        'header_gradient': 'linear-gradient(135deg, #ef4444 0%, #dc2626 100%)',
+        'accent_color': '#ef4444',
+        'button_color': '#ef4444',
+        'button_text': 'View Details'
+    },
+    'booking_canceled': {
+        'header_gradient': 'linear-gradient(135deg, #f59e0b 0%, #d97706 100%)',
+        'accent_color': '#f59e0b',
+        'button_color': '#f59e0b',
+        'button_text': 'View Details'
+    },
+    'payment_required': {
+        'header_gradient': 'linear-gradient(135deg, #f59e0b 0%, #d97706 100%)',
+        'accent_color': '#f59e0b',
+        'button_color': '#f59e0b',
+        'button_text': 'Make Payment'
+    },
+    'payment_received': {
+        'header_gradient': 'linear-gradient(135deg, #10b981 0%, #059669 100%)',
+        'accent_color': '#10b981',
+        'button_color': '#10b981',
+        'button_text': 'View Order'
+    },
+    'session_completed': {
+        'header_gradient': 'linear-gradient(135deg, #10b981 0%, #059669 100%)',
+        'accent_color': '#10b981',
+        'button_color': '#10b981',
+        'button_text': 'View Order'
+    },
+    'new_client_added': {
+        'header_gradient': 'linear-gradient(135deg, #667eea 0%, #764ba2 100%)',
+        'accent_color': '#667eea',
+        'button_color': '#667eea',
+        'button_text': 'View Clients'
+    },
+    'payment_reminder': {
+        'header_gradient': 'linear-gradient(135deg, #f59e0b 0%, #d97706 100%)',
+        'accent_color': '#f59e0b',
+        'button_color': '#f59e0b',
+        'button_text': 'Make Payment'
+    }
+}
+
+DEFAULT_NOTIFICATION_STYLE = {
+    'header_gradient': 'linear-gradient(135deg, #667eea 0%, #764ba2 100%)',
+    'accent_color': '#667eea',
+    'button_color': '#667eea',
+    'button_text': 'View Details'
+}
+
+_skeleton_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    block_start_string="[%",
+    block_end_string="%]",
+    variable_start_string="[[",
+    variable_end_string="]]",
+    comment_start_string="[#",
+    comment_end_string="#]",
+    trim_blocks=True,
+    lstrip_blocks=True,
+    auto_reload=False,
+    undefined=StrictUndefined,
+)
+
+_email_env = Environment(autoescape=True)
+
+
+def get_notification_style(notification_type: Optional[str]) -> Dict[str, str]:
+    """Styling and button text based on notification type"""
+    return NOTIFICATION_STYLES.get(notification_type, DEFAULT_NOTIFICATION_STYLE)
+
+
+@lru_cache(maxsize=256)
+def _skeleton(template_name: str, notification_type: Optional[str], role: Optional[str], logo_src: Optional[str]) -> Template:
+    source = _skeleton_env.get_template(template_name).render(
+        style=get_notification_style(notification_type),
+        notification_type=notification_type,
+        role=role,
+        logo_src=logo_src,
+    )
+    return _email_env.from_string(source)
+
+
+def render_email(
+    template_name: str,
+    context: Dict[str, Any],
+    notification_type: Optional[str] = None,
+    role: Optional[str] = None,
+    logo_src: Optional[str] = None
+) -> str:
+    """Render an email body from its memoized (template, type, role) skeleton
+
+    logo_src is "cid:logo" for the inline attachment, a hosted image URL, or None for no logo.
+    """
+    return _skeleton(template_name, notification_type, role, logo_src).render(**context)
+
+
+def precompile_templates() -> None:
+    """Compile every template up front so the first email doesn't pay for parsing"""
+    for template_name in EMAIL_TEMPLATES:
+        _skeleton_env.get_template(template_name)
@@ -1,181 +1,126 @@
-import pyclamd
-import os
 import logging
 from typing import Tuple, Optional, Dict
 from fastapi import UploadFile
 from core.safe_errors import is_dev_env
+from services.file_scanning.clamd_pool import ClamdPool, ClamdUnavailable, CONNECTION_ERRORS, clamd_pool
+from util.upload_spool import get_upload_size
 
 logger = logging.getLogger(__name__)
 
+CLAMAV_MAX_SIZE = 2 * 1024 * 1024 * 1024  # 2GB
+LARGE_FILE_THRESHOLD = 100 * 1024 * 1024  # 100MB
+
 class ClamAVScanner:
-    """ClamAV antivirus scanner integration"""
+    """ClamAV antivirus scanner integration (scans run on the shared clamd connection pool)"""
     
-    def __init__(self):
-        self.clamd = None
-        self.connection_type = None
-        self._connect()
+    def __init__(self, pool: ClamdPool = clamd_pool):
+        self.pool = pool
     
-    def _connect(self):
-        """Connect to ClamAV daemon"""
-        try:
-            # Try Unix socket first (faster, more secure)
-            unix_socket_path = os.getenv('CLAMAV_UNIX_SOCKET', '/var/run/clamav/clamd.ctl')
-            if os.path.exists(unix_socket_path):
-                self.clamd = pyclamd.ClamdUnixSocket(unix_socket_path)
-                self.connection_type = 'unix'
-                if is_dev_env():
-                    logger.info(f"Connected to ClamAV via Unix socket: {unix_socket_path}")
-            else:
-                # Fall back to TCP connection
-                host = os.getenv('CLAMAV_HOST', 'localhost')
-                port = int(os.getenv('CLAMAV_PORT', 3310))
-                self.clamd = pyclamd.ClamdNetworkSocket(host, port)
-                self.connection_type = 'tcp'
-                if is_dev_env():
-                    logger.info(f"Connected to ClamAV via TCP: {host}:{port}")
-            
-            # Test connection
-            self.clamd.ping()
-            if is_dev_env():
-                logger.info("ClamAV connection successful")
-        except pyclamd.ConnectionError as e:
-            if is_dev_env():
-                logger.error(f"ClamAV connection failed: {e}")
-            self.clamd = None
-        except Exception as e:
-            if is_dev_env():
-                logger.error(f"ClamAV initialization error: {e}")
-            self.clamd = None
+    @property
+    def connection_type(self) -> str:
+        return self.pool.connection_type
     
     def is_available(self) -> bool:
-        """Check if ClamAV is available"""
-        if not self.clamd:
-            return False
-        try:
-            self.clamd.ping()
-            return True
-        except:
-            self._connect()  # Try to reconnect
-            return self.clamd is not None
+        """Check if ClamAV is available (circuit breaker state, kept current by background health checks)"""
+        return self.pool.is_available()
+    
+    def _skipped_details(self, file: UploadFile, file_size: int, reason: str, warning: Optional[str] = None) -> Dict:
+        details = {
+            'scanner': 'ClamAV',
+            'connection_type': self.connection_type,
+            'file_size': file_size,
+            'filename': file.filename,
+            'scanned': False,
+            'skipped': True,
+            'reason': reason
+        }
+        if warning:
+            details['warning'] = warning
+        return details
     
     async def scan_file(self, file: UploadFile) -> Tuple[bool, Optional[str], Dict]:
         """
         Scan file for malware using ClamAV
         
+        The file is streamed to clamd in chunks rather than read into memory. Waits for a free
+        scan slot when CLAMAV_MAX_CONCURRENT_SCANS scans are already running.
+        
         Returns:
             (is_safe, threat_name_or_error, scan_details)
         """
         if not self.is_available():
             return False, "ClamAV scanner unavailable", {'available': False}
         
-        # Read file content once at the start
-        content = await file.read()
-        await file.seek(0)  # Reset for later use
-        file_size = len(content)
+        file_size = get_upload_size(file)
         
         # ClamAV default max file size is typically 100MB, but can be configured
         # For files larger than 2GB, skip ClamAV to avoid connection issues
         # This is a reasonable threshold that balances security and performance
         # Files up to 30GB are allowed but won't be scanned by ClamAV
-        CLAMAV_MAX_SIZE = 2 * 1024 * 1024 * 1024  # 2GB
-        
         if file_size > CLAMAV_MAX_SIZE:
             if is_dev_env():
                 logger.info(f"File {file.filename} ({file_size / (1024*1024):.1f}MB) exceeds ClamAV recommended size ({CLAMAV_MAX_SIZE / (1024*1024):.1f}MB), skipping scan")
-            return True, None, {
-                'scanner': 'ClamAV',
-                'connection_type': self.connection_type,
-                'file_size': file_size,
-                'filename': file.filename,
-                'scanned': False,
-                'skipped': True,
-                'reason': f'File size ({file_size / (1024*1024):.1f}MB) exceeds ClamAV recommended limit ({CLAMAV_MAX_SIZE / (1024*1024):.1f}MB)'
-            }
+            return True, None, self._skipped_details(
+                file, file_size,
+                f'File size ({file_size / (1024*1024):.1f}MB) exceeds ClamAV recommended limit ({CLAMAV_MAX_SIZE / (1024*1024):.1f}MB)'
+            )
         
         try:
-            # Scan the file
-            scan_result = self.clamd.scan_stream(content)
-            
-            scan_details = {
-                'scanner': 'ClamAV',
-                'connection_type': self.connection_type,
-                'file_size': file_size,
-                'filename': file.filename
-            }
-            
-            if scan_result:
-                # File is infected
-                # scan_result format: {stream: ('FOUND', 'ThreatName')}
-                threat_info = list(scan_result.values())[0]
-                threat_name = threat_info[1] if isinstance(threat_info, tuple) else str(threat_info)
-                
-                scan_details['threat_detected'] = True
-                scan_details['threat_name'] = threat_name
-                
-                return False, f"Malware detected: {threat_name}", scan_details
-            
-            # File is clean
-            scan_details['threat_detected'] = False
-            return True, None, scan_details
-            
-        except (pyclamd.ConnectionError, ConnectionAbortedError, OSError) as e:
-            # Handle connection errors - could be due to large file size or ClamAV limits
-            error_str = str(e)
+            reply = await self.pool.instream(file)
+        except ClamdUnavailable as e:
             if is_dev_env():
-                logger.warning(f"ClamAV connection error for {file.filename}: {error_str}")
-            
-            # If it's a connection abort and file is large, skip scan but allow file
-            if isinstance(e, (ConnectionAbortedError, OSError)) and ('10053' in error_str or 'aborted' in error_str.lower()):
-                if file_size > 100 * 1024 * 1024:  # If file is > 100MB, likely a size issue
-                    if is_dev_env():
-                        logger.warning(f"ClamAV connection aborted for large file {file.filename} ({file_size / (1024*1024):.1f}MB), allowing file through")
-                    return True, None, {
-                        'scanner': 'ClamAV',
-                        'connection_type': self.connection_type,
-                        'file_size': file_size,
-                        'filename': file.filename,
-                        'scanned': False,
-                        'skipped': True,
-                        'reason': 'Connection aborted - likely due to large file size. File allowed through.',
-                        'warning': 'File was not scanned due to size limitations'
-                    }
+                logger.warning(f"ClamAV unavailable for {file.filename}: {e}")
+            return False, "ClamAV scanner unavailable", {'available': False}
+        except CONNECTION_ERRORS as e:
+            if is_dev_env():
+                logger.warning(f"ClamAV connection error for {file.filename}: {e}")
             
-            # Try to reconnect for other connection errors
-            self._connect()
-            if not self.is_available():
-                return False, "ClamAV scanner connection error", {'available': False}
-            # Retry once for connection errors (but only for smaller files to avoid infinite loop)
-            if file_size <= CLAMAV_MAX_SIZE:
-                return await self.scan_file(file)
-            else:
-                # File is too large, allow it through
-                return True, None, {
-                    'scanner': 'ClamAV',
-                    'connection_type': self.connection_type,
-                    'file_size': file_size,
-                    'filename': file.filename,
-                    'scanned': False,
-                    'skipped': True,
-                    'reason': 'Connection error on large file. File allowed through.',
-                    'warning': 'File was not scanned due to connection issues'
-                }
+            # A connection dropped mid-stream on a large file is most likely clamd enforcing its size limits
+            if file_size > LARGE_FILE_THRESHOLD:
+                if is_dev_env():
+                    logger.warning(f"ClamAV connection aborted for large file {file.filename} ({file_size / (1024*1024):.1f}MB), allowing file through")
+                return True, None, self._skipped_details(
+                    file, file_size,
+                    'Connection aborted - likely due to large file size. File allowed through.',
+                    warning='File was not scanned due to size limitations'
+                )
+            return False, "ClamAV scanner connection error", {'available': False}
         except Exception as e:
             if is_dev_env():
                 logger.error(f"ClamAV scan error: {str(e)}", exc_info=True)
-            # For other errors, check if it's a size-related issue
-            error_str = str(e).lower()
-            if 'size' in error_str or 'too large' in error_str or 'limit' in error_str:
-                if is_dev_env():
-                    logger.warning(f"ClamAV size-related error for {file.filename} ({file_size / (1024*1024):.1f}MB), allowing file through")
-                return True, None, {
-                    'scanner': 'ClamAV',
-                    'connection_type': self.connection_type,
-                    'file_size': file_size,
-                    'filename': file.filename,
-                    'scanned': False,
-                    'skipped': True,
-                    'reason': 'File size exceeds ClamAV limits. File allowed through.',
-                    'warning': 'File was not scanned due to size limitations'
-                }
             return False, f"Scan error: {str(e)}", {'error': str(e)}
+        
+        scan_details = {
+            'scanner': 'ClamAV',
+            'connection_type': self.connection_type,
+            'file_size': file_size,
+            'filename': file.filename
+        }
+        
+        if reply.endswith('FOUND'):
+            # Reply format: "stream: <ThreatName> FOUND"
+            threat_name = reply[len('stream:'):-len('FOUND')].strip() if reply.startswith('stream:') else reply
+            scan_details['threat_detected'] = True
+            scan_details['threat_name'] = threat_name
+            return False, f"Malware detected: {threat_name}", scan_details
+        
+        if reply.endswith('ERROR'):
+            # "INSTREAM size limit exceeded. ERROR" - the file is larger than clamd's StreamMaxLength
+            if 'size limit' in reply.lower():
+                if is_dev_env():
+                    logger.warning(f"ClamAV size limit exceeded for {file.filename} ({file_size / (1024*1024):.1f}MB), allowing file through")
+                return True, None, self._skipped_details(
+                    file, file_size,
+                    'File size exceeds ClamAV limits. File allowed through.',
+                    warning='File was not scanned due to size limitations'
+                )
+            if is_dev_env():
+                logger.error(f"ClamAV scan error for {file.filename}: {reply}")
+            return False, f"Scan error: {reply}", {'error': reply}
+        
+        # File is clean
+        scan_details['threat_detected'] = False
+        return True, None, scan_details
+
 
+clamav_scanner = ClamAVScanner()
@@ -0,0 +1,311 @@
+"""
+Pooled async connections to clamd
+
+Connections are opened in IDSESSION mode, so one socket serves many scans, and are handed out
+by ClamdPool, which also:
+- caps concurrent scans at CLAMAV_MAX_CONCURRENT_SCANS; extra scans queue (up to
+  CLAMAV_QUEUE_TIMEOUT seconds) and the time spent queued is reported by stats()
+- pings idle connections from a background task every CLAMAV_HEALTH_INTERVAL seconds, which
+  keeps them inside clamd's IdleTimeout and means availability checks on the request path never
+  touch the network
+- opens a circuit after CLAMAV_BREAKER_THRESHOLD consecutive failures; while it is open, scans
+  are refused immediately until a health check succeeds or CLAMAV_BREAKER_COOLDOWN passes
+"""
+import os
+import time
+import struct
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+from fastapi import UploadFile
+from core.safe_errors import is_dev_env, log_exception_if_dev
+
+logger = logging.getLogger(__name__)
+
+# INSTREAM chunk size; must stay below clamd's StreamMaxLength
+CLAMAV_CHUNK_SIZE = int(os.getenv('CLAMAV_CHUNK_SIZE', 64 * 1024))
+CLAMAV_CONNECT_TIMEOUT = float(os.getenv('CLAMAV_CONNECT_TIMEOUT', 5))
+CLAMAV_SCAN_TIMEOUT = float(os.getenv('CLAMAV_SCAN_TIMEOUT', 300))
+CLAMAV_MAX_CONCURRENT_SCANS = int(os.getenv('CLAMAV_MAX_CONCURRENT_SCANS', 4))
+CLAMAV_QUEUE_TIMEOUT = float(os.getenv('CLAMAV_QUEUE_TIMEOUT', 60))
+CLAMAV_HEALTH_INTERVAL = float(os.getenv('CLAMAV_HEALTH_INTERVAL', 10))
+CLAMAV_BREAKER_THRESHOLD = int(os.getenv('CLAMAV_BREAKER_THRESHOLD', 3))
+CLAMAV_BREAKER_COOLDOWN = float(os.getenv('CLAMAV_BREAKER_COOLDOWN', 30))
+
+# Errors that mean the connection to clamd is unusable
+CONNECTION_ERRORS = (ConnectionError, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError)
+
+
+class ClamdUnavailable(Exception):
+    """clamd can't take a scan right now (circuit open or the scan queue timed out)"""
+
+
+class ClamdSession:
+    """One clamd connection in IDSESSION mode, running one command at a time"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def open(cls, connection_type: str, address: Any) -> "ClamdSession":
+        if connection_type == 'unix':
+            connect = asyncio.open_unix_connection(address)
+        else:
+            connect = asyncio.open_connection(*address)
+        reader, writer = await asyncio.wait_for(connect, timeout=CLAMAV_CONNECT_TIMEOUT)
+        writer.write(b'zIDSESSION\0')
+        await writer.drain()
+        return cls(reader, writer)
+
+    async def _read_reply(self, timeout: float) -> str:
+        reply = await asyncio.wait_for(self.reader.readuntil(b'\0'), timeout=timeout)
+        text = reply.rstrip(b'\0').decode('utf-8', errors='replace').strip()
+        # Session replies are prefixed with the request number: "<n>: stream: OK"
+        request_number, separator, rest = text.partition(': ')
+        return rest if separator and request_number.isdigit() else text
+
+    async def ping(self) -> bool:
+        self.writer.write(b'zPING\0')
+        await self.writer.drain()
+        return await self._read_reply(CLAMAV_CONNECT_TIMEOUT) == 'PONG'
+
+    async def instream(self, file: UploadFile) -> str:
+        """
+        Stream an upload with the INSTREAM command
+
+        The spool is sent CLAMAV_CHUNK_SIZE bytes at a time, each chunk prefixed with its length as
+        a 4-byte big-endian integer, and a zero-length chunk ends the stream. Waiting on drain()
+        after every chunk keeps at most one chunk (plus the socket buffer) in memory no matter how
+        large the file is.
+
+        Returns:
+            clamd's reply, e.g. "stream: OK" or "stream: <name> FOUND"
+        """
+        await file.seek(0)
+        try:
+            self.writer.write(b'zINSTREAM\0')
+            try:
+                while True:
+                    chunk = await file.read(CLAMAV_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    self.writer.write(struct.pack('>I', len(chunk)) + chunk)
+                    await self.writer.drain()
+                self.writer.write(struct.pack('>I', 0))
+                await self.writer.drain()
+            except (ConnectionResetError, BrokenPipeError):
+                # clamd closes the socket once StreamMaxLength is exceeded; its reply explains why
+                pass
+            return await self._read_reply(CLAMAV_SCAN_TIMEOUT)
+        finally:
+            await file.seek(0)  # Reset for later use
+
+    async def close(self) -> None:
+        try:
+            if not self.writer.is_closing():
+                self.writer.write(b'zEND\0')
+            self.writer.close()
+            await self.writer.wait_closed()
+        except CONNECTION_ERRORS:
+            pass
+
+
+class ClamdPool:
+    """Shared clamd connections with a scan concurrency limit, health checks and a circuit breaker"""
+
+    def __init__(self, max_concurrent_scans: int = CLAMAV_MAX_CONCURRENT_SCANS):
+        self.unix_socket_path = os.getenv('CLAMAV_UNIX_SOCKET', '/var/run/clamav/clamd.ctl')
+        self.host = os.getenv('CLAMAV_HOST', 'localhost')
+        self.port = int(os.getenv('CLAMAV_PORT', 3310))
+        self.max_concurrent_scans = max(1, max_concurrent_scans)
+
+        self._idle: Deque[ClamdSession] = deque()
+        self._limiter = asyncio.Semaphore(self.max_concurrent_scans)
+        self._health_task: Optional[asyncio.Task] = None
+
+        # Circuit breaker
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+
+        # Metrics
+        self._queued = 0
+        self._in_flight = 0
+        self._scans_total = 0
+        self._failures_total = 0
+        self._rejected_total = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+
+    @property
+    def connection_type(self) -> str:
+        # Unix socket when clamd runs locally (faster, more secure), TCP otherwise
+        return 'unix' if os.path.exists(self.unix_socket_path) else 'tcp'
+
+    def _address(self) -> Tuple[str, Any]:
+        connection_type = self.connection_type
+        if connection_type == 'unix':
+            return connection_type, self.unix_socket_path
+        return connection_type, (self.host, self.port)
+
+    def is_available(self) -> bool:
+        """Whether scans are accepted - reads breaker state only, no network I/O"""
+        return time.monotonic() >= self._open_until
+
+    def _record_success(self) -> None:
+        if self._open_until and is_dev_env():
+            logger.info("ClamAV reachable again, closing circuit")
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+
+    def _record_failure(self) -> None:
+        self._consecutive_failures += 1
+        if self._consecutive_failures >= CLAMAV_BREAKER_THRESHOLD:
+            if self.is_available():
+                logger.warning(f"ClamAV failed {self._consecutive_failures} times in a row, opening circuit for {CLAMAV_BREAKER_COOLDOWN:.0f}s")
+            self._open_until = time.monotonic() + CLAMAV_BREAKER_COOLDOWN
+
+    async def _checkout(self) -> Tuple[ClamdSession, bool]:
+        """An idle session, or a new one; the flag says whether it was reused"""
+        if self._idle:
+            return self._idle.popleft(), True
+        connection_type, address = self._address()
+        return await ClamdSession.open(connection_type, address), False
+
+    async def _checkin(self, session: ClamdSession) -> None:
+        if len(self._idle) < self.max_concurrent_scans:
+            self._idle.append(session)
+        else:
+            await session.close()
+
+    async def instream(self, file: UploadFile) -> str:
+        """
+        Scan an upload on a pooled connection, waiting for a free scan slot first
+
+        Raises:
+            ClamdUnavailable: circuit open or no slot within CLAMAV_QUEUE_TIMEOUT
+            CONNECTION_ERRORS: clamd failed during the scan
+        """
+        if not self.is_available():
+            self._rejected_total += 1
+            raise ClamdUnavailable("ClamAV circuit open")
+
+        queued_at = time.monotonic()
+        self._queued += 1
+        try:
+            await asyncio.wait_for(self._limiter.acquire(), timeout=CLAMAV_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._rejected_total += 1
+            raise ClamdUnavailable("Timed out waiting for a ClamAV scan slot")
+        finally:
+            self._queued -= 1
+
+        waited = time.monotonic() - queued_at
+        self._queue_wait_total += waited
+        self._queue_wait_max = max(self._queue_wait_max, waited)
+        self._scans_total += 1
+        self._in_flight += 1
+        try:
+            while True:
+                session, reused = None, False
+                try:
+                    session, reused = await self._checkout()
+                    reply = await session.instream(file)
+                except CONNECTION_ERRORS:
+                    if session:
+                        await session.close()
+                    if reused:
+                        # clamd dropped an idle session; retry on a fresh connection
+                        continue
+                    self._failures_total += 1
+                    self._record_failure()
+                    raise
+
+                self._record_success()
+                if reply.endswith('ERROR'):
+                    # clamd ends the session after an error reply
+                    await session.close()
+                else:
+                    await self._checkin(session)
+                return reply
+        finally:
+            self._in_flight -= 1
+            self._limiter.release()
+
+    async def check_health(self) -> bool:
+        """Ping idle sessions (dropping dead ones), or a new connection when none are idle"""
+        sessions = list(self._idle)
+        self._idle.clear()
+        alive = []
+        for session in sessions:
+            try:
+                healthy = await session.ping()
+            except CONNECTION_ERRORS:
+                healthy = False
+            if healthy:
+                alive.append(session)
+            else:
+                await session.close()
+
+        if not alive:
+            session = None
+            try:
+                connection_type, address = self._address()
+                session = await ClamdSession.open(connection_type, address)
+                if await session.ping():
+                    alive.append(session)
+            except CONNECTION_ERRORS as e:
+                if is_dev_env():
+                    logger.warning(f"ClamAV health check failed: {e}")
+            if session and session not in alive:
+                await session.close()
+
+        for session in alive:
+            await self._checkin(session)
+        if alive:
+            self._record_success()
+        else:
+            self._record_failure()
+        return bool(alive)
+
+    async def _run_health_checks(self) -> None:
+        while True:
+            try:
+                await self.check_health()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_exception_if_dev(logger, "ClamAV health check error", e)
+            await asyncio.sleep(CLAMAV_HEALTH_INTERVAL)
+
+    async def start(self) -> None:
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._run_health_checks(), name="clamd-health-check")
+
+    async def stop(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        while self._idle:
+            await self._idle.popleft().close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'connection_type': self.connection_type,
+            'circuit': 'closed' if self.is_available() else 'open',
+            'consecutive_failures': self._consecutive_failures,
+            'max_concurrent_scans': self.max_concurrent_scans,
+            'in_flight': self._in_flight,
+            'queued': self._queued,
+            'idle_connections': len(self._idle),
+            'scans_total': self._scans_total,
+            'failures_total': self._failures_total,
+            'rejected_total': self._rejected_total,
+            'queue_wait_avg_ms': round(self._queue_wait_total / self._scans_total * 1000, 1) if self._scans_total else 0.0,
+            'queue_wait_max_ms': round(self._queue_wait_max * 1000, 1),
+        }
+
+
+clamd_pool = ClamdPool()
@@ -1,6 +1,6 @@
 from typing import Tuple, Optional, Dict
 from fastapi import UploadFile
-from services.file_scanning.clamav_scanner import ClamAVScanner
+from services.file_scanning.clamav_scanner import clamav_scanner
 from util.file_validator import FileValidator
 from core.safe_errors import is_dev_env
 import logging
@@ -8,16 +8,22 @@ import os
 
 logger = logging.getLogger(__name__)
 
+# ClamAV scanning is off unless explicitly enabled (e.g. where a clamd container is deployed)
+CLAMAV_ENABLED = os.getenv("CLAMAV_ENABLED", "false").lower() == "true"
+
 class ScannerService:
     """Main service that orchestrates file validation and scanning"""
     
     def __init__(self):
-        # ClamAV scanning is disabled for all environments
         self.env = os.getenv("ENV", "dev").lower()
-        self.skip_clamav = True
+        self.skip_clamav = not CLAMAV_ENABLED
         
-        logger.info("ClamAV scanning is disabled")
-        self.clamav = None
+        if self.skip_clamav:
+            logger.info("ClamAV scanning is disabled")
+            self.clamav = None
+        else:
+            # Shared scanner: connections, scan slots and circuit state are process-wide
+            self.clamav = clamav_scanner
         
         self.validator = FileValidator()
     
@@ -49,7 +55,7 @@ class ScannerService:
         
         scan_details['validation'] = 'passed'
         
-        # Step 2: ClamAV scan (primary) - currently disabled
+        # Step 2: ClamAV scan (primary) - disabled unless CLAMAV_ENABLED
         if self.skip_clamav:
             if is_dev_env():
                 logger.info("ClamAV scanning skipped")
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 import jwt
 from fastapi import HTTPException
 from core.safe_errors import log_exception_if_dev
+from core.identity import identity_cache
 from typing import Dict, Any, Optional
 from supabase import Client
 from schemas.invite import (
@@ -12,6 +13,9 @@ from schemas.invite import (
     AcceptInviteResponse
 )
 from db.db_session import db_admin
+from db.query_executor import run_query
+from services.notifications.notifications_service import NotificationsController
+from services.notifications.notification_hub import notification_hub
 
 logger = logging.getLogger(__name__)
 
@@ -19,30 +23,6 @@ logger = logging.getLogger(__name__)
 INVITE_SECRET = os.getenv("INVITE_SECRET", "dev-invite-secret-change-in-production")
 
 
-async def _send_notification_email(notification_data: Dict[str, Any], recipient_user_id: str, recipient_name: str, client: Client = None):
-    """Helper function to send email after notification creation"""
-    try:
-        from services.notifications.notifications_service import NotificationsController
-        # Get recipient email
-        recipient_email = None
-        if client:
-            try:
-                user_result = client.table('users').select('email').eq('user_id', recipient_user_id).single().execute()
-                if user_result.data:
-                    recipient_email = user_result.data.get('email')
-            except:
-                pass
-        
-        await NotificationsController.send_notification_email(
-            notification_data=notification_data,
-            recipient_email=recipient_email,
-            recipient_name=recipient_name,
-            client=client
-        )
-    except Exception as e:
-        log_exception_if_dev(logger, "Failed to send notification email", e)
-
-
 class InviteController:
     """Controller for invite-related operations"""
     
@@ -60,17 +40,13 @@ class InviteController:
         try:
             logger.info(f"Starting invite generation for user: {user_id}")
             
-            # Get user roles from database (using authenticated client - respects RLS)
-            user_response = client.table("users") \
-                .select("roles") \
-                .eq("user_id", user_id) \
-                .single() \
-                .execute()
+            # Get user roles (shared identity lookup, using authenticated client - respects RLS)
+            identity = await identity_cache.get_with_role(user_id, client, 'creative')
 
-            if not user_response.data:
+            if identity is None:
                 raise HTTPException(status_code=404, detail="User not found")
             
-            user_roles = user_response.data.get('roles', [])
+            user_roles = identity.roles
             logger.info(f"User roles: {user_roles}")
             
             if 'creative' not in user_roles:
@@ -138,10 +114,9 @@ class InviteController:
             # This ensures the query works regardless of RLS policies since this is a public endpoint
             # We're only reading public fields (display_name, title, user_id) which are safe to expose
             try:
-                creative_response = db_admin.table("creatives") \
+                creative_response = await run_query(db_admin.table("creatives") \
                     .select("display_name, title, user_id") \
-                    .eq("user_id", creative_user_id) \
-                    .execute()
+                    .eq("user_id", creative_user_id))
                 
                 logger.info(f"Creative query response: {creative_response.data}")
             except Exception as query_error:
@@ -216,19 +191,13 @@ class InviteController:
             
             logger.info(f"Creative user ID: {creative_user_id}, Client user ID: {client_user_id}")
             
-            # Get user roles from database (using authenticated client - respects RLS)
-            user_response = client.table("users") \
-                .select("roles") \
-                .eq("user_id", client_user_id) \
-                .single() \
-                .execute()
+            # Get user roles (shared identity lookup, using authenticated client - respects RLS)
+            identity = await identity_cache.get_with_role(client_user_id, client, 'client')
             
-            logger.info(f"User response: {user_response.data}")
-            
-            if not user_response.data:
+            if identity is None:
                 raise HTTPException(status_code=404, detail="User not found")
             
-            user_roles = user_response.data.get('roles', [])
+            user_roles = identity.roles
             logger.info(f"User roles: {user_roles}")
             
             if 'client' not in user_roles:
@@ -241,11 +210,10 @@ class InviteController:
                 )
             
             # Check if relationship already exists (using authenticated client - respects RLS)
-            existing_relationship = client.table("creative_client_relationships") \
+            existing_relationship = await run_query(client.table("creative_client_relationships") \
                 .select("id") \
                 .eq("creative_user_id", creative_user_id) \
-                .eq("client_user_id", client_user_id) \
-                .execute()
+                .eq("client_user_id", client_user_id))
             
             logger.info(f"Existing relationship check: {existing_relationship.data}")
             
@@ -273,9 +241,8 @@ class InviteController:
             # 1. User is authenticated and has client role
             # 2. Invite token has been validated
             # 3. We're only creating a relationship between the creative and client specified in the token
-            result = db_admin.table("creative_client_relationships") \
-                .insert(relationship_data) \
-                .execute()
+            result = await run_query(db_admin.table("creative_client_relationships") \
+                .insert(relationship_data))
             
             logger.info(f"Insert result: {result.data}")
             
@@ -283,11 +250,10 @@ class InviteController:
                 logger.info(f"Successfully created relationship")
                 
                 # Get client display name for notification (using authenticated client - respects RLS)
-                client_response = client.table("clients") \
+                client_response = await run_query(client.table("clients") \
                     .select("display_name") \
                     .eq("user_id", client_user_id) \
-                    .single() \
-                    .execute()
+                    .single())
                 
                 client_display_name = client_response.data.get("display_name", "A client") if client_response.data else "A client"
                 
@@ -314,18 +280,18 @@ class InviteController:
                     # Create notification using admin client to bypass RLS
                     # We need admin privileges because we're creating a notification for the creative user
                     # (the client user doesn't have permission to create notifications for other users)
-                    notification_result = db_admin.table("notifications") \
-                        .insert(notification_data) \
-                        .execute()
+                    notification_result = await run_query(db_admin.table("notifications") \
+                        .insert(notification_data))
+                    notification_hub.publish_created(notification_result.data)
                     logger.info(f"Notification created: {notification_result.data}")
                     
                     # Send email notification
                     if notification_result.data:
                         # Get creative name
                         try:
-                            creative_result = db_admin.table('creatives').select('display_name').eq('user_id', creative_user_id).single().execute()
+                            creative_result = await run_query(db_admin.table('creatives').select('display_name').eq('user_id', creative_user_id).single())
                             creative_name = creative_result.data.get('display_name', 'Creative') if creative_result.data else 'Creative'
-                            await _send_notification_email(notification_data, creative_user_id, creative_name, db_admin)
+                            await NotificationsController.send_notification_email(notification_data, recipient_name=creative_name)
                         except Exception as email_error:
                             log_exception_if_dev(logger, "Failed to send new client email", email_error)
                 except Exception as notif_error:
@@ -374,38 +340,28 @@ class InviteController:
             if not creative_user_id:
                 raise HTTPException(status_code=400, detail="Invalid invite token")
             
-            # Get user roles from database to verify client role was added (using authenticated client - respects RLS)
-            user_response = client.table("users") \
-                .select("roles") \
-                .eq("user_id", client_user_id) \
-                .single() \
-                .execute()
+            # Verify the client role was added and its profile set up (shared identity lookup,
+            # using authenticated client - respects RLS)
+            identity = await identity_cache.get_with_role(client_user_id, client, 'client', with_profile=True)
             
-            if not user_response.data:
+            if identity is None:
                 raise HTTPException(status_code=404, detail="User not found")
             
-            user_roles = user_response.data.get('roles', [])
-            if 'client' not in user_roles:
+            if not identity.has_role('client'):
                 raise HTTPException(status_code=400, detail="User still doesn't have client role")
             
             # Verify client profile exists before creating relationship
-            client_profile_check = client.table("clients") \
-                .select("user_id") \
-                .eq("user_id", client_user_id) \
-                .execute()
-            
-            if not client_profile_check.data:
+            if not identity.has_profile('client'):
                 raise HTTPException(
                     status_code=400, 
                     detail="Client profile not found. Please ensure your profile is set up before accepting invites."
                 )
             
             # Check if relationship already exists (using authenticated client - respects RLS)
-            existing_relationship = client.table("creative_client_relationships") \
+            existing_relationship = await run_query(client.table("creative_client_relationships") \
                 .select("id") \
                 .eq("creative_user_id", creative_user_id) \
-                .eq("client_user_id", client_user_id) \
-                .execute()
+                .eq("client_user_id", client_user_id))
             
             if existing_relationship.data:
                 return AcceptInviteResponse(
@@ -430,17 +386,15 @@ class InviteController:
             # 1. User is authenticated and has client role
             # 2. Invite token has been validated
             # 3. We're only creating a relationship between the creative and client specified in the token
-            result = db_admin.table("creative_client_relationships") \
-                .insert(relationship_data) \
-                .execute()
+            result = await run_query(db_admin.table("creative_client_relationships") \
+                .insert(relationship_data))
             
             if result.data:
                 # Get client display name for notification (using authenticated client - respects RLS)
                 try:
-                    client_response = client.table("clients") \
+                    client_response = await run_query(client.table("clients") \
                         .select("display_name") \
-                        .eq("user_id", client_user_id) \
-                        .execute()
+                        .eq("user_id", client_user_id))
                     
                     client_display_name = client_response.data[0].get("display_name", "A client") if client_response.data and len(client_response.data) > 0 else "A client"
                 except Exception:
@@ -470,18 +424,18 @@ class InviteController:
                     # Create notification using admin client to bypass RLS
                     # We need admin privileges because we're creating a notification for the creative user
                     # (the client user doesn't have permission to create notifications for other users)
-                    notification_result = db_admin.table("notifications") \
-                        .insert(notification_data) \
-                        .execute()
+                    notification_result = await run_query(db_admin.table("notifications") \
+                        .insert(notification_data))
+                    notification_hub.publish_created(notification_result.data)
                     logger.info(f"Notification created: {notification_result.data}")
                     
                     # Send email notification
                     if notification_result.data:
                         # Get creative name
                         try:
-                            creative_result = db_admin.table('creatives').select('display_name').eq('user_id', creative_user_id).single().execute()
+                            creative_result = await run_query(db_admin.table('creatives').select('display_name').eq('user_id', creative_user_id).single())
                             creative_name = creative_result.data.get('display_name', 'Creative') if creative_result.data else 'Creative'
-                            await _send_notification_email(notification_data, creative_user_id, creative_name, db_admin)
+                            await NotificationsController.send_notification_email(notification_data, recipient_name=creative_name)
                         except Exception as email_error:
                             log_exception_if_dev(logger, "Failed to send new client email", email_error)
                 except Exception as notif_error:
@@ -0,0 +1,198 @@
+"""
+Stored order documents (EZ invoices and compliance sheets)
+
+Documents are rendered once, when a booking reaches a final status (completed / download /
+cancelled), and kept in the private order-documents bucket. Download endpoints then only have to
+sign the stored object. The storage path encodes the booking fields that change a document after
+it is issued (client status and amount paid), so a document stored for an earlier state is never
+served for a later one; a missing object is rendered and stored on first request.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+from storage3.utils import StorageException
+from core.safe_errors import log_exception_if_dev, is_dev_env
+from db.db_session import db_admin
+from db.query_executor import run_query, run_blocking
+from services.invoice.pdf_renderer import pdf_renderer
+
+logger = logging.getLogger(__name__)
+
+ORDER_DOCUMENTS_BUCKET = 'order-documents'
+ORDER_DOCUMENT_URL_EXPIRES_IN = 3600
+
+FINAL_CLIENT_STATUSES = ('canceled', 'cancelled', 'completed', 'download')
+
+# Booking columns needed to locate and render a booking's documents
+BOOKING_DOCUMENT_FIELDS = 'id, client_user_id, client_status, service_id, order_date, price, payment_option, approved_at, canceled_date, creative_user_id, amount_paid, booking_date, split_deposit_amount'
+
+BOOKING_DOCUMENT_FILENAMES = {
+    'invoice': 'EZ_Invoice_{short_id}.pdf',
+    'compliance_sheet': 'EZ_Compliance_Sheet_{short_id}.pdf',
+}
+
+# Keeps scheduled pre-renders referenced until they finish
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def booking_document_path(document_type: str, booking: Dict[str, Any]) -> str:
+    """Storage path of a booking document as of the booking's current state"""
+    status = (booking.get('client_status') or 'unknown').lower()
+    amount_paid_cents = int(round(float(booking.get('amount_paid') or 0) * 100))
+    return f"bookings/{booking['id']}/{document_type}-{status}-{amount_paid_cents}.pdf"
+
+
+def booking_document_filename(document_type: str, booking_id: str) -> str:
+    return BOOKING_DOCUMENT_FILENAMES[document_type].format(short_id=booking_id[:8])
+
+
+class OrderDocuments:
+    """Render, store and sign booking invoices and compliance sheets"""
+
+    @staticmethod
+    async def build_booking_order_data(document_type: str, booking: Dict[str, Any]) -> Dict[str, Any]:
+        """Order data for InvoiceService / ComplianceService from a booking row (BOOKING_DOCUMENT_FIELDS)"""
+        creative_user_id = booking.get('creative_user_id')
+        client_user_id = booking.get('client_user_id')
+
+        service_result, creative_result, users_result = await asyncio.gather(
+            run_query(db_admin.table('creative_services')\
+                .select('title, description')\
+                .eq('id', booking.get('service_id'))\
+                .limit(1)),
+            run_query(db_admin.table('creatives')\
+                .select('display_name')\
+                .eq('user_id', creative_user_id)\
+                .limit(1)),
+            run_query(db_admin.table('users')\
+                .select('user_id, name, email')\
+                .in_('user_id', [user_id for user_id in (client_user_id, creative_user_id) if user_id])),
+        )
+
+        service = service_result.data[0] if service_result.data else {}
+        service_name = service.get('title', 'Unknown Service')
+        service_description = service.get('description', '')
+
+        users = {user['user_id']: user for user in (users_result.data or [])}
+        client_user = users.get(client_user_id, {})
+        creative_user = users.get(creative_user_id, {})
+
+        creative_name = creative_result.data[0].get('display_name') if creative_result.data else None
+        if not creative_name or creative_name == 'Unknown Creative':
+            creative_name = creative_user.get('name') or 'Unknown Creative'
+
+        # approved_at stands in for the completion date of completed orders
+        client_status = (booking.get('client_status') or '').lower()
+        completed_date = booking.get('approved_at') if client_status == 'completed' else None
+
+        if document_type == 'compliance_sheet':
+            return {
+                'id': booking.get('id'),
+                'service_name': service_name,
+                'creative_name': creative_name,
+                'order_date': booking.get('order_date'),
+                'price': float(booking.get('price', 0)),
+                'payment_option': booking.get('payment_option', 'later'),
+                'client_status': booking.get('client_status'),
+                'approved_at': booking.get('approved_at'),
+                'canceled_date': booking.get('canceled_date'),
+                'completed_date': completed_date,
+                'split_deposit_amount': booking.get('split_deposit_amount')
+            }
+
+        return {
+            'id': booking.get('id'),
+            'service_name': service_name,
+            'service_description': service_description,
+            'creative_name': creative_name,
+            'creative_email': creative_user.get('email', ''),
+            'client_name': client_user.get('name', 'Unknown Client'),
+            'client_email': client_user.get('email', ''),
+            'order_date': booking.get('order_date'),
+            'booking_date': booking.get('booking_date'),
+            'price': float(booking.get('price', 0)),
+            'payment_option': booking.get('payment_option', 'later'),
+            'amount_paid': float(booking.get('amount_paid', 0) or 0),
+            'approved_at': booking.get('approved_at'),
+            'completed_date': completed_date,
+            'description': service_description,
+            'split_deposit_amount': booking.get('split_deposit_amount')
+        }
+
+    @staticmethod
+    async def render_booking_document(document_type: str, booking: Dict[str, Any]) -> bytes:
+        order_data = await OrderDocuments.build_booking_order_data(document_type, booking)
+        return await pdf_renderer.render(document_type, order_data)
+
+    @staticmethod
+    async def store_booking_document(document_type: str, booking: Dict[str, Any]) -> bytes:
+        """Render a booking document and store it at its current path (overwriting)"""
+        content = await OrderDocuments.render_booking_document(document_type, booking)
+        await run_blocking(
+            db_admin.storage.from_(ORDER_DOCUMENTS_BUCKET).upload,
+            path=booking_document_path(document_type, booking),
+            file=content,
+            file_options={
+                "content-type": "application/pdf",
+                "cache-control": "3600",
+                "upsert": "true"
+            }
+        )
+        return content
+
+    @staticmethod
+    async def get_booking_document_url(document_type: str, booking: Dict[str, Any]) -> str:
+        """Signed download URL of a booking document, storing the document first if needed"""
+        bucket = db_admin.storage.from_(ORDER_DOCUMENTS_BUCKET)
+        path = booking_document_path(document_type, booking)
+        options = {"download": booking_document_filename(document_type, str(booking['id']))}
+        try:
+            signed = await run_blocking(bucket.create_signed_url, path, ORDER_DOCUMENT_URL_EXPIRES_IN, options)
+        except StorageException:
+            # Not pre-rendered (older order, or the pre-render failed)
+            await OrderDocuments.store_booking_document(document_type, booking)
+            signed = await run_blocking(bucket.create_signed_url, path, ORDER_DOCUMENT_URL_EXPIRES_IN, options)
+        return signed['signedURL']
+
+    @staticmethod
+    async def get_booking_document(document_type: str, booking: Dict[str, Any]) -> bytes:
+        """Content of a booking document: the stored copy for final statuses, else a (cached) render"""
+        if (booking.get('client_status') or '').lower() not in FINAL_CLIENT_STATUSES:
+            return await OrderDocuments.render_booking_document(document_type, booking)
+        try:
+            return await run_blocking(
+                db_admin.storage.from_(ORDER_DOCUMENTS_BUCKET).download,
+                booking_document_path(document_type, booking)
+            )
+        except StorageException:
+            return await OrderDocuments.store_booking_document(document_type, booking)
+
+    @staticmethod
+    async def prerender_booking_documents(booking_id: str) -> None:
+        """Store the invoice and compliance sheet of a booking that has reached a final status"""
+        try:
+            booking_result = await run_query(db_admin.table('bookings')\
+                .select(BOOKING_DOCUMENT_FIELDS)\
+                .eq('id', booking_id)\
+                .limit(1))
+            if not booking_result.data:
+                return
+            booking = booking_result.data[0]
+            if (booking.get('client_status') or '').lower() not in FINAL_CLIENT_STATUSES:
+                return
+            for document_type in ('invoice', 'compliance_sheet'):
+                await OrderDocuments.store_booking_document(document_type, booking)
+            if is_dev_env():
+                logger.info(f"Pre-rendered order documents for booking {booking_id} ({booking.get('client_status')})")
+        except Exception as e:
+            # Downloads fall back to rendering on demand
+            log_exception_if_dev(logger, f"Failed to pre-render order documents for booking {booking_id}", e)
+
+    @staticmethod
+    def schedule_prerender(booking_id: Optional[str]) -> None:
+        """Pre-render a booking's documents in the background, off the request that changed its status"""
+        if not booking_id:
+            return
+        task = asyncio.create_task(OrderDocuments.prerender_booking_documents(str(booking_id)))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
@@ -0,0 +1,250 @@
+"""
+Off-loop PDF rendering with a content-addressed cache
+
+ReportLab is pure-Python and CPU-bound, so rendering on the event loop (or in a thread, where it
+holds the GIL) stalls every other request on the worker. PdfRenderer runs renders in a small
+process pool instead and:
+- bounds the work: at most PDF_RENDER_WORKERS renders run and PDF_RENDER_QUEUE_SIZE wait; a
+  render that can't get a slot within PDF_RENDER_QUEUE_TIMEOUT seconds is refused with a 503
+- caches results under a hash of the normalized order data, in memory (LRU) and on disk, so
+  downloading an unchanged invoice again costs a cache read
+- shares one render between concurrent requests for the same document
+"""
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import tempfile
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from core.safe_errors import is_dev_env, log_exception_if_dev
+from db.query_executor import run_blocking
+from services.invoice.invoice_service import InvoiceService
+from services.compliance.compliance_service import ComplianceService
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Render processes; 0 renders on the shared thread pool instead (scripts, constrained hosts)
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+# Renders allowed to wait for a process before new ones are refused
+PDF_RENDER_QUEUE_SIZE = int(os.getenv("PDF_RENDER_QUEUE_SIZE", "16"))
+PDF_RENDER_QUEUE_TIMEOUT = float(os.getenv("PDF_RENDER_QUEUE_TIMEOUT", "10"))
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ez-pdf-cache"))
+PDF_CACHE_MEMORY_BYTES = int(os.getenv("PDF_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+PDF_CACHE_DISK_BYTES = int(os.getenv("PDF_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+
+# Bump when a document layout changes so cached PDFs rendered with the old layout are not served
+PDF_LAYOUT_VERSION = 1
+
+PDF_RENDERERS = {
+    'invoice': InvoiceService.generate_client_invoice,
+    'compliance_sheet': ComplianceService.generate_compliance_sheet,
+}
+
+
+def _render(document_type: str, order_data: Dict[str, Any]) -> bytes:
+    # Module-level so the process pool can pickle it
+    return PDF_RENDERERS[document_type](order_data)
+
+
+def pdf_cache_key(document_type: str, order_data: Dict[str, Any]) -> str:
+    """Hash of the document type, layout version and normalized order data
+
+    Both documents print the date they were issued, so the key also includes today's date.
+    """
+    normalized = json.dumps(
+        {
+            'type': document_type,
+            'layout': PDF_LAYOUT_VERSION,
+            'issued': date.today().isoformat(),
+            'data': order_data,
+        },
+        sort_keys=True,
+        default=str,
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class PdfCache:
+    """Rendered PDFs by cache key: an in-memory LRU in front of a directory of files"""
+
+    def __init__(self, directory: str = PDF_CACHE_DIR, memory_bytes: int = PDF_CACHE_MEMORY_BYTES, disk_bytes: int = PDF_CACHE_DISK_BYTES):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._disk_size: Optional[int] = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def _remember(self, key: str, content: bytes) -> None:
+        if len(content) > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_size -= len(self._memory.pop(key))
+        self._memory[key] = content
+        self._memory_size += len(content)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _read_file(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as cached_file:
+                return cached_file.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_file(self, key: str, content: bytes) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(content)
+        # Atomic, so readers (including other worker processes) never see a partial file
+        os.replace(temp_path, self._path(key))
+        if self._disk_size is None:
+            self._disk_size = self._scan_disk_size()
+        else:
+            self._disk_size += len(content)
+        if self._disk_size > self.disk_bytes:
+            self._trim_disk()
+
+    def _scan_disk_size(self) -> int:
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith('.pdf'):
+                    total += entry.stat().st_size
+        return total
+
+    def _trim_disk(self) -> None:
+        """Delete the least recently used files until the directory is at 80% of its budget"""
+        with os.scandir(self.directory) as entries:
+            files = [(entry.stat().st_atime, entry.stat().st_size, entry.path) for entry in entries if entry.name.endswith('.pdf')]
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_bytes * 0.8:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._disk_size = total
+
+    async def get(self, key: str) -> Optional[bytes]:
+        content = self._memory.get(key)
+        if content is not None:
+            self._memory.move_to_end(key)
+            return content
+        content = await run_blocking(self._read_file, key)
+        if content is not None:
+            self._remember(key, content)
+        return content
+
+    async def put(self, key: str, content: bytes) -> None:
+        self._remember(key, content)
+        try:
+            await run_blocking(self._write_file, key, content)
+        except OSError as e:
+            # The disk cache is best effort; the in-memory copy still serves this process
+            log_exception_if_dev(logger, "Failed to write PDF cache file", e)
+
+
+class PdfRenderer:
+    """Renders invoices and compliance sheets off the event loop, through PdfCache"""
+
+    def __init__(self, workers: int = PDF_RENDER_WORKERS, queue_size: int = PDF_RENDER_QUEUE_SIZE, cache: Optional[PdfCache] = None):
+        self.workers = max(0, workers)
+        self.cache = cache or PdfCache()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(max(1, self.workers) + max(0, queue_size))
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Created lazily; spawn so the children don't inherit the server's threads and sockets
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            if is_dev_env():
+                logger.info(f"Created PDF render pool with {self.workers} processes")
+        return self._pool
+
+    async def _run_render(self, document_type: str, order_data: Dict[str, Any]) -> bytes:
+        if not self.workers:
+            return await run_blocking(_render, document_type, order_data)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_pool(), _render, document_type, order_data)
+        except BrokenProcessPool:
+            # A render process died (e.g. OOM-killed); start a fresh pool and retry once
+            logger.warning("PDF render pool broke, recreating it")
+            self.shutdown()
+            return await loop.run_in_executor(self._get_pool(), _render, document_type, order_data)
+
+    async def _render_and_cache(self, key: str, document_type: str, order_data: Dict[str, Any]) -> bytes:
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=PDF_RENDER_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail="Document generation is busy, please try again shortly",
+                headers={"Retry-After": "5"}
+            )
+        try:
+            content = await self._run_render(document_type, order_data)
+        finally:
+            self._slots.release()
+        await self.cache.put(key, content)
+        return content
+
+    async def render(self, document_type: str, order_data: Dict[str, Any]) -> bytes:
+        """
+        The PDF for order_data, from cache or freshly rendered
+
+        Args:
+            document_type: 'invoice' (InvoiceService.generate_client_invoice) or
+                'compliance_sheet' (ComplianceService.generate_compliance_sheet)
+            order_data: The renderer's order data
+
+        Raises:
+            HTTPException: 503 when the render queue is full
+        """
+        if document_type not in PDF_RENDERERS:
+            raise ValueError(f"Unknown PDF document type: {document_type}")
+
+        key = pdf_cache_key(document_type, order_data)
+        content = await self.cache.get(key)
+        if content is not None:
+            return content
+
+        # Concurrent downloads of the same document wait for one render
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._render_and_cache(key, document_type, order_data))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(inflight)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+pdf_renderer = PdfRenderer()
@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List, Set, Callable, AsyncIterator
+from dotenv import load_dotenv
+from core.safe_errors import log_exception_if_dev
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How notification events reach the other worker processes: 'local' (single process, events stay
+# in this process) or 'realtime' (Supabase Realtime broadcast between all workers)
+NOTIFICATIONS_BROKER = os.getenv("NOTIFICATIONS_BROKER", "local").lower()
+NOTIFICATIONS_BROKER_CHANNEL = os.getenv("NOTIFICATIONS_BROKER_CHANNEL", "notification-events")
+# Comment line sent on idle streams so proxies and load balancers keep the connection open
+NOTIFICATION_STREAM_HEARTBEAT = float(os.getenv("NOTIFICATION_STREAM_HEARTBEAT", "25"))
+NOTIFICATION_STREAM_MAX_PER_USER = int(os.getenv("NOTIFICATION_STREAM_MAX_PER_USER", "10"))
+# Events buffered per stream; a client that falls further behind is told to refetch instead
+NOTIFICATION_STREAM_QUEUE_SIZE = 100
+# Reconnect delay suggested to EventSource-style clients (ms)
+NOTIFICATION_STREAM_RETRY_MS = 5000
+
+# Queue item that ends a stream (server shutting down)
+_CLOSE = object()
+# Streams still open when the server is asked to exit are cancelled by uvicorn after its
+# --timeout-graceful-shutdown (set in Dockerfile.backend); streams left after that end in stop()
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class NotificationBroker:
+    """Carries notification events between worker processes
+
+    The base broker is the single-process case: published events are only delivered locally.
+    Brokers call deliver(event) for events published by other processes, never for their own.
+    """
+
+    async def start(self, deliver: Callable[[Dict[str, Any]], None]) -> None:
+        pass
+
+    async def publish(self, event: Dict[str, Any]) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class RealtimeNotificationBroker(NotificationBroker):
+    """Fan-out through a private Supabase Realtime broadcast channel
+
+    Every worker joins the channel with the service role key; self-broadcast is off, so each
+    worker only receives the events the others published. Events carry ids, never content.
+    """
+
+    def __init__(self, url: str, service_role_key: str, channel: str = NOTIFICATIONS_BROKER_CHANNEL):
+        self._url = f"{url}/realtime/v1"
+        self._key = service_role_key
+        self._topic = channel
+        self._client = None
+        self._channel = None
+
+    async def start(self, deliver: Callable[[Dict[str, Any]], None]) -> None:
+        from realtime import AsyncRealtimeClient
+
+        self._client = AsyncRealtimeClient(self._url, self._key)
+        await self._client.connect()
+        self._channel = self._client.channel(self._topic, {
+            "config": {"broadcast": {"ack": False, "self": False}, "presence": {"key": ""}, "private": True}
+        })
+        self._channel.on_broadcast("notification", lambda message: deliver(message.get('payload') or {}))
+        await self._channel.subscribe()
+
+    async def publish(self, event: Dict[str, Any]) -> None:
+        if self._channel is not None:
+            await self._channel.send_broadcast("notification", event)
+
+    async def stop(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+        self._client = None
+        self._channel = None
+
+
+def create_broker() -> NotificationBroker:
+    if NOTIFICATIONS_BROKER == 'realtime':
+        from db.db_session import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+        return RealtimeNotificationBroker(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+    return NotificationBroker()
+
+
+class NotificationHub:
+    """In-process pub/sub behind the notification streams
+
+    Code that inserts notifications calls publish_created (and mark-as-read calls publish_read);
+    each open stream of the recipient gets a small event and the client refetches what it shows.
+    Idle streams cost a heartbeat every NOTIFICATION_STREAM_HEARTBEAT seconds and no queries.
+    """
+
+    def __init__(self, broker: Optional[NotificationBroker] = None):
+        self._broker = broker or NotificationBroker()
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._pending: Set[asyncio.Task] = set()
+        self._started = False
+        self._closing = False
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def can_subscribe(self, user_id: str) -> bool:
+        return not self._closing and len(self._subscribers.get(user_id, ())) < NOTIFICATION_STREAM_MAX_PER_USER
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=NOTIFICATION_STREAM_QUEUE_SIZE)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        """Hand an event to this process's streams of its user"""
+        for queue in self._subscribers.get(event.get('user_id'), ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too far behind to be worth catching up event by event
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({'type': 'resync', 'user_id': event.get('user_id')})
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Deliver locally and pass the event to the other workers; never raises"""
+        try:
+            self.deliver(event)
+            if self._started:
+                task = asyncio.get_running_loop().create_task(self._broker_publish(event))
+                self._pending.add(task)
+                task.add_done_callback(self._pending.discard)
+        except Exception as e:
+            log_exception_if_dev(logger, "Failed to publish notification event", e)
+
+    async def _broker_publish(self, event: Dict[str, Any]) -> None:
+        try:
+            await self._broker.publish(event)
+        except Exception as e:
+            log_exception_if_dev(logger, "Failed to broadcast notification event", e)
+
+    def publish_created(self, rows: Optional[List[Dict[str, Any]]]) -> None:
+        """Announce inserted notification rows (the .data of the insert) to their recipients"""
+        for row in rows or []:
+            if not isinstance(row, dict) or not row.get('recipient_user_id'):
+                continue
+            self.publish({
+                'type': 'created',
+                'user_id': str(row['recipient_user_id']),
+                'notification_id': str(row.get('id')) if row.get('id') else None,
+                'target_roles': row.get('target_roles') or [],
+            })
+
+    def publish_read(self, user_id: str, notification_id: Optional[str]) -> None:
+        """notification_id is None when several notifications were marked at once"""
+        self.publish({'type': 'read', 'user_id': user_id, 'notification_id': notification_id})
+
+    async def stream(
+        self,
+        user_id: str,
+        role_context: Optional[str] = None,
+        expires_at: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        Server-sent events for one connection
+        Starts with 'ready' (the client loads its current state), then sends 'created', 'read' and
+        'resync' events. Ends with 'reauth' once the access token expires.
+        """
+        queue = self.subscribe(user_id)
+        try:
+            yield f"retry: {NOTIFICATION_STREAM_RETRY_MS}\n" + _sse('ready', {})
+            while not self._closing:
+                timeout = NOTIFICATION_STREAM_HEARTBEAT
+                if expires_at is not None:
+                    remaining = expires_at - time.time()
+                    if remaining <= 0:
+                        yield _sse('reauth', {})
+                        return
+                    timeout = min(timeout, remaining)
+
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if event is _CLOSE:
+                    return
+                target_roles = event.get('target_roles')
+                if role_context and target_roles and role_context not in target_roles:
+                    continue
+                yield _sse(event['type'], {'notification_id': event.get('notification_id')})
+        finally:
+            self.unsubscribe(user_id, queue)
+
+    def close_streams(self) -> None:
+        """End every open stream (clients reconnect to another worker)"""
+        for queues in list(self._subscribers.values()):
+            for queue in list(queues):
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(_CLOSE)
+
+    async def start(self) -> None:
+        self._closing = False
+        if self._started:
+            return
+        try:
+            await self._broker.start(self.deliver)
+            self._started = True
+        except Exception as e:
+            # Streams still work for notifications created by this worker
+            logger.warning(f"Notification broker unavailable, events stay in this process: {e}")
+
+    async def stop(self) -> None:
+        """End open streams and refuse new ones (shutdown hook)"""
+        self._closing = True
+        self.close_streams()
+        self._started = False
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        try:
+            await self._broker.stop()
+        except Exception as e:
+            log_exception_if_dev(logger, "Error stopping notification broker", e)
+
+
+notification_hub = NotificationHub(create_broker())
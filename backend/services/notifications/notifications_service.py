@@ -1,16 +1,61 @@
+import uuid
+import base64
 import logging
+from datetime import datetime
 from fastapi import HTTPException
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from supabase import Client
 from core.safe_errors import log_exception_if_dev
+from core.identity import identity_cache
 from db.db_session import db_admin
-from schemas.notifications import NotificationResponse, UnreadCountResponse
+from db.query_executor import run_query
+from schemas.notifications import NotificationResponse, NotificationPageResponse, UnreadCountResponse, MarkAllReadResponse
 from postgrest.exceptions import APIError
-from services.email.email_service import email_service
+from postgrest.types import CountMethod, ReturnMethod
+from services.email.email_outbox import EmailOutbox
+from services.notifications.notification_hub import notification_hub
 
 logger = logging.getLogger(__name__)
 
 
+def encode_cursor(notification: Dict[str, Any]) -> str:
+    """Opaque cursor for the position after this notification (newest-first order)"""
+    raw = f"{notification['created_at']}|{notification['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """(created_at, id) of a cursor from encode_cursor; raises HTTPException(400) if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, notification_id = raw.rsplit('|', 1)
+        datetime.fromisoformat(created_at)
+        return created_at, str(uuid.UUID(notification_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _target_roles_filter(roles: List[str]) -> str:
+    """
+    PostgREST or-filter for notifications shown to these roles: aimed at any of them, or untargeted
+    (empty/null target_roles, backward compatibility)
+    """
+    return f"target_roles.is.null,target_roles.eq.{{}},target_roles.ov.{{{','.join(roles)}}}"
+
+
+def _cursor_filter(created_at: str, notification_id: str, inclusive: bool = False) -> str:
+    """PostgREST or-filter for rows after the cursor in (created_at, id) descending order"""
+    id_operator = 'lte' if inclusive else 'lt'
+    return f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.{id_operator}.{notification_id})'
+
+
+async def _user_identity(user_id: str, role_context: Optional[str], client: Client):
+    """The user's identity; reloaded rather than trusted if a cached copy lacks role_context"""
+    if role_context:
+        return await identity_cache.get_with_role(user_id, client, role_context)
+    return await identity_cache.get(user_id, client)
+
+
 class NotificationsController:
     """Controller for notification-related operations"""
     
@@ -21,36 +66,36 @@ class NotificationsController:
         offset: int = 0,
         unread_only: bool = False,
         role_context: Optional[str] = None,
-        client: Client = None
+        client: Client = None,
+        cursor: Optional[str] = None
     ) -> List[NotificationResponse]:
         """
         Get notifications for the current user, filtered by their role context.
+        Newest first; role filtering happens in the query, so pages are exactly `limit` long
+        until the history runs out.
         
         Args:
             user_id: The user ID to fetch notifications for
             limit: Maximum number of notifications to return
-            offset: Number of notifications to skip
+            offset: Number of notifications to skip (ignored when cursor is given)
             unread_only: If True, only return unread notifications
             role_context: Optional role context ('client', 'creative', 'advocate'). 
                          If provided, only notifications with this role in target_roles will be returned.
                          If not provided, returns notifications for all of the user's roles.
             client: Authenticated Supabase client (required, respects RLS policies)
+            cursor: Return the notifications after this cursor (see encode_cursor); keyset
+                    pagination on (created_at, id), constant cost at any depth
         """
         if not client:
             raise ValueError("Supabase client is required for this operation")
         
         try:
-            # Get user roles from database to filter notifications (using authenticated client - respects RLS)
-            user_response = client.table("users") \
-                .select("roles") \
-                .eq("user_id", user_id) \
-                .single() \
-                .execute()
-            
-            if not user_response.data:
+            # User roles to filter notifications (shared identity lookup, authenticated client - respects RLS)
+            identity = await _user_identity(user_id, role_context, client)
+            if identity is None:
                 raise HTTPException(status_code=404, detail="User not found")
             
-            user_roles = user_response.data.get('roles', [])
+            user_roles = identity.roles
             if not user_roles:
                 # If user has no roles, return empty list
                 return []
@@ -66,46 +111,37 @@ class NotificationsController:
                 # No role context provided - filter by all user roles (backward compatibility)
                 filter_role = None
             
-            # Build query - filter by recipient_user_id (using authenticated client - respects RLS)
+            # Build query - filter by recipient_user_id and target_roles (using authenticated client - respects RLS)
             query = client.table("notifications") \
                 .select("*") \
                 .eq("recipient_user_id", user_id) \
-                .order("created_at", desc=True) \
-                .limit(limit) \
-                .offset(offset)
+                .or_(_target_roles_filter([filter_role] if filter_role else user_roles))
             
             # Filter by read status if requested
             if unread_only:
                 query = query.eq("is_read", False)
             
-            result = query.execute()
+            if cursor:
+                query = query.or_(_cursor_filter(*decode_cursor(cursor)))
+            
+            # id breaks created_at ties so the cursor position is exact
+            query = query \
+                .order("created_at", desc=True) \
+                .order("id", desc=True) \
+                .limit(limit)
+            if offset and not cursor:
+                query = query.offset(offset)
+            
+            result = await run_query(query)
             
             if not result.data:
                 return []
             
-            # Filter notifications by target_roles first
-            filtered_notifications = []
+            filtered_notifications = result.data
             booking_ids = []
             user_ids_needing_avatar_color = set()
             
-            for notification in result.data:
-                target_roles = notification.get('target_roles', [])
-                
-                # Check if notification should be included based on target_roles
-                should_include = False
-                if not target_roles or len(target_roles) == 0:
-                    should_include = True
-                elif filter_role:
-                    if filter_role in target_roles:
-                        should_include = True
-                else:
-                    if any(role in target_roles for role in user_roles):
-                        should_include = True
-                
-                if not should_include:
-                    continue
-                
-                filtered_notifications.append(notification)
+            for notification in filtered_notifications:
                 
                 # Collect IDs for batch fetching
                 related_entity_type = notification.get('related_entity_type')
@@ -123,10 +159,9 @@ class NotificationsController:
             bookings_map = {}
             if booking_ids:
                 try:
-                    bookings_response = client.table("bookings") \
+                    bookings_response = await run_query(client.table("bookings") \
                         .select("id, service_id, creative_user_id") \
-                        .in_("id", booking_ids) \
-                        .execute()
+                        .in_("id", booking_ids))
                     
                     if bookings_response.data:
                         for booking in bookings_response.data:
@@ -147,10 +182,9 @@ class NotificationsController:
             if service_ids:
                 try:
                     # Batch fetch service colors (using authenticated client - respects RLS)
-                    services_response = client.table("creative_services") \
+                    services_response = await run_query(client.table("creative_services") \
                         .select("id, color") \
-                        .in_("id", service_ids) \
-                        .execute()
+                        .in_("id", service_ids))
                     
                     if services_response.data:
                         for service in services_response.data:
@@ -162,10 +196,9 @@ class NotificationsController:
             creatives_map = {}
             if user_ids_needing_avatar_color:
                 try:
-                    creatives_response = client.table("creatives") \
+                    creatives_response = await run_query(client.table("creatives") \
                         .select("user_id, avatar_background_color") \
-                        .in_("user_id", list(user_ids_needing_avatar_color)) \
-                        .execute()
+                        .in_("user_id", list(user_ids_needing_avatar_color)))
                     
                     if creatives_response.data:
                         for creative in creatives_response.data:
@@ -216,6 +249,28 @@ class NotificationsController:
             log_exception_if_dev(logger, "Error fetching notifications", e)
             raise HTTPException(status_code=500, detail="Failed to fetch notifications")
 
+    @staticmethod
+    async def get_notifications_page(
+        user_id: str,
+        limit: int = 25,
+        cursor: Optional[str] = None,
+        unread_only: bool = False,
+        role_context: Optional[str] = None,
+        client: Client = None
+    ) -> NotificationPageResponse:
+        """
+        One page of notifications plus the cursor of the next page (None on the last page).
+        
+        Args:
+            cursor: next_cursor of the previous page; omit for the newest notifications
+            (other arguments as in get_notifications)
+        """
+        notifications = await NotificationsController.get_notifications(
+            user_id, limit, 0, unread_only, role_context, client, cursor=cursor
+        )
+        next_cursor = encode_cursor(notifications[-1].model_dump()) if notifications and len(notifications) == limit else None
+        return NotificationPageResponse(notifications=notifications, next_cursor=next_cursor)
+
     @staticmethod
     async def get_unread_count(
         user_id: str,
@@ -235,17 +290,12 @@ class NotificationsController:
             raise ValueError("Supabase client is required for this operation")
         
         try:
-            # Get user roles from database to filter notifications (using authenticated client - respects RLS)
-            user_response = client.table("users") \
-                .select("roles") \
-                .eq("user_id", user_id) \
-                .single() \
-                .execute()
-            
-            if not user_response.data:
+            # User roles (shared identity lookup, using authenticated client - respects RLS)
+            identity = await _user_identity(user_id, role_context, client)
+            if identity is None:
                 return UnreadCountResponse(count=0)
             
-            user_roles = user_response.data.get('roles', [])
+            user_roles = identity.roles
             if not user_roles:
                 return UnreadCountResponse(count=0)
             
@@ -258,33 +308,28 @@ class NotificationsController:
             else:
                 filter_role = None
             
-            # Query unread notifications (using authenticated client - respects RLS)
-            result = client.table("notifications") \
-                .select("id, target_roles") \
-                .eq("recipient_user_id", user_id) \
-                .eq("is_read", False) \
-                .execute()
-            
-            if not result.data:
-                return UnreadCountResponse(count=0)
+            # Unread counters, one row per target_roles set (maintained by triggers on notifications)
+            counters_response = await run_query(client.table("notification_unread_counts") \
+                .select("target_roles, unread_count") \
+                .eq("recipient_user_id", user_id))
             
-            # Filter notifications by target_roles
+            # Add up the counters whose target_roles match (same rules as get_notifications)
             filtered_count = 0
-            for notification in result.data:
-                target_roles = notification.get('target_roles', [])
-                # If target_roles is empty or null, include it (backward compatibility)
-                if not target_roles or len(target_roles) == 0:
-                    filtered_count += 1
+            for counter in counters_response.data or []:
+                target_roles = counter.get('target_roles') or []
+                # If target_roles is empty, include it (backward compatibility)
+                if not target_roles:
+                    filtered_count += counter.get('unread_count') or 0
                 # If role_context is provided, check if it's in target_roles
                 elif filter_role:
                     if filter_role in target_roles:
-                        filtered_count += 1
+                        filtered_count += counter.get('unread_count') or 0
                 # If no role_context, check if any of the user's roles are in target_roles
                 else:
                     if any(role in target_roles for role in user_roles):
-                        filtered_count += 1
+                        filtered_count += counter.get('unread_count') or 0
             
-            return UnreadCountResponse(count=filtered_count)
+            return UnreadCountResponse(count=max(filtered_count, 0))
             
         except HTTPException:
             raise
@@ -316,11 +361,10 @@ class NotificationsController:
             notification_data = None
             
             try:
-                notification_response = db_admin.table("notifications") \
+                notification_response = await run_query(db_admin.table("notifications") \
                     .select("*") \
                     .eq("id", notification_id) \
-                    .single() \
-                    .execute()
+                    .single())
                 notification_data = notification_response.data if notification_response else None
             except APIError as api_error:
                 # APIError from postgrest - the exception is raised with the notification dict
@@ -387,16 +431,14 @@ class NotificationsController:
             
             # Update the notification to mark it as read
             # Use service role client to bypass RLS since we've already verified ownership
-            from datetime import datetime
             try:
-                update_response = db_admin.table("notifications") \
+                update_response = await run_query(db_admin.table("notifications") \
                     .update({
                         "is_read": True,
                         "updated_at": datetime.utcnow().isoformat()
                     }) \
                     .eq("id", notification_id) \
-                    .eq("recipient_user_id", user_id) \
-                    .execute()
+                    .eq("recipient_user_id", user_id))
             except Exception as update_error:
                 log_exception_if_dev(logger, "Error updating notification in database", update_error)
                 raise HTTPException(status_code=500, detail="Failed to update notification")
@@ -405,6 +447,9 @@ class NotificationsController:
                 log_exception_if_dev(logger, "Update response was empty for notification", None)
                 raise HTTPException(status_code=500, detail="Failed to update notification")
             
+            # Let the user's other open tabs update their unread state
+            notification_hub.publish_read(user_id, notification_id)
+            
             # Use the notification data we already have and update is_read and updated_at
             # This avoids potential issues with the update response format
             updated_notification = notification_data.copy()
@@ -465,25 +510,80 @@ class NotificationsController:
             log_exception_if_dev(logger, "Error marking notification as read", e)
             raise HTTPException(status_code=500, detail="Failed to mark notification as read")
     
+    @staticmethod
+    async def mark_all_as_read(
+        user_id: str,
+        role_context: Optional[str] = None,
+        up_to: Optional[str] = None,
+        client: Client = None
+    ) -> MarkAllReadResponse:
+        """
+        Mark the user's unread notifications as read in one update.
+        
+        Args:
+            user_id: The user ID who owns the notifications
+            role_context: Optional role context ('client', 'creative', 'advocate').
+                         If provided, only notifications shown in this role context are marked.
+            up_to: Optional cursor (encode_cursor of the newest notification the user has seen);
+                   that notification and everything older is marked, newer arrivals stay unread
+            client: Authenticated Supabase client (required, respects RLS policies)
+        """
+        if not client:
+            raise ValueError("Supabase client is required for this operation")
+        
+        try:
+            # User roles to filter notifications (shared identity lookup, authenticated client - respects RLS)
+            identity = await _user_identity(user_id, role_context, client)
+            user_roles = identity.roles if identity else []
+            if not user_roles or (role_context and role_context not in user_roles):
+                return MarkAllReadResponse(success=True, updated=0)
+            
+            # Use service role client to bypass RLS; the recipient filter limits it to the user's rows
+            query = db_admin.table("notifications") \
+                .update({
+                    "is_read": True,
+                    "updated_at": datetime.utcnow().isoformat()
+                }, count=CountMethod.exact, returning=ReturnMethod.minimal) \
+                .eq("recipient_user_id", user_id) \
+                .eq("is_read", False) \
+                .or_(_target_roles_filter([role_context] if role_context else user_roles))
+            if up_to:
+                query = query.or_(_cursor_filter(*decode_cursor(up_to), inclusive=True))
+            
+            result = await run_query(query)
+            updated = result.count or 0
+            
+            if updated:
+                # Let the user's open tabs refresh their unread state
+                notification_hub.publish_read(user_id, None)
+            
+            return MarkAllReadResponse(success=True, updated=updated)
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            log_exception_if_dev(logger, "Error marking all notifications as read", e)
+            raise HTTPException(status_code=500, detail="Failed to mark notifications as read")
+    
     @staticmethod
     async def send_notification_email(
         notification_data: Dict[str, Any],
         recipient_email: Optional[str] = None,
-        recipient_name: Optional[str] = None,
-        client: Optional[Client] = None
+        recipient_name: Optional[str] = None
     ) -> bool:
         """
         Send an email notification when a notification is created.
         This is a helper function that should be called after creating a notification.
+        The email is written to the outbox and delivered in the background; a missing email
+        address or name is resolved by the outbox worker, in one bulk lookup per batch.
         
         Args:
             notification_data: The notification data dictionary (from database)
-            recipient_email: Recipient's email address (optional, will be fetched if not provided)
-            recipient_name: Recipient's display name (optional, will be fetched if not provided)
-            client: Supabase client for fetching user data (optional)
+            recipient_email: Recipient's email address (optional, resolved from recipient_user_id if not provided)
+            recipient_name: Recipient's display name (optional, resolved from recipient_user_id if not provided)
             
         Returns:
-            True if email was sent successfully, False otherwise
+            True if the email was queued, False otherwise
         """
         try:
             recipient_user_id = notification_data.get('recipient_user_id')
@@ -506,39 +606,9 @@ class NotificationsController:
                 logger.warning(f"Cannot send notification email - no recipient role determined for notification {notification_data.get('id')}")
                 return False
             
-            # Fetch recipient email and name if not provided
-            if not recipient_email or not recipient_name:
-                if client and recipient_user_id:
-                    try:
-                        # Try to get from users table first
-                        user_response = client.table('users').select('email, name').eq('user_id', recipient_user_id).single().execute()
-                        if user_response.data:
-                            if not recipient_email:
-                                recipient_email = user_response.data.get('email')
-                            if not recipient_name:
-                                recipient_name = user_response.data.get('name')
-                        
-                        # If still missing, try to get from role-specific tables
-                        if recipient_role == 'client' and (not recipient_email or not recipient_name):
-                            client_response = client.table('clients').select('email, display_name').eq('user_id', recipient_user_id).single().execute()
-                            if client_response.data:
-                                if not recipient_email:
-                                    recipient_email = client_response.data.get('email')
-                                if not recipient_name:
-                                    recipient_name = client_response.data.get('display_name')
-                        elif recipient_role == 'creative' and (not recipient_email or not recipient_name):
-                            creative_response = client.table('creatives').select('primary_contact, display_name').eq('user_id', recipient_user_id).single().execute()
-                            if creative_response.data:
-                                if not recipient_email:
-                                    recipient_email = creative_response.data.get('primary_contact')
-                                if not recipient_name:
-                                    recipient_name = creative_response.data.get('display_name')
-                    except Exception as fetch_error:
-                        log_exception_if_dev(logger, "Failed to fetch recipient info for email", fetch_error)
-            
-            # If still no email, skip sending
-            if not recipient_email:
-                logger.warning(f"Cannot send notification email - no email found for user {recipient_user_id}")
+            # Without an address there must be a user to resolve it from
+            if not recipient_email and not recipient_user_id:
+                logger.warning(f"Cannot send notification email - no email or recipient for notification {notification_data.get('id')}")
                 return False
             
             # Extract booking_id or payment_request_id from metadata or related_entity_id
@@ -554,8 +624,8 @@ class NotificationsController:
                 booking_id = metadata.get('booking_id') or metadata.get('order_id')
                 payment_request_id = metadata.get('payment_request_id')
             
-            # Send the email
-            return await email_service.send_notification_email(
+            # Queue the email; the outbox worker renders and sends it off the request path
+            outbox_id = await EmailOutbox.enqueue_notification_email(
                 to_email=recipient_email,
                 notification_type=notification_type,
                 title=title,
@@ -564,8 +634,11 @@ class NotificationsController:
                 recipient_name=recipient_name,
                 booking_id=booking_id,
                 payment_request_id=payment_request_id,
-                metadata=metadata
+                metadata=metadata,
+                recipient_user_id=recipient_user_id,
+                notification_id=notification_data.get('id')
             )
+            return outbox_id is not None
             
         except Exception as e:
             log_exception_if_dev(logger, "Failed to send notification email", e)
@@ -6,41 +6,13 @@ from fastapi import HTTPException
 from core.safe_errors import log_exception_if_dev, is_dev_env
 from supabase import Client
 from db.db_session import db_admin
+from db.query_executor import run_query, run_blocking
+from services.notifications.notifications_service import NotificationsController
+from services.notifications.notification_hub import notification_hub
 
 logger = logging.getLogger(__name__)
 
 
-async def _send_notification_email(notification_data: Dict[str, Any], recipient_user_id: str, recipient_name: str, client: Client = None):
-    """Helper function to send email after notification creation"""
-    try:
-        from services.notifications.notifications_service import NotificationsController
-        # Get recipient email
-        recipient_email = None
-        if client:
-            try:
-                user_result = client.table('users').select('email').eq('user_id', recipient_user_id).single().execute()
-                if user_result.data:
-                    recipient_email = user_result.data.get('email')
-            except:
-                pass
-        
-        await NotificationsController.send_notification_email(
-            notification_data=notification_data,
-            recipient_email=recipient_email,
-            recipient_name=recipient_name,
-            client=client
-        )
-    except Exception as e:
-        log_exception_if_dev(logger, "Failed to send notification email", e)
-
-# Get Stripe secret key from environment
-STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
-if not STRIPE_SECRET_KEY:
-    raise ValueError("STRIPE_SECRET_KEY environment variable is not set")
-
-stripe.api_key = STRIPE_SECRET_KEY
-
-
 class PaymentRequestService:
     @staticmethod
     async def create_payment_request(
@@ -70,11 +42,10 @@ class PaymentRequestService:
                 raise HTTPException(status_code=400, detail="Amount must be greater than 0")
             
             # Get creative info (for validation and notification) - fetch all needed fields in one query
-            creative_result = client.table('creatives')\
+            creative_result = await run_query(client.table('creatives')\
                 .select('user_id, display_name, avatar_background_color')\
                 .eq('user_id', creative_user_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not creative_result.data:
                 raise HTTPException(status_code=404, detail="Creative not found")
@@ -89,11 +60,10 @@ class PaymentRequestService:
             
             # If booking_id is provided, get client_user_id from booking and verify ownership
             if booking_id:
-                booking_result = client.table('bookings')\
+                booking_result = await run_query(client.table('bookings')\
                     .select('id, creative_user_id, client_user_id, service_id')\
                     .eq('id', booking_id)\
-                    .single()\
-                    .execute()
+                    .single())
                 
                 if not booking_result.data:
                     raise HTTPException(status_code=404, detail="Booking not found")
@@ -111,11 +81,10 @@ class PaymentRequestService:
                 raise HTTPException(status_code=400, detail="Client user ID is required")
             
             # Verify client exists
-            client_result = client.table('clients')\
+            client_result = await run_query(client.table('clients')\
                 .select('user_id')\
                 .eq('user_id', final_client_user_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not client_result.data:
                 raise HTTPException(status_code=404, detail="Client not found")
@@ -138,9 +107,8 @@ class PaymentRequestService:
             if booking_id:
                 payment_request_data['booking_id'] = str(booking_id)  # Ensure it's a string
             
-            result = client.table('payment_requests')\
-                .insert(payment_request_data)\
-                .execute()
+            result = await run_query(client.table('payment_requests')\
+                .insert(payment_request_data))
             
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to create payment request")
@@ -155,11 +123,10 @@ class PaymentRequestService:
                 service_title = None
                 service_color = None
                 if booking_service_id:
-                    service_result = client.table('creative_services')\
+                    service_result = await run_query(client.table('creative_services')\
                         .select('title, color')\
                         .eq('id', booking_service_id)\
-                        .single()\
-                        .execute()
+                        .single())
                     
                     if service_result.data:
                         service_title = service_result.data.get('title')
@@ -197,7 +164,8 @@ class PaymentRequestService:
                     'metadata': metadata
                 }
                 
-                notification_result = db_admin.table("notifications").insert(notification_data).execute()
+                notification_result = await run_query(db_admin.table("notifications").insert(notification_data))
+                notification_hub.publish_created(notification_result.data)
                 if is_dev_env():
                     logger.info("Payment request notification created for client: %s, notification_id: %s", final_client_user_id, notification_result.data[0]['id'] if notification_result.data else 'unknown')
                 
@@ -205,9 +173,9 @@ class PaymentRequestService:
                 if notification_result.data:
                     # Get client name
                     try:
-                        client_result = db_admin.table('clients').select('display_name').eq('user_id', final_client_user_id).single().execute()
+                        client_result = await run_query(db_admin.table('clients').select('display_name').eq('user_id', final_client_user_id).single())
                         client_name = client_result.data.get('display_name', 'Client') if client_result.data else 'Client'
-                        await _send_notification_email(notification_data, final_client_user_id, client_name, db_admin)
+                        await NotificationsController.send_notification_email(notification_data, recipient_name=client_name)
                     except Exception as email_error:
                         log_exception_if_dev(logger, "Failed to send payment request email", email_error)
             except Exception as notif_error:
@@ -240,10 +208,9 @@ class PaymentRequestService:
         """
         try:
             # Get total count first
-            count_result = client.table('payment_requests')\
+            count_result = await run_query(client.table('payment_requests')\
                 .select('id', count='exact')\
-                .eq('client_user_id', client_user_id)\
-                .execute()
+                .eq('client_user_id', client_user_id))
             
             total = count_result.count if count_result.count is not None else 0
             
@@ -251,12 +218,11 @@ class PaymentRequestService:
             offset = (page - 1) * page_size
             
             # Get payment requests with pagination - only select fields we actually need
-            result = client.table('payment_requests')\
+            result = await run_query(client.table('payment_requests')\
                 .select('id, creative_user_id, client_user_id, booking_id, amount, notes, status, created_at, paid_at, cancelled_at, stripe_session_id')\
                 .eq('client_user_id', client_user_id)\
                 .order('created_at', desc=True)\
-                .range(offset, offset + page_size - 1)\
-                .execute()
+                .range(offset, offset + page_size - 1))
             
             if not result.data:
                 return {
@@ -276,10 +242,9 @@ class PaymentRequestService:
             # Fetch creatives data
             creatives_map = {}
             if creative_ids:
-                creatives_result = client.table('creatives')\
+                creatives_result = await run_query(client.table('creatives')\
                     .select('user_id, display_name, profile_banner_url')\
-                    .in_('user_id', creative_ids)\
-                    .execute()
+                    .in_('user_id', creative_ids))
                 
                 if creatives_result.data:
                     for creative in creatives_result.data:
@@ -289,10 +254,9 @@ class PaymentRequestService:
             bookings_map = {}
             services_map = {}
             if booking_ids:
-                bookings_result = client.table('bookings')\
+                bookings_result = await run_query(client.table('bookings')\
                     .select('id, service_id, order_date')\
-                    .in_('id', booking_ids)\
-                    .execute()
+                    .in_('id', booking_ids))
                 
                 if bookings_result.data:
                     service_ids = list(set([b['service_id'] for b in bookings_result.data if b.get('service_id')]))
@@ -302,10 +266,9 @@ class PaymentRequestService:
                     
                     # Fetch services
                     if service_ids:
-                        services_result = client.table('creative_services')\
+                        services_result = await run_query(client.table('creative_services')\
                             .select('id, title')\
-                            .in_('id', service_ids)\
-                            .execute()
+                            .in_('id', service_ids))
                         
                         if services_result.data:
                             for service in services_result.data:
@@ -372,10 +335,9 @@ class PaymentRequestService:
         """
         try:
             # Get total count first
-            count_result = client.table('payment_requests')\
+            count_result = await run_query(client.table('payment_requests')\
                 .select('id', count='exact')\
-                .eq('creative_user_id', creative_user_id)\
-                .execute()
+                .eq('creative_user_id', creative_user_id))
             
             total = count_result.count if count_result.count is not None else 0
             
@@ -383,12 +345,11 @@ class PaymentRequestService:
             offset = (page - 1) * page_size
             
             # Get payment requests with pagination - only select fields we actually need
-            result = client.table('payment_requests')\
+            result = await run_query(client.table('payment_requests')\
                 .select('id, creative_user_id, client_user_id, booking_id, amount, notes, status, created_at, paid_at, cancelled_at, stripe_session_id')\
                 .eq('creative_user_id', creative_user_id)\
                 .order('created_at', desc=True)\
-                .range(offset, offset + page_size - 1)\
-                .execute()
+                .range(offset, offset + page_size - 1))
             
             if not result.data:
                 return {
@@ -408,10 +369,9 @@ class PaymentRequestService:
             # Fetch clients data
             clients_map = {}
             if client_ids:
-                clients_result = client.table('clients')\
+                clients_result = await run_query(client.table('clients')\
                     .select('user_id, display_name')\
-                    .in_('user_id', client_ids)\
-                    .execute()
+                    .in_('user_id', client_ids))
                 
                 if clients_result.data:
                     for client_data in clients_result.data:
@@ -421,10 +381,9 @@ class PaymentRequestService:
             bookings_map = {}
             services_map = {}
             if booking_ids:
-                bookings_result = client.table('bookings')\
+                bookings_result = await run_query(client.table('bookings')\
                     .select('id, service_id, order_date')\
-                    .in_('id', booking_ids)\
-                    .execute()
+                    .in_('id', booking_ids))
                 
                 if bookings_result.data:
                     service_ids = list(set([b['service_id'] for b in bookings_result.data if b.get('service_id')]))
@@ -434,10 +393,9 @@ class PaymentRequestService:
                     
                     # Fetch services
                     if service_ids:
-                        services_result = client.table('creative_services')\
+                        services_result = await run_query(client.table('creative_services')\
                             .select('id, title')\
-                            .in_('id', service_ids)\
-                            .execute()
+                            .in_('id', service_ids))
                         
                         if services_result.data:
                             for service in services_result.data:
@@ -500,11 +458,10 @@ class PaymentRequestService:
             Count of pending payment requests
         """
         try:
-            result = client.table('payment_requests')\
+            result = await run_query(client.table('payment_requests')\
                 .select('id', count='exact')\
                 .eq('client_user_id', client_user_id)\
-                .eq('status', 'pending')\
-                .execute()
+                .eq('status', 'pending'))
             
             return result.count or 0
             
@@ -533,11 +490,10 @@ class PaymentRequestService:
         try:
             # Use db_admin to bypass RLS since authorization is already verified in the router
             # This ensures both client and creative can see payment requests for the booking
-            result = db_admin.table('payment_requests')\
+            result = await run_query(db_admin.table('payment_requests')\
                 .select('id, creative_user_id, client_user_id, booking_id, amount, notes, status, created_at, paid_at, cancelled_at, stripe_session_id')\
                 .eq('booking_id', booking_id)\
-                .order('created_at', desc=True)\
-                .execute()
+                .order('created_at', desc=True))
             
             if not result.data:
                 return []
@@ -549,10 +505,9 @@ class PaymentRequestService:
             # Fetch creatives data (use db_admin to bypass RLS)
             creatives_map = {}
             if creative_ids:
-                creatives_result = db_admin.table('creatives')\
+                creatives_result = await run_query(db_admin.table('creatives')\
                     .select('user_id, display_name, profile_banner_url')\
-                    .in_('user_id', creative_ids)\
-                    .execute()
+                    .in_('user_id', creative_ids))
                 
                 if creatives_result.data:
                     for creative in creatives_result.data:
@@ -561,10 +516,9 @@ class PaymentRequestService:
             # Fetch clients data (use db_admin to bypass RLS)
             clients_map = {}
             if client_ids:
-                clients_result = db_admin.table('clients')\
+                clients_result = await run_query(db_admin.table('clients')\
                     .select('user_id, display_name')\
-                    .in_('user_id', client_ids)\
-                    .execute()
+                    .in_('user_id', client_ids))
                 
                 if clients_result.data:
                     for client_data in clients_result.data:
@@ -620,11 +574,10 @@ class PaymentRequestService:
         """
         try:
             # Get payment request - only select fields we actually need
-            result = client.table('payment_requests')\
+            result = await run_query(client.table('payment_requests')\
                 .select('id, creative_user_id, client_user_id, booking_id, amount, notes, status, stripe_session_id')\
                 .eq('id', payment_request_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not result.data:
                 raise HTTPException(status_code=404, detail="Payment request not found")
@@ -643,11 +596,10 @@ class PaymentRequestService:
             amount = float(payment_request['amount'])
             
             # Get creative's Stripe account ID and subscription tier
-            creative_result = client.table('creatives')\
+            creative_result = await run_query(client.table('creatives')\
                 .select('stripe_account_id, subscription_tier_id')\
                 .eq('user_id', creative_user_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not creative_result.data:
                 raise HTTPException(status_code=404, detail="Creative not found")
@@ -660,11 +612,10 @@ class PaymentRequestService:
             
             # Get subscription tier to determine platform fee percentage
             subscription_tier_id = creative.get('subscription_tier_id')
-            tier_result = client.table('subscription_tiers')\
+            tier_result = await run_query(client.table('subscription_tiers')\
                 .select('fee_percentage')\
                 .eq('id', subscription_tier_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not tier_result.data:
                 raise HTTPException(status_code=404, detail="Subscription tier not found")
@@ -708,10 +659,9 @@ class PaymentRequestService:
             )
             
             # Update payment request with session ID
-            client.table('payment_requests')\
+            await run_query(client.table('payment_requests')\
                 .update({'stripe_session_id': checkout_session.id})\
-                .eq('id', payment_request_id)\
-                .execute()
+                .eq('id', payment_request_id))
             
             return {
                 'checkout_url': checkout_session.url,
@@ -743,15 +693,12 @@ class PaymentRequestService:
         Returns:
             Dictionary containing success status and updated payment request info
         """
-        from datetime import datetime
-        
         try:
             # Get payment request details - only select fields we actually need
-            pr_result = client.table('payment_requests')\
+            pr_result = await run_query(client.table('payment_requests')\
                 .select('id, creative_user_id, client_user_id, booking_id, amount, status, stripe_session_id')\
                 .eq('id', payment_request_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not pr_result.data:
                 raise HTTPException(status_code=404, detail="Payment request not found")
@@ -775,11 +722,10 @@ class PaymentRequestService:
             creative_user_id = payment_request.get('creative_user_id')
             
             # Get creative's Stripe account ID
-            creative_result = client.table('creatives')\
+            creative_result = await run_query(client.table('creatives')\
                 .select('stripe_account_id')\
                 .eq('user_id', creative_user_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not creative_result.data:
                 raise HTTPException(status_code=404, detail="Creative not found")
@@ -789,11 +735,59 @@ class PaymentRequestService:
                 raise HTTPException(status_code=400, detail="Creative has not connected their Stripe account")
             
             # Retrieve the checkout session from Stripe (from the connected account)
-            checkout_session = stripe.checkout.Session.retrieve(
+            checkout_session = await run_blocking(
+                stripe.checkout.Session.retrieve,
                 session_id,
                 stripe_account=stripe_account_id
             )
             
+            return await PaymentRequestService.apply_paid_checkout_session(
+                checkout_session, payment_request_id, client
+            )
+            
+        except stripe.error.StripeError as e:
+            log_exception_if_dev(logger, "Stripe error verifying payment", e)
+            raise HTTPException(status_code=400, detail="Payment verification failed")
+        except HTTPException:
+            raise
+        except Exception as e:
+            log_exception_if_dev(logger, "Error verifying payment request", e)
+            raise HTTPException(status_code=500, detail="Failed to verify payment")
+    
+    @staticmethod
+    async def apply_paid_checkout_session(
+        checkout_session: Any,
+        payment_request_id: str,
+        client: Client
+    ) -> Dict[str, Any]:
+        """Mark a payment request paid from a completed checkout session and notify both parties
+        
+        Shared by the verify endpoint and the Stripe webhook worker. Only the call that
+        moves the request out of 'pending' sends notifications.
+        
+        Args:
+            checkout_session: The Stripe checkout session object (retrieved or from a webhook event)
+            payment_request_id: The payment request ID
+            client: Supabase client for database operations
+            
+        Returns:
+            Dictionary containing success status and updated payment request info
+        """
+        from datetime import datetime
+        
+        try:
+            session_id = checkout_session.id
+            pr_result = await run_query(client.table('payment_requests')\
+                .select('id, creative_user_id, client_user_id, booking_id, amount, status, stripe_session_id')\
+                .eq('id', payment_request_id)\
+                .single())
+            
+            if not pr_result.data:
+                raise HTTPException(status_code=404, detail="Payment request not found")
+            
+            payment_request = pr_result.data
+            creative_user_id = payment_request.get('creative_user_id')
+            
             # Verify payment was successful
             if checkout_session.payment_status != 'paid':
                 raise HTTPException(
@@ -818,15 +812,28 @@ class PaymentRequestService:
             
             # Update payment request status to paid
             now = datetime.utcnow().isoformat()
-            update_result = client.table('payment_requests')\
+            update_result = await run_query(client.table('payment_requests')\
                 .update({
                     'status': 'paid',
                     'paid_at': now
                 })\
                 .eq('id', payment_request_id)\
-                .execute()
+                .eq('status', 'pending'))
             
             if not update_result.data:
+                # Another worker/verify call already marked it paid - nothing left to do
+                refreshed = await run_query(client.table('payment_requests')\
+                    .select('status, amount')\
+                    .eq('id', payment_request_id)\
+                    .single())
+                if refreshed.data and refreshed.data.get('status') == 'paid':
+                    return {
+                        "success": True,
+                        "message": "Payment request already verified",
+                        "payment_request_id": payment_request_id,
+                        "status": "paid",
+                        "amount": float(refreshed.data.get('amount', 0))
+                    }
                 raise HTTPException(status_code=500, detail="Failed to update payment request")
             
             updated_payment_request = update_result.data[0]
@@ -839,11 +846,10 @@ class PaymentRequestService:
                 amount = float(payment_request.get('amount', 0))
                 
                 # Get client display name for creative notification
-                client_result = client.table('clients')\
+                client_result = await run_query(client.table('clients')\
                     .select('display_name')\
                     .eq('user_id', client_user_id)\
-                    .single()\
-                    .execute()
+                    .single())
                 
                 client_display_name = client_result.data.get('display_name', 'A client') if client_result.data else 'A client'
                 
@@ -854,21 +860,19 @@ class PaymentRequestService:
                 booking_service_id = None
                 
                 if booking_id:
-                    booking_result = client.table('bookings')\
+                    booking_result = await run_query(client.table('bookings')\
                         .select('service_id')\
                         .eq('id', booking_id)\
-                        .single()\
-                        .execute()
+                        .single())
                     
                     if booking_result.data:
                         booking_service_id = booking_result.data.get('service_id')
                 
                 if booking_service_id:
-                    service_result = client.table('creative_services')\
+                    service_result = await run_query(client.table('creative_services')\
                         .select('title, color')\
                         .eq('id', booking_service_id)\
-                        .single()\
-                        .execute()
+                        .single())
                     
                     if service_result.data:
                         service_title = service_result.data.get('title')
@@ -928,22 +932,22 @@ class PaymentRequestService:
                 }
                 
                 try:
-                    client_notif_result = db_admin.table("notifications")\
-                        .insert(client_notification_data)\
-                        .execute()
+                    client_notif_result = await run_query(db_admin.table("notifications")\
+                        .insert(client_notification_data))
+                    notification_hub.publish_created(client_notif_result.data)
                     if is_dev_env():
                         logger.info("Client payment notification created for client: %s, notification_id: %s", client_user_id, client_notif_result.data[0]['id'] if client_notif_result.data else 'unknown')
                     
                     # Send email notification
                     if client_notif_result.data:
-                        await _send_notification_email(client_notification_data, client_user_id, client_display_name, db_admin)
+                        await NotificationsController.send_notification_email(client_notification_data, recipient_name=client_display_name)
                 except Exception as notif_error:
                     log_exception_if_dev(logger, "Failed to create client payment notification", notif_error)
                 
                 try:
-                    creative_notif_result = db_admin.table("notifications")\
-                        .insert(creative_notification_data)\
-                        .execute()
+                    creative_notif_result = await run_query(db_admin.table("notifications")\
+                        .insert(creative_notification_data))
+                    notification_hub.publish_created(creative_notif_result.data)
                     if is_dev_env():
                         logger.info("Creative payment notification created for creative: %s, notification_id: %s", creative_user_id, creative_notif_result.data[0]['id'] if creative_notif_result.data else 'unknown')
                     
@@ -951,9 +955,9 @@ class PaymentRequestService:
                     if creative_notif_result.data:
                         # Get creative name
                         try:
-                            creative_result = db_admin.table('creatives').select('display_name').eq('user_id', creative_user_id).single().execute()
+                            creative_result = await run_query(db_admin.table('creatives').select('display_name').eq('user_id', creative_user_id).single())
                             creative_name = creative_result.data.get('display_name', 'Creative') if creative_result.data else 'Creative'
-                            await _send_notification_email(creative_notification_data, creative_user_id, creative_name, db_admin)
+                            await NotificationsController.send_notification_email(creative_notification_data, recipient_name=creative_name)
                         except Exception as email_error:
                             log_exception_if_dev(logger, "Failed to send payment received email to creative", email_error)
                 except Exception as notif_error:
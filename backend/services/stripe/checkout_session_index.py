@@ -0,0 +1,84 @@
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
+from supabase import Client
+from db.db_session import db_admin
+from db.query_executor import run_query
+from core.safe_errors import log_exception_if_dev
+
+logger = logging.getLogger(__name__)
+
+
+class CheckoutSessionIndex:
+    """Local booking -> Stripe checkout session index (booking_checkout_sessions)
+
+    Receipts are resolved from this table instead of listing checkout sessions on the
+    creative's connected account and filtering them by metadata.
+    """
+
+    @staticmethod
+    async def record_session(
+        checkout_session: Any,
+        booking_id: str,
+        stripe_account_id: str,
+        applied: bool = False
+    ) -> None:
+        """Index a checkout session for a booking
+
+        Existing rows are left untouched, so this never resets applied_at on a session that
+        was already counted towards the booking.
+
+        Args:
+            checkout_session: Stripe checkout session object
+            booking_id: The booking the session pays for
+            stripe_account_id: Connected account the session was created on
+            applied: Mark the session as already applied to bookings.amount_paid (backfill only)
+        """
+        created = checkout_session.get('created')
+        row = {
+            'session_id': checkout_session.get('id'),
+            'booking_id': booking_id,
+            'stripe_account_id': stripe_account_id,
+            'amount_total': checkout_session.get('amount_total'),
+            'payment_status': checkout_session.get('payment_status'),
+        }
+        if created:
+            row['created_at'] = datetime.fromtimestamp(created, tz=timezone.utc).isoformat()
+        if applied:
+            row['applied_at'] = datetime.now(timezone.utc).isoformat()
+
+        await run_query(db_admin.table('booking_checkout_sessions')\
+            .upsert(row, on_conflict='session_id', ignore_duplicates=True))
+
+    @staticmethod
+    async def get_paid_session_ids(booking_ids: List[str], client: Optional[Client] = None) -> Dict[str, List[str]]:
+        """Paid checkout session IDs per booking, oldest first
+
+        Split payments have two sessions (deposit, then final payment), so the order matters
+        for numbering receipts.
+
+        Args:
+            booking_ids: Bookings to look up (one query regardless of count)
+            client: Supabase client to query with (defaults to the service-role client)
+
+        Returns:
+            Dictionary mapping booking_id to its paid session IDs
+        """
+        if not booking_ids:
+            return {}
+
+        db_client = client or db_admin
+        try:
+            result = await run_query(db_client.table('booking_checkout_sessions')\
+                .select('session_id, booking_id')\
+                .in_('booking_id', booking_ids)\
+                .eq('payment_status', 'paid')\
+                .order('created_at'))
+        except Exception as e:
+            log_exception_if_dev(logger, "Could not load checkout sessions for bookings", e)
+            return {}
+
+        sessions_by_booking: Dict[str, List[str]] = {}
+        for row in (result.data or []):
+            sessions_by_booking.setdefault(str(row['booking_id']), []).append(row['session_id'])
+        return sessions_by_booking
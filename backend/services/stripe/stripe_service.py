@@ -7,7 +7,13 @@ from dotenv import load_dotenv
 import logging
 from datetime import datetime
 from db.db_session import db_admin
+from db.query_executor import run_query, run_blocking
+from services.stripe.checkout_session_index import CheckoutSessionIndex
+from services.notifications.notifications_service import NotificationsController
+from services.notifications.notification_hub import notification_hub
+from services.invoice.order_documents import OrderDocuments
 from core.safe_errors import log_exception_if_dev, is_dev_env
+from core.identity import identity_cache
 
 load_dotenv()
 
@@ -21,30 +27,6 @@ if not STRIPE_SECRET_KEY:
 stripe.api_key = STRIPE_SECRET_KEY
 
 
-async def _send_notification_email(notification_data: Dict[str, Any], recipient_user_id: str, recipient_name: str, client: Client = None):
-    """Helper function to send email after notification creation"""
-    try:
-        from services.notifications.notifications_service import NotificationsController
-        # Get recipient email
-        recipient_email = None
-        if client:
-            try:
-                user_result = client.table('users').select('email').eq('user_id', recipient_user_id).single().execute()
-                if user_result.data:
-                    recipient_email = user_result.data.get('email')
-            except:
-                pass
-        
-        await NotificationsController.send_notification_email(
-            notification_data=notification_data,
-            recipient_email=recipient_email,
-            recipient_name=recipient_name,
-            client=client
-        )
-    except Exception as e:
-        log_exception_if_dev(logger, "Failed to send notification email", e)
-
-
 class StripeService:
     @staticmethod
     async def create_connect_account(user_id: str, email: str, client: Client) -> Dict[str, Any]:
@@ -60,7 +42,7 @@ class StripeService:
         """
         try:
             # Check if account already exists
-            creative_result = client.table('creatives').select('stripe_account_id').eq('user_id', user_id).single().execute()
+            creative_result = await run_query(client.table('creatives').select('stripe_account_id').eq('user_id', user_id).single())
             
             if creative_result.data and creative_result.data.get('stripe_account_id'):
                 # Account already exists, create new onboarding link
@@ -90,11 +72,12 @@ class StripeService:
             )
             
             # Save account ID to database
-            client.table('creatives').update({
+            await run_query(client.table('creatives').update({
                 'stripe_account_id': account.id,
                 'stripe_onboarding_complete': False,
                 'stripe_payouts_enabled': False
-            }).eq('user_id', user_id).execute()
+            }).eq('user_id', user_id))
+            identity_cache.invalidate(user_id)
             
             # Create onboarding link
             frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:3000').rstrip('/')
@@ -135,9 +118,9 @@ class StripeService:
             Dictionary containing account status information
         """
         try:
-            creative_result = client.table('creatives').select(
+            creative_result = await run_query(client.table('creatives').select(
                 'stripe_account_id, stripe_onboarding_complete, stripe_payouts_enabled, stripe_account_type, stripe_last_payout_date'
-            ).eq('user_id', user_id).single().execute()
+            ).eq('user_id', user_id).single())
             
             if not creative_result.data:
                 raise HTTPException(status_code=404, detail="Creative profile not found")
@@ -231,12 +214,12 @@ class StripeService:
                     pass
                 
                 # Update database with ISO format timestamp
-                client.table('creatives').update({
+                await run_query(client.table('creatives').update({
                     'stripe_onboarding_complete': details_submitted,
                     'stripe_payouts_enabled': payouts_enabled,
                     'stripe_account_type': account_type,  # Will be None, 'individual', or 'company'
                     'stripe_last_payout_date': last_payout_date_iso
-                }).eq('user_id', user_id).execute()
+                }).eq('user_id', user_id))
                 
                 return {
                     "connected": True,
@@ -251,11 +234,12 @@ class StripeService:
             except stripe.error.StripeError as e:
                 # If account doesn't exist in Stripe, reset database
                 if e.code == 'resource_missing':
-                    client.table('creatives').update({
+                    await run_query(client.table('creatives').update({
                         'stripe_account_id': None,
                         'stripe_onboarding_complete': False,
                         'stripe_payouts_enabled': False
-                    }).eq('user_id', user_id).execute()
+                    }).eq('user_id', user_id))
+                    identity_cache.invalidate(user_id)
                 
                 log_exception_if_dev(logger, "Stripe error in get_account_status", e)
                 return {
@@ -283,12 +267,15 @@ class StripeService:
             Dictionary containing login_url
         """
         try:
-            creative_result = client.table('creatives').select('stripe_account_id').eq('user_id', user_id).single().execute()
+            identity = await identity_cache.get(user_id, client)
+            if identity is None or identity.creative is None or not identity.stripe_account_id:
+                # Not connected as far as the cached copy knows - the account may have just been created
+                identity = await identity_cache.get(user_id, client, fresh=True)
             
-            if not creative_result.data:
+            if identity is None or identity.creative is None:
                 raise HTTPException(status_code=404, detail="Creative profile not found")
             
-            account_id = creative_result.data.get('stripe_account_id')
+            account_id = identity.stripe_account_id
             
             if not account_id:
                 raise HTTPException(status_code=400, detail="Stripe account not connected")
@@ -342,11 +329,10 @@ class StripeService:
         """
         try:
             # Get booking details including creative_user_id
-            booking_result = client.table('bookings')\
+            booking_result = await run_query(client.table('bookings')\
                 .select('id, creative_user_id, price, payment_option, client_user_id')\
                 .eq('id', booking_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not booking_result.data:
                 raise HTTPException(status_code=404, detail="Booking not found")
@@ -360,11 +346,10 @@ class StripeService:
             creative_user_id = booking['creative_user_id']
             
             # Get creative's Stripe account ID and subscription tier
-            creative_result = client.table('creatives')\
+            creative_result = await run_query(client.table('creatives')\
                 .select('stripe_account_id, subscription_tier_id')\
                 .eq('user_id', creative_user_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not creative_result.data:
                 raise HTTPException(status_code=404, detail="Creative not found")
@@ -377,11 +362,10 @@ class StripeService:
             
             # Get subscription tier to determine platform fee percentage
             subscription_tier_id = creative.get('subscription_tier_id')
-            tier_result = client.table('subscription_tiers')\
+            tier_result = await run_query(client.table('subscription_tiers')\
                 .select('fee_percentage')\
                 .eq('id', subscription_tier_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not tier_result.data:
                 raise HTTPException(status_code=404, detail="Subscription tier not found")
@@ -427,7 +411,14 @@ class StripeService:
                 },
                 stripe_account=stripe_account_id,
             )
-            
+
+            # Index the session so receipts can be resolved locally once it is paid
+            try:
+                await CheckoutSessionIndex.record_session(checkout_session, booking_id, stripe_account_id)
+            except Exception as e:
+                # The verify call / webhook indexes it again when the payment completes
+                log_exception_if_dev(logger, "Failed to index checkout session", e)
+
             return {
                 "checkout_url": checkout_session.url,
                 "session_id": checkout_session.id,
@@ -458,6 +449,10 @@ class StripeService:
     ) -> Dict[str, Any]:
         """Verify a Stripe payment session and update booking status/amount_paid
         
+        The checkout.session.completed webhook normally applies the session before the
+        client lands on the success page, in which case this only reads local state.
+        Stripe is only queried when the webhook has not been processed yet.
+        
         Args:
             session_id: The Stripe checkout session ID
             booking_id: The booking ID
@@ -466,28 +461,30 @@ class StripeService:
         Returns:
             Dictionary containing success status and updated booking info
         """
-        from datetime import datetime
-        
         try:
+            # Fast path: session already applied by the webhook worker (or an earlier verify call)
+            applied_session = await StripeService._get_applied_checkout_session(session_id)
+            if applied_session:
+                if applied_session.get('booking_id') != booking_id:
+                    raise HTTPException(status_code=400, detail="Booking ID mismatch in payment session")
+                return await StripeService._booking_payment_result(booking_id, client)
+            
             # Get booking details first to find the creative's Stripe account
-            booking_result = client.table('bookings')\
-                .select('id, price, payment_option, amount_paid, client_status, creative_status, client_user_id, creative_user_id, service_id')\
+            booking_result = await run_query(client.table('bookings')\
+                .select('id, creative_user_id')\
                 .eq('id', booking_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not booking_result.data:
                 raise HTTPException(status_code=404, detail="Booking not found")
             
-            booking = booking_result.data
-            creative_user_id = booking.get('creative_user_id')
+            creative_user_id = booking_result.data.get('creative_user_id')
             
             # Get creative's Stripe account ID
-            creative_result = client.table('creatives')\
+            creative_result = await run_query(client.table('creatives')\
                 .select('stripe_account_id')\
                 .eq('user_id', creative_user_id)\
-                .single()\
-                .execute()
+                .single())
             
             if not creative_result.data:
                 raise HTTPException(status_code=404, detail="Creative not found")
@@ -497,11 +494,90 @@ class StripeService:
                 raise HTTPException(status_code=400, detail="Creative has not connected their Stripe account")
             
             # Retrieve the checkout session from Stripe (from the connected account)
-            checkout_session = stripe.checkout.Session.retrieve(
+            checkout_session = await run_blocking(
+                stripe.checkout.Session.retrieve,
                 session_id,
                 stripe_account=stripe_account_id
             )
             
+            return await StripeService.apply_checkout_session_to_booking(
+                checkout_session, booking_id, stripe_account_id, client
+            )
+            
+        except stripe.error.StripeError as e:
+            log_exception_if_dev(logger, "Stripe error verifying payment", e)
+            raise HTTPException(status_code=400, detail="Payment verification failed")
+        except HTTPException:
+            raise
+        except Exception as e:
+            log_exception_if_dev(logger, "Error verifying payment", e)
+            raise HTTPException(status_code=500, detail="Failed to verify payment")
+    
+    @staticmethod
+    async def _get_applied_checkout_session(session_id: str) -> Optional[Dict[str, Any]]:
+        """Return the booking_checkout_sessions row if the session has already been applied"""
+        result = await run_query(db_admin.table('booking_checkout_sessions')\
+            .select('session_id, booking_id, applied_at')\
+            .eq('session_id', session_id)\
+            .limit(1))
+        if result.data and result.data[0].get('applied_at'):
+            return result.data[0]
+        return None
+    
+    @staticmethod
+    async def _booking_payment_result(booking_id: str, client: Client) -> Dict[str, Any]:
+        """Build the verify response from the locally stored booking state"""
+        booking_result = await run_query(client.table('bookings')\
+            .select('id, amount_paid, payment_status, client_status, creative_status')\
+            .eq('id', booking_id)\
+            .single())
+        
+        if not booking_result.data:
+            raise HTTPException(status_code=404, detail="Booking not found")
+        
+        booking = booking_result.data
+        return {
+            "success": True,
+            "message": "Payment verified and booking updated successfully",
+            "booking_id": booking_id,
+            "amount_paid": float(booking.get('amount_paid') or 0),
+            "payment_status": booking.get('payment_status'),
+            "client_status": booking.get('client_status'),
+            "creative_status": booking.get('creative_status')
+        }
+    
+    @staticmethod
+    async def apply_checkout_session_to_booking(
+        checkout_session: Any,
+        booking_id: str,
+        stripe_account_id: str,
+        client: Client
+    ) -> Dict[str, Any]:
+        """Apply a paid checkout session to a booking (amount_paid, statuses, notifications)
+        
+        Shared by the verify endpoint and the Stripe webhook worker. Idempotent per session.
+        
+        Args:
+            checkout_session: The Stripe checkout session object (retrieved or from a webhook event)
+            booking_id: The booking ID
+            stripe_account_id: The connected account the session was created on
+            client: Supabase client for database operations
+            
+        Returns:
+            Dictionary containing success status and updated booking info
+        """
+        try:
+            booking_result = await run_query(client.table('bookings')\
+                .select('id, price, payment_option, amount_paid, client_status, creative_status, client_user_id, creative_user_id, service_id')\
+                .eq('id', booking_id)\
+                .single())
+            
+            if not booking_result.data:
+                raise HTTPException(status_code=404, detail="Booking not found")
+            
+            booking = booking_result.data
+            creative_user_id = booking.get('creative_user_id')
+            
             # Verify payment was successful
             if checkout_session.payment_status != 'paid':
                 raise HTTPException(
@@ -516,77 +592,14 @@ class StripeService:
                     status_code=400,
                     detail="Booking ID mismatch in payment session"
                 )
-            price = float(booking.get('price', 0))
-            payment_option = booking.get('payment_option', 'later')
-            current_amount_paid = float(booking.get('amount_paid', 0))
-            
-            # Get the amount paid from the session (in dollars)
-            amount_total = checkout_session.amount_total / 100.0  # Convert from cents
-            
-            # Calculate new amount_paid
-            new_amount_paid = current_amount_paid + amount_total
-            
-            # Determine new statuses based on payment type
-            client_status = booking.get('client_status')
-            creative_status = booking.get('creative_status')
-            payment_status = 'pending'
-            
-            # Update status based on payment option
-            if payment_option == 'split':
-                # For split payment, if this is the first payment (50%), move to in_progress
-                if current_amount_paid == 0:
-                    # First payment - move to in_progress
-                    client_status = 'in_progress'
-                    creative_status = 'in_progress'
-                    payment_status = 'deposit_paid'
-                elif new_amount_paid >= price:
-                    # Second payment - fully paid
-                    payment_status = 'fully_paid'
-                else:
-                    # Partial payment
-                    payment_status = 'deposit_paid'
-            elif payment_option == 'upfront':
-                # For upfront payment, move to in_progress when paid
-                client_status = 'in_progress'
-                creative_status = 'in_progress'
-                payment_status = 'fully_paid'
-            elif payment_option == 'later':
-                # Payment later - status should already be in_progress
-                if new_amount_paid >= price:
-                    payment_status = 'fully_paid'
-                else:
-                    payment_status = 'deposit_paid'
-            
-            # Check if this is a locked order that's now fully paid
-            current_client_status = booking.get('client_status')
-            is_locked_order = current_client_status == 'locked'
-            is_fully_paid = new_amount_paid >= price
-            
-            # If order is fully paid (regardless of current status), check for files and update statuses
-            if is_fully_paid:
-                # Check if order has files
-                deliverables_response = client.table('booking_deliverables')\
-                    .select('id')\
-                    .eq('booking_id', booking_id)\
-                    .execute()
-                
-                has_files = deliverables_response.data and len(deliverables_response.data) > 0
-                
-                if has_files:
-                    # Order has files - client can download, creative is completed
-                    client_status = 'download'
-                    creative_status = 'completed'
-                else:
-                    # No files - both are completed
-                    client_status = 'completed'
-                    creative_status = 'completed'
             
             # Get payment timestamp from payment intent (most accurate - when payment was actually processed)
             payment_timestamp = None
             try:
                 # Try to get payment intent for accurate payment timestamp
                 if hasattr(checkout_session, 'payment_intent') and checkout_session.payment_intent:
-                    payment_intent = stripe.PaymentIntent.retrieve(
+                    payment_intent = await run_blocking(
+                        stripe.PaymentIntent.retrieve,
                         checkout_session.payment_intent,
                         stripe_account=stripe_account_id
                     )
@@ -611,35 +624,35 @@ class StripeService:
                 from datetime import timezone
                 payment_timestamp = datetime.now(timezone.utc)
             
-            # Update booking with new amount_paid and statuses
-            # Explicitly set updated_at to payment timestamp to ensure accurate last payment date
-            # Format as ISO string with timezone for Supabase
-            update_data = {
-                'amount_paid': new_amount_paid,
-                'payment_status': payment_status,
-                'updated_at': payment_timestamp.isoformat(),
-            }
+            # Claim the session and add its amount to the booking in one transaction (see the
+            # apply_booking_checkout_session migration): a failure rolls the claim back, and the
+            # increment happens under the booking's row lock so concurrent sessions don't overwrite
+            # each other. The payment timestamp becomes updated_at (the last payment date).
+            apply_result = await run_query(db_admin.rpc('apply_booking_checkout_session', {
+                'p_session_id': checkout_session.id,
+                'p_booking_id': booking_id,
+                'p_stripe_account_id': stripe_account_id,
+                'p_amount_total': checkout_session.amount_total,
+                'p_paid_at': payment_timestamp.isoformat()
+            }))
+            if not apply_result.data:
+                # Already applied (by the webhook worker or an earlier verify call)
+                return await StripeService._booking_payment_result(booking_id, client)
+            
+            updated_booking = apply_result.data['booking']
+            price = float(updated_booking.get('price') or 0)
+            payment_option = updated_booking.get('payment_option') or 'later'
+            amount_total = checkout_session.amount_total / 100.0  # Convert from cents
+            new_amount_paid = float(updated_booking.get('amount_paid') or 0)
+            payment_status = updated_booking.get('payment_status')
             
-            # Update statuses if they're changing to in_progress
-            if client_status == 'in_progress' and booking.get('client_status') != 'in_progress':
-                update_data['client_status'] = client_status
-            if creative_status == 'in_progress' and booking.get('creative_status') != 'in_progress':
-                update_data['creative_status'] = creative_status
+            # Check if this was a locked order that's now fully paid
+            is_locked_order = apply_result.data.get('previous_client_status') == 'locked'
+            is_fully_paid = new_amount_paid >= price
             
-            # Update statuses if order is now fully paid (regardless of previous status)
+            # A fully paid order is final (completed / download); store its documents
             if is_fully_paid:
-                update_data['client_status'] = client_status
-                update_data['creative_status'] = creative_status
-            
-            update_response = client.table('bookings')\
-                .update(update_data)\
-                .eq('id', booking_id)\
-                .execute()
-            
-            if not update_response.data or len(update_response.data) == 0:
-                raise HTTPException(status_code=500, detail="Failed to update booking")
-            
-            updated_booking = update_response.data[0]
+                OrderDocuments.schedule_prerender(booking_id)
             
             # Create notifications for both client and creative after successful payment
             try:
@@ -647,31 +660,28 @@ class StripeService:
                 service_id = booking.get('service_id')
                 service_title = 'Service'
                 if service_id:
-                    service_result = db_admin.table('creative_services')\
+                    service_result = await run_query(db_admin.table('creative_services')\
                         .select('id, title')\
                         .eq('id', service_id)\
-                        .single()\
-                        .execute()
+                        .single())
                     
                     if service_result.data:
                         service_title = service_result.data.get('title', 'Service')
                 
                 # Get client display name from clients table
                 client_user_id = booking.get('client_user_id')
-                client_result = db_admin.table('clients')\
+                client_result = await run_query(db_admin.table('clients')\
                     .select('display_name')\
                     .eq('user_id', client_user_id)\
-                    .single()\
-                    .execute()
+                    .single())
                 
                 client_display_name = client_result.data.get('display_name', 'A client') if client_result.data else 'A client'
                 
                 # Get creative display name from creatives table
-                creative_result = db_admin.table('creatives')\
+                creative_result = await run_query(db_admin.table('creatives')\
                     .select('display_name')\
                     .eq('user_id', creative_user_id)\
-                    .single()\
-                    .execute()
+                    .single())
                 
                 creative_display_name = creative_result.data.get('display_name', 'A creative') if creative_result.data else 'A creative'
                 
@@ -692,10 +702,9 @@ class StripeService:
                 if was_locked:
                     # Locked order was unlocked - send unlock notifications
                     # Check if files exist to customize message
-                    deliverables_check = db_admin.table('booking_deliverables')\
+                    deliverables_check = await run_query(db_admin.table('booking_deliverables')\
                         .select('id')\
-                        .eq('booking_id', booking_id)\
-                        .execute()
+                        .eq('booking_id', booking_id))
                     has_files_for_notification = deliverables_check.data and len(deliverables_check.data) > 0
                     
                     if has_files_for_notification and final_client_status == 'download' and final_creative_status == 'completed':
@@ -844,28 +853,28 @@ class StripeService:
                 # Create notifications (don't fail payment verification if notification creation fails)
                 # Use db_admin to bypass RLS policies for notification insertion
                 try:
-                    client_notif_result = db_admin.table("notifications") \
-                        .insert(client_notification_data) \
-                        .execute()
+                    client_notif_result = await run_query(db_admin.table("notifications") \
+                        .insert(client_notification_data))
+                    notification_hub.publish_created(client_notif_result.data)
                     if is_dev_env():
                         logger.info("Client payment notification created: %s", client_notif_result.data)
                     
                     # Send email notification
                     if client_notif_result.data:
-                        await _send_notification_email(client_notification_data, booking.get('client_user_id'), client_display_name, db_admin)
+                        await NotificationsController.send_notification_email(client_notification_data, recipient_name=client_display_name)
                 except Exception as notif_error:
                     log_exception_if_dev(logger, "Failed to create client payment notification", notif_error)
                 
                 try:
-                    creative_notif_result = db_admin.table("notifications") \
-                        .insert(creative_notification_data) \
-                        .execute()
+                    creative_notif_result = await run_query(db_admin.table("notifications") \
+                        .insert(creative_notification_data))
+                    notification_hub.publish_created(creative_notif_result.data)
                     if is_dev_env():
                         logger.info("Creative payment notification created: %s", creative_notif_result.data)
                     
                     # Send email notification
                     if creative_notif_result.data:
-                        await _send_notification_email(creative_notification_data, creative_user_id, creative_display_name, db_admin)
+                        await NotificationsController.send_notification_email(creative_notification_data, recipient_name=creative_display_name)
                 except Exception as notif_error:
                     log_exception_if_dev(logger, "Failed to create creative payment notification", notif_error)
                     
@@ -0,0 +1,390 @@
+import os
+import json
+import random
+import asyncio
+import logging
+import stripe
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List
+from fastapi import HTTPException
+from dotenv import load_dotenv
+from db.db_session import db_admin
+from db.query_executor import run_query
+from core.safe_errors import log_exception_if_dev, is_dev_env
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Signing secrets for the platform endpoint and the Connect endpoint (events from connected accounts).
+# Both deliver to the same URL, so a payload is accepted if it verifies against either secret.
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+STRIPE_CONNECT_WEBHOOK_SECRET = os.getenv("STRIPE_CONNECT_WEBHOOK_SECRET")
+
+# Background worker tuning
+WEBHOOK_WORKER_CONCURRENCY = int(os.getenv("STRIPE_WEBHOOK_WORKERS", "2"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("STRIPE_WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_RETRY_BASE_DELAY = 2.0
+WEBHOOK_RETRY_MAX_DELAY = 300.0
+# Maximum number of unfinished events re-queued from the database on startup
+WEBHOOK_RECOVERY_BATCH_SIZE = 200
+# A worker renews its lease (updated_at) on an event every WEBHOOK_LEASE_RENEW_SECONDS while applying
+# it; events left in 'processing' longer than WEBHOOK_PROCESSING_STALE_SECONDS (process died
+# mid-apply) are handed back to the queue, checked every WEBHOOK_STALE_CHECK_INTERVAL seconds
+WEBHOOK_LEASE_RENEW_SECONDS = 60
+WEBHOOK_PROCESSING_STALE_SECONDS = 300
+WEBHOOK_STALE_CHECK_INTERVAL = 60.0
+
+CHECKOUT_COMPLETED_EVENTS = (
+    'checkout.session.completed',
+    'checkout.session.async_payment_succeeded',
+)
+
+
+class StripeWebhookService:
+    """Verifies, stores and applies Stripe webhook events
+
+    Events are written to stripe_webhook_events once per Stripe event id, so Stripe retries and
+    duplicate deliveries are acknowledged without being applied twice. Processing happens off the
+    request path in StripeWebhookWorker.
+    """
+
+    @staticmethod
+    def construct_event(payload: bytes, sig_header: Optional[str]) -> stripe.Event:
+        """Verify the Stripe-Signature header and parse the event
+
+        Raises:
+            HTTPException 400 if the signature is missing or does not match any configured secret
+        """
+        if not sig_header:
+            raise HTTPException(status_code=400, detail="Missing Stripe signature")
+
+        secrets = [s for s in (STRIPE_WEBHOOK_SECRET, STRIPE_CONNECT_WEBHOOK_SECRET) if s]
+        if not secrets:
+            logger.error("Stripe webhook received but no webhook signing secret is configured")
+            raise HTTPException(status_code=500, detail="Webhook not configured")
+
+        for secret in secrets:
+            try:
+                return stripe.Webhook.construct_event(payload, sig_header, secret)
+            except stripe.error.SignatureVerificationError:
+                continue
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid payload")
+
+        raise HTTPException(status_code=400, detail="Invalid signature")
+
+    @staticmethod
+    async def record_event(event: stripe.Event, payload: bytes) -> bool:
+        """Persist a verified event together with its raw payload
+
+        Returns:
+            True if the event is new (or still needs processing), False if it was already handled
+        """
+        data_object = event.get('data', {}).get('object', {}) or {}
+        event_row = {
+            'id': event.id,
+            'event_type': event.type,
+            'object_id': data_object.get('id'),
+            'stripe_account_id': event.get('account'),
+            'livemode': bool(event.get('livemode', False)),
+            'payload': json.loads(payload),
+            'status': 'pending'
+        }
+
+        insert_result = await run_query(db_admin.table('stripe_webhook_events')\
+            .upsert(event_row, on_conflict='id', ignore_duplicates=True))
+
+        if insert_result.data:
+            return True
+
+        # Duplicate delivery - only worth queueing again if an earlier attempt did not finish
+        existing = await run_query(db_admin.table('stripe_webhook_events')\
+            .select('status')\
+            .eq('id', event.id)\
+            .limit(1))
+        return bool(existing.data) and existing.data[0].get('status') in ('pending', 'failed')
+
+    @staticmethod
+    async def process_event(event_id: str) -> str:
+        """Claim a stored event and apply it
+
+        Returns:
+            The final status of the event ('processed', 'ignored', 'failed' or 'skipped' when
+            another worker already owns it)
+        """
+        event_result = await run_query(db_admin.table('stripe_webhook_events')\
+            .select('id, payload, status, attempts')\
+            .eq('id', event_id)\
+            .limit(1))
+
+        if not event_result.data:
+            return 'skipped'
+
+        stored = event_result.data[0]
+        if stored.get('status') not in ('pending', 'failed'):
+            return 'skipped'
+
+        # Claim the event; the status/attempts guard makes concurrent workers race safely
+        claim_result = await run_query(db_admin.table('stripe_webhook_events')\
+            .update({
+                'status': 'processing',
+                'attempts': (stored.get('attempts') or 0) + 1,
+                'updated_at': datetime.now(timezone.utc).isoformat()
+            })\
+            .eq('id', event_id)\
+            .eq('status', stored.get('status'))\
+            .eq('attempts', stored.get('attempts') or 0))
+
+        if not claim_result.data:
+            return 'skipped'
+
+        lease = asyncio.create_task(StripeWebhookService._renew_lease(event_id))
+        try:
+            event = stripe.Event.construct_from(stored['payload'], stripe.api_key)
+            handled = await StripeWebhookService._dispatch(event)
+            status = 'processed' if handled else 'ignored'
+            now = datetime.now(timezone.utc).isoformat()
+            await run_query(db_admin.table('stripe_webhook_events')\
+                .update({
+                    'status': status,
+                    'last_error': None,
+                    'processed_at': now,
+                    'updated_at': now
+                })\
+                .eq('id', event_id))
+            return status
+        except Exception as e:
+            # Client errors (missing booking, mismatched metadata) will not succeed on retry
+            permanent = isinstance(e, HTTPException) and e.status_code < 500
+            await run_query(db_admin.table('stripe_webhook_events')\
+                .update({
+                    'status': 'ignored' if permanent else 'failed',
+                    'last_error': str(getattr(e, 'detail', e))[:1000],
+                    'updated_at': datetime.now(timezone.utc).isoformat()
+                })\
+                .eq('id', event_id))
+            raise
+        finally:
+            lease.cancel()
+
+    @staticmethod
+    async def _renew_lease(event_id: str) -> None:
+        """Keep a claimed event from looking abandoned while it is applied (cancelled when done)"""
+        while True:
+            await asyncio.sleep(WEBHOOK_LEASE_RENEW_SECONDS)
+            try:
+                await run_query(db_admin.table('stripe_webhook_events')\
+                    .update({'updated_at': datetime.now(timezone.utc).isoformat()})\
+                    .eq('id', event_id)\
+                    .eq('status', 'processing'))
+            except Exception as e:
+                log_exception_if_dev(logger, "Failed to renew Stripe webhook event lease", e)
+
+    @staticmethod
+    async def _dispatch(event: stripe.Event) -> bool:
+        """Route an event to the service that owns the affected records
+
+        Returns:
+            True if the event changed local state, False if it is not relevant to us
+        """
+        # Imported here to avoid circular imports (these services import notification helpers)
+        from services.stripe.stripe_service import StripeService
+        from services.subscriptions.subscription_service import SubscriptionService
+        from services.payment_requests.payment_request_service import PaymentRequestService
+
+        event_type = event.type
+        data_object = event.data.object
+
+        if event_type in CHECKOUT_COMPLETED_EVENTS:
+            if data_object.get('payment_status') != 'paid':
+                # Delayed payment methods finish with checkout.session.async_payment_succeeded
+                return False
+
+            metadata = data_object.get('metadata') or {}
+            if metadata.get('payment_request_id'):
+                await PaymentRequestService.apply_paid_checkout_session(
+                    data_object, metadata['payment_request_id'], db_admin
+                )
+                return True
+            if metadata.get('booking_id'):
+                await StripeService.apply_checkout_session_to_booking(
+                    data_object, metadata['booking_id'], event.get('account'), db_admin
+                )
+                return True
+            if data_object.get('mode') == 'subscription':
+                await SubscriptionService.apply_subscription_checkout(data_object)
+                return True
+            return False
+
+        if event_type == 'invoice.paid':
+            return await SubscriptionService.record_invoice_paid(data_object)
+
+        if event_type.startswith('customer.subscription.'):
+            return await SubscriptionService.sync_subscription(data_object)
+
+        if event_type in ('payout.paid', 'payout.created') and event.get('account'):
+            arrival_date = data_object.get('arrival_date') or data_object.get('created')
+            if not arrival_date:
+                return False
+            await run_query(db_admin.table('creatives')\
+                .update({
+                    'stripe_last_payout_date': datetime.fromtimestamp(arrival_date, tz=timezone.utc).isoformat()
+                })\
+                .eq('stripe_account_id', event.get('account')))
+            return True
+
+        if event_type == 'account.updated':
+            await run_query(db_admin.table('creatives')\
+                .update({
+                    'stripe_onboarding_complete': bool(data_object.get('details_submitted', False)),
+                    'stripe_payouts_enabled': bool(data_object.get('payouts_enabled', False))
+                })\
+                .eq('stripe_account_id', data_object.get('id')))
+            return True
+
+        return False
+
+    @staticmethod
+    async def get_processed_checkout_session(session_id: str) -> Optional[Dict[str, Any]]:
+        """Return the checkout session payload if its completion webhook was already applied"""
+        result = await run_query(db_admin.table('stripe_webhook_events')\
+            .select('payload')\
+            .eq('object_id', session_id)\
+            .in_('event_type', list(CHECKOUT_COMPLETED_EVENTS))\
+            .eq('status', 'processed')\
+            .limit(1))
+
+        if not result.data:
+            return None
+        return ((result.data[0].get('payload') or {}).get('data') or {}).get('object')
+
+    @staticmethod
+    async def get_unfinished_event_ids(limit: int = WEBHOOK_RECOVERY_BATCH_SIZE) -> List[str]:
+        """Events that were received but never applied (e.g. the process restarted mid-queue)"""
+        result = await run_query(db_admin.table('stripe_webhook_events')\
+            .select('id, attempts')\
+            .in_('status', ['pending', 'failed'])\
+            .lt('attempts', WEBHOOK_MAX_ATTEMPTS)\
+            .order('received_at')\
+            .limit(limit))
+
+        event_ids = []
+        for row in result.data or []:
+            event_ids.append(row['id'])
+        return event_ids
+
+    @staticmethod
+    async def reset_stale_processing() -> List[str]:
+        """Hand events left in 'processing' by a dead process back to the queue; returns their ids"""
+        stale_before = (datetime.now(timezone.utc) - timedelta(seconds=WEBHOOK_PROCESSING_STALE_SECONDS)).isoformat()
+        result = await run_query(db_admin.table('stripe_webhook_events')\
+            .update({
+                'status': 'failed',
+                'last_error': 'Interrupted during processing',
+                'updated_at': datetime.now(timezone.utc).isoformat()
+            })\
+            .eq('status', 'processing')\
+            .lt('updated_at', stale_before))
+        return [row['id'] for row in (result.data or []) if (row.get('attempts') or 0) < WEBHOOK_MAX_ATTEMPTS]
+
+
+class StripeWebhookWorker:
+    """In-process queue that applies stored webhook events with retries
+
+    The webhook endpoint only verifies and stores an event, then enqueues its id here so Stripe gets
+    its 2xx immediately. Failed events are retried with exponential backoff up to
+    WEBHOOK_MAX_ATTEMPTS; client errors (4xx) are not retried. On startup, events that were stored
+    but never finished are re-queued from the database, and events abandoned in 'processing' by a
+    dead process (stale lease) are re-queued as they are found.
+    """
+
+    def __init__(self, concurrency: int = WEBHOOK_WORKER_CONCURRENCY):
+        self._concurrency = max(1, concurrency)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retry_handles: List[asyncio.TimerHandle] = []
+
+    def enqueue(self, event_id: str) -> None:
+        if self._queue is None:
+            # Worker not started (e.g. scripts) - the event stays pending and is recovered on next startup
+            return
+        self._queue.put_nowait((event_id, 1))
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"stripe-webhook-worker-{i}")
+            for i in range(self._concurrency)
+        ]
+        self._tasks.append(asyncio.create_task(self._recover_stale(), name="stripe-webhook-stale-check"))
+
+        try:
+            await StripeWebhookService.reset_stale_processing()
+            event_ids = await StripeWebhookService.get_unfinished_event_ids()
+            for event_id in event_ids:
+                self._queue.put_nowait((event_id, 1))
+            if event_ids and is_dev_env():
+                logger.info(f"Re-queued {len(event_ids)} unfinished Stripe webhook events")
+        except Exception as e:
+            log_exception_if_dev(logger, "Failed to recover unfinished Stripe webhook events", e)
+
+    async def stop(self) -> None:
+        for handle in self._retry_handles:
+            handle.cancel()
+        self._retry_handles = []
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def _run(self) -> None:
+        while True:
+            event_id, attempt = await self._queue.get()
+            try:
+                status = await StripeWebhookService.process_event(event_id)
+                if is_dev_env():
+                    logger.info(f"Stripe webhook event {event_id}: {status}")
+            except asyncio.CancelledError:
+                raise
+            except HTTPException as e:
+                if e.status_code < 500:
+                    # Bad data for this event (missing booking, mismatched metadata) - retrying won't help
+                    logger.warning(f"Stripe webhook event {event_id} rejected: {e.detail}")
+                else:
+                    self._schedule_retry(event_id, attempt)
+            except Exception as e:
+                log_exception_if_dev(logger, f"Error processing Stripe webhook event {event_id}", e)
+                self._schedule_retry(event_id, attempt)
+            finally:
+                self._queue.task_done()
+
+    async def _recover_stale(self) -> None:
+        while True:
+            await asyncio.sleep(WEBHOOK_STALE_CHECK_INTERVAL)
+            try:
+                for event_id in await StripeWebhookService.reset_stale_processing():
+                    self._queue.put_nowait((event_id, 1))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_exception_if_dev(logger, "Failed to recover stale Stripe webhook events", e)
+
+    def _schedule_retry(self, event_id: str, attempt: int) -> None:
+        if attempt >= WEBHOOK_MAX_ATTEMPTS or self._queue is None:
+            logger.error(f"Stripe webhook event {event_id} failed after {attempt} attempts")
+            return
+
+        delay = min(WEBHOOK_RETRY_MAX_DELAY, WEBHOOK_RETRY_BASE_DELAY * (2 ** (attempt - 1)))
+        delay += random.uniform(0, delay / 4)
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        handle = loop.call_later(delay, queue.put_nowait, (event_id, attempt + 1))
+        self._retry_handles = [h for h in self._retry_handles if not h.cancelled()]
+        self._retry_handles.append(handle)
+
+
+stripe_webhook_worker = StripeWebhookWorker()
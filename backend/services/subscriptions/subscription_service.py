@@ -7,7 +7,9 @@ from dotenv import load_dotenv
 import logging
 from datetime import datetime
 from db.db_session import db_admin
+from db.query_executor import run_query, run_blocking
 from core.safe_errors import log_exception_if_dev
+from core.identity import identity_cache
 
 load_dotenv()
 
@@ -40,9 +42,9 @@ class SubscriptionService:
         """
         try:
             # Get subscription tier details using admin client to bypass RLS
-            tier_result = db_admin.table('subscription_tiers').select(
+            tier_result = await run_query(db_admin.table('subscription_tiers').select(
                 'id, name, price, stripe_price_id, stripe_product_id'
-            ).eq('id', subscription_tier_id).single().execute()
+            ).eq('id', subscription_tier_id).single())
             
             if not tier_result.data:
                 raise HTTPException(status_code=404, detail="Subscription tier not found")
@@ -57,16 +59,16 @@ class SubscriptionService:
                 )
             
             # Get or create Stripe customer using admin client
-            user_result = db_admin.table('users').select('user_id, email').eq('user_id', user_id).single().execute()
+            user_result = await run_query(db_admin.table('users').select('user_id, email').eq('user_id', user_id).single())
             if not user_result.data:
                 raise HTTPException(status_code=404, detail="User not found")
             
             user_email = user_result.data.get('email')
             
             # Check if user already has a Stripe customer ID in user_subscriptions
-            existing_sub = db_admin.table('user_subscriptions').select(
+            existing_sub = await run_query(db_admin.table('user_subscriptions').select(
                 'stripe_customer_id'
-            ).eq('user_id', user_id).order('created_at', desc=True).limit(1).execute()
+            ).eq('user_id', user_id).order('created_at', desc=True).limit(1))
             
             stripe_customer_id = None
             if existing_sub.data and existing_sub.data[0].get('stripe_customer_id'):
@@ -96,9 +98,9 @@ class SubscriptionService:
                     stripe_product_id = product.id
                     
                     # Update database with product ID using admin client
-                    db_admin.table('subscription_tiers').update({
+                    await run_query(db_admin.table('subscription_tiers').update({
                         'stripe_product_id': stripe_product_id
-                    }).eq('id', subscription_tier_id).execute()
+                    }).eq('id', subscription_tier_id))
                 
                 # Create price
                 price_cents = int(float(tier['price']) * 100)
@@ -113,9 +115,9 @@ class SubscriptionService:
                 stripe_price_id = price.id
                 
                 # Update database with price ID using admin client
-                db_admin.table('subscription_tiers').update({
+                await run_query(db_admin.table('subscription_tiers').update({
                     'stripe_price_id': stripe_price_id
-                }).eq('id', subscription_tier_id).execute()
+                }).eq('id', subscription_tier_id))
             
             # Get frontend URL for redirects
             frontend_url = os.getenv('FRONTEND_URL', 'http://localhost:3000').rstrip('/')
@@ -157,6 +159,9 @@ class SubscriptionService:
     ) -> Dict[str, Any]:
         """Verify a Stripe subscription session and update user subscription
         
+        Reads local state when the checkout.session.completed webhook has already
+        been processed; otherwise retrieves the session from Stripe and applies it.
+        
         Args:
             session_id: The Stripe checkout session ID
             client: Supabase client for database operations
@@ -165,85 +170,31 @@ class SubscriptionService:
             Dictionary containing success status and subscription info
         """
         try:
+            from services.stripe.webhook_service import StripeWebhookService
+            
+            # Fast path: the webhook worker already applied this session
+            processed_session = await StripeWebhookService.get_processed_checkout_session(session_id)
+            if processed_session and processed_session.get('subscription'):
+                sub_result = await run_query(db_admin.table('user_subscriptions').select(
+                    'subscription_tier_id, status'
+                ).eq('stripe_subscription_id', processed_session['subscription']).limit(1))
+                
+                if sub_result.data:
+                    return {
+                        "success": True,
+                        "message": "Subscription activated successfully",
+                        "subscription_tier_id": sub_result.data[0].get('subscription_tier_id'),
+                        "subscription_status": sub_result.data[0].get('status')
+                    }
+            
             # Retrieve the checkout session from Stripe
-            checkout_session = stripe.checkout.Session.retrieve(
+            checkout_session = await run_blocking(
+                stripe.checkout.Session.retrieve,
                 session_id,
                 expand=['subscription']
             )
             
-            # Verify payment was successful
-            if checkout_session.payment_status != 'paid':
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Payment not completed. Status: {checkout_session.payment_status}"
-                )
-            
-            # Get metadata
-            user_id = checkout_session.metadata.get('user_id')
-            subscription_tier_id = checkout_session.metadata.get('subscription_tier_id')
-            
-            if not user_id or not subscription_tier_id:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Missing user or subscription tier information"
-                )
-            
-            # Get subscription details from Stripe
-            stripe_subscription = checkout_session.subscription
-            if isinstance(stripe_subscription, str):
-                stripe_subscription = stripe.Subscription.retrieve(stripe_subscription)
-            
-            # Cancel any existing active subscriptions for this user using admin client
-            existing_subs = db_admin.table('user_subscriptions').select('*').eq(
-                'user_id', user_id
-            ).eq('status', 'active').execute()
-            
-            for sub in existing_subs.data:
-                # Cancel in Stripe
-                if sub.get('stripe_subscription_id'):
-                    try:
-                        stripe.Subscription.modify(
-                            sub['stripe_subscription_id'],
-                            cancel_at_period_end=True
-                        )
-                    except Exception as e:
-                        log_exception_if_dev(logger, "Failed to cancel old subscription in Stripe", e)
-                
-                # Update status in database using admin client
-                db_admin.table('user_subscriptions').update({
-                    'status': 'canceled',
-                    'cancel_at_period_end': True,
-                    'canceled_at': datetime.utcnow().isoformat()
-                }).eq('id', sub['id']).execute()
-            
-            # Create new subscription record using admin client to bypass RLS
-            subscription_data = {
-                'user_id': user_id,
-                'subscription_tier_id': subscription_tier_id,
-                'stripe_subscription_id': stripe_subscription.id,
-                'stripe_customer_id': checkout_session.customer,
-                'status': stripe_subscription.status,
-                'current_period_start': datetime.fromtimestamp(stripe_subscription.current_period_start).isoformat(),
-                'current_period_end': datetime.fromtimestamp(stripe_subscription.current_period_end).isoformat(),
-                'cancel_at_period_end': stripe_subscription.cancel_at_period_end or False,
-            }
-            
-            insert_result = db_admin.table('user_subscriptions').insert(subscription_data).execute()
-            
-            if not insert_result.data:
-                raise HTTPException(status_code=500, detail="Failed to create subscription record")
-            
-            # Update creative's subscription_tier_id using admin client
-            db_admin.table('creatives').update({
-                'subscription_tier_id': subscription_tier_id
-            }).eq('user_id', user_id).execute()
-            
-            return {
-                "success": True,
-                "message": "Subscription activated successfully",
-                "subscription_tier_id": subscription_tier_id,
-                "subscription_status": stripe_subscription.status
-            }
+            return await SubscriptionService.apply_subscription_checkout(checkout_session)
             
         except stripe.error.StripeError as e:
             log_exception_if_dev(logger, "Stripe error verifying subscription", e)
@@ -254,6 +205,175 @@ class SubscriptionService:
             log_exception_if_dev(logger, "Error verifying subscription", e)
             raise HTTPException(status_code=500, detail="Failed to verify subscription")
     
+    @staticmethod
+    async def apply_subscription_checkout(checkout_session: Any) -> Dict[str, Any]:
+        """Activate the subscription bought through a completed checkout session
+        
+        Shared by the verify endpoint and the Stripe webhook worker. Applying the same
+        session twice is a no-op because subscriptions are keyed by stripe_subscription_id.
+        
+        Args:
+            checkout_session: The Stripe checkout session object (retrieved or from a webhook event)
+            
+        Returns:
+            Dictionary containing success status and subscription info
+        """
+        # Verify payment was successful
+        if checkout_session.payment_status != 'paid':
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Payment not completed. Status: {checkout_session.payment_status}"
+            )
+        
+        # Get metadata
+        metadata = checkout_session.metadata or {}
+        user_id = metadata.get('user_id')
+        subscription_tier_id = metadata.get('subscription_tier_id')
+        
+        if not user_id or not subscription_tier_id:
+            raise HTTPException(
+                status_code=400,
+                detail="Missing user or subscription tier information"
+            )
+        
+        # Get subscription details from Stripe
+        stripe_subscription = checkout_session.subscription
+        if isinstance(stripe_subscription, str):
+            # Already recorded (webhook and verify raced) - nothing left to do
+            existing_result = await run_query(db_admin.table('user_subscriptions').select(
+                'subscription_tier_id, status'
+            ).eq('stripe_subscription_id', stripe_subscription).limit(1))
+            if existing_result.data:
+                return {
+                    "success": True,
+                    "message": "Subscription activated successfully",
+                    "subscription_tier_id": existing_result.data[0].get('subscription_tier_id'),
+                    "subscription_status": existing_result.data[0].get('status')
+                }
+            stripe_subscription = await run_blocking(stripe.Subscription.retrieve, stripe_subscription)
+        
+        # Cancel any existing active subscriptions for this user using admin client
+        existing_subs = await run_query(db_admin.table('user_subscriptions').select('*').eq(
+            'user_id', user_id
+        ).eq('status', 'active'))
+        
+        for sub in existing_subs.data:
+            if sub.get('stripe_subscription_id') == stripe_subscription.id:
+                continue
+            
+            # Cancel in Stripe
+            if sub.get('stripe_subscription_id'):
+                try:
+                    await run_blocking(
+                        stripe.Subscription.modify,
+                        sub['stripe_subscription_id'],
+                        cancel_at_period_end=True
+                    )
+                except Exception as e:
+                    log_exception_if_dev(logger, "Failed to cancel old subscription in Stripe", e)
+            
+            # Update status in database using admin client
+            await run_query(db_admin.table('user_subscriptions').update({
+                'status': 'canceled',
+                'cancel_at_period_end': True,
+                'canceled_at': datetime.utcnow().isoformat()
+            }).eq('id', sub['id']))
+        
+        # Create (or refresh) the subscription record using admin client to bypass RLS
+        subscription_data = {
+            'user_id': user_id,
+            'subscription_tier_id': subscription_tier_id,
+            'stripe_subscription_id': stripe_subscription.id,
+            'stripe_customer_id': checkout_session.customer,
+            'status': stripe_subscription.status,
+            'current_period_start': datetime.fromtimestamp(stripe_subscription.current_period_start).isoformat(),
+            'current_period_end': datetime.fromtimestamp(stripe_subscription.current_period_end).isoformat(),
+            'cancel_at_period_end': stripe_subscription.cancel_at_period_end or False,
+        }
+        
+        upsert_result = await run_query(db_admin.table('user_subscriptions').upsert(
+            subscription_data, on_conflict='stripe_subscription_id'
+        ))
+        
+        if not upsert_result.data:
+            raise HTTPException(status_code=500, detail="Failed to create subscription record")
+        
+        # Update creative's subscription_tier_id using admin client
+        await run_query(db_admin.table('creatives').update({
+            'subscription_tier_id': subscription_tier_id
+        }).eq('user_id', user_id))
+        identity_cache.invalidate(user_id)
+        
+        return {
+            "success": True,
+            "message": "Subscription activated successfully",
+            "subscription_tier_id": subscription_tier_id,
+            "subscription_status": stripe_subscription.status
+        }
+    
+    @staticmethod
+    async def sync_subscription(stripe_subscription: Any) -> bool:
+        """Mirror a Stripe subscription object (customer.subscription.* webhooks) into user_subscriptions
+        
+        Args:
+            stripe_subscription: The Stripe subscription object from the webhook event
+            
+        Returns:
+            True if a local subscription record was updated
+        """
+        # Stripe statuses without a local equivalent are folded into the closest allowed value
+        status = stripe_subscription.status
+        if status == 'incomplete_expired':
+            status = 'canceled'
+        elif status == 'paused':
+            status = 'past_due'
+        
+        update_data = {
+            'status': status,
+            'cancel_at_period_end': stripe_subscription.cancel_at_period_end or False,
+            'updated_at': datetime.utcnow().isoformat(),
+        }
+        if getattr(stripe_subscription, 'current_period_start', None):
+            update_data['current_period_start'] = datetime.fromtimestamp(stripe_subscription.current_period_start).isoformat()
+        if getattr(stripe_subscription, 'current_period_end', None):
+            update_data['current_period_end'] = datetime.fromtimestamp(stripe_subscription.current_period_end).isoformat()
+        if getattr(stripe_subscription, 'canceled_at', None):
+            update_data['canceled_at'] = datetime.fromtimestamp(stripe_subscription.canceled_at).isoformat()
+        
+        update_result = await run_query(db_admin.table('user_subscriptions')\
+            .update(update_data)\
+            .eq('stripe_subscription_id', stripe_subscription.id))
+        return bool(update_result.data)
+    
+    @staticmethod
+    async def record_invoice_paid(invoice: Any) -> bool:
+        """Mark the subscription of a paid invoice (invoice.paid webhook) active for the billed period
+        
+        Args:
+            invoice: The Stripe invoice object from the webhook event
+            
+        Returns:
+            True if a local subscription record was updated
+        """
+        stripe_subscription_id = getattr(invoice, 'subscription', None)
+        if not stripe_subscription_id:
+            return False
+        
+        update_data = {
+            'status': 'active',
+            'updated_at': datetime.utcnow().isoformat(),
+        }
+        lines = getattr(invoice, 'lines', None)
+        if lines and lines.data:
+            period = lines.data[0].period
+            update_data['current_period_start'] = datetime.fromtimestamp(period.start).isoformat()
+            update_data['current_period_end'] = datetime.fromtimestamp(period.end).isoformat()
+        
+        update_result = await run_query(db_admin.table('user_subscriptions')\
+            .update(update_data)\
+            .eq('stripe_subscription_id', stripe_subscription_id))
+        return bool(update_result.data)
+    
     @staticmethod
     async def get_subscription_status(
         user_id: str,
@@ -270,11 +390,11 @@ class SubscriptionService:
         """
         try:
             # Get active subscription using admin client
-            sub_result = db_admin.table('user_subscriptions').select(
+            sub_result = await run_query(db_admin.table('user_subscriptions').select(
                 '*, subscription_tiers(id, name)'
             ).eq('user_id', user_id).eq('status', 'active').order(
                 'created_at', desc=True
-            ).limit(1).execute()
+            ).limit(1))
             
             if not sub_result.data or len(sub_result.data) == 0:
                 return {
@@ -315,9 +435,9 @@ class SubscriptionService:
         """
         try:
             # Get active subscription using admin client
-            sub_result = db_admin.table('user_subscriptions').select('*').eq(
+            sub_result = await run_query(db_admin.table('user_subscriptions').select('*').eq(
                 'user_id', user_id
-            ).eq('status', 'active').order('created_at', desc=True).limit(1).execute()
+            ).eq('status', 'active').order('created_at', desc=True).limit(1))
             
             if not sub_result.data or len(sub_result.data) == 0:
                 raise HTTPException(status_code=404, detail="No active subscription found")
@@ -335,10 +455,10 @@ class SubscriptionService:
             )
             
             # Update database using admin client
-            db_admin.table('user_subscriptions').update({
+            await run_query(db_admin.table('user_subscriptions').update({
                 'cancel_at_period_end': True,
                 'canceled_at': datetime.utcnow().isoformat()
-            }).eq('id', sub['id']).execute()
+            }).eq('id', sub['id']))
             
             return {
                 "success": True,
@@ -371,10 +491,10 @@ class SubscriptionService:
         """
         try:
             # Get user's active subscription from database
-            sub_result = db_admin.table('user_subscriptions').select(
+            sub_result = await run_query(db_admin.table('user_subscriptions').select(
                 'id, subscription_tier_id, stripe_subscription_id, stripe_customer_id, status, '
                 'current_period_start, current_period_end, cancel_at_period_end, canceled_at'
-            ).eq('user_id', user_id).eq('status', 'active').execute()
+            ).eq('user_id', user_id).eq('status', 'active'))
             
             response_data = {
                 "has_subscription": False,
@@ -404,16 +524,16 @@ class SubscriptionService:
             response_data["stripe_customer_id"] = sub.get('stripe_customer_id')
             
             # Get subscription tier details
-            tier_result = db_admin.table('subscription_tiers').select(
+            tier_result = await run_query(db_admin.table('subscription_tiers').select(
                 'id, name, price, storage_amount_bytes, storage_display, description, '
                 'fee_percentage, is_active, tier_level, stripe_product_id, stripe_price_id'
-            ).eq('id', sub['subscription_tier_id']).single().execute()
+            ).eq('id', sub['subscription_tier_id']).single())
             
             if tier_result.data:
                 response_data["subscription_tier"] = tier_result.data
                 
                 # Check if this is the top tier
-                all_tiers_result = db_admin.table('subscription_tiers').select('tier_level').execute()
+                all_tiers_result = await run_query(db_admin.table('subscription_tiers').select('tier_level'))
                 if all_tiers_result.data:
                     max_tier_level = max(t['tier_level'] for t in all_tiers_result.data)
                     response_data["is_top_tier"] = tier_result.data['tier_level'] >= max_tier_level
@@ -492,9 +612,9 @@ class SubscriptionService:
         """
         try:
             # Get user's stripe customer ID from active subscription
-            sub_result = db_admin.table('user_subscriptions').select(
+            sub_result = await run_query(db_admin.table('user_subscriptions').select(
                 'stripe_customer_id'
-            ).eq('user_id', user_id).eq('status', 'active').execute()
+            ).eq('user_id', user_id).eq('status', 'active'))
             
             if not sub_result.data or len(sub_result.data) == 0:
                 raise HTTPException(status_code=404, detail="No active subscription found")
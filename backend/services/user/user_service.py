@@ -5,6 +5,8 @@ from supabase import Client
 from services.email.email_service import email_service
 import logging
 from core.safe_errors import is_dev_env
+from core.identity import identity_cache
+from db.query_executor import run_query
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +27,7 @@ class UserController:
         
         try:
             # Query the users table using authenticated client (respects RLS)
-            result = client.table('users').select('*').eq('user_id', user_id).single().execute()
+            result = await run_query(client.table('users').select('*').eq('user_id', user_id).single())
             
             if not result.data:
                 raise HTTPException(status_code=404, detail="User profile not found")
@@ -76,7 +78,7 @@ class UserController:
                 raise HTTPException(status_code=400, detail=error_message)
             
             # Get current user data to check existing roles (using authenticated client - respects RLS)
-            current_user = client.table('users').select('roles').eq('user_id', user_id).single().execute()
+            current_user = await run_query(client.table('users').select('roles').eq('user_id', user_id).single())
             current_roles = current_user.data['roles'] if current_user.data else []
             
             # Clean up profile data for roles that are being removed (using authenticated client - respects RLS)
@@ -84,19 +86,20 @@ class UserController:
             for role in removed_roles:
                 if role == 'creative':
                     # Delete creative profile if role is removed (RLS ensures user can only delete their own)
-                    client.table('creatives').delete().eq('user_id', user_id).execute()
+                    await run_query(client.table('creatives').delete().eq('user_id', user_id))
                 elif role == 'client':
                     # Delete client profile if role is removed (RLS ensures user can only delete their own)
-                    client.table('clients').delete().eq('user_id', user_id).execute()
+                    await run_query(client.table('clients').delete().eq('user_id', user_id))
                 elif role == 'advocate':
                     # Delete advocate profile if role is removed (RLS ensures user can only delete their own)
-                    client.table('advocates').delete().eq('user_id', user_id).execute()
+                    await run_query(client.table('advocates').delete().eq('user_id', user_id))
             
             # Update user roles (keep first_login as True until setup is completed)
             # Using authenticated client - RLS ensures user can only update their own record
-            update_result = client.table('users').update({
+            update_result = await run_query(client.table('users').update({
                 'roles': selected_roles
-            }).eq('user_id', user_id).execute()
+            }).eq('user_id', user_id))
+            identity_cache.invalidate(user_id)
             
             if not update_result.data:
                 raise HTTPException(status_code=404, detail="User not found")
@@ -133,13 +136,14 @@ class UserController:
             raise ValueError("Authenticated client is required for this operation")
         
         try:
-            # Get user's roles (using authenticated client - respects RLS)
-            user_result = client.table('users').select('roles, first_login').eq('user_id', user_id).single().execute()
-            if not user_result.data:
+            # Get user's roles and role profiles in one lookup (using authenticated client - respects RLS).
+            # Loaded fresh: this is polled right after roles change, possibly through another worker
+            identity = await identity_cache.get(user_id, client, fresh=True)
+            if identity is None:
                 raise HTTPException(status_code=404, detail="User not found")
             
-            user_roles = user_result.data['roles']
-            first_login = user_result.data['first_login']
+            user_roles = identity.roles
+            first_login = identity.first_login
             
             # If first_login is True, they haven't completed setup yet
             # Check if they have roles selected (setup in progress) or no roles (need role selection)
@@ -153,25 +157,10 @@ class UserController:
             
             incomplete_setups = []
             
-            # Check each role to see if setup is complete (using authenticated client - respects RLS)
+            # Check each role to see if setup is complete (its profile exists)
             for role in user_roles:
-                if role == 'creative':
-                    # Check if creative profile exists
-                    creative_result = client.table('creatives').select('user_id').eq('user_id', user_id).execute()
-                    if not creative_result.data:
-                        incomplete_setups.append('creative')
-                
-                elif role == 'client':
-                    # Check if client profile exists
-                    client_result = client.table('clients').select('user_id').eq('user_id', user_id).execute()
-                    if not client_result.data:
-                        incomplete_setups.append('client')
-                
-                elif role == 'advocate':
-                    # Check if advocate profile exists
-                    advocate_result = client.table('advocates').select('user_id').eq('user_id', user_id).execute()
-                    if not advocate_result.data:
-                        incomplete_setups.append('advocate')
+                if role in ('creative', 'client', 'advocate') and not identity.has_profile(role):
+                    incomplete_setups.append(role)
             
             return SetupStatusResponse(incomplete_setups=incomplete_setups)
             
@@ -204,7 +193,7 @@ class UserController:
         
         try:
             # Get user data for profile fields (using authenticated client - respects RLS)
-            user_result = client.table('users').select('roles, name, email, profile_picture_url, avatar_source').eq('user_id', user_id).single().execute()
+            user_result = await run_query(client.table('users').select('roles, name, email, profile_picture_url, avatar_source').eq('user_id', user_id).single())
             if not user_result.data:
                 raise HTTPException(status_code=404, detail="User not found")
             
@@ -240,9 +229,9 @@ class UserController:
                 
                 # Validate subscription_tier_id and get storage limit from subscription_tier
                 # Using authenticated client - RLS allows authenticated users to read subscription_tiers
-                subscription_result = client.table('subscription_tiers').select(
+                subscription_result = await run_query(client.table('subscription_tiers').select(
                     'id, storage_amount_bytes, is_active'
-                ).eq('id', subscription_tier_id).single().execute()
+                ).eq('id', subscription_tier_id).single())
                 
                 if not subscription_result.data:
                     raise HTTPException(status_code=404, detail="Subscription tier not found")
@@ -263,7 +252,7 @@ class UserController:
                 }
                 
                 # Using authenticated client - RLS ensures user can only create their own profile
-                result = client.table('creatives').upsert(creative_row).execute()
+                result = await run_query(client.table('creatives').upsert(creative_row))
                 if result.data:
                     created_profiles.append('creative')
             
@@ -280,7 +269,7 @@ class UserController:
                 }
                 
                 # Using authenticated client - RLS ensures user can only create their own profile
-                result = client.table('clients').upsert(client_row).execute()
+                result = await run_query(client.table('clients').upsert(client_row))
                 if result.data:
                     created_profiles.append('client')
             
@@ -307,15 +296,16 @@ class UserController:
                 }
                 
                 # Using authenticated client - RLS ensures user can only create their own profile
-                result = client.table('advocates').upsert(advocate_row).execute()
+                result = await run_query(client.table('advocates').upsert(advocate_row))
                 if result.data:
                     created_profiles.append('advocate')
             
             # Mark setup as complete by setting first_login to False
             # Using authenticated client - RLS ensures user can only update their own record
-            client.table('users').update({
+            await run_query(client.table('users').update({
                 'first_login': False
-            }).eq('user_id', user_id).execute()
+            }).eq('user_id', user_id))
+            identity_cache.invalidate(user_id)
             
             # Send welcome email to the new user
             user_email = user_data.get('email')
@@ -369,53 +359,20 @@ class UserController:
             raise ValueError("Authenticated client is required for this operation")
         
         try:
-            # Get user's roles first using authenticated client (respects RLS)
-            user_result = client.table('users').select('roles').eq('user_id', user_id).single().execute()
-            if not user_result.data:
+            # Roles and role profiles in one shared lookup (using authenticated client - respects RLS)
+            identity = await identity_cache.get(user_id, client)
+            if identity is None:
                 raise HTTPException(status_code=404, detail="User not found")
             
-            user_roles = user_result.data.get('roles', [])
             role_profiles = {}
             
-            # Batch fetch all role profiles in parallel to avoid sequential queries
-            if user_roles:
-                # Use a single query with UNION to get all role profiles at once
-                # This is more efficient than separate queries for each role
-                creative_data = None
-                client_data = None
-                advocate_data = None
-                
-                # Fetch creative profile if user has creative role (using authenticated client - respects RLS)
-                if 'creative' in user_roles:
-                    creative_result = client.table('creatives').select(
-                        'user_id, title'
-                    ).eq('user_id', user_id).execute()
-                    if creative_result.data and len(creative_result.data) > 0:
-                        creative_data = creative_result.data[0]
-                
-                # Fetch client profile if user has client role (using authenticated client - respects RLS)
-                if 'client' in user_roles:
-                    client_result = client.table('clients').select(
-                        'user_id'
-                    ).eq('user_id', user_id).execute()
-                    if client_result.data and len(client_result.data) > 0:
-                        client_data = client_result.data[0]
-                
-                # Fetch advocate profile if user has advocate role (using authenticated client - respects RLS)
-                if 'advocate' in user_roles:
-                    advocate_result = client.table('advocates').select(
-                        'user_id, tier'
-                    ).eq('user_id', user_id).execute()
-                    if advocate_result.data and len(advocate_result.data) > 0:
-                        advocate_data = advocate_result.data[0]
-                
-                # Build response object
-                if creative_data:
-                    role_profiles['creative'] = creative_data
-                if client_data:
-                    role_profiles['client'] = client_data
-                if advocate_data:
-                    role_profiles['advocate'] = advocate_data
+            # Only roles the user has and whose profile exists
+            if identity.has_role('creative') and identity.creative is not None:
+                role_profiles['creative'] = {'user_id': user_id, 'title': identity.creative.get('title')}
+            if identity.has_role('client') and identity.client is not None:
+                role_profiles['client'] = {'user_id': user_id}
+            if identity.has_role('advocate') and identity.advocate is not None:
+                role_profiles['advocate'] = {'user_id': user_id, 'tier': identity.advocate.get('tier')}
             
             return RoleProfilesResponse(**role_profiles)
             
@@ -450,9 +407,9 @@ class UserController:
         
         try:
             # Query subscription tiers (respects RLS - public read policy allows anonymous access)
-            result = client.table('subscription_tiers').select(
+            result = await run_query(client.table('subscription_tiers').select(
                 'id, name, price, storage_amount_bytes, description, fee_percentage, tier_level'
-            ).eq('is_active', True).order('tier_level', desc=True).order('price', desc=False).execute()
+            ).eq('is_active', True).order('tier_level', desc=True).order('price', desc=False))
             
             if not result.data:
                 return []
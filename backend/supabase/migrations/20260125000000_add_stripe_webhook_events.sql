@@ -0,0 +1,58 @@
+-- Stripe webhook event store
+-- Events are stored once per Stripe event id (idempotent ingestion) and applied by a background worker.
+create table if not exists "public"."stripe_webhook_events" (
+    "id" text not null,
+    "event_type" text not null,
+    "object_id" text,
+    "stripe_account_id" text,
+    "livemode" boolean not null default false,
+    "payload" jsonb not null,
+    "status" text not null default 'pending'::text,
+    "attempts" integer not null default 0,
+    "last_error" text,
+    "received_at" timestamp with time zone not null default now(),
+    "processed_at" timestamp with time zone
+);
+
+alter table "public"."stripe_webhook_events" enable row level security;
+
+CREATE UNIQUE INDEX stripe_webhook_events_pkey ON public.stripe_webhook_events USING btree (id);
+
+CREATE INDEX idx_stripe_webhook_events_status ON public.stripe_webhook_events USING btree (status, received_at);
+
+CREATE INDEX idx_stripe_webhook_events_object_id ON public.stripe_webhook_events USING btree (object_id);
+
+alter table "public"."stripe_webhook_events" add constraint "stripe_webhook_events_pkey" PRIMARY KEY using index "stripe_webhook_events_pkey";
+
+alter table "public"."stripe_webhook_events" add constraint "stripe_webhook_events_status_check" CHECK ((status = ANY (ARRAY['pending'::text, 'processing'::text, 'processed'::text, 'failed'::text, 'ignored'::text])));
+
+-- Checkout sessions applied to bookings
+-- applied_at is set exactly once, so a session is never counted twice towards bookings.amount_paid
+-- whether it arrives through the webhook worker or the client-side verify call.
+create table if not exists "public"."booking_checkout_sessions" (
+    "session_id" text not null,
+    "booking_id" uuid not null,
+    "stripe_account_id" text not null,
+    "amount_total" integer,
+    "payment_status" text,
+    "applied_at" timestamp with time zone,
+    "created_at" timestamp with time zone not null default now()
+);
+
+alter table "public"."booking_checkout_sessions" enable row level security;
+
+CREATE UNIQUE INDEX booking_checkout_sessions_pkey ON public.booking_checkout_sessions USING btree (session_id);
+
+CREATE INDEX idx_booking_checkout_sessions_booking_id ON public.booking_checkout_sessions USING btree (booking_id);
+
+alter table "public"."booking_checkout_sessions" add constraint "booking_checkout_sessions_pkey" PRIMARY KEY using index "booking_checkout_sessions_pkey";
+
+alter table "public"."booking_checkout_sessions" add constraint "booking_checkout_sessions_booking_id_fkey" FOREIGN KEY (booking_id) REFERENCES bookings(id) ON DELETE CASCADE;
+
+-- Policy: Booking participants can read the checkout sessions of their bookings
+create policy "Booking participants can view checkout sessions"
+on "public"."booking_checkout_sessions" for select
+to authenticated
+using (
+  EXISTS ( SELECT 1 FROM bookings b WHERE ((b.id = booking_checkout_sessions.booking_id) AND ((b.client_user_id = auth.uid()) OR (b.creative_user_id = auth.uid()))))
+);
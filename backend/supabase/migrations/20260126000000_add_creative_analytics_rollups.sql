@@ -0,0 +1,291 @@
+-- Per-creative analytics rollups
+-- Maintained by a trigger on bookings so the analytics endpoints read a handful of
+-- pre-aggregated rows instead of every booking of the creative.
+-- Days are UTC days of bookings.order_date (same bucketing the endpoints used before).
+
+-- Income from completed + fully paid bookings, per creative per day
+create table if not exists "public"."creative_daily_income" (
+    "creative_user_id" uuid not null,
+    "day" date not null,
+    "income" numeric not null default 0,
+    "booking_count" integer not null default 0
+);
+
+-- Same contributions split by service
+create table if not exists "public"."creative_daily_service_revenue" (
+    "creative_user_id" uuid not null,
+    "day" date not null,
+    "service_id" uuid not null,
+    "revenue" numeric not null default 0,
+    "booking_count" integer not null default 0
+);
+
+-- Fully paid totals per (creative, client) for the client leaderboard
+create table if not exists "public"."creative_client_totals" (
+    "creative_user_id" uuid not null,
+    "client_user_id" uuid not null,
+    "total_paid" numeric not null default 0,
+    "services_amount" integer not null default 0,
+    "last_payment_date" timestamp with time zone
+);
+
+-- Headline dashboard metrics per creative
+create table if not exists "public"."creative_analytics_totals" (
+    "creative_user_id" uuid not null,
+    "total_earnings" numeric not null default 0,
+    "unpaid_pending" numeric not null default 0,
+    "completed_projects" integer not null default 0
+);
+
+alter table "public"."creative_daily_income" enable row level security;
+
+alter table "public"."creative_daily_service_revenue" enable row level security;
+
+alter table "public"."creative_client_totals" enable row level security;
+
+alter table "public"."creative_analytics_totals" enable row level security;
+
+CREATE UNIQUE INDEX creative_daily_income_pkey ON public.creative_daily_income USING btree (creative_user_id, day);
+
+CREATE UNIQUE INDEX creative_daily_service_revenue_pkey ON public.creative_daily_service_revenue USING btree (creative_user_id, day, service_id);
+
+CREATE UNIQUE INDEX creative_client_totals_pkey ON public.creative_client_totals USING btree (creative_user_id, client_user_id);
+
+CREATE INDEX idx_creative_client_totals_total_paid ON public.creative_client_totals USING btree (creative_user_id, total_paid DESC);
+
+CREATE UNIQUE INDEX creative_analytics_totals_pkey ON public.creative_analytics_totals USING btree (creative_user_id);
+
+-- Used by the trigger to recompute a single (creative, client) pair
+CREATE INDEX idx_bookings_creative_client ON public.bookings USING btree (creative_user_id, client_user_id);
+
+alter table "public"."creative_daily_income" add constraint "creative_daily_income_pkey" PRIMARY KEY using index "creative_daily_income_pkey";
+
+alter table "public"."creative_daily_service_revenue" add constraint "creative_daily_service_revenue_pkey" PRIMARY KEY using index "creative_daily_service_revenue_pkey";
+
+alter table "public"."creative_client_totals" add constraint "creative_client_totals_pkey" PRIMARY KEY using index "creative_client_totals_pkey";
+
+alter table "public"."creative_analytics_totals" add constraint "creative_analytics_totals_pkey" PRIMARY KEY using index "creative_analytics_totals_pkey";
+
+-- Policy: Creatives can read their own analytics rollups (writes only happen through the trigger)
+create policy "Creatives can view their daily income"
+on "public"."creative_daily_income" for select
+to authenticated
+using ((auth.uid() = creative_user_id));
+
+create policy "Creatives can view their daily service revenue"
+on "public"."creative_daily_service_revenue" for select
+to authenticated
+using ((auth.uid() = creative_user_id));
+
+create policy "Creatives can view their client totals"
+on "public"."creative_client_totals" for select
+to authenticated
+using ((auth.uid() = creative_user_id));
+
+create policy "Creatives can view their analytics totals"
+on "public"."creative_analytics_totals" for select
+to authenticated
+using ((auth.uid() = creative_user_id));
+
+-- Add (p_sign = 1) or remove (p_sign = -1) one booking's contribution to the additive rollups
+CREATE OR REPLACE FUNCTION public.apply_booking_analytics_delta(b public.bookings, p_sign integer)
+ RETURNS void
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public
+AS $function$
+DECLARE
+  v_day date;
+  v_amount numeric := COALESCE(b.amount_paid, 0);
+  v_is_earning boolean := COALESCE(b.creative_status = 'completed' AND b.payment_status = 'fully_paid', false);
+  v_pending numeric := 0;
+BEGIN
+  IF b.creative_status IN ('awaiting_payment', 'in_progress') THEN
+    v_pending := GREATEST(COALESCE(b.price, 0) - v_amount, 0);
+  END IF;
+
+  INSERT INTO creative_analytics_totals AS t (creative_user_id, total_earnings, unpaid_pending, completed_projects)
+  VALUES (
+    b.creative_user_id,
+    p_sign * CASE WHEN v_is_earning THEN v_amount ELSE 0 END,
+    p_sign * v_pending,
+    p_sign * CASE WHEN b.creative_status = 'completed' THEN 1 ELSE 0 END
+  )
+  ON CONFLICT (creative_user_id) DO UPDATE SET
+    total_earnings = t.total_earnings + EXCLUDED.total_earnings,
+    unpaid_pending = t.unpaid_pending + EXCLUDED.unpaid_pending,
+    completed_projects = t.completed_projects + EXCLUDED.completed_projects;
+
+  IF NOT v_is_earning OR b.order_date IS NULL THEN
+    RETURN;
+  END IF;
+
+  v_day := (b.order_date AT TIME ZONE 'UTC')::date;
+
+  INSERT INTO creative_daily_income AS d (creative_user_id, day, income, booking_count)
+  VALUES (b.creative_user_id, v_day, p_sign * v_amount, p_sign)
+  ON CONFLICT (creative_user_id, day) DO UPDATE SET
+    income = d.income + EXCLUDED.income,
+    booking_count = d.booking_count + EXCLUDED.booking_count;
+
+  INSERT INTO creative_daily_service_revenue AS s (creative_user_id, day, service_id, revenue, booking_count)
+  VALUES (b.creative_user_id, v_day, b.service_id, p_sign * v_amount, p_sign)
+  ON CONFLICT (creative_user_id, day, service_id) DO UPDATE SET
+    revenue = s.revenue + EXCLUDED.revenue,
+    booking_count = s.booking_count + EXCLUDED.booking_count;
+
+  IF p_sign < 0 THEN
+    DELETE FROM creative_daily_income
+    WHERE creative_user_id = b.creative_user_id AND day = v_day AND booking_count <= 0;
+    DELETE FROM creative_daily_service_revenue
+    WHERE creative_user_id = b.creative_user_id AND day = v_day AND service_id = b.service_id AND booking_count <= 0;
+  END IF;
+END;
+$function$
+;
+
+-- last_payment_date is a max, so the (creative, client) row is recomputed rather than patched
+CREATE OR REPLACE FUNCTION public.refresh_creative_client_total(p_creative_user_id uuid, p_client_user_id uuid)
+ RETURNS void
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public
+AS $function$
+DECLARE
+  v_total numeric;
+  v_count integer;
+  v_last timestamp with time zone;
+BEGIN
+  SELECT COALESCE(SUM(amount_paid), 0), COUNT(*), MAX(updated_at)
+  INTO v_total, v_count, v_last
+  FROM bookings
+  WHERE creative_user_id = p_creative_user_id
+    AND client_user_id = p_client_user_id
+    AND payment_status = 'fully_paid';
+
+  IF v_count = 0 THEN
+    DELETE FROM creative_client_totals
+    WHERE creative_user_id = p_creative_user_id AND client_user_id = p_client_user_id;
+  ELSE
+    INSERT INTO creative_client_totals (creative_user_id, client_user_id, total_paid, services_amount, last_payment_date)
+    VALUES (p_creative_user_id, p_client_user_id, v_total, v_count, v_last)
+    ON CONFLICT (creative_user_id, client_user_id) DO UPDATE SET
+      total_paid = EXCLUDED.total_paid,
+      services_amount = EXCLUDED.services_amount,
+      last_payment_date = EXCLUDED.last_payment_date;
+  END IF;
+END;
+$function$
+;
+
+CREATE OR REPLACE FUNCTION public.update_creative_analytics_rollups()
+ RETURNS trigger
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public
+AS $function$
+BEGIN
+  -- Most booking updates (notes, scheduling, files) don't touch anything the rollups use
+  IF TG_OP = 'UPDATE' AND
+     (NEW.creative_user_id, NEW.client_user_id, NEW.service_id, NEW.order_date, NEW.price,
+      NEW.amount_paid, NEW.payment_status, NEW.creative_status, NEW.updated_at)
+     IS NOT DISTINCT FROM
+     (OLD.creative_user_id, OLD.client_user_id, OLD.service_id, OLD.order_date, OLD.price,
+      OLD.amount_paid, OLD.payment_status, OLD.creative_status, OLD.updated_at) THEN
+    RETURN NULL;
+  END IF;
+
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM apply_booking_analytics_delta(OLD, -1);
+    IF OLD.payment_status = 'fully_paid' THEN
+      PERFORM refresh_creative_client_total(OLD.creative_user_id, OLD.client_user_id);
+    END IF;
+  END IF;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM apply_booking_analytics_delta(NEW, 1);
+    IF NEW.payment_status = 'fully_paid' AND (
+       TG_OP = 'INSERT'
+       OR OLD.payment_status IS DISTINCT FROM 'fully_paid'
+       OR NEW.creative_user_id IS DISTINCT FROM OLD.creative_user_id
+       OR NEW.client_user_id IS DISTINCT FROM OLD.client_user_id) THEN
+      PERFORM refresh_creative_client_total(NEW.creative_user_id, NEW.client_user_id);
+    END IF;
+  END IF;
+
+  RETURN NULL;
+END;
+$function$
+;
+
+-- The helpers run as definer from the trigger only; don't expose them through the API
+revoke execute on function public.apply_booking_analytics_delta(public.bookings, integer) from public, anon, authenticated;
+
+revoke execute on function public.refresh_creative_client_total(uuid, uuid) from public, anon, authenticated;
+
+CREATE TRIGGER trigger_update_creative_analytics_rollups AFTER INSERT OR DELETE OR UPDATE ON public.bookings FOR EACH ROW EXECUTE FUNCTION update_creative_analytics_rollups();
+
+-- Distinct week/month/year buckets that have income in [p_start, p_end)
+CREATE OR REPLACE FUNCTION public.get_creative_income_periods(p_creative_user_id uuid, p_granularity text, p_start date, p_end date)
+ RETURNS TABLE(period_start date)
+ LANGUAGE plpgsql
+AS $function$
+BEGIN
+  RETURN QUERY
+  SELECT DISTINCT date_trunc(p_granularity, d.day::timestamp)::date
+  FROM creative_daily_income d
+  WHERE d.creative_user_id = p_creative_user_id
+    AND d.day >= p_start
+    AND d.day < p_end;
+END;
+$function$
+;
+
+-- Revenue per service in [p_start, p_end); NULL bounds mean unbounded (all-time)
+CREATE OR REPLACE FUNCTION public.get_creative_service_revenue(p_creative_user_id uuid, p_start date, p_end date)
+ RETURNS TABLE(service_id uuid, revenue numeric)
+ LANGUAGE plpgsql
+AS $function$
+BEGIN
+  RETURN QUERY
+  SELECT s.service_id, SUM(s.revenue)
+  FROM creative_daily_service_revenue s
+  WHERE s.creative_user_id = p_creative_user_id
+    AND (p_start IS NULL OR s.day >= p_start)
+    AND (p_end IS NULL OR s.day < p_end)
+  GROUP BY s.service_id;
+END;
+$function$
+;
+
+-- Backfill from existing bookings
+INSERT INTO public.creative_analytics_totals (creative_user_id, total_earnings, unpaid_pending, completed_projects)
+SELECT
+  creative_user_id,
+  COALESCE(SUM(CASE WHEN creative_status = 'completed' AND payment_status = 'fully_paid' THEN COALESCE(amount_paid, 0) ELSE 0 END), 0),
+  COALESCE(SUM(CASE WHEN creative_status IN ('awaiting_payment', 'in_progress') THEN GREATEST(COALESCE(price, 0) - COALESCE(amount_paid, 0), 0) ELSE 0 END), 0),
+  COUNT(*) FILTER (WHERE creative_status = 'completed')
+FROM public.bookings
+GROUP BY creative_user_id
+ON CONFLICT (creative_user_id) DO NOTHING;
+
+INSERT INTO public.creative_daily_income (creative_user_id, day, income, booking_count)
+SELECT creative_user_id, (order_date AT TIME ZONE 'UTC')::date, SUM(COALESCE(amount_paid, 0)), COUNT(*)
+FROM public.bookings
+WHERE creative_status = 'completed' AND payment_status = 'fully_paid' AND order_date IS NOT NULL
+GROUP BY creative_user_id, (order_date AT TIME ZONE 'UTC')::date
+ON CONFLICT (creative_user_id, day) DO NOTHING;
+
+INSERT INTO public.creative_daily_service_revenue (creative_user_id, day, service_id, revenue, booking_count)
+SELECT creative_user_id, (order_date AT TIME ZONE 'UTC')::date, service_id, SUM(COALESCE(amount_paid, 0)), COUNT(*)
+FROM public.bookings
+WHERE creative_status = 'completed' AND payment_status = 'fully_paid' AND order_date IS NOT NULL
+GROUP BY creative_user_id, (order_date AT TIME ZONE 'UTC')::date, service_id
+ON CONFLICT (creative_user_id, day, service_id) DO NOTHING;
+
+INSERT INTO public.creative_client_totals (creative_user_id, client_user_id, total_paid, services_amount, last_payment_date)
+SELECT creative_user_id, client_user_id, SUM(COALESCE(amount_paid, 0)), COUNT(*), MAX(updated_at)
+FROM public.bookings
+WHERE payment_status = 'fully_paid'
+GROUP BY creative_user_id, client_user_id
+ON CONFLICT (creative_user_id, client_user_id) DO NOTHING;
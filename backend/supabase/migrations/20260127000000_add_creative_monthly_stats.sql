@@ -0,0 +1,34 @@
+-- Per-creative monthly dashboard stats cache
+-- stripe_cursor is the newest balance transaction already counted in stripe_net_cents, so a refresh
+-- only asks Stripe for transactions created after it.
+create table if not exists "public"."creative_monthly_stats" (
+    "creative_user_id" uuid not null,
+    "month" date not null,
+    "stripe_account_id" text,
+    "stripe_net_cents" bigint not null default 0,
+    "stripe_cursor" text,
+    "stripe_synced_at" timestamp with time zone,
+    "total_clients" integer not null default 0,
+    "total_bookings" integer not null default 0,
+    "completed_sessions" integer not null default 0,
+    "refreshed_at" timestamp with time zone not null default now()
+);
+
+alter table "public"."creative_monthly_stats" enable row level security;
+
+CREATE UNIQUE INDEX creative_monthly_stats_pkey ON public.creative_monthly_stats USING btree (creative_user_id, month);
+
+-- Date-filtered dashboard queries
+CREATE INDEX idx_bookings_creative_order_date ON public.bookings USING btree (creative_user_id, order_date);
+
+CREATE INDEX idx_bookings_creative_completed_updated ON public.bookings USING btree (creative_user_id, updated_at) WHERE (creative_status = 'completed'::text);
+
+alter table "public"."creative_monthly_stats" add constraint "creative_monthly_stats_pkey" PRIMARY KEY using index "creative_monthly_stats_pkey";
+
+alter table "public"."creative_monthly_stats" add constraint "creative_monthly_stats_creative_user_id_fkey" FOREIGN KEY (creative_user_id) REFERENCES creatives(user_id) ON DELETE CASCADE;
+
+-- Policy: Creatives can read their own cached stats (written by the backend with the service role)
+create policy "Creatives can view their monthly stats"
+on "public"."creative_monthly_stats" for select
+to authenticated
+using ((auth.uid() = creative_user_id));
@@ -0,0 +1,35 @@
+-- Transactional email outbox
+-- Notification emails are written here in the request that creates the notification and delivered
+-- by a background worker, with retries (next_attempt_at) and dead-lettering after the last attempt.
+create table if not exists "public"."email_outbox" (
+    "id" uuid not null default gen_random_uuid(),
+    "notification_id" uuid,
+    "recipient_user_id" uuid,
+    "to_email" text not null,
+    "notification_type" text,
+    "provider" text not null default 'resend'::text,
+    "payload" jsonb not null,
+    "status" text not null default 'pending'::text,
+    "attempts" integer not null default 0,
+    "next_attempt_at" timestamp with time zone not null default now(),
+    "last_error" text,
+    "provider_message_id" text,
+    "created_at" timestamp with time zone not null default now(),
+    "updated_at" timestamp with time zone not null default now(),
+    "sent_at" timestamp with time zone
+);
+
+alter table "public"."email_outbox" enable row level security;
+
+CREATE UNIQUE INDEX email_outbox_pkey ON public.email_outbox USING btree (id);
+
+-- Worker poll: due rows in order
+CREATE INDEX idx_email_outbox_due ON public.email_outbox USING btree (next_attempt_at) WHERE (status = ANY (ARRAY['pending'::text, 'sending'::text]));
+
+CREATE INDEX idx_email_outbox_dead ON public.email_outbox USING btree (updated_at) WHERE (status = 'dead'::text);
+
+alter table "public"."email_outbox" add constraint "email_outbox_pkey" PRIMARY KEY using index "email_outbox_pkey";
+
+alter table "public"."email_outbox" add constraint "email_outbox_status_check" CHECK ((status = ANY (ARRAY['pending'::text, 'sending'::text, 'sent'::text, 'dead'::text])));
+
+alter table "public"."email_outbox" add constraint "email_outbox_notification_id_fkey" FOREIGN KEY (notification_id) REFERENCES notifications(id) ON DELETE SET NULL;
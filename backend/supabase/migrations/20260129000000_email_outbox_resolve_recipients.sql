@@ -0,0 +1,4 @@
+-- Recipient addresses can be resolved by the outbox worker
+-- Rows may be queued with only recipient_user_id; the worker looks up the addresses of a whole
+-- batch in one query and fills to_email in before sending.
+alter table "public"."email_outbox" alter column "to_email" drop not null;
@@ -0,0 +1,7 @@
+-- Pre-rendered EZ invoices and compliance sheets
+-- Written by the backend (service role) when a booking reaches a final status and downloaded
+-- through signed URLs, so the bucket is private and needs no policies.
+insert into storage.buckets (id, name, public)
+values
+  ('order-documents', 'order-documents', false)
+on conflict (id) do nothing;
@@ -0,0 +1,3 @@
+-- CRC-32 of each deliverable's stored object, saved the first time it streams through a ZIP export
+-- so resumed (range) downloads can write the archive's central directory without re-reading files
+alter table "public"."booking_deliverables" add column "content_crc32" bigint;
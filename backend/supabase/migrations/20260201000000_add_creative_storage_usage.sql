@@ -0,0 +1,168 @@
+-- Per-creative storage usage counter
+-- Maintained by triggers on booking_deliverables (register / upload / delete) and bookings (booking
+-- deleted or moved to another creative) so the upload quota check reads one row instead of summing
+-- every deliverable of the creative. util/reconcile_storage_usage.py checks and repairs drift.
+create table if not exists "public"."creative_storage_usage" (
+    "creative_user_id" uuid not null,
+    "used_bytes" bigint not null default 0,
+    "file_count" integer not null default 0,
+    "updated_at" timestamp with time zone not null default now()
+);
+
+alter table "public"."creative_storage_usage" enable row level security;
+
+CREATE UNIQUE INDEX creative_storage_usage_pkey ON public.creative_storage_usage USING btree (creative_user_id);
+
+alter table "public"."creative_storage_usage" add constraint "creative_storage_usage_pkey" PRIMARY KEY using index "creative_storage_usage_pkey";
+
+alter table "public"."creative_storage_usage" add constraint "creative_storage_usage_creative_user_id_fkey" FOREIGN KEY (creative_user_id) REFERENCES creatives(user_id) ON DELETE CASCADE;
+
+-- Policy: Creatives can read their own usage (writes only happen through the triggers)
+create policy "Creatives can view their storage usage"
+on "public"."creative_storage_usage" for select
+to authenticated
+using ((auth.uid() = creative_user_id));
+
+-- Add p_bytes / p_files (negative to remove) to a creative's usage
+CREATE OR REPLACE FUNCTION public.apply_creative_storage_delta(p_creative_user_id uuid, p_bytes bigint, p_files integer)
+ RETURNS void
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public
+AS $function$
+BEGIN
+  IF p_creative_user_id IS NULL OR (p_bytes = 0 AND p_files = 0) THEN
+    RETURN;
+  END IF;
+
+  -- Held until commit, so reconcile_creative_storage_usage never recounts around an uncommitted change
+  PERFORM pg_advisory_xact_lock(hashtext('creative_storage_usage:' || p_creative_user_id::text));
+
+  INSERT INTO creative_storage_usage AS u (creative_user_id, used_bytes, file_count, updated_at)
+  SELECT p_creative_user_id, GREATEST(p_bytes, 0), GREATEST(p_files, 0), now()
+  WHERE EXISTS (SELECT 1 FROM creatives WHERE user_id = p_creative_user_id)
+  ON CONFLICT (creative_user_id) DO UPDATE SET
+    used_bytes = GREATEST(u.used_bytes + p_bytes, 0),
+    file_count = GREATEST(u.file_count + p_files, 0),
+    updated_at = now();
+END;
+$function$
+;
+
+CREATE OR REPLACE FUNCTION public.update_creative_storage_usage()
+ RETURNS trigger
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public
+AS $function$
+DECLARE
+  v_old_creative uuid;
+  v_new_creative uuid;
+BEGIN
+  IF TG_OP = 'UPDATE' AND
+     (NEW.booking_id, NEW.file_size_bytes) IS NOT DISTINCT FROM (OLD.booking_id, OLD.file_size_bytes) THEN
+    RETURN NULL;
+  END IF;
+
+  -- A deliverable deleted by its booking's cascade has no booking left to look up; the bookings
+  -- trigger already removed it from the usage
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    SELECT creative_user_id INTO v_old_creative FROM bookings WHERE id = OLD.booking_id;
+    PERFORM apply_creative_storage_delta(v_old_creative, -COALESCE(OLD.file_size_bytes, 0), -1);
+  END IF;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    SELECT creative_user_id INTO v_new_creative FROM bookings WHERE id = NEW.booking_id;
+    PERFORM apply_creative_storage_delta(v_new_creative, COALESCE(NEW.file_size_bytes, 0), 1);
+  END IF;
+
+  RETURN NULL;
+END;
+$function$
+;
+
+-- Moves a booking's deliverables off its creative's usage before the booking is deleted (the
+-- cascade then deletes them) or onto the new creative when the booking changes hands
+CREATE OR REPLACE FUNCTION public.update_creative_storage_usage_for_booking()
+ RETURNS trigger
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public
+AS $function$
+DECLARE
+  v_bytes bigint;
+  v_files integer;
+BEGIN
+  IF TG_OP = 'UPDATE' AND NEW.creative_user_id IS NOT DISTINCT FROM OLD.creative_user_id THEN
+    RETURN NEW;
+  END IF;
+
+  SELECT COALESCE(SUM(file_size_bytes), 0), COUNT(*)
+  INTO v_bytes, v_files
+  FROM booking_deliverables
+  WHERE booking_id = OLD.id;
+
+  PERFORM apply_creative_storage_delta(OLD.creative_user_id, -v_bytes, -v_files);
+  IF TG_OP = 'UPDATE' THEN
+    PERFORM apply_creative_storage_delta(NEW.creative_user_id, v_bytes, v_files);
+    RETURN NEW;
+  END IF;
+  RETURN OLD;
+END;
+$function$
+;
+
+-- Recompute one creative's usage from booking_deliverables; returns the stored and actual values
+-- and, with p_fix, replaces the stored ones
+CREATE OR REPLACE FUNCTION public.reconcile_creative_storage_usage(p_creative_user_id uuid, p_fix boolean DEFAULT false)
+ RETURNS TABLE(stored_bytes bigint, actual_bytes bigint, stored_files integer, actual_files integer)
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public
+AS $function$
+BEGIN
+  -- Same lock as apply_creative_storage_delta: concurrent uploads and deletes wait for the recount
+  PERFORM pg_advisory_xact_lock(hashtext('creative_storage_usage:' || p_creative_user_id::text));
+
+  SELECT COALESCE(u.used_bytes, 0), COALESCE(u.file_count, 0)
+  INTO stored_bytes, stored_files
+  FROM (SELECT 1) AS one
+  LEFT JOIN creative_storage_usage u ON u.creative_user_id = p_creative_user_id;
+
+  SELECT COALESCE(SUM(d.file_size_bytes), 0), COUNT(d.id)
+  INTO actual_bytes, actual_files
+  FROM booking_deliverables d
+  JOIN bookings b ON b.id = d.booking_id
+  WHERE b.creative_user_id = p_creative_user_id;
+
+  IF p_fix AND (stored_bytes, stored_files) IS DISTINCT FROM (actual_bytes, actual_files) THEN
+    INSERT INTO creative_storage_usage (creative_user_id, used_bytes, file_count, updated_at)
+    VALUES (p_creative_user_id, actual_bytes, actual_files, now())
+    ON CONFLICT (creative_user_id) DO UPDATE SET
+      used_bytes = EXCLUDED.used_bytes,
+      file_count = EXCLUDED.file_count,
+      updated_at = now();
+  END IF;
+
+  RETURN NEXT;
+END;
+$function$
+;
+
+-- The helpers run as definer from the triggers and the service-role reconciliation only
+revoke execute on function public.apply_creative_storage_delta(uuid, bigint, integer) from public, anon, authenticated;
+
+revoke execute on function public.reconcile_creative_storage_usage(uuid, boolean) from public, anon, authenticated;
+
+CREATE TRIGGER trigger_update_creative_storage_usage AFTER INSERT OR DELETE OR UPDATE ON public.booking_deliverables FOR EACH ROW EXECUTE FUNCTION update_creative_storage_usage();
+
+CREATE TRIGGER trigger_update_creative_storage_usage_for_booking BEFORE DELETE OR UPDATE OF creative_user_id ON public.bookings FOR EACH ROW EXECUTE FUNCTION update_creative_storage_usage_for_booking();
+
+-- Backfill from existing deliverables
+INSERT INTO public.creative_storage_usage (creative_user_id, used_bytes, file_count)
+SELECT b.creative_user_id, COALESCE(SUM(d.file_size_bytes), 0), COUNT(d.id)
+FROM public.booking_deliverables d
+JOIN public.bookings b ON b.id = d.booking_id
+JOIN public.creatives c ON c.user_id = b.creative_user_id
+GROUP BY b.creative_user_id
+ON CONFLICT (creative_user_id) DO NOTHING;
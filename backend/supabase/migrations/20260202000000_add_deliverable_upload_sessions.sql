@@ -0,0 +1,47 @@
+-- Resumable deliverable uploads
+-- One row per chunked upload session. Chunks are forwarded to a Supabase Storage TUS upload
+-- (tus_url) in order; upload_offset is the number of bytes accepted so far and chunk_checksums the
+-- SHA-256 of each accepted chunk, so a client that lost track can resume from the server's state.
+create table if not exists "public"."deliverable_upload_sessions" (
+    "id" uuid not null default gen_random_uuid(),
+    "booking_id" uuid not null,
+    "creative_user_id" uuid not null,
+    "storage_path" text not null,
+    "file_name" text not null,
+    "file_type" text,
+    "file_size" bigint not null,
+    "chunk_size" integer not null,
+    "upload_offset" bigint not null default 0,
+    "chunk_checksums" jsonb not null default '[]'::jsonb,
+    "tus_url" text,
+    "status" text not null default 'uploading'::text,
+    "error" text,
+    "deliverable_id" uuid,
+    "created_at" timestamp with time zone not null default now(),
+    "updated_at" timestamp with time zone not null default now(),
+    "expires_at" timestamp with time zone not null default (now() + interval '24 hours')
+);
+
+alter table "public"."deliverable_upload_sessions" enable row level security;
+
+CREATE UNIQUE INDEX deliverable_upload_sessions_pkey ON public.deliverable_upload_sessions USING btree (id);
+
+CREATE UNIQUE INDEX deliverable_upload_sessions_storage_path_key ON public.deliverable_upload_sessions USING btree (storage_path);
+
+CREATE INDEX idx_deliverable_upload_sessions_booking ON public.deliverable_upload_sessions USING btree (booking_id, created_at DESC);
+
+alter table "public"."deliverable_upload_sessions" add constraint "deliverable_upload_sessions_pkey" PRIMARY KEY using index "deliverable_upload_sessions_pkey";
+
+alter table "public"."deliverable_upload_sessions" add constraint "deliverable_upload_sessions_storage_path_key" UNIQUE using index "deliverable_upload_sessions_storage_path_key";
+
+alter table "public"."deliverable_upload_sessions" add constraint "deliverable_upload_sessions_status_check" CHECK ((status = ANY (ARRAY['uploading'::text, 'scanning'::text, 'completed'::text, 'rejected'::text, 'failed'::text, 'aborted'::text])));
+
+alter table "public"."deliverable_upload_sessions" add constraint "deliverable_upload_sessions_booking_id_fkey" FOREIGN KEY (booking_id) REFERENCES bookings(id) ON DELETE CASCADE;
+
+alter table "public"."deliverable_upload_sessions" add constraint "deliverable_upload_sessions_deliverable_id_fkey" FOREIGN KEY (deliverable_id) REFERENCES booking_deliverables(id) ON DELETE SET NULL;
+
+-- Policy: Creatives can read their own upload sessions (written by the backend with the service role)
+create policy "Creatives can view their upload sessions"
+on "public"."deliverable_upload_sessions" for select
+to authenticated
+using ((auth.uid() = creative_user_id));
@@ -0,0 +1,188 @@
+-- Per-user unread notification counters
+-- One row per recipient and target_roles set (sorted, '{}' for untargeted notifications), kept
+-- current by statement-level triggers on notifications, so the unread count is a read of a few rows
+-- instead of a scan of every unread notification. A bulk "mark all read" touches each counter row
+-- once. util/reconcile_unread_counts.py checks and repairs drift.
+create table if not exists "public"."notification_unread_counts" (
+    "recipient_user_id" uuid not null,
+    "target_roles" text[] not null,
+    "unread_count" integer not null default 0,
+    "updated_at" timestamp with time zone not null default now()
+);
+
+alter table "public"."notification_unread_counts" enable row level security;
+
+CREATE UNIQUE INDEX notification_unread_counts_pkey ON public.notification_unread_counts USING btree (recipient_user_id, target_roles);
+
+alter table "public"."notification_unread_counts" add constraint "notification_unread_counts_pkey" PRIMARY KEY using index "notification_unread_counts_pkey";
+
+alter table "public"."notification_unread_counts" add constraint "notification_unread_counts_recipient_user_id_fkey" FOREIGN KEY (recipient_user_id) REFERENCES users(user_id) ON DELETE CASCADE;
+
+-- Policy: Users can read their own counters (writes only happen through the triggers)
+create policy "Users can view their unread notification counts"
+on "public"."notification_unread_counts" for select
+to authenticated
+using ((auth.uid() = recipient_user_id));
+
+-- Counter key of a target_roles value: distinct roles, sorted
+CREATE OR REPLACE FUNCTION public.normalize_notification_roles(p_roles text[])
+ RETURNS text[]
+ LANGUAGE sql
+ IMMUTABLE
+AS $function$
+  SELECT COALESCE(array_agg(DISTINCT r ORDER BY r), '{}'::text[])
+  FROM unnest(COALESCE(p_roles, '{}'::text[])) AS r
+  WHERE r IS NOT NULL;
+$function$
+;
+
+-- Apply [{user_id, target_roles, delta}, ...] to the counters
+CREATE OR REPLACE FUNCTION public.apply_notification_unread_deltas(p_deltas jsonb)
+ RETURNS void
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public
+AS $function$
+BEGIN
+  IF p_deltas IS NULL OR jsonb_array_length(p_deltas) = 0 THEN
+    RETURN;
+  END IF;
+
+  -- Held until commit, so reconcile_notification_unread_counts never recounts around an
+  -- uncommitted change; taken in user order so concurrent statements can't deadlock
+  PERFORM pg_advisory_xact_lock(hashtext('notification_unread_counts:' || s.user_id))
+  FROM (
+    SELECT DISTINCT d->>'user_id' AS user_id
+    FROM jsonb_array_elements(p_deltas) AS d
+    ORDER BY 1
+  ) AS s;
+
+  -- Notifications deleted by their user's cascade have no counter left to update
+  INSERT INTO notification_unread_counts AS c (recipient_user_id, target_roles, unread_count, updated_at)
+  SELECT
+    (d->>'user_id')::uuid,
+    ARRAY(SELECT jsonb_array_elements_text(d->'target_roles')),
+    (d->>'delta')::integer,
+    now()
+  FROM jsonb_array_elements(p_deltas) AS d
+  WHERE EXISTS (SELECT 1 FROM users WHERE user_id = (d->>'user_id')::uuid)
+  ORDER BY d->>'user_id'
+  ON CONFLICT (recipient_user_id, target_roles) DO UPDATE SET
+    unread_count = c.unread_count + EXCLUDED.unread_count,
+    updated_at = now();
+END;
+$function$
+;
+
+CREATE OR REPLACE FUNCTION public.update_notification_unread_counts()
+ RETURNS trigger
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public
+AS $function$
+DECLARE
+  v_deltas jsonb;
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    SELECT jsonb_agg(jsonb_build_object('user_id', d.recipient_user_id, 'target_roles', d.roles, 'delta', d.delta))
+    INTO v_deltas
+    FROM (
+      SELECT recipient_user_id, normalize_notification_roles(target_roles) AS roles, COUNT(*) AS delta
+      FROM new_rows
+      WHERE NOT is_read
+      GROUP BY 1, 2
+    ) AS d;
+  ELSIF TG_OP = 'DELETE' THEN
+    SELECT jsonb_agg(jsonb_build_object('user_id', d.recipient_user_id, 'target_roles', d.roles, 'delta', d.delta))
+    INTO v_deltas
+    FROM (
+      SELECT recipient_user_id, normalize_notification_roles(target_roles) AS roles, -COUNT(*) AS delta
+      FROM old_rows
+      WHERE NOT is_read
+      GROUP BY 1, 2
+    ) AS d;
+  ELSE
+    SELECT jsonb_agg(jsonb_build_object('user_id', d.recipient_user_id, 'target_roles', d.roles, 'delta', d.delta))
+    INTO v_deltas
+    FROM (
+      SELECT recipient_user_id, roles, SUM(delta) AS delta
+      FROM (
+        SELECT recipient_user_id, normalize_notification_roles(target_roles) AS roles, 1 AS delta
+        FROM new_rows
+        WHERE NOT is_read
+        UNION ALL
+        SELECT recipient_user_id, normalize_notification_roles(target_roles) AS roles, -1 AS delta
+        FROM old_rows
+        WHERE NOT is_read
+      ) AS changes
+      GROUP BY 1, 2
+      HAVING SUM(delta) <> 0
+    ) AS d;
+  END IF;
+
+  PERFORM apply_notification_unread_deltas(v_deltas);
+  RETURN NULL;
+END;
+$function$
+;
+
+-- Recount one user's unread notifications; returns the counters that differ (stored vs actual)
+-- and, with p_fix, replaces the stored counters
+CREATE OR REPLACE FUNCTION public.reconcile_notification_unread_counts(p_user_id uuid, p_fix boolean DEFAULT false)
+ RETURNS TABLE(roles_key text[], stored_count integer, actual_count integer)
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public
+AS $function$
+BEGIN
+  -- Same lock as apply_notification_unread_deltas: concurrent notification changes wait for the recount
+  PERFORM pg_advisory_xact_lock(hashtext('notification_unread_counts:' || p_user_id::text));
+
+  RETURN QUERY
+  WITH actual AS (
+    SELECT normalize_notification_roles(n.target_roles) AS roles, COUNT(*)::integer AS cnt
+    FROM notifications n
+    WHERE n.recipient_user_id = p_user_id AND NOT n.is_read
+    GROUP BY 1
+  ), stored AS (
+    SELECT c.target_roles AS roles, c.unread_count AS cnt
+    FROM notification_unread_counts c
+    WHERE c.recipient_user_id = p_user_id
+  )
+  SELECT COALESCE(a.roles, s.roles), COALESCE(s.cnt, 0), COALESCE(a.cnt, 0)
+  FROM actual a
+  FULL JOIN stored s ON s.roles = a.roles
+  WHERE COALESCE(s.cnt, 0) <> COALESCE(a.cnt, 0);
+
+  IF p_fix AND FOUND THEN
+    DELETE FROM notification_unread_counts c WHERE c.recipient_user_id = p_user_id;
+    INSERT INTO notification_unread_counts (recipient_user_id, target_roles, unread_count, updated_at)
+    SELECT p_user_id, normalize_notification_roles(n.target_roles), COUNT(*), now()
+    FROM notifications n
+    WHERE n.recipient_user_id = p_user_id AND NOT n.is_read
+    GROUP BY 2;
+  END IF;
+END;
+$function$
+;
+
+-- The helpers run as definer from the triggers and the service-role reconciliation only
+revoke execute on function public.apply_notification_unread_deltas(jsonb) from public, anon, authenticated;
+
+revoke execute on function public.reconcile_notification_unread_counts(uuid, boolean) from public, anon, authenticated;
+
+-- Transition tables need one trigger per event
+CREATE TRIGGER trigger_notification_unread_counts_insert AFTER INSERT ON public.notifications REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION update_notification_unread_counts();
+
+CREATE TRIGGER trigger_notification_unread_counts_update AFTER UPDATE ON public.notifications REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION update_notification_unread_counts();
+
+CREATE TRIGGER trigger_notification_unread_counts_delete AFTER DELETE ON public.notifications REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION update_notification_unread_counts();
+
+-- Backfill from existing notifications
+INSERT INTO public.notification_unread_counts (recipient_user_id, target_roles, unread_count)
+SELECT n.recipient_user_id, public.normalize_notification_roles(n.target_roles), COUNT(*)
+FROM public.notifications n
+JOIN public.users u ON u.user_id = n.recipient_user_id
+WHERE NOT n.is_read
+GROUP BY 1, 2
+ON CONFLICT (recipient_user_id, target_roles) DO NOTHING;
@@ -0,0 +1,5 @@
+-- Keyset pagination of a user's notifications: newest first on (created_at, id), so any page (and
+-- "mark all read up to a cursor") is an index range scan regardless of how deep it is
+CREATE INDEX IF NOT EXISTS idx_notifications_recipient_created_id ON public.notifications USING btree (recipient_user_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_notifications_recipient_unread_created_id ON public.notifications USING btree (recipient_user_id, created_at DESC, id DESC) WHERE (is_read = false);
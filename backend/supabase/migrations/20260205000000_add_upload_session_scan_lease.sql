@@ -0,0 +1,4 @@
+-- Lease of the process finalizing an upload session: renewed while the scan runs, so a session left
+-- in 'scanning' by a process that died (restart, crash) is recognised by its stale heartbeat and
+-- finalized again
+alter table "public"."deliverable_upload_sessions" add column if not exists "scan_heartbeat_at" timestamp with time zone;
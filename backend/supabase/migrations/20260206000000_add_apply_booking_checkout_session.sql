@@ -0,0 +1,100 @@
+-- Apply a paid checkout session to its booking in one transaction
+-- Claims the session (applied_at), then adds its amount to bookings.amount_paid under the booking's
+-- row lock and moves the payment and order statuses. A failure anywhere rolls the claim back, so a
+-- session is counted exactly once, and concurrent sessions of one booking (deposit and remainder,
+-- webhook and verify racing) are applied one after the other instead of overwriting each other.
+-- Returns NULL if the session was already applied, otherwise
+-- {booking: <updated row>, previous_amount_paid, previous_client_status}.
+CREATE OR REPLACE FUNCTION public.apply_booking_checkout_session(
+  p_session_id text,
+  p_booking_id uuid,
+  p_stripe_account_id text,
+  p_amount_total integer,
+  p_paid_at timestamp with time zone
+)
+ RETURNS jsonb
+ LANGUAGE plpgsql
+ SECURITY DEFINER
+ SET search_path = public
+AS $function$
+DECLARE
+  b bookings%ROWTYPE;
+  v_previous_amount numeric;
+  v_previous_client_status text;
+  v_new_amount numeric;
+  v_price numeric;
+  v_payment_status text := 'pending';
+  v_client_status text;
+  v_creative_status text;
+BEGIN
+  INSERT INTO booking_checkout_sessions (session_id, booking_id, stripe_account_id, amount_total, payment_status)
+  VALUES (p_session_id, p_booking_id, p_stripe_account_id, p_amount_total, 'paid')
+  ON CONFLICT (session_id) DO NOTHING;
+
+  UPDATE booking_checkout_sessions
+  SET applied_at = now(), payment_status = 'paid', amount_total = p_amount_total
+  WHERE session_id = p_session_id AND applied_at IS NULL;
+  IF NOT FOUND THEN
+    RETURN NULL;
+  END IF;
+
+  SELECT * INTO b FROM bookings WHERE id = p_booking_id FOR UPDATE;
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Booking % not found', p_booking_id;
+  END IF;
+
+  v_previous_amount := COALESCE(b.amount_paid, 0);
+  v_previous_client_status := b.client_status;
+  v_new_amount := v_previous_amount + COALESCE(p_amount_total, 0) / 100.0;
+  v_price := COALESCE(b.price, 0);
+  v_client_status := b.client_status;
+  v_creative_status := b.creative_status;
+
+  IF b.payment_option = 'split' THEN
+    IF v_previous_amount = 0 THEN
+      -- First (deposit) payment starts the work
+      v_client_status := 'in_progress';
+      v_creative_status := 'in_progress';
+      v_payment_status := 'deposit_paid';
+    ELSIF v_new_amount >= v_price THEN
+      v_payment_status := 'fully_paid';
+    ELSE
+      v_payment_status := 'deposit_paid';
+    END IF;
+  ELSIF b.payment_option = 'upfront' THEN
+    v_client_status := 'in_progress';
+    v_creative_status := 'in_progress';
+    v_payment_status := 'fully_paid';
+  ELSIF COALESCE(b.payment_option, 'later') = 'later' THEN
+    v_payment_status := CASE WHEN v_new_amount >= v_price THEN 'fully_paid' ELSE 'deposit_paid' END;
+  END IF;
+
+  -- A fully paid order is final: downloadable if it has files, completed otherwise
+  IF v_new_amount >= v_price THEN
+    v_creative_status := 'completed';
+    v_client_status := CASE
+      WHEN EXISTS (SELECT 1 FROM booking_deliverables WHERE booking_id = p_booking_id) THEN 'download'
+      ELSE 'completed'
+    END;
+  END IF;
+
+  UPDATE bookings
+  SET amount_paid = v_new_amount,
+      payment_status = v_payment_status,
+      client_status = v_client_status,
+      creative_status = v_creative_status,
+      updated_at = COALESCE(p_paid_at, now())
+  WHERE id = p_booking_id
+  RETURNING * INTO b;
+
+  RETURN jsonb_build_object(
+    'booking', to_jsonb(b),
+    'previous_amount_paid', v_previous_amount,
+    'previous_client_status', v_previous_client_status
+  );
+END;
+$function$
+;
+
+-- Called by the backend with the service role only
+revoke execute on function public.apply_booking_checkout_session(text, uuid, text, integer, timestamp with time zone) from public, anon, authenticated;
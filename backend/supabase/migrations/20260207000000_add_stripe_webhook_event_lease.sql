@@ -0,0 +1,6 @@
+-- Lease of the worker applying a webhook event: set when the event is claimed and renewed while it is
+-- processed, so only events left in 'processing' by a dead process (stale updated_at) are re-queued,
+-- never ones another live worker is still applying
+alter table "public"."stripe_webhook_events" add column if not exists "updated_at" timestamp with time zone not null default now();
+
+CREATE INDEX IF NOT EXISTS idx_stripe_webhook_events_processing ON public.stripe_webhook_events USING btree (updated_at) WHERE (status = 'processing'::text);
@@ -0,0 +1,127 @@
+"""
+One-off backfill of booking_checkout_sessions from Stripe
+
+Pages through every connected account (creatives with a stripe_account_id) and indexes the
+booking checkout sessions created before the index existed, so receipt listings can resolve
+them locally.
+
+Run from the backend directory:
+    python -m util.backfill_checkout_sessions [--dry-run]
+"""
+import os
+import sys
+import asyncio
+import logging
+import stripe
+from typing import Dict, Any, List, Set
+from dotenv import load_dotenv
+from db.db_session import db_admin
+from db.query_executor import run_query, run_blocking, shutdown_executor
+from services.stripe.checkout_session_index import CheckoutSessionIndex
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CREATIVES_PAGE_SIZE = 100
+STRIPE_PAGE_SIZE = 100
+
+
+async def _existing_booking_ids(booking_ids: List[str]) -> Set[str]:
+    """Booking IDs that still exist locally (sessions of deleted bookings are skipped)"""
+    if not booking_ids:
+        return set()
+    result = await run_query(db_admin.table('bookings')\
+        .select('id')\
+        .in_('id', booking_ids))
+    return {str(b['id']) for b in (result.data or [])}
+
+
+async def backfill_account(stripe_account_id: str, dry_run: bool = False) -> int:
+    """Index all booking checkout sessions of one connected account
+
+    Returns:
+        Number of sessions indexed
+    """
+    booking_sessions: List[Dict[str, Any]] = []
+    starting_after = None
+    while True:
+        params = {'limit': STRIPE_PAGE_SIZE, 'stripe_account': stripe_account_id}
+        if starting_after:
+            params['starting_after'] = starting_after
+        page = await run_blocking(stripe.checkout.Session.list, **params)
+
+        for session in page.data:
+            metadata = session.get('metadata') or {}
+            if metadata.get('booking_id'):
+                booking_sessions.append(session)
+
+        if not page.has_more or not page.data:
+            break
+        starting_after = page.data[-1].id
+
+    if not booking_sessions:
+        return 0
+
+    existing = await _existing_booking_ids(list({s['metadata']['booking_id'] for s in booking_sessions}))
+    indexed = 0
+    for session in booking_sessions:
+        booking_id = session['metadata']['booking_id']
+        if booking_id not in existing:
+            continue
+        if not dry_run:
+            # Paid sessions from before the index were already counted by the verify endpoint
+            await CheckoutSessionIndex.record_session(
+                session, booking_id, stripe_account_id,
+                applied=session.get('payment_status') == 'paid'
+            )
+        indexed += 1
+    return indexed
+
+
+async def backfill(dry_run: bool = False) -> int:
+    """Backfill the index for every connected account, one page of creatives at a time"""
+    total = 0
+    offset = 0
+    while True:
+        creatives_result = await run_query(db_admin.table('creatives')\
+            .select('user_id, stripe_account_id')\
+            .not_.is_('stripe_account_id', 'null')\
+            .order('user_id')\
+            .range(offset, offset + CREATIVES_PAGE_SIZE - 1))
+        creatives = creatives_result.data or []
+
+        for creative in creatives:
+            stripe_account_id = creative['stripe_account_id']
+            try:
+                count = await backfill_account(stripe_account_id, dry_run=dry_run)
+                total += count
+                logger.info(f"{stripe_account_id}: {count} booking sessions {'found' if dry_run else 'indexed'}")
+            except stripe.error.StripeError as e:
+                # Disconnected / revoked accounts - keep going with the rest
+                logger.warning(f"{stripe_account_id}: skipped ({e})")
+
+        if len(creatives) < CREATIVES_PAGE_SIZE:
+            break
+        offset += CREATIVES_PAGE_SIZE
+
+    return total
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+    if not stripe.api_key:
+        logger.error("STRIPE_SECRET_KEY environment variable is required")
+        sys.exit(1)
+
+    dry_run = '--dry-run' in sys.argv[1:]
+    try:
+        total = asyncio.run(backfill(dry_run=dry_run))
+        logger.info(f"Done: {total} booking checkout sessions {'found' if dry_run else 'indexed'}")
+    finally:
+        shutdown_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import os
 from typing import Tuple, Optional, List
 from fastapi import UploadFile
+from util.upload_spool import get_upload_size
+
 
 class FileValidator:
     """Validates files using extension and basic checks"""
@@ -28,11 +30,10 @@ class FileValidator:
         max_size = max_size or FileValidator.MAX_FILE_SIZE
         
         # Check file size
-        content = await file.read()
-        await file.seek(0)
+        file_size = get_upload_size(file)
         
-        if len(content) > max_size:
-            return False, f"File size ({len(content) / (1024*1024):.1f}MB) exceeds limit ({max_size / (1024*1024)}MB)"
+        if file_size > max_size:
+            return False, f"File size ({file_size / (1024*1024):.1f}MB) exceeds limit ({max_size / (1024*1024)}MB)"
         
         # Check extension
         if file.filename:
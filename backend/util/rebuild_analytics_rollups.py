@@ -0,0 +1,136 @@
+"""
+Verify (and optionally rebuild) the per-creative analytics rollup tables
+
+Reads each creative's bookings once, recomputes every rollup in a single columnar pass
+(services.creative.analytics_engine) and compares the result with what the bookings trigger
+maintained. With --fix, the creative's rollup rows are replaced by the recomputed ones.
+
+Run from the backend directory:
+    python -m util.rebuild_analytics_rollups [--fix] [--creative <user_id>]
+"""
+import sys
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from db.db_session import db_admin
+from db.query_executor import run_query, shutdown_executor
+from services.creative.analytics_engine import BookingColumns, aggregate, rollup_rows, to_cents
+
+logger = logging.getLogger(__name__)
+
+BOOKINGS_PAGE_SIZE = 1000
+CREATIVES_PAGE_SIZE = 100
+INSERT_BATCH_SIZE = 500
+
+BOOKING_COLUMNS = 'id, order_date, updated_at, amount_paid, price, service_id, client_user_id, payment_status, creative_status'
+
+# Natural key and amount columns of each rollup table
+ROLLUP_TABLES = {
+    'creative_analytics_totals': (('creative_user_id',), ('total_earnings', 'unpaid_pending', 'completed_projects')),
+    'creative_daily_income': (('day',), ('income', 'booking_count')),
+    'creative_daily_service_revenue': (('day', 'service_id'), ('revenue', 'booking_count')),
+    'creative_client_totals': (('client_user_id',), ('total_paid', 'services_amount')),
+}
+
+
+async def _fetch_all(query_factory) -> List[Dict[str, Any]]:
+    """Page through a query (PostgREST caps the rows returned per request)"""
+    rows: List[Dict[str, Any]] = []
+    offset = 0
+    while True:
+        result = await run_query(query_factory().range(offset, offset + BOOKINGS_PAGE_SIZE - 1))
+        page = result.data or []
+        rows.extend(page)
+        if len(page) < BOOKINGS_PAGE_SIZE:
+            return rows
+        offset += BOOKINGS_PAGE_SIZE
+
+
+def _normalize(table: str, rows: List[Dict[str, Any]]) -> Dict[tuple, tuple]:
+    key_columns, value_columns = ROLLUP_TABLES[table]
+    normalized = {}
+    for row in rows:
+        key = tuple(str(row[c]) for c in key_columns)
+        # Compare in cents so numeric formatting differences don't show up as drift
+        normalized[key] = tuple(to_cents(row.get(c)) for c in value_columns)
+    return normalized
+
+
+async def rebuild_creative(creative_user_id: str, fix: bool = False) -> bool:
+    """Check one creative's rollups; returns True if they matched"""
+    bookings = await _fetch_all(lambda: db_admin.table('bookings')\
+        .select(BOOKING_COLUMNS)\
+        .eq('creative_user_id', creative_user_id)\
+        .order('id'))
+
+    columns = BookingColumns.from_rows(bookings)
+    expected = rollup_rows(creative_user_id, columns, aggregate(columns))
+    if not bookings:
+        expected['creative_analytics_totals'] = []
+
+    in_sync = True
+    for table, (key_columns, value_columns) in ROLLUP_TABLES.items():
+        select_columns = ', '.join(dict.fromkeys(key_columns + value_columns))
+        stored = await _fetch_all(lambda: db_admin.table(table)\
+            .select(select_columns)\
+            .eq('creative_user_id', creative_user_id)\
+            .order(key_columns[0]))
+
+        # An all-zero totals row is equivalent to no row
+        if table == 'creative_analytics_totals':
+            stored = [r for r in stored if any(to_cents(r.get(c)) for c in value_columns)]
+            expected[table] = [r for r in expected[table] if any(to_cents(r.get(c)) for c in value_columns)]
+
+        if _normalize(table, stored) == _normalize(table, expected[table]):
+            continue
+
+        in_sync = False
+        logger.warning(f"{creative_user_id}: {table} drifted ({len(stored)} stored rows, {len(expected[table])} expected)")
+        if fix:
+            await run_query(db_admin.table(table).delete().eq('creative_user_id', creative_user_id))
+            rows = expected[table]
+            for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                await run_query(db_admin.table(table).insert(rows[start:start + INSERT_BATCH_SIZE]))
+
+    return in_sync
+
+
+async def rebuild(fix: bool = False, creative_user_id: Optional[str] = None) -> int:
+    """Check every creative (or one); returns the number of creatives whose rollups drifted"""
+    if creative_user_id:
+        return 0 if await rebuild_creative(creative_user_id, fix=fix) else 1
+
+    drifted = 0
+    offset = 0
+    while True:
+        creatives_result = await run_query(db_admin.table('creatives')\
+            .select('user_id')\
+            .order('user_id')\
+            .range(offset, offset + CREATIVES_PAGE_SIZE - 1))
+        creatives = creatives_result.data or []
+
+        for creative in creatives:
+            if not await rebuild_creative(creative['user_id'], fix=fix):
+                drifted += 1
+
+        if len(creatives) < CREATIVES_PAGE_SIZE:
+            return drifted
+        offset += CREATIVES_PAGE_SIZE
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = sys.argv[1:]
+    fix = '--fix' in args
+    creative_user_id = args[args.index('--creative') + 1] if '--creative' in args else None
+
+    try:
+        drifted = asyncio.run(rebuild(fix=fix, creative_user_id=creative_user_id))
+        logger.info(f"Done: {drifted} creative(s) with drifted rollups{' rebuilt' if fix and drifted else ''}")
+    finally:
+        shutdown_executor()
+    sys.exit(1 if drifted and not fix else 0)
+
+
+if __name__ == "__main__":
+    main()
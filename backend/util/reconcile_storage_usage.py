@@ -0,0 +1,76 @@
+"""
+Verify (and optionally repair) the per-creative storage usage counters
+
+creative_storage_usage is maintained by triggers on booking_deliverables and bookings. This
+recounts each creative's deliverables in the database (reconcile_creative_storage_usage) and
+reports creatives whose counter drifted. With --fix, drifted counters are replaced by the recount.
+
+Run from the backend directory (e.g. nightly):
+    python -m util.reconcile_storage_usage [--fix] [--creative <user_id>]
+"""
+import sys
+import asyncio
+import logging
+from typing import Optional
+from db.db_session import db_admin
+from db.query_executor import run_query, shutdown_executor
+
+logger = logging.getLogger(__name__)
+
+CREATIVES_PAGE_SIZE = 100
+
+
+async def reconcile_creative(creative_user_id: str, fix: bool = False) -> bool:
+    """Check one creative's counter; returns True if it matched"""
+    result = await run_query(db_admin.rpc('reconcile_creative_storage_usage', {
+        'p_creative_user_id': creative_user_id,
+        'p_fix': fix
+    }))
+    row = (result.data or [{}])[0]
+    stored = (row.get('stored_bytes') or 0, row.get('stored_files') or 0)
+    actual = (row.get('actual_bytes') or 0, row.get('actual_files') or 0)
+    if stored == actual:
+        return True
+    logger.warning(f"{creative_user_id}: storage usage drifted (stored {stored[0]} bytes / {stored[1]} files, actual {actual[0]} bytes / {actual[1]} files)")
+    return False
+
+
+async def reconcile(fix: bool = False, creative_user_id: Optional[str] = None) -> int:
+    """Check every creative (or one); returns the number of creatives whose counter drifted"""
+    if creative_user_id:
+        return 0 if await reconcile_creative(creative_user_id, fix=fix) else 1
+
+    drifted = 0
+    offset = 0
+    while True:
+        creatives_result = await run_query(db_admin.table('creatives')\
+            .select('user_id')\
+            .order('user_id')\
+            .range(offset, offset + CREATIVES_PAGE_SIZE - 1))
+        creatives = creatives_result.data or []
+
+        for creative in creatives:
+            if not await reconcile_creative(creative['user_id'], fix=fix):
+                drifted += 1
+
+        if len(creatives) < CREATIVES_PAGE_SIZE:
+            return drifted
+        offset += CREATIVES_PAGE_SIZE
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = sys.argv[1:]
+    fix = '--fix' in args
+    creative_user_id = args[args.index('--creative') + 1] if '--creative' in args else None
+
+    try:
+        drifted = asyncio.run(reconcile(fix=fix, creative_user_id=creative_user_id))
+        logger.info(f"Done: {drifted} creative(s) with drifted storage usage{' repaired' if fix and drifted else ''}")
+    finally:
+        shutdown_executor()
+    sys.exit(1 if drifted and not fix else 0)
+
+
+if __name__ == "__main__":
+    main()
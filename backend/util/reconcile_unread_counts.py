@@ -0,0 +1,74 @@
+"""
+Verify (and optionally repair) the per-user unread notification counters
+
+notification_unread_counts is maintained by triggers on notifications. This recounts each user's
+unread notifications in the database (reconcile_notification_unread_counts) and reports users whose
+counters drifted. With --fix, a drifted user's counters are replaced by the recount.
+
+Run from the backend directory (e.g. nightly):
+    python -m util.reconcile_unread_counts [--fix] [--user <user_id>]
+"""
+import sys
+import asyncio
+import logging
+from typing import Optional
+from db.db_session import db_admin
+from db.query_executor import run_query, shutdown_executor
+
+logger = logging.getLogger(__name__)
+
+USERS_PAGE_SIZE = 100
+
+
+async def reconcile_user(user_id: str, fix: bool = False) -> bool:
+    """Check one user's counters; returns True if they all matched"""
+    result = await run_query(db_admin.rpc('reconcile_notification_unread_counts', {
+        'p_user_id': user_id,
+        'p_fix': fix
+    }))
+    drifted = result.data or []
+    for row in drifted:
+        roles = ','.join(row.get('roles_key') or []) or '(untargeted)'
+        logger.warning(f"{user_id} [{roles}]: unread count drifted (stored {row.get('stored_count')}, actual {row.get('actual_count')})")
+    return not drifted
+
+
+async def reconcile(fix: bool = False, user_id: Optional[str] = None) -> int:
+    """Check every user (or one); returns the number of users whose counters drifted"""
+    if user_id:
+        return 0 if await reconcile_user(user_id, fix=fix) else 1
+
+    drifted = 0
+    offset = 0
+    while True:
+        users_result = await run_query(db_admin.table('users')\
+            .select('user_id')\
+            .order('user_id')\
+            .range(offset, offset + USERS_PAGE_SIZE - 1))
+        users = users_result.data or []
+
+        for user in users:
+            if not await reconcile_user(user['user_id'], fix=fix):
+                drifted += 1
+
+        if len(users) < USERS_PAGE_SIZE:
+            return drifted
+        offset += USERS_PAGE_SIZE
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = sys.argv[1:]
+    fix = '--fix' in args
+    user_id = args[args.index('--user') + 1] if '--user' in args else None
+
+    try:
+        drifted = asyncio.run(reconcile(fix=fix, user_id=user_id))
+        logger.info(f"Done: {drifted} user(s) with drifted unread counts{' repaired' if fix and drifted else ''}")
+    finally:
+        shutdown_executor()
+    sys.exit(1 if drifted and not fix else 0)
+
+
+if __name__ == "__main__":
+    main()
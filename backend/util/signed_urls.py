@@ -0,0 +1,161 @@
+"""
+Signed URLs for private storage objects, in bulk and with a short-lived cache
+
+Storage's sign endpoint accepts many paths per request, so signing every deliverable of a
+booking is one round trip instead of one per file. Signed URLs are also kept in process for
+SIGNED_URL_CACHE_TTL seconds: a URL is only handed out while most of its lifetime remains, and
+callers get the remaining lifetime back as expires_in.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+from core.safe_errors import log_exception_if_dev
+from db.db_session import db_admin
+from db.query_executor import run_blocking
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How long a signed URL is reused; keep well below the URL expiry
+SIGNED_URL_CACHE_TTL = int(os.getenv("SIGNED_URL_CACHE_TTL", "300"))
+SIGNED_URL_CACHE_SIZE = int(os.getenv("SIGNED_URL_CACHE_SIZE", "10000"))
+# Paths per sign request, and sign requests in flight at once
+SIGNED_URL_BATCH_SIZE = 500
+SIGNED_URL_CONCURRENCY = 4
+
+FILE_NOT_FOUND_ERROR = "File not found in storage. The file may have been deleted or never uploaded successfully."
+SIGN_FAILED_ERROR = "Failed to generate download URL."
+
+
+def normalize_storage_path(file_path: str, bucket_name: str) -> str:
+    """
+    Object path within the bucket for a stored file reference
+
+    Accepts "booking_id/filename.ext" as well as paths with a leading slash or bucket prefix and
+    full storage URLs (public or signed), which older rows may contain.
+    """
+    normalized_path = file_path.strip().lstrip('/')
+
+    if normalized_path.startswith(f"{bucket_name}/"):
+        normalized_path = normalized_path[len(f"{bucket_name}/"):]
+
+    # Format: https://project.supabase.co/storage/v1/object/public/bucket/path
+    # or: https://project.supabase.co/storage/v1/object/sign/bucket/path
+    if normalized_path.startswith('http://') or normalized_path.startswith('https://'):
+        try:
+            path_parts = urlparse(normalized_path).path.split('/')
+            if bucket_name in path_parts:
+                bucket_index = path_parts.index(bucket_name)
+                if bucket_index + 1 < len(path_parts):
+                    normalized_path = '/'.join(path_parts[bucket_index + 1:])
+        except Exception as parse_error:
+            # Keep the original path and let signing fail with a clear error
+            log_exception_if_dev(logger, "Failed to parse URL path for stored file", parse_error)
+
+    return normalized_path
+
+
+def _sign_error_message(error: Any) -> str:
+    error_msg = str(error)
+    if '404' in error_msg or 'not_found' in error_msg.lower() or 'not found' in error_msg.lower() or 'does not exist' in error_msg:
+        return FILE_NOT_FOUND_ERROR
+    return SIGN_FAILED_ERROR
+
+
+class SignedUrlCache:
+    """Signed URLs by (bucket, path, expires_in), reused for at most SIGNED_URL_CACHE_TTL seconds"""
+
+    def __init__(self, ttl: int = SIGNED_URL_CACHE_TTL, max_entries: int = SIGNED_URL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (signed_url, signed_at)
+        self._entries: "OrderedDict[Tuple[str, str, int], Tuple[str, float]]" = OrderedDict()
+
+    def get(self, bucket_name: str, path: str, expires_in: int) -> Optional[Dict[str, Any]]:
+        key = (bucket_name, path, expires_in)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        signed_url, signed_at = entry
+        age = time.monotonic() - signed_at
+        if age >= min(self.ttl, expires_in):
+            del self._entries[key]
+            return None
+        return {"signed_url": signed_url, "expires_in": int(expires_in - age)}
+
+    def put(self, bucket_name: str, path: str, expires_in: int, signed_url: str) -> None:
+        if self.ttl <= 0:
+            return
+        key = (bucket_name, path, expires_in)
+        self._entries.pop(key, None)
+        self._entries[key] = (signed_url, time.monotonic())
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, bucket_name: str, path: str) -> None:
+        """Forget every cached URL for an object (after it is deleted or replaced)"""
+        for key in [key for key in self._entries if key[0] == bucket_name and key[1] == path]:
+            del self._entries[key]
+
+
+signed_url_cache = SignedUrlCache()
+
+
+async def _sign_chunk(bucket_name: str, paths: list, expires_in: int, limiter: asyncio.Semaphore) -> Dict[str, Dict[str, Any]]:
+    async with limiter:
+        try:
+            signed = await run_blocking(db_admin.storage.from_(bucket_name).create_signed_urls, paths, expires_in)
+        except Exception as sign_error:
+            log_exception_if_dev(logger, "Failed to sign storage paths", sign_error)
+            return {path: {"error": _sign_error_message(sign_error)} for path in paths}
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for item in signed or []:
+        path = item.get('path')
+        signed_url = item.get('signedURL') or item.get('signedUrl')
+        # Missing objects come back with an error and no usable URL
+        if item.get('error') or not signed_url:
+            results[path] = {"error": _sign_error_message(item.get('error') or 'not found')}
+            continue
+        signed_url_cache.put(bucket_name, path, expires_in, signed_url)
+        results[path] = {"signed_url": signed_url, "expires_in": expires_in}
+    for path in paths:
+        results.setdefault(path, {"error": SIGN_FAILED_ERROR})
+    return results
+
+
+async def create_signed_urls(bucket_name: str, paths: Iterable[str], expires_in: int = 3600) -> Dict[str, Dict[str, Any]]:
+    """
+    Signed URLs for many objects in one bucket
+
+    Returns a dict keyed by path of {"signed_url", "expires_in"} (seconds the URL remains valid)
+    or {"error"} with a user-facing message. Cached URLs are served without a request; the rest
+    are signed SIGNED_URL_BATCH_SIZE paths per request.
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    to_sign = []
+    for path in dict.fromkeys(paths):
+        cached = signed_url_cache.get(bucket_name, path, expires_in)
+        if cached is not None:
+            results[path] = cached
+        else:
+            to_sign.append(path)
+
+    if to_sign:
+        limiter = asyncio.Semaphore(SIGNED_URL_CONCURRENCY)
+        chunks = [to_sign[i:i + SIGNED_URL_BATCH_SIZE] for i in range(0, len(to_sign), SIGNED_URL_BATCH_SIZE)]
+        for chunk_results in await asyncio.gather(*(_sign_chunk(bucket_name, chunk, expires_in, limiter) for chunk in chunks)):
+            results.update(chunk_results)
+
+    return results
+
+
+async def create_signed_url(bucket_name: str, path: str, expires_in: int = 3600) -> Dict[str, Any]:
+    """Signed URL for one object; see create_signed_urls"""
+    return (await create_signed_urls(bucket_name, [path], expires_in))[path]
@@ -3,9 +3,10 @@ Utility to set up Supabase Storage buckets
 """
 import os
 import logging
-from supabase import create_client, Client
+from supabase import Client
 from dotenv import load_dotenv
 from core.safe_errors import is_dev_env
+from db.db_session import db_admin
 
 load_dotenv()
 
@@ -30,7 +31,8 @@ def ensure_bucket_exists(bucket_name: str, is_public: bool = False) -> bool:
             logger.error("Missing Supabase configuration")
             return False
         
-        admin_client: Client = create_client(supabase_url, supabase_service_key)
+        # Reuse the shared service-role client instead of building a new one per call
+        admin_client: Client = db_admin
         
         # Try to list buckets to check if it exists
         try:
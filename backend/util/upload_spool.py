@@ -0,0 +1,47 @@
+"""
+Helpers for working with multipart uploads without loading them into memory
+
+Starlette spools each uploaded file to a SpooledTemporaryFile (in memory up to 1MB, on disk
+beyond that) and records its size while parsing the form. These helpers read the size from
+that record and hand the spool to storage uploads as a stream.
+"""
+import io
+import os
+from typing import Union
+from fastapi import UploadFile
+from db.query_executor import run_blocking
+
+
+def get_upload_size(file: UploadFile) -> int:
+    """Size of an upload without reading it (uses the size recorded while spooling, else seeks the spool)"""
+    size = getattr(file, 'size', None)
+    if size is not None:
+        return size
+    spool = file.file
+    position = spool.tell()
+    spool.seek(0, os.SEEK_END)
+    size = spool.tell()
+    spool.seek(position)
+    return size
+
+
+async def open_upload_body(file: UploadFile) -> Union[bytes, io.BufferedReader]:
+    """
+    Body to pass to a Supabase Storage upload
+    
+    Once the spool has rolled to disk, returns a reader over its own file descriptor, which
+    httpx streams in chunks; small in-memory spools are returned as bytes. Close the result
+    with close_upload_body().
+    """
+    await file.seek(0)
+    spool = file.file
+    if not getattr(spool, '_rolled', False):
+        return await file.read()
+    reader = io.BufferedReader(io.FileIO(os.dup(spool.fileno()), 'rb'))
+    await run_blocking(reader.seek, 0)
+    return reader
+
+
+def close_upload_body(body: Union[bytes, io.BufferedReader]) -> None:
+    if isinstance(body, io.BufferedReader):
+        body.close()
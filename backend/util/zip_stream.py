@@ -0,0 +1,245 @@
+"""
+Streaming ZIP archives of stored (uncompressed) members
+
+The archive layout depends only on the member names and sizes: every member is stored, its
+local header carries the real sizes and the CRC-32 follows the data in a data descriptor. So
+the total length and the offset of every byte are known before any member is read, which is
+what makes HTTP range requests (resumed downloads) possible. CRCs are only needed for the data
+descriptors and the central directory; they are computed while members stream through, or up
+front by the caller-supplied member_crc when a range starts past a member.
+
+ZIP64 records are used for members or archives of 4 GiB and more.
+"""
+import re
+import struct
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+
+# Bit 3: CRC in a data descriptor after the data; bit 11: UTF-8 names
+_FLAGS = 0x0008 | 0x0800
+_STORED = 0
+_VERSION = 20
+_VERSION_ZIP64 = 45
+
+_RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+@dataclass
+class ZipMember:
+    name: str
+    size: int
+    modified: datetime
+    crc32: Optional[int] = None
+
+
+def _dos_datetime(modified: datetime) -> Tuple[int, int]:
+    if modified.year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time = (modified.hour << 11) | (modified.minute << 5) | (modified.second // 2)
+    dos_date = ((modified.year - 1980) << 9) | (modified.month << 5) | modified.day
+    return dos_time, dos_date
+
+
+def parse_range(range_header: Optional[str], total_size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive byte range of a single-range Range header, or None for the whole body
+
+    Multiple ranges and malformed headers are ignored (whole body), as RFC 9110 allows.
+
+    Raises:
+        ValueError: The range is not satisfiable (respond 416)
+    """
+    if not range_header:
+        return None
+    match = _RANGE_PATTERN.match(range_header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, total_size - suffix), total_size - 1
+    start = int(first)
+    end = min(int(last), total_size - 1) if last else total_size - 1
+    if start >= total_size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+class ZipLayout:
+    """Byte layout of a stored-member archive; see the module docstring"""
+
+    def __init__(self, members: List[ZipMember]):
+        self.members = members
+        # (offset, length, kind, member index) with kind 'header' | 'data' | 'descriptor' | 'directory'
+        self.segments: List[Tuple[int, int, str, int]] = []
+        self._headers: List[bytes] = []
+        self._offsets: List[int] = []
+
+        offset = 0
+        for index, member in enumerate(members):
+            header = self._local_header(member)
+            self._headers.append(header)
+            self._offsets.append(offset)
+            self.segments.append((offset, len(header), 'header', index))
+            offset += len(header)
+            self.segments.append((offset, member.size, 'data', index))
+            offset += member.size
+            descriptor_length = 24 if member.size >= ZIP64_LIMIT else 16
+            self.segments.append((offset, descriptor_length, 'descriptor', index))
+            offset += descriptor_length
+
+        self.directory_offset = offset
+        self.directory_length = sum(46 + len(self._encoded_name(m)) + len(self._central_extra(m, o)) for m, o in zip(members, self._offsets))
+        self.segments.append((offset, self.directory_length + self._end_records_length(), 'directory', -1))
+        self.total_size = offset + self.directory_length + self._end_records_length()
+
+    @staticmethod
+    def _encoded_name(member: ZipMember) -> bytes:
+        return member.name.encode('utf-8')
+
+    def _local_header(self, member: ZipMember) -> bytes:
+        name = self._encoded_name(member)
+        dos_time, dos_date = _dos_datetime(member.modified)
+        if member.size >= ZIP64_LIMIT:
+            extra = struct.pack('<HHQQ', 0x0001, 16, member.size, member.size)
+            version, size_field = _VERSION_ZIP64, ZIP64_LIMIT
+        else:
+            extra = b''
+            version, size_field = _VERSION, member.size
+        return struct.pack(
+            '<IHHHHHIIIHH',
+            0x04034b50, version, _FLAGS, _STORED, dos_time, dos_date,
+            0, size_field, size_field, len(name), len(extra)
+        ) + name + extra
+
+    @staticmethod
+    def _central_extra(member: ZipMember, offset: int) -> bytes:
+        fields = []
+        if member.size >= ZIP64_LIMIT:
+            fields += [member.size, member.size]
+        if offset >= ZIP64_LIMIT:
+            fields.append(offset)
+        if not fields:
+            return b''
+        return struct.pack(f'<HH{len(fields)}Q', 0x0001, 8 * len(fields), *fields)
+
+    def _needs_zip64_end(self) -> bool:
+        return (
+            len(self.members) >= ZIP64_COUNT_LIMIT
+            or self.directory_offset >= ZIP64_LIMIT
+            or self.directory_length >= ZIP64_LIMIT
+        )
+
+    def _end_records_length(self) -> int:
+        return 22 + (56 + 20 if self._needs_zip64_end() else 0)
+
+    def header(self, index: int) -> bytes:
+        return self._headers[index]
+
+    def descriptor(self, index: int) -> bytes:
+        member = self.members[index]
+        if member.size >= ZIP64_LIMIT:
+            return struct.pack('<IIQQ', 0x08074b50, member.crc32, member.size, member.size)
+        return struct.pack('<IIII', 0x08074b50, member.crc32, member.size, member.size)
+
+    def directory(self) -> bytes:
+        """Central directory and end records (every member's crc32 must be set)"""
+        records = []
+        for member, offset in zip(self.members, self._offsets):
+            name = self._encoded_name(member)
+            extra = self._central_extra(member, offset)
+            dos_time, dos_date = _dos_datetime(member.modified)
+            version = _VERSION_ZIP64 if extra else _VERSION
+            size_field = ZIP64_LIMIT if member.size >= ZIP64_LIMIT else member.size
+            records.append(struct.pack(
+                '<IHHHHHHIIIHHHHHII',
+                0x02014b50, version, version, _FLAGS, _STORED, dos_time, dos_date,
+                member.crc32, size_field, size_field, len(name), len(extra), 0, 0, 0, 0,
+                min(offset, ZIP64_LIMIT)
+            ) + name + extra)
+
+        count = len(self.members)
+        if self._needs_zip64_end():
+            zip64_end_offset = self.directory_offset + self.directory_length
+            records.append(struct.pack(
+                '<IQHHIIQQQQ',
+                0x06064b50, 44, _VERSION_ZIP64, _VERSION_ZIP64, 0, 0,
+                count, count, self.directory_length, self.directory_offset
+            ))
+            records.append(struct.pack('<IIQI', 0x07064b50, 0, zip64_end_offset, 1))
+        records.append(struct.pack(
+            '<IHHHHIIH',
+            0x06054b50, 0, 0, min(count, ZIP64_COUNT_LIMIT), min(count, ZIP64_COUNT_LIMIT),
+            min(self.directory_length, ZIP64_LIMIT), min(self.directory_offset, ZIP64_LIMIT), 0
+        ))
+        return b''.join(records)
+
+
+async def stream_zip(
+    layout: ZipLayout,
+    start: int,
+    end: int,
+    read_member: Callable[[int, int, int], AsyncIterator[bytes]],
+    member_crc: Callable[[int], Awaitable[int]],
+    on_crc: Optional[Callable[[int, int], Awaitable[None]]] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Bytes start..end (inclusive) of the archive
+
+    Args:
+        read_member: (index, offset, length) -> the member's bytes offset..offset+length
+        member_crc: index -> the member's CRC-32, for members not streamed in full here
+        on_crc: Called with (index, crc32) when a member's CRC is computed while streaming
+    """
+    for segment_offset, length, kind, index in layout.segments:
+        segment_end = segment_offset + length - 1
+        if length == 0 and kind == 'data':
+            if layout.members[index].crc32 is None:
+                layout.members[index].crc32 = 0
+            continue
+        if segment_end < start or segment_offset > end:
+            continue
+        slice_start = max(start, segment_offset) - segment_offset
+        slice_end = min(end, segment_end) - segment_offset + 1
+
+        if kind == 'data':
+            member = layout.members[index]
+            whole = slice_start == 0 and slice_end == length
+            crc = 0
+            received = 0
+            async for chunk in read_member(index, slice_start, slice_end - slice_start):
+                if whole:
+                    crc = zlib.crc32(chunk, crc)
+                received += len(chunk)
+                yield chunk
+            if received != slice_end - slice_start:
+                # The stored object changed size; the archive can't be completed
+                raise IOError(f"Member {member.name} is {received} bytes short of its expected range")
+            if whole and member.crc32 != crc:
+                member.crc32 = crc
+                if on_crc is not None:
+                    await on_crc(index, crc)
+            continue
+
+        if kind == 'header':
+            data = layout.header(index)
+        elif kind == 'descriptor':
+            if layout.members[index].crc32 is None:
+                layout.members[index].crc32 = await member_crc(index)
+            data = layout.descriptor(index)
+        else:
+            for member_index, member in enumerate(layout.members):
+                if member.crc32 is None:
+                    member.crc32 = await member_crc(member_index)
+            data = layout.directory()
+        yield data[slice_start:slice_end]
@@ -537,6 +537,93 @@ class BookingService {
     return response.data;
   }
 
+  /**
+   * Upload one large deliverable through a resumable upload session
+   * Chunks are sent with a SHA-256 checksum; after a network error the upload continues from the
+   * server's offset. Pass a previous session id to resume an upload from an earlier page load.
+   * Resolves once the file has been scanned and registered.
+   * @param onSession - Called with the session id (store it to resume after a reload)
+   */
+  async uploadDeliverableResumable(
+    bookingId: string,
+    file: File,
+    onProgress?: (percent: number) => void,
+    abortSignal?: AbortSignal,
+    resumeSessionId?: string,
+    onSession?: (sessionId: string) => void
+  ): Promise<{ success: boolean; deliverable_id: string; storage_path: string }> {
+    type UploadSession = {
+      session_id: string;
+      storage_path: string;
+      chunk_size: number;
+      total_chunks: number;
+      upload_offset: number;
+      next_chunk: number;
+      status: string;
+      error?: string;
+      deliverable_id?: string;
+    };
+    const sessionsUrl = `${this.bookingsUrl}/upload-sessions`;
+    const maxRetries = 5;
+
+    let session: UploadSession;
+    if (resumeSessionId) {
+      session = (await apiClient.get(`${sessionsUrl}/${resumeSessionId}`)).data.session;
+    } else {
+      session = (await apiClient.post(sessionsUrl, {
+        booking_id: bookingId,
+        file_name: file.name,
+        file_size: file.size,
+        file_type: file.type || 'application/octet-stream'
+      })).data.session;
+    }
+    onSession?.(session.session_id);
+
+    let retries = 0;
+    while (session.status === 'uploading' && session.upload_offset < file.size) {
+      if (abortSignal?.aborted) {
+        throw new Error('Upload cancelled by user');
+      }
+      onProgress?.(Math.min((session.upload_offset / file.size) * 95, 95));
+
+      const chunk = await file.slice(session.upload_offset, session.upload_offset + session.chunk_size).arrayBuffer();
+      const digest = new Uint8Array(await crypto.subtle.digest('SHA-256', chunk));
+      const checksum = btoa(String.fromCharCode(...digest));
+      try {
+        session = (await apiClient.put(`${sessionsUrl}/${session.session_id}/chunks/${session.next_chunk}`, chunk, {
+          headers: { 'Upload-Checksum': `sha256 ${checksum}` },
+          signal: abortSignal
+        })).data.session;
+        retries = 0;
+      } catch (error: any) {
+        if (abortSignal?.aborted || ++retries > maxRetries || [400, 403, 404, 410, 413].includes(error.response?.status)) {
+          throw error;
+        }
+        // Network error, checksum mismatch or out of order: re-read the server's offset and continue
+        await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+        session = (await apiClient.get(`${sessionsUrl}/${session.session_id}`)).data.session;
+      }
+    }
+
+    if (session.status === 'uploading' || session.status === 'failed') {
+      session = (await apiClient.post(`${sessionsUrl}/${session.session_id}/complete`)).data.session;
+    }
+    // Scanning runs on the server; poll until it finishes
+    while (session.status === 'scanning') {
+      if (abortSignal?.aborted) {
+        throw new Error('Upload cancelled by user');
+      }
+      await new Promise(resolve => setTimeout(resolve, 2000));
+      session = (await apiClient.get(`${sessionsUrl}/${session.session_id}`)).data.session;
+    }
+    if (session.status !== 'completed' || !session.deliverable_id) {
+      throw new Error(session.error || 'Upload failed');
+    }
+
+    onProgress?.(100);
+    return { success: true, deliverable_id: session.deliverable_id, storage_path: session.storage_path };
+  }
+
   async getCreativeDeliverables(): Promise<Array<{
     id: string;
     booking_id: string;
@@ -587,10 +674,9 @@ class BookingService {
   }
 
   async downloadComplianceSheet(bookingId: string): Promise<Blob> {
-    const response = await apiClient.get(`/api/bookings/compliance-sheet/${bookingId}`, {
-      responseType: 'blob'
-    });
-    return response.data;
+    // The API returns a signed URL to the stored PDF
+    const response = await apiClient.get<{ success: boolean; url: string; filename: string }>(`/api/bookings/compliance-sheet/${bookingId}`);
+    return this.fetchDocument(response.data.url);
   }
 
   async getInvoices(bookingId: string): Promise<{ success: boolean; booking_id: string; invoices: Array<{ type: string; name: string; download_url: string; session_id?: string }> }> {
@@ -599,10 +685,17 @@ class BookingService {
   }
 
   async downloadEzInvoice(bookingId: string): Promise<Blob> {
-    const response = await apiClient.get(`/api/bookings/invoice/ez/${bookingId}`, {
-      responseType: 'blob'
-    });
-    return response.data;
+    // The API returns a signed URL to the stored PDF
+    const response = await apiClient.get<{ success: boolean; url: string; filename: string }>(`/api/bookings/invoice/ez/${bookingId}`);
+    return this.fetchDocument(response.data.url);
+  }
+
+  private async fetchDocument(signedUrl: string): Promise<Blob> {
+    const response = await fetch(signedUrl);
+    if (!response.ok) {
+      throw new Error(`Failed to download document (${response.status})`);
+    }
+    return response.blob();
   }
 
   async getStripeReceipt(bookingId: string, sessionId: string): Promise<{ success: boolean; receipt_url: string; session_id: string }> {
@@ -89,6 +89,61 @@ export async function getNotifications(
   }
 }
 
+export interface NotificationPage {
+  notifications: Notification[];
+  next_cursor: string | null;
+}
+
+/**
+ * Get one page of notifications (newest first)
+ * @param limit - Page size (1-100)
+ * @param cursor - next_cursor of the previous page; omit for the first page
+ * @param unreadOnly - If true, only return unread notifications
+ * @param roleContext - Optional role context ('client', 'creative', 'advocate')
+ */
+export async function getNotificationsPage(
+  limit: number = 25,
+  cursor?: string | null,
+  unreadOnly: boolean = false,
+  roleContext?: 'client' | 'creative' | 'advocate'
+): Promise<NotificationPage> {
+  // Check authentication before making API call
+  const isAuthenticated = await checkAuth();
+  if (!isAuthenticated) {
+    return { notifications: [], next_cursor: null };
+  }
+
+  try {
+    const headers = await getAuthHeaders();
+    const params: Record<string, any> = {
+      limit,
+      unread_only: unreadOnly
+    };
+
+    if (cursor) {
+      params.cursor = cursor;
+    }
+    if (roleContext) {
+      params.role_context = roleContext;
+    }
+
+    const response = await axios.get<NotificationPage>(
+      `${API_BASE_URL}/notifications/page`,
+      {
+        headers,
+        params
+      }
+    );
+    return response.data;
+  } catch (error: any) {
+    if (error.response?.status === 401) {
+      return { notifications: [], next_cursor: null };
+    }
+    const msg = typeof error.response?.data?.detail === 'string' ? error.response.data.detail : undefined;
+    throw new Error(msg || 'Failed to fetch notifications');
+  }
+}
+
 /**
  * Get count of unread notifications
  * @param roleContext - Optional role context ('client', 'creative', 'advocate'). 
@@ -154,3 +209,127 @@ export async function markNotificationAsRead(notificationId: string): Promise<No
   }
 }
 
+
+/**
+ * Mark all unread notifications as read
+ * @param roleContext - Optional role context; only notifications shown in this context are marked
+ * @param upTo - Optional cursor of the newest notification the user has seen; newer ones stay unread
+ * @returns The number of notifications marked
+ */
+export async function markAllNotificationsAsRead(
+  roleContext?: 'client' | 'creative' | 'advocate',
+  upTo?: string
+): Promise<number> {
+  // Check authentication before making API call
+  const isAuthenticated = await checkAuth();
+  if (!isAuthenticated) {
+    throw new Error('User not authenticated');
+  }
+
+  try {
+    const headers = await getAuthHeaders();
+    const response = await axios.put<{ success: boolean; updated: number }>(
+      `${API_BASE_URL}/notifications/read-all`,
+      { role_context: roleContext, up_to: upTo },
+      { headers }
+    );
+    return response.data.updated;
+  } catch (error: any) {
+    if (error.response?.status === 401) {
+      throw new Error('User not authenticated');
+    }
+    const msg = typeof error.response?.data?.detail === 'string' ? error.response.data.detail : undefined;
+    throw new Error(msg || 'Failed to mark notifications as read');
+  }
+}
+
+export type NotificationStreamEvent = 'ready' | 'created' | 'read' | 'resync';
+
+/**
+ * Listen for notification changes pushed by the server (replaces polling)
+ * The callback runs on connect ('ready') and whenever a notification is created or read; the
+ * caller refetches what it displays. Reconnects with backoff and a fresh access token.
+ * @param onEvent - Called with the event type and, for 'created'/'read', the notification ID
+ * @param roleContext - Optional role context; 'created' events for other roles are skipped
+ * @returns A function that closes the stream
+ */
+export function subscribeToNotifications(
+  onEvent: (event: NotificationStreamEvent, notificationId?: string) => void,
+  roleContext?: 'client' | 'creative' | 'advocate'
+): () => void {
+  const controller = new AbortController();
+  let retryDelay = 1000;
+
+  const dispatch = (block: string) => {
+    let event = 'message';
+    let data = '';
+    for (const line of block.split('\n')) {
+      if (line.startsWith('event:')) {
+        event = line.slice(6).trim();
+      } else if (line.startsWith('data:')) {
+        data += line.slice(5).trim();
+      }
+    }
+    if (event === 'reauth') {
+      return;
+    }
+    let notificationId: string | undefined;
+    try {
+      notificationId = data ? JSON.parse(data).notification_id ?? undefined : undefined;
+    } catch {
+      notificationId = undefined;
+    }
+    onEvent(event as NotificationStreamEvent, notificationId);
+  };
+
+  const connect = async () => {
+    while (!controller.signal.aborted) {
+      try {
+        const { data: session } = await supabase.auth.getSession();
+        const jwtToken = session.session?.access_token;
+        if (!jwtToken) {
+          return;
+        }
+        const query = roleContext ? `?role_context=${encodeURIComponent(roleContext)}` : '';
+        const response = await fetch(`${API_BASE_URL}/notifications/stream${query}`, {
+          headers: { Accept: 'text/event-stream', Authorization: `Bearer ${jwtToken}` },
+          signal: controller.signal
+        });
+        if (response.status === 401) {
+          return;
+        }
+        if (!response.ok || !response.body) {
+          throw new Error(`Notification stream failed: ${response.status}`);
+        }
+
+        retryDelay = 1000;
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) {
+            break;
+          }
+          buffer += value.replace(/\r\n/g, '\n');
+          let boundary = buffer.indexOf('\n\n');
+          while (boundary !== -1) {
+            dispatch(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+            boundary = buffer.indexOf('\n\n');
+          }
+        }
+        // Stream ended (token expired or server restarting): reconnect right away
+        continue;
+      } catch {
+        if (controller.signal.aborted) {
+          return;
+        }
+      }
+      await new Promise(resolve => setTimeout(resolve, retryDelay));
+      retryDelay = Math.min(retryDelay * 2, 30000);
+    }
+  };
+
+  connect();
+  return () => controller.abort();
+}
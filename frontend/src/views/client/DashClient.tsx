@@ -4,7 +4,7 @@ import { WelcomeCard } from '../../components/cards/client/WelcomeCard';
 import { UpcomingBookingsCard } from '../../components/cards/client/UpcomingBookingsCard';
 import { RecentActivityCard } from '../../components/cards/client/RecentActivityCard';
 import { useState, useEffect, useRef } from 'react';
-import { getNotifications } from '../../api/notificationsService';
+import { getNotifications, subscribeToNotifications } from '../../api/notificationsService';
 import { notificationsToActivityItems } from '../../utils/notificationUtils';
 import type { ActivityItem } from '../../types/activity';
 import { useAuth } from '../../context/auth';
@@ -203,11 +203,17 @@ export function ClientDashboard() {
       setIsLoading(false);
     });
 
-    // Set up polling to refresh notifications every 10 seconds
-    const pollInterval = setInterval(() => {
+    // Refresh notifications when the server pushes a change (or the stream reconnects)
+    let initialReady = true;
+    const unsubscribe = subscribeToNotifications((event) => {
       if (!mountedRef.current || !isAuthenticated) {
         return;
       }
+      if (event === 'ready' && initialReady) {
+        // Just loaded above
+        initialReady = false;
+        return;
+      }
 
       // Invalidate cache to force refresh
       const now = Date.now();
@@ -231,17 +237,17 @@ export function ClientDashboard() {
           return items;
         } catch (error) {
           clientNotificationsCache.promise = null;
-          // Don't update state on polling errors to avoid disrupting UI
+          // Don't update state on refresh errors to avoid disrupting UI
           return [];
         }
       })();
 
       clientNotificationsCache.promise = fetchPromise;
-    }, 10000); // Poll every 10 seconds
+    }, 'client');
 
     return () => {
       mountedRef.current = false;
-      clearInterval(pollInterval);
+      unsubscribe();
     };
   }, [isAuthenticated]);
 
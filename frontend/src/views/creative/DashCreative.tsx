@@ -5,7 +5,7 @@ import { ActivityFeedCard } from '../../components/cards/creative/ActivityFeedCa
 import type { CreativeDashboardStats } from '../../api/userService';
 import { userService } from '../../api/userService';
 import { useState, useEffect, useRef } from 'react';
-import { getNotifications } from '../../api/notificationsService';
+import { getNotifications, subscribeToNotifications } from '../../api/notificationsService';
 import { notificationsToActivityItems } from '../../utils/notificationUtils';
 import type { ActivityItem } from '../../types/activity';
 import { useAuth } from '../../context/auth';
@@ -192,11 +192,17 @@ export function DashCreative() {
       setIsLoading(false);
     });
 
-    // Set up polling to refresh notifications every 10 seconds
-    const pollInterval = setInterval(() => {
+    // Refresh notifications when the server pushes a change (or the stream reconnects)
+    let initialReady = true;
+    const unsubscribe = subscribeToNotifications((event) => {
       if (!mountedRef.current || !isAuthenticated) {
         return;
       }
+      if (event === 'ready' && initialReady) {
+        // Just loaded above
+        initialReady = false;
+        return;
+      }
 
       // Invalidate cache to force refresh
       const now = Date.now();
@@ -220,17 +226,17 @@ export function DashCreative() {
           return items;
         } catch (error) {
           notificationsCache.promise = null;
-          // Don't update state on polling errors to avoid disrupting UI
+          // Don't update state on refresh errors to avoid disrupting UI
           return [];
         }
       })();
 
       notificationsCache.promise = fetchPromise;
-    }, 10000); // Poll every 10 seconds
+    }, 'creative');
 
     return () => {
       mountedRef.current = false;
-      clearInterval(pollInterval);
+      unsubscribe();
     };
   }, [isAuthenticated]);
 